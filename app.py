@@ -5,6 +5,19 @@ citeflex/app.py
 Flask application for CiteFlex Unified.
 
 Version History:
+    2026-10-16: Document cost tracking uses a per-context ledger
+                (cost_tracker.track_document_costs)
+    2026-10-16: /api/process-author-date looks its citations up with batched AI
+                requests (get_parenthetical_metadata_batch)
+    2026-10-16: Added /api/process-batch and /api/download-batch/<batch_id>: a zip
+                or several documents processed together, each distinct citation
+                looked up once (batch_processor.py)
+    2026-10-16: Job mode for /api/process and /api/process-author-date (async=true):
+                documents run on a background pool (jobs.py), progress via
+                /api/jobs/<job_id> (polling) or /api/jobs/<job_id>/events (SSE)
+    2026-10-16: Added /metrics (routing-cascade latency histograms and counters,
+                see metrics.py); /api/process and /api/process-author-date
+                return a per-document trace
     2025-12-12: Added document topic extraction for AI context.
                 Extracts keywords from document body to help AI disambiguate
                 between authors with same name in different fields.
@@ -38,28 +51,36 @@ FIXES APPLIED:
 """
 
 import os
+import json
 import uuid
 import time
 import threading
+import heapq
 import pickle
 from pathlib import Path
 from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, Response
 from werkzeug.utils import secure_filename
 
-from unified_router import get_citation, get_multiple_citations, get_parenthetical_options, get_parenthetical_metadata
+from unified_router import get_citation, get_multiple_citations, get_parenthetical_options, get_parenthetical_metadata, get_parenthetical_metadata_batch
 from formatters.base import get_formatter
 from document_processor import process_document
+from batch_processor import read_batch_upload, process_batch, BatchTooLarge
+from config import DOCUMENT_DEADLINE, BATCH_MAX_DOCUMENTS, BATCH_MAX_TOTAL_MB
 from processors.topic_extractor import get_document_context
 from processors.document_metadata import export_cache_to_csv
+from session_store import FileSessionStore, make_session_store
+import metrics
+from negative_cache import submit_in_context
+from jobs import JobManager, JobQueueFull, TERMINAL_STATES
 
 # Billing system imports
 from billing import (
     init_billing, billing_bp, 
-    requires_credits, spend_user_credit,
-    get_balance_fast, has_credits
+    requires_auth, requires_credits, spend_user_credit,
+    get_balance_fast, has_credits, CREDITS_PER_DOCUMENT
 )
 from flask_login import current_user
 
@@ -141,15 +162,40 @@ def record_preview_usage(ip_address: str, session_id: str = None):
 # Session storage directory - use Railway Volume mount point for persistence
 SESSIONS_DIR = Path(os.environ.get('SESSIONS_DIR', '/data/sessions'))
 
+# 'sqlite' - one store shared by all gunicorn workers; 'file' - per-key files
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite').lower()
+
+
+class _SessionShard:
+    """One slice of the session table with its own lock."""
+    
+    __slots__ = ('lock', 'sessions')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+
 class SessionManager:
     """
-    Thread-safe session manager with file-based persistence.
+    Thread-safe session manager with persistent, optionally shared storage.
     
     Features:
-    1. Thread-safe with threading.Lock()
+    1. Thread-safe: sessions are sharded by id, each shard has its own lock
     2. Sessions expire after 4 hours
     3. Persists to disk - survives server restarts/deployments
     4. Requires Railway Volume mounted at /data for full persistence
+    5. Delta persistence (session_store.py): only changed keys are written,
+       large bytes (the .docx) are stored once as content-addressed blobs,
+       and update() commits several keys in one call
+    6. Disk reads and writes happen outside the shard locks; writes to one
+       session are ordered by a per-session I/O lock
+    7. Expired sessions are removed by a background sweeper driven by an
+       expiry heap, not by scanning every session under a lock
+    8. SESSION_BACKEND=sqlite (default): all workers share one SQLite store.
+       Each session carries a version; before serving a cached session the
+       worker applies only the keys other workers changed since (read-your-
+       writes across workers, no whole-session reloads)
     
     Setup for Railway:
     1. Go to your service in Railway
@@ -160,20 +206,34 @@ class SessionManager:
     
     SESSION_EXPIRY_HOURS = 4
     CLEANUP_INTERVAL_MINUTES = 15
+    SHARD_COUNT = 16
     
-    def __init__(self, storage_dir: Path = SESSIONS_DIR):
-        self._sessions = {}
-        self._lock = threading.Lock()
-        self._last_cleanup = time.time()
+    def __init__(self, storage_dir: Path = SESSIONS_DIR, backend: str = SESSION_BACKEND):
+        self._shards = [_SessionShard() for _ in range(self.SHARD_COUNT)]
         self._storage_dir = storage_dir
+        self._backend = backend
+        self._store = None
         self._persistence_available = False
         
+        # Expiry heap of (expires_at timestamp, session_id), consumed by the sweeper
+        self._expiry_heap = []
+        self._expiry_lock = threading.Lock()
+        self._sweeper_wakeup = threading.Event()
+        self._sweeper_pid = None
+        
         # Try to set up persistent storage
         self._init_storage()
         
         # Load existing sessions from disk
         self._load_sessions()
     
+    def __len__(self) -> int:
+        """Number of sessions held in memory."""
+        return sum(len(shard.sessions) for shard in self._shards)
+    
+    def _shard(self, session_id: str) -> _SessionShard:
+        return self._shards[hash(session_id) % self.SHARD_COUNT]
+    
     def _init_storage(self):
         """Initialize storage directory if possible."""
         try:
@@ -182,50 +242,144 @@ class SessionManager:
             test_file = self._storage_dir / '.test'
             test_file.write_text('test')
             test_file.unlink()
+            self._store = make_session_store(self._backend, self._storage_dir)
             self._persistence_available = True
-            print(f"[SessionManager] Persistent storage enabled at {self._storage_dir}")
+            print(f"[SessionManager] Persistent storage enabled at {self._storage_dir} ({self._backend})")
         except Exception as e:
             self._persistence_available = False
             print(f"[SessionManager] Persistent storage unavailable ({e}). Using in-memory only.")
             print("[SessionManager] To enable persistence, add a Railway Volume mounted at /data")
     
-    def _get_session_file(self, session_id: str) -> Path:
-        """Get the file path for a session."""
-        return self._storage_dir / f"{session_id}.pkl"
+    # -------------------------------------------------------------------------
+    # Disk I/O (never called with a shard lock held)
+    # -------------------------------------------------------------------------
     
-    def _save_session(self, session_id: str):
-        """Save a single session to disk with file locking."""
-        if not self._persistence_available:
-            return
-        try:
-            import fcntl
-            session = self._sessions.get(session_id)
-            if session:
-                session_file = self._get_session_file(session_id)
-                # Write to temp file first, then rename (atomic on POSIX)
-                temp_file = session_file.with_suffix('.tmp')
-                with open(temp_file, 'wb') as f:
-                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Exclusive lock
-                    pickle.dump(session, f)
-                    f.flush()
-                    os.fsync(f.fileno())  # Force write to disk
-                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)  # Unlock
-                # Atomic rename
-                temp_file.rename(session_file)
-        except Exception as e:
-            print(f"[SessionManager] Failed to save session {session_id[:8]}: {e}")
+    @staticmethod
+    def _meta_record(session: dict) -> dict:
+        """created_at / expires_at as stored in meta.json."""
+        return {
+            'created_at': session['created_at'].isoformat(),
+            'expires_at': session['expires_at'].isoformat(),
+        }
+    
+    def _save_changes(self, session_id: str, session: dict, keys, meta: bool = False, values: dict = None):
+        """
+        Apply values in memory (if given) and persist the given keys (and the
+        expiry record if meta=True).
+        
+        Runs under the session's I/O lock, so writes to one session reach the
+        store in the order they were made in memory, and a refresh from the
+        shared store can't interleave with them.
+        """
+        with session['io_lock']:
+            if values:
+                with self._shard(session_id).lock:
+                    session['data'].update(values)
+            if not self._persistence_available:
+                return
+            data = session['data']
+            changes = {key: data[key] for key in keys if key in data}
+            try:
+                version = self._store.write(
+                    session_id,
+                    changes,
+                    meta=self._meta_record(session) if meta else None
+                )
+            except Exception as e:
+                print(f"[SessionManager] Failed to save session {session_id[:8]}: {e}")
+                return
+            # Only advance if no other worker wrote in between - otherwise the
+            # next refresh picks up their keys (and harmlessly ours)
+            if version == session['version'] + 1:
+                session['version'] = version
+    
+    def _refresh(self, session_id: str, session: dict) -> bool:
+        """
+        Bring a cached session up to date with the shared store.
+        
+        Returns False if another worker deleted (or expired) the session.
+        """
+        with session['io_lock']:
+            try:
+                delta = self._store.changes_since(session_id, session['version'])
+            except Exception as e:
+                # Serve the cached copy rather than fail the request
+                print(f"[SessionManager] Failed to refresh session {session_id[:8]}: {e}")
+                return True
+            if delta is None:
+                return False
+            version, changed = delta
+            if changed:
+                with self._shard(session_id).lock:
+                    session['data'].update(changed)
+            session['version'] = version
+        return True
+    
+    def _new_record(self, created_at: datetime, expires_at: datetime, data: dict, version: int = 0) -> dict:
+        return {
+            'created_at': created_at,
+            'expires_at': expires_at,
+            'data': data,
+            'version': version,
+            'io_lock': threading.Lock(),
+        }
+    
+    def _read_session(self, session_id: str):
+        """Read one session from disk, or None."""
+        stored = self._store.read(session_id)
+        if stored is None:
+            return None
+        meta, data, version = stored
+        return self._new_record(
+            datetime.fromisoformat(meta['created_at']),
+            datetime.fromisoformat(meta['expires_at']),
+            data,
+            version
+        )
     
     def _delete_session_file(self, session_id: str):
-        """Delete session file from disk."""
+        """Delete session files from disk (shared blobs go in cleanup)."""
         if not self._persistence_available:
             return
         try:
-            session_file = self._get_session_file(session_id)
-            if session_file.exists():
-                session_file.unlink()
+            self._store.delete(session_id)
+            legacy_file = self._storage_dir / f"{session_id}.pkl"
+            if legacy_file.exists():
+                legacy_file.unlink()
         except Exception as e:
             print(f"[SessionManager] Failed to delete session file {session_id[:8]}: {e}")
     
+    def _migrate_legacy_sessions(self) -> int:
+        """Convert whole-session <id>.pkl files (and, for a shared store,
+        per-key session directories) into the configured store."""
+        migrated = 0
+        if self._store.shared:
+            file_store = FileSessionStore(self._storage_dir)
+            for session_id in list(file_store.session_ids()):
+                try:
+                    stored = file_store.read(session_id)
+                    if stored is not None:
+                        meta, data, _ = stored
+                        self._store.write(session_id, data, meta=meta)
+                        migrated += 1
+                except Exception as e:
+                    print(f"[SessionManager] Failed to migrate {session_id[:8]}: {e}")
+                file_store.delete(session_id)
+        for session_file in self._storage_dir.glob("*.pkl"):
+            try:
+                with open(session_file, 'rb') as f:
+                    session = pickle.load(f)
+                self._store.write(session_file.stem, session.get('data', {}), meta=self._meta_record(session))
+                migrated += 1
+            except Exception as e:
+                print(f"[SessionManager] Failed to migrate {session_file.name}: {e}")
+            # Remove migrated (or corrupted) file
+            try:
+                session_file.unlink()
+            except OSError:
+                pass
+        return migrated
+    
     def _load_sessions(self):
         """Load all sessions from disk on startup."""
         if not self._persistence_available:
@@ -236,143 +390,264 @@ class SessionManager:
         current_time = datetime.now()
         
         try:
-            for session_file in self._storage_dir.glob("*.pkl"):
+            migrated = self._migrate_legacy_sessions()
+            if migrated:
+                print(f"[SessionManager] Migrated {migrated} legacy session files")
+            
+            if self._store.shared:
+                # Shared store: sessions are loaded lazily on first access
+                expired = self._store.purge_expired()
+                if expired:
+                    print(f"[SessionManager] Cleaned {expired} expired sessions")
+                return
+            
+            for session_id in list(self._store.session_ids()):
                 try:
-                    with open(session_file, 'rb') as f:
-                        session = pickle.load(f)
+                    session = self._read_session(session_id)
+                    if session is None:
+                        continue
                     
                     # Check if expired
-                    if current_time > session.get('expires_at', current_time):
-                        session_file.unlink()
+                    if current_time > session['expires_at']:
+                        self._store.delete(session_id)
                         expired += 1
                         continue
                     
-                    session_id = session_file.stem
-                    self._sessions[session_id] = session
+                    self._shard(session_id).sessions[session_id] = session
+                    self._schedule_expiry(session_id, session)
                     loaded += 1
                 except Exception as e:
-                    print(f"[SessionManager] Failed to load {session_file.name}: {e}")
-                    # Remove corrupted file
-                    try:
-                        session_file.unlink()
-                    except:
-                        pass
+                    print(f"[SessionManager] Failed to load session {session_id[:8]}: {e}")
+                    # Remove corrupted session
+                    self._store.delete(session_id)
             
             if loaded > 0 or expired > 0:
                 print(f"[SessionManager] Loaded {loaded} sessions, cleaned {expired} expired")
         except Exception as e:
             print(f"[SessionManager] Failed to load sessions: {e}")
     
+    # -------------------------------------------------------------------------
+    # Public interface
+    # -------------------------------------------------------------------------
+    
     def create(self) -> str:
         """Create a new session with expiration."""
         session_id = str(uuid.uuid4())
+        now = datetime.now()
+        session = self._new_record(now, now + timedelta(hours=self.SESSION_EXPIRY_HOURS), {})
         
-        with self._lock:
-            self._sessions[session_id] = {
-                'created_at': datetime.now(),
-                'expires_at': datetime.now() + timedelta(hours=self.SESSION_EXPIRY_HOURS),
-                'data': {}
-            }
-            self._save_session(session_id)
-            self._maybe_cleanup()
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.sessions[session_id] = session
         
+        self._save_changes(session_id, session, (), meta=True)
+        self._schedule_expiry(session_id, session)
         return session_id
     
+    def _live_session(self, session_id: str, purpose: str = ""):
+        """
+        The in-memory session record, recovering it from disk if needed.
+        
+        Returns None (and removes the session) if it is missing or expired.
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = shard.sessions.get(session_id)
+        
+        # Shared store: apply what other workers changed since our copy
+        if session and self._persistence_available and self._store.shared:
+            if not self._refresh(session_id, session):
+                with shard.lock:
+                    if shard.sessions.get(session_id) is session:
+                        del shard.sessions[session_id]
+                return None
+        
+        # Fallback: load from disk (e.g. created by another worker) - outside the lock
+        if not session and self._persistence_available:
+            try:
+                loaded = self._read_session(session_id)
+            except Exception as e:
+                print(f"[SessionManager] Failed to recover session {session_id[:8]}: {e}")
+                loaded = None
+            if loaded:
+                with shard.lock:
+                    # Another thread may have recovered it meanwhile - keep theirs
+                    session = shard.sessions.setdefault(session_id, loaded)
+                if session is loaded:
+                    self._schedule_expiry(session_id, session)
+                    print(f"[SessionManager] Recovered session {session_id[:8]} from disk{purpose}")
+        
+        if not session:
+            return None
+        
+        # Check expiration
+        if datetime.now() > session['expires_at']:
+            self._expire(session_id, session)
+            return None
+        
+        return session
+    
     def get(self, session_id: str) -> dict:
         """Get session data (thread-safe). Falls back to disk if not in memory."""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            
-            # Fallback: try loading from disk if not in memory
-            if not session and self._persistence_available:
-                session_file = self._get_session_file(session_id)
-                if session_file.exists():
-                    try:
-                        with open(session_file, 'rb') as f:
-                            session = pickle.load(f)
-                        self._sessions[session_id] = session
-                        print(f"[SessionManager] Recovered session {session_id[:8]} from disk")
-                    except Exception as e:
-                        print(f"[SessionManager] Failed to recover session {session_id[:8]}: {e}")
-            
-            if not session:
-                return None
-            
-            # Check expiration
-            if datetime.now() > session['expires_at']:
-                del self._sessions[session_id]
-                self._delete_session_file(session_id)
-                return None
-            
-            return session['data']
+        session = self._live_session(session_id)
+        return session['data'] if session else None
     
     def set(self, session_id: str, key: str, value) -> bool:
-        """Set session data (thread-safe). Falls back to disk if not in memory."""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            
-            # Fallback: try loading from disk if not in memory
-            if not session and self._persistence_available:
-                session_file = self._get_session_file(session_id)
-                if session_file.exists():
-                    try:
-                        with open(session_file, 'rb') as f:
-                            session = pickle.load(f)
-                        self._sessions[session_id] = session
-                        print(f"[SessionManager] Recovered session {session_id[:8]} from disk for set()")
-                    except Exception as e:
-                        print(f"[SessionManager] Failed to recover session {session_id[:8]}: {e}")
-            
-            if not session:
-                return False
-            
-            if datetime.now() > session['expires_at']:
-                del self._sessions[session_id]
-                self._delete_session_file(session_id)
-                return False
-            
-            session['data'][key] = value
-            self._save_session(session_id)
-            return True
+        """Set one session key (thread-safe). Only that key is written to disk."""
+        return self.update(session_id, {key: value})
+    
+    def update(self, session_id: str, values: dict) -> bool:
+        """
+        Set several session keys in one batched commit (thread-safe).
+        
+        Falls back to disk if the session is not in memory.
+        """
+        session = self._live_session(session_id, " for set()")
+        if not session:
+            return False
+        
+        self._save_changes(session_id, session, list(values), values=values)
+        return True
     
     def delete(self, session_id: str) -> bool:
         """Delete a session (thread-safe)."""
-        with self._lock:
-            if session_id in self._sessions:
-                del self._sessions[session_id]
-                self._delete_session_file(session_id)
-                return True
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = shard.sessions.pop(session_id, None)
+        if session is None:
             return False
+        self._delete_session_file(session_id)
+        return True
     
-    def _maybe_cleanup(self) -> None:
-        """
-        Clean up expired sessions periodically.
-        Called within lock, so no additional locking needed.
-        """
-        now = time.time()
-        if now - self._last_cleanup < self.CLEANUP_INTERVAL_MINUTES * 60:
+    # -------------------------------------------------------------------------
+    # Expiry (background sweeper)
+    # -------------------------------------------------------------------------
+    
+    def _expire(self, session_id: str, session: dict) -> bool:
+        """Remove a session if it is still the given (expired) record."""
+        shard = self._shard(session_id)
+        with shard.lock:
+            if shard.sessions.get(session_id) is not session:
+                return False
+            del shard.sessions[session_id]
+        self._delete_session_file(session_id)
+        return True
+    
+    def _schedule_expiry(self, session_id: str, session: dict) -> None:
+        """Queue a session for the sweeper (and start it in this process)."""
+        with self._expiry_lock:
+            heapq.heappush(self._expiry_heap, (session['expires_at'].timestamp(), session_id))
+        self._ensure_sweeper()
+    
+    def _ensure_sweeper(self) -> None:
+        """Start the sweeper thread once per process (gunicorn forks workers)."""
+        pid = os.getpid()
+        if self._sweeper_pid == pid:
             return
+        with self._expiry_lock:
+            if self._sweeper_pid == pid:
+                return
+            self._sweeper_pid = pid
+        threading.Thread(target=self._sweep_forever, name='session-sweeper', daemon=True).start()
+    
+    def _sweep_forever(self) -> None:
+        interval = self.CLEANUP_INTERVAL_MINUTES * 60
+        last_gc = time.time()
+        while True:
+            with self._expiry_lock:
+                next_due = self._expiry_heap[0][0] if self._expiry_heap else None
+            wait = interval if next_due is None else min(interval, max(0.0, next_due - time.time()))
+            self._sweeper_wakeup.wait(wait)
+            self._sweeper_wakeup.clear()
+            
+            try:
+                self._sweep_expired()
+                if time.time() - last_gc >= interval:
+                    last_gc = time.time()
+                    self._purge_shared()
+                    self._collect_blobs()
+            except Exception as e:
+                print(f"[SessionManager] Sweeper error: {e}")
+    
+    def _sweep_expired(self) -> int:
+        """Pop due heap entries and drop those sessions; returns how many."""
+        now = time.time()
+        due = []
+        with self._expiry_lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                due.append(heapq.heappop(self._expiry_heap)[1])
         
-        self._last_cleanup = now
+        removed = 0
         current_time = datetime.now()
-        
-        expired = [
-            sid for sid, session in self._sessions.items()
-            if current_time > session['expires_at']
-        ]
-        
-        for sid in expired:
-            del self._sessions[sid]
-            self._delete_session_file(sid)
-        
-        if expired:
-            print(f"[SessionManager] Cleaned up {len(expired)} expired sessions")
+        for session_id in due:
+            shard = self._shard(session_id)
+            with shard.lock:
+                session = shard.sessions.get(session_id)
+            if session and current_time > session['expires_at'] and self._expire(session_id, session):
+                removed += 1
+        
+        if removed:
+            print(f"[SessionManager] Cleaned up {removed} expired sessions")
+        return removed
+    
+    def _purge_shared(self) -> None:
+        """Drop expired sessions other workers created but never swept."""
+        if not self._persistence_available or not self._store.shared:
+            return
+        try:
+            removed = self._store.purge_expired()
+            if removed:
+                print(f"[SessionManager] Purged {removed} expired sessions from the shared store")
+        except Exception as e:
+            print(f"[SessionManager] Shared store purge failed: {e}")
+    
+    def _collect_blobs(self) -> None:
+        """Drop documents no remaining session refers to."""
+        if not self._persistence_available:
+            return
+        try:
+            removed = self._store.gc_blobs()
+            if removed:
+                print(f"[SessionManager] Removed {removed} unreferenced document blobs")
+        except Exception as e:
+            print(f"[SessionManager] Blob cleanup failed: {e}")
 
 
 # Global session manager instance
 sessions = SessionManager()
 
 
+# =============================================================================
+# BACKGROUND DOCUMENT JOBS
+# =============================================================================
+
+# 'optional' - job mode when the upload asks for it (async=true)
+# 'always'   - every upload runs as a job
+# 'off'      - always process inside the request
+DOCUMENT_JOBS = os.environ.get('DOCUMENT_JOBS', 'optional').lower()
+
+# Documents processed at once per gunicorn worker in job mode
+DOCUMENT_JOB_WORKERS = int(os.environ.get('DOCUMENT_JOB_WORKERS', '2'))
+
+# Unfinished (queued + running) jobs per gunicorn worker, overall and per
+# client IP - further uploads get a 429 instead of growing the queue
+DOCUMENT_JOB_MAX_PENDING = int(os.environ.get('DOCUMENT_JOB_MAX_PENDING', '32'))
+DOCUMENT_JOB_MAX_PER_CLIENT = int(os.environ.get('DOCUMENT_JOB_MAX_PER_CLIENT', '3'))
+
+
+def _publish_job(snapshot: dict) -> None:
+    """Mirror job status into its session so every worker can serve polls."""
+    sessions.set(snapshot['job_id'], 'job', snapshot)
+
+
+document_jobs = JobManager(
+    workers=DOCUMENT_JOB_WORKERS,
+    on_update=_publish_job,
+    max_pending=DOCUMENT_JOB_MAX_PENDING,
+    max_per_client=DOCUMENT_JOB_MAX_PER_CLIENT,
+)
+
+
 # =============================================================================
 # HELPERS
 # =============================================================================
@@ -381,6 +656,80 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _client_ip() -> str:
+    """Client address (first X-Forwarded-For hop behind the proxy)."""
+    client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    if client_ip and ',' in client_ip:
+        client_ip = client_ip.split(',')[0].strip()
+    return client_ip
+
+
+def _wants_job() -> bool:
+    """Should this upload run as a background job?"""
+    if DOCUMENT_JOBS == 'always':
+        return True
+    if DOCUMENT_JOBS == 'off':
+        return False
+    return request.form.get('async', request.args.get('async', '')).lower() == 'true'
+
+
+def _submit_job(kind: str, pipeline, file_bytes: bytes, filename: str, *args, is_preview: bool = False):
+    """
+    Queue a document pipeline and answer 202 right away.
+    
+    The session is created up front; its id doubles as the job id, and the
+    pipeline fills it in when it finishes. Answers 429 if the client (or the
+    worker) already has too many unfinished jobs. A preview upload counts
+    against the daily preview limit as soon as it is queued.
+    """
+    client_ip = _client_ip()
+    session_id = sessions.create()
+    try:
+        document_jobs.submit(
+            session_id, kind, pipeline, file_bytes, filename, *args,
+            session_id=session_id, label=filename, client=client_ip
+        )
+    except JobQueueFull as e:
+        sessions.delete(session_id)
+        print(f"[API] Rejected {kind} job for {client_ip}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'code': 'TOO_MANY_JOBS'
+        }), 429
+    
+    if is_preview:
+        record_preview_usage(client_ip)
+    print(f"[API] Queued {kind} job {session_id[:8]} for document {filename}")
+    return jsonify({
+        'success': True,
+        'job_id': session_id,
+        'session_id': session_id,
+        'status': 'queued',
+        'status_url': f"/api/jobs/{session_id}",
+        'events_url': f"/api/jobs/{session_id}/events",
+    }), 202
+
+
+def _job_snapshot(job_id: str):
+    """Job status from this worker's pool, else from the shared session."""
+    job = document_jobs.get(job_id)
+    if job is not None:
+        return job.snapshot()
+    session_data = sessions.get(job_id)
+    return session_data.get('job') if session_data else None
+
+
+def _sse(event_type: str, data: dict, event_id: int = None) -> str:
+    """Format one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
 # =============================================================================
 # ROUTES
 # =============================================================================
@@ -732,6 +1081,134 @@ def format_citation():
         }), 500
 
 
+def _session_results(results: list) -> list:
+    """Per-note results as stored in a document session."""
+    return [
+        {
+            'id': idx + 1,
+            'original': r.original,
+            'formatted': r.formatted,
+            'success': r.success,
+            'error': r.error,
+            'form': r.citation_form,
+            'type': r.citation_type.name.lower() if hasattr(r, 'citation_type') and r.citation_type else 'unknown'
+        }
+        for idx, r in enumerate(results)
+    ]
+
+
+def _note_stats(results: list, metadata_cache) -> dict:
+    """Summary counts for a processed document."""
+    success_count = sum(1 for r in results if r.success)
+    return {
+        'total': len(results),
+        'success': success_count,
+        'failed': len(results) - success_count,
+        'ibid': sum(1 for r in results if r.citation_form == 'ibid'),
+        'short': sum(1 for r in results if r.citation_form == 'short'),
+        'full': sum(1 for r in results if r.citation_form == 'full'),
+        'cached_citations': metadata_cache.size(),  # Total cached (old + new)
+    }
+
+
+def _process_footnote_document(
+    file_bytes: bytes,
+    filename: str,
+    style: str,
+    add_links: bool,
+    is_preview: bool,
+    client_ip: str = None,
+    session_id: str = None,
+    progress=None
+) -> dict:
+    """
+    Footnote/endnote pipeline behind /api/process (request-independent, so
+    it can also run as a background job).
+    
+    Args:
+        file_bytes: The uploaded .docx
+        filename: Original file name
+        style: Citation style
+        add_links: Whether to make URLs clickable
+        is_preview: Unauthenticated preview upload
+        client_ip: Client address (preview rate limiting)
+        session_id: Existing session to fill (job mode); created if None
+        progress: Optional callback(stage, done, total, **detail)
+        
+    Returns:
+        The /api/process response payload
+    """
+    # Track costs for this document (a ledger in this context, carried into
+    # the lookup threads)
+    from cost_tracker import track_document_costs, finish_document_tracking
+    
+    # Process document (returns bytes, results, and metadata cache)
+    with track_document_costs(filename) as cost_ledger, metrics.trace_document(filename) as trace:
+        processed_bytes, results, metadata_cache = process_document(
+            file_bytes,
+            style=style,
+            add_links=add_links,
+            progress=progress
+        )
+    trace_summary = trace.summary()
+    
+    # Create session to store results (job mode created it up front)
+    if session_id is None:
+        session_id = sessions.create()
+    print(f"[API] Created session {session_id[:8]}... for document {filename} (preview={is_preview})")
+    
+    # One batched commit for all keys
+    sessions.update(session_id, {
+        'processed_doc': processed_bytes,
+        'original_bytes': file_bytes,  # Store original for re-processing
+        'style': style,
+        'metadata_cache': metadata_cache,  # Store cache for CSV export
+        'is_preview': is_preview,  # Track preview status
+        'results': _session_results(results),
+        'filename': secure_filename(filename),
+        'trace': trace_summary,
+    })
+    
+    print(f"[API] Session {session_id[:8]} initialized with {len(results)} notes, doc size={len(processed_bytes)}")
+    print(f"[API] Total active sessions: {len(sessions)}")
+    
+    # Build notes list for UI
+    notes = []
+    for idx, r in enumerate(results):
+        note_type = 'unknown'
+        if hasattr(r, 'citation_type') and r.citation_type:
+            note_type = r.citation_type.name.lower()
+        
+        notes.append({
+            'id': idx + 1,
+            'text': r.original,
+            'formatted': r.formatted if r.success else r.original,
+            'type': note_type,
+            'success': r.success,
+            'form': r.citation_form
+        })
+    
+    # Return summary with notes for workbench UI
+    # Finish tracking costs and send email
+    doc_cost_summary = finish_document_tracking(cost_ledger)
+    
+    # Get remaining previews for unauthenticated users
+    remaining_previews = None
+    if is_preview:
+        _, _, remaining_previews = check_preview_allowed(client_ip)
+    
+    return {
+        'success': True,
+        'session_id': session_id,
+        'notes': notes,  # For workbench UI
+        'is_preview': is_preview,  # Frontend uses this to show login prompt
+        'remaining_previews': remaining_previews,  # How many free previews left
+        'stats': _note_stats(results, metadata_cache),
+        'cost': doc_cost_summary,  # Include cost info in response
+        'trace': trace_summary,  # Per-stage timings / cache hits for this upload
+    }
+
+
 @app.route('/api/process', methods=['POST'])
 def process_doc():
     """
@@ -741,9 +1218,15 @@ def process_doc():
     - file: .docx document
     - style: citation style (optional)
     - add_links: whether to make URLs clickable (optional)
+    - async: 'true' to run as a background job (optional)
     
     Returns processed document as download.
     
+    Job mode (async=true, or DOCUMENT_JOBS=always):
+    - Returns 202 with job_id (= session_id) immediately
+    - Progress: GET /api/jobs/<job_id> or /api/jobs/<job_id>/events (SSE)
+    - The final status carries the same payload as the synchronous response
+    
     Preview Mode (Option C):
     - Unauthenticated users can preview (rate limited)
     - Download requires authentication + credits
@@ -754,10 +1237,9 @@ def process_doc():
         is_preview = not is_authenticated
         
         # Rate limit for unauthenticated users
+        client_ip = None
         if is_preview:
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            if client_ip and ',' in client_ip:
-                client_ip = client_ip.split(',')[0].strip()
+            client_ip = _client_ip()
             
             allowed, reason, remaining = check_preview_allowed(client_ip)
             if not allowed:
@@ -788,107 +1270,200 @@ def process_doc():
                 'error': 'Only .docx files are supported'
             }), 400
         
-        # Start tracking costs for this document
-        from cost_tracker import start_document_tracking
-        start_document_tracking(file.filename)
-        
         style = request.form.get('style', 'Chicago Manual of Style')
         add_links = request.form.get('add_links', 'true').lower() == 'true'
         
         # Read file bytes
         file_bytes = file.read()
         
-        # Process document (returns bytes, results, and metadata cache)
-        processed_bytes, results, metadata_cache = process_document(
-            file_bytes,
-            style=style,
-            add_links=add_links
-        )
+        if _wants_job():
+            return _submit_job('footnotes', _process_footnote_document, file_bytes, file.filename,
+                               style, add_links, is_preview, client_ip, is_preview=is_preview)
         
-        # Record preview usage for rate limiting
+        # Record preview usage for rate limiting (before the lookups run, so
+        # concurrent uploads can't all pass the check)
         if is_preview:
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            if client_ip and ',' in client_ip:
-                client_ip = client_ip.split(',')[0].strip()
             record_preview_usage(client_ip)
         
-        # Create session to store results
+        return jsonify(_process_footnote_document(file_bytes, file.filename, style, add_links, is_preview, client_ip))
+        
+    except Exception as e:
+        print(f"[API] Error in /api/process: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def _process_batch_documents(
+    documents: list,
+    label: str,
+    style: str,
+    add_links: bool,
+    user_id: int = None,
+    session_id: str = None,
+    progress=None,
+    deadline: float = None
+) -> dict:
+    """
+    Batch pipeline behind /api/process-batch (see batch_processor.py).
+    
+    Each distinct citation across the batch is looked up once. Every
+    processed document gets its own session (reviewable and downloadable
+    like a single upload); the batch session lists them.
+    
+    Args:
+        documents: (name, .docx bytes) pairs
+        label: Upload name, for logs and cost tracking
+        style: Citation style
+        add_links: Whether to make URLs clickable
+        user_id: Uploading user
+        session_id: Existing batch session to fill (job mode); created if None
+        progress: Optional callback(stage, done, total, **detail)
+        deadline: Seconds for all lookups (default: config.BATCH_DEADLINE)
+        
+    Returns:
+        The /api/process-batch response payload
+    """
+    from cost_tracker import track_document_costs, finish_document_tracking
+    
+    with track_document_costs(label) as cost_ledger, metrics.trace_document(label) as trace:
+        batch = process_batch(documents, style=style, add_links=add_links, progress=progress, deadline=deadline)
+    trace_summary = trace.summary()
+    
+    if session_id is None:
         session_id = sessions.create()
-        print(f"[API] Created session {session_id[:8]}... for document {file.filename} (preview={is_preview})")
-        
-        sessions.set(session_id, 'processed_doc', processed_bytes)
-        sessions.set(session_id, 'original_bytes', file_bytes)  # Store original for re-processing
-        sessions.set(session_id, 'style', style)
-        sessions.set(session_id, 'metadata_cache', metadata_cache)  # Store cache for CSV export
-        sessions.set(session_id, 'is_preview', is_preview)  # Track preview status
-        sessions.set(session_id, 'results', [
-            {
-                'id': idx + 1,
-                'original': r.original,
-                'formatted': r.formatted,
-                'success': r.success,
-                'error': r.error,
-                'form': r.citation_form,
-                'type': r.citation_type.name.lower() if hasattr(r, 'citation_type') and r.citation_type else 'unknown'
-            }
-            for idx, r in enumerate(results)
-        ])
-        sessions.set(session_id, 'filename', secure_filename(file.filename))
-        
-        print(f"[API] Session {session_id[:8]} initialized with {len(results)} notes, doc size={len(processed_bytes)}")
-        print(f"[API] Total active sessions: {len(sessions._sessions)}")
-        
-        # Build notes list for UI
-        notes = []
-        for idx, r in enumerate(results):
-            note_type = 'unknown'
-            if hasattr(r, 'citation_type') and r.citation_type:
-                note_type = r.citation_type.name.lower()
-            
-            notes.append({
-                'id': idx + 1,
-                'text': r.original,
-                'formatted': r.formatted if r.success else r.original,
-                'type': note_type,
-                'success': r.success,
-                'form': r.citation_form
-            })
+    
+    entries = []
+    for document in batch.documents:
+        if not document.success:
+            entries.append({'name': document.name, 'success': False, 'error': document.error})
+            continue
+        
+        doc_session = sessions.create()
+        sessions.update(doc_session, {
+            'processed_doc': document.processed_bytes,
+            'original_bytes': document.original_bytes,
+            'style': style,
+            'metadata_cache': document.metadata_cache,
+            'is_preview': False,
+            'results': _session_results(document.results),
+            'filename': secure_filename(os.path.basename(document.name)),
+            'batch_id': session_id,
+        })
+        entries.append({
+            'name': document.name,
+            'success': True,
+            'session_id': doc_session,
+            'stats': _note_stats(document.results, document.metadata_cache),
+        })
+    
+    sessions.update(session_id, {
+        'batch_documents': entries,
+        'style': style,
+        'filename': secure_filename(label),
+        'owner_id': user_id,
+        'trace': trace_summary,
+    })
+    print(f"[API] Batch {session_id[:8]}: {batch.stats['processed']}/{batch.stats['documents']} documents, "
+          f"{batch.stats['lookups_distinct']} distinct lookups")
+    
+    doc_cost_summary = finish_document_tracking(cost_ledger)
+    
+    return {
+        'success': True,
+        'batch_id': session_id,
+        'session_id': session_id,
+        'documents': entries,
+        'stats': batch.stats,
+        'download_url': f"/api/download-batch/{session_id}",
+        'cost': doc_cost_summary,
+        'trace': trace_summary,
+    }
+
+
+@app.route('/api/process-batch', methods=['POST'])
+@requires_auth
+def process_batch_docs():
+    """
+    Batch processing API - many documents, shared lookups.
+    
+    Expects multipart form with:
+    - files: one or more .docx documents and/or zips of .docx documents
+      (a single 'file' is accepted too)
+    - style: citation style (optional)
+    - add_links: whether to make URLs clickable (optional)
+    
+    Runs as a background job unless DOCUMENT_JOBS=off: returns 202 with
+    job_id (= batch_id); the final status carries the batch payload, with a
+    session_id per document for review and single downloads.
+    
+    Requires authentication, and enough credits for every document
+    (spent on download).
+    """
+    try:
+        uploads = request.files.getlist('files') or request.files.getlist('file')
+        uploads = [f for f in uploads if f and f.filename]
+        if not uploads:
+            return jsonify({
+                'success': False,
+                'error': 'No files provided'
+            }), 400
         
-        # Return summary with notes for workbench UI
-        success_count = sum(1 for r in results if r.success)
+        # Limits apply across all uploads, before any document is inflated
+        documents = []
+        total_bytes = 0
+        for upload in uploads:
+            try:
+                found = read_batch_upload(
+                    upload.read(), upload.filename,
+                    max_documents=BATCH_MAX_DOCUMENTS - len(documents),
+                    max_total_bytes=BATCH_MAX_TOTAL_MB * 1024 * 1024 - total_bytes
+                )
+            except BatchTooLarge:
+                return jsonify({
+                    'success': False,
+                    'error': f'A batch can hold at most {BATCH_MAX_DOCUMENTS} documents '
+                             f'and {BATCH_MAX_TOTAL_MB} MB uncompressed ({upload.filename} goes over)'
+                }), 400
+            if not found:
+                return jsonify({
+                    'success': False,
+                    'error': f'{upload.filename}: only .docx files or zips of .docx files are supported'
+                }), 400
+            documents.extend(found)
+            total_bytes += sum(len(data) for _, data in found)
         
-        # Finish tracking costs and send email
-        from cost_tracker import finish_document_tracking
-        doc_cost_summary = finish_document_tracking()
+        if len(documents) > BATCH_MAX_DOCUMENTS:
+            return jsonify({
+                'success': False,
+                'error': f'A batch can hold at most {BATCH_MAX_DOCUMENTS} documents ({len(documents)} given)'
+            }), 400
         
-        # Get remaining previews for unauthenticated users
-        remaining_previews = None
-        if is_preview:
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            if client_ip and ',' in client_ip:
-                client_ip = client_ip.split(',')[0].strip()
-            _, _, remaining_previews = check_preview_allowed(client_ip)
+        required = len(documents) * CREDITS_PER_DOCUMENT
+        if not has_credits(current_user.id, required):
+            return jsonify({
+                'success': False,
+                'error': f'You need {required} credits to process {len(documents)} documents.',
+                'code': 'INSUFFICIENT_CREDITS',
+                'required': required,
+                'balance': get_balance_fast(current_user.id)
+            }), 402
         
-        return jsonify({
-            'success': True,
-            'session_id': session_id,
-            'notes': notes,  # For workbench UI
-            'is_preview': is_preview,  # Frontend uses this to show login prompt
-            'remaining_previews': remaining_previews,  # How many free previews left
-            'stats': {
-                'total': len(results),
-                'success': success_count,
-                'failed': len(results) - success_count,
-                'ibid': sum(1 for r in results if r.citation_form == 'ibid'),
-                'short': sum(1 for r in results if r.citation_form == 'short'),
-                'full': sum(1 for r in results if r.citation_form == 'full'),
-                'cached_citations': metadata_cache.size(),  # Total cached (old + new)
-            },
-            'cost': doc_cost_summary,  # Include cost info in response
-        })
+        style = request.form.get('style', 'Chicago Manual of Style')
+        add_links = request.form.get('add_links', 'true').lower() == 'true'
+        label = uploads[0].filename if len(uploads) == 1 else f"{len(documents)} documents"
+        
+        if DOCUMENT_JOBS != 'off':
+            return _submit_job('batch', _process_batch_documents, documents, label,
+                               style, add_links, current_user.id)
+        
+        # In-request: keep lookups inside the gunicorn timeout
+        return jsonify(_process_batch_documents(documents, label, style, add_links, current_user.id,
+                                                deadline=DOCUMENT_DEADLINE))
         
     except Exception as e:
-        print(f"[API] Error in /api/process: {e}")
+        print(f"[API] Error in /api/process-batch: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -957,8 +1532,7 @@ def download(session_id: str):
                 }), 500
             
             # Mark credit as spent for this session
-            sessions.set(session_id, 'credit_spent', True)
-            sessions.set(session_id, 'downloaded_by', current_user.id)
+            sessions.update(session_id, {'credit_spent': True, 'downloaded_by': current_user.id})
             print(f"[API] Credit spent for user {current_user.id}, session {session_id[:8]}")
         
         from io import BytesIO
@@ -980,6 +1554,83 @@ def download(session_id: str):
         }), 500
 
 
+@app.route('/api/download-batch/<batch_id>')
+@requires_auth
+def download_batch(batch_id: str):
+    """
+    Download every processed document of a batch as one zip.
+    
+    Spends one credit per document not downloaded before (same per-session
+    idempotency as /api/download).
+    """
+    try:
+        batch_data = sessions.get(batch_id)
+        if not batch_data or 'batch_documents' not in batch_data:
+            return jsonify({
+                'success': False,
+                'error': 'Batch not found or expired'
+            }), 404
+        
+        documents = []
+        for entry in batch_data['batch_documents']:
+            if not entry.get('success'):
+                continue
+            session_data = sessions.get(entry['session_id'])
+            if session_data and session_data.get('processed_doc'):
+                documents.append((entry, session_data))
+        
+        if not documents:
+            return jsonify({
+                'success': False,
+                'error': 'Processed documents not found or expired'
+            }), 404
+        
+        unpaid = [(entry, data) for entry, data in documents if not data.get('credit_spent')]
+        required = len(unpaid) * CREDITS_PER_DOCUMENT
+        if unpaid and not has_credits(current_user.id, required):
+            return jsonify({
+                'success': False,
+                'error': 'You need credits to download. Purchase credits to continue.',
+                'code': 'INSUFFICIENT_CREDITS',
+                'required': required,
+                'balance': get_balance_fast(current_user.id)
+            }), 402
+        
+        for entry, _ in unpaid:
+            if not spend_user_credit(notes=f"Batch download: {entry['name']}"):
+                return jsonify({
+                    'success': False,
+                    'error': 'Failed to process credit. Please try again.',
+                    'code': 'CREDIT_ERROR'
+                }), 500
+            sessions.update(entry['session_id'], {'credit_spent': True, 'downloaded_by': current_user.id})
+        if unpaid:
+            print(f"[API] {len(unpaid)} credits spent for user {current_user.id}, batch {batch_id[:8]}")
+        
+        import zipfile
+        from io import BytesIO
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for entry, session_data in documents:
+                archive.writestr(entry['name'], session_data['processed_doc'])
+        buffer.seek(0)
+        
+        filename = batch_data.get('filename') or 'batch'
+        return send_file(
+            buffer,
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name=f"citategenie_{filename.rsplit('.', 1)[0]}.zip"
+        )
+        
+    except Exception as e:
+        print(f"[API] Error in /api/download-batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/export-metadata/<session_id>')
 def export_metadata(session_id: str):
     """
@@ -1247,17 +1898,11 @@ def update_note():
                 'error': 'Missing session_id or note_id'
             }), 400
         
-        # Retry logic - wait for any concurrent writes to complete
-        session_data = None
-        for attempt in range(3):
-            session_data = sessions.get(session_id)
-            if session_data:
-                break
-            print(f"[API] Session {session_id[:8]} not found, attempt {attempt+1}/3, waiting...")
-            time.sleep(0.2)  # Wait 200ms between retries
+        # The session store is shared by all workers - no need to retry
+        session_data = sessions.get(session_id)
         
         if not session_data:
-            print(f"[API] Session {session_id[:8]} NOT FOUND after 3 attempts")
+            print(f"[API] Session {session_id[:8]} NOT FOUND")
             return jsonify({
                 'success': False,
                 'error': 'Session not found or expired'
@@ -1321,6 +1966,457 @@ def update_note():
         }), 500
 
 
+def _parenthetical_text(cite) -> str:
+    """
+    Lookup text for an extracted author-date citation.
+    
+    Preserves ALL author names for better AI lookup accuracy - the full
+    author list is sent, not simplified to "et al.".
+    """
+    if cite.third_author:
+        # Three or more authors - include all three for better matching
+        return f"({cite.author}, {cite.second_author}, & {cite.third_author}, {cite.year})"
+    elif cite.second_author:
+        # Two authors
+        return f"({cite.author} & {cite.second_author}, {cite.year})"
+    # Single author
+    return f"({cite.author}, {cite.year})"
+
+
+def _process_author_date_document(
+    file_bytes: bytes,
+    filename: str,
+    style: str,
+    is_preview: bool,
+    client_ip: str = None,
+    session_id: str = None,
+    progress=None
+) -> dict:
+    """
+    Author-date pipeline behind /api/process-author-date (request-independent,
+    so it can also run as a background job).
+    
+    Args:
+        file_bytes: The uploaded .docx
+        filename: Original file name
+        style: Citation style
+        is_preview: Unauthenticated preview upload
+        client_ip: Client address (preview rate limiting)
+        session_id: Existing session to fill (job mode); created if None
+        progress: Optional callback(stage, done, total, **detail) - stage is
+                  'citations' or 'urls'
+        
+    Returns:
+        The /api/process-author-date response payload
+    """
+    # Open the upload once - topic, citation and URL extraction share one parse
+    from processors.docx_package import DocxPackage
+    package = DocxPackage(file_bytes)
+    
+    # Extract document topics for AI context (improves accuracy)
+    document_context = get_document_context(package)
+    print(f"[API] Document context: {document_context[:100]}..." if document_context else "[API] No document context extracted")
+    
+    # Extract author-date citations from document BODY TEXT
+    from processors.author_year_extractor import AuthorDateExtractor
+    
+    extractor = AuthorDateExtractor()
+    extracted_citations = extractor.extract_citations_from_docx(package)
+    unique_citations = extractor.get_unique_citations(extracted_citations)
+    
+    print(f"[API] Extracted {len(extracted_citations)} author-year citations, {len(unique_citations)} unique")
+    
+    # =====================================================================
+    # URL EXTRACTION (Added 2025-12-14)
+    # Extract URLs from document body for AI-first metadata lookup
+    # =====================================================================
+    from processors.url_extractor import extract_urls_from_docx, get_unique_urls
+    
+    extracted_urls = extract_urls_from_docx(package)
+    unique_urls = get_unique_urls(extracted_urls)
+    
+    print(f"[API] Extracted {len(extracted_urls)} URLs, {len(unique_urls)} unique")
+    
+    # Process citations in PARALLEL for speed
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    def process_single_citation(idx, cite):
+        """Process one citation - called in parallel. Returns raw metadata."""
+        original_text = _parenthetical_text(cite)
+        
+        note_id = idx + 1
+        
+        try:
+            # Raw metadata (no formatting yet) from the batched lookup; a
+            # citation it missed is looked up on its own, with the document context
+            metadata_list = prefetched.get(original_text)
+            if metadata_list is None:
+                metadata_list = get_parenthetical_metadata(original_text, limit=4, context=document_context)
+            
+            # Build options with raw metadata
+            options = [{
+                'id': 0,
+                'title': '[Keep Original]',
+                'authors': [],
+                'year': '',
+                'journal': '',
+                'publisher': '',
+                'volume': '',
+                'issue': '',
+                'pages': '',
+                'doi': '',
+                'url': '',
+                'citation_type': 'original',
+                'source': 'original',
+                'is_original': True
+            }]
+            
+            for opt_idx, meta in enumerate(metadata_list):
+                options.append({
+                    'id': opt_idx + 1,
+                    'title': meta.title if meta else '',
+                    'authors': meta.authors if meta else [],
+                    'year': meta.year if meta else '',
+                    'journal': getattr(meta, 'journal', '') or '',
+                    'publisher': getattr(meta, 'publisher', '') or '',
+                    'volume': getattr(meta, 'volume', '') or '',
+                    'issue': getattr(meta, 'issue', '') or '',
+                    'pages': getattr(meta, 'pages', '') or '',
+                    'doi': getattr(meta, 'doi', '') or '',
+                    'url': getattr(meta, 'url', '') or '',
+                    'citation_type': meta.citation_type.name.lower() if meta and meta.citation_type else 'unknown',
+                    'source': getattr(meta, 'source_engine', 'ai_lookup'),
+                    'is_original': False
+                })
+            
+            # Pre-format the recommended option (first AI result) for immediate display
+            formatted_recommendation = None
+            if len(options) > 1 and len(metadata_list) > 0:
+                try:
+                    from formatters.base import get_formatter
+                    formatter = get_formatter(style)
+                    formatted_recommendation = formatter.format(metadata_list[0])
+                except Exception as fmt_err:
+                    print(f"[API] Error pre-formatting recommendation: {fmt_err}")
+            
+            return {
+                'id': idx + 1,
+                'note_id': note_id,
+                'original': original_text,
+                'options': options,
+                'selected_option': 1 if len(options) > 1 else 0,  # Default to first AI result
+                'formatted': formatted_recommendation,  # Pre-formatted for immediate display
+                'accepted': False
+            }
+            
+        except Exception as e:
+            print(f"[API] Error processing '{original_text[:40]}': {e}")
+            return {
+                'id': idx + 1,
+                'note_id': note_id,
+                'original': original_text,
+                'options': [{
+                    'id': 0,
+                    'title': '[Keep Original]',
+                    'authors': [],
+                    'year': '',
+                    'journal': '',
+                    'publisher': '',
+                    'volume': '',
+                    'issue': '',
+                    'pages': '',
+                    'doi': '',
+                    'url': '',
+                    'citation_type': 'original',
+                    'source': 'original',
+                    'is_original': True
+                }],
+                'selected_option': 0,
+                'formatted': None,
+                'accepted': False,
+                'error': str(e)
+            }
+    
+    # Look the citations up with batched AI requests (the document context
+    # is sent once per request), then build the options in parallel
+    trace = metrics.DocumentTrace(filename)
+    with metrics.trace_document(trace=trace):
+        prefetched = get_parenthetical_metadata_batch(
+            [_parenthetical_text(cite) for cite in unique_citations],
+            limit=4,
+            context=document_context,
+        )
+    
+    citations = [None] * len(unique_citations)
+    with metrics.trace_document(trace=trace), ThreadPoolExecutor(max_workers=5) as executor:
+        futures = {
+            submit_in_context(executor, process_single_citation, idx, cite): idx 
+            for idx, cite in enumerate(unique_citations)
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            idx = futures[future]
+            citations[idx] = future.result()
+            print(f"[API] Completed citation {idx + 1}/{len(unique_citations)}")
+            if progress:
+                progress('citations', completed, len(unique_citations), note=idx + 1)
+    
+    # =====================================================================
+    # URL PROCESSING (Added 2025-12-14)
+    # Process each URL through AI lookup to extract metadata
+    # =====================================================================
+    
+    def get_family_name(author_parsed):
+        """
+        Get the family name from a parsed author dict.
+        
+        Args:
+            author_parsed: Dict with 'family' key, optionally 'given' and 'is_org'
+            
+        Returns:
+            The family name string
+        """
+        if not author_parsed:
+            return 'Unknown'
+        if isinstance(author_parsed, str):
+            # Fallback: parse the string
+            from models import parse_author_name
+            author_parsed = parse_author_name(author_parsed)
+        return author_parsed.get('family', 'Unknown')
+    
+    def build_parenthetical(metadata):
+        """
+        Build parenthetical citation from metadata using authors_parsed.
+        
+        Uses structured author data when available for accurate surnames.
+        Falls back to parsing author strings if authors_parsed is empty.
+        """
+        year = metadata.year or 'n.d.'
+        
+        # Prefer authors_parsed (structured data)
+        authors_parsed = getattr(metadata, 'authors_parsed', []) or []
+        
+        # Fallback: parse from authors strings
+        if not authors_parsed and metadata.authors:
+            from models import parse_author_name
+            authors_parsed = [parse_author_name(a) for a in metadata.authors]
+        
+        if not authors_parsed:
+            # No authors - use title
+            title = metadata.title or 'Unknown'
+            title_short = (title[:30] + '...') if len(title) > 33 else title
+            return f"({title_short}, {year})"
+        
+        if len(authors_parsed) >= 3:
+            # 3+ authors: use et al.
+            surname = get_family_name(authors_parsed[0])
+            return f"({surname} et al., {year})"
+        elif len(authors_parsed) == 2:
+            # 2 authors: Author1 & Author2
+            surname1 = get_family_name(authors_parsed[0])
+            surname2 = get_family_name(authors_parsed[1])
+            return f"({surname1} & {surname2}, {year})"
+        else:
+            # 1 author
+            surname = get_family_name(authors_parsed[0])
+            return f"({surname}, {year})"
+    
+    def process_single_url(url_idx, url_info):
+        """Process one URL - called in parallel. Returns citation-like structure."""
+        url = url_info.get('url', '')
+        original_text = url  # The URL itself is the "original"
+        
+        # Calculate global ID (after author-year citations)
+        global_id = len(unique_citations) + url_idx + 1
+        
+        try:
+            # Use the unified router to get metadata for the URL
+            from unified_router import get_citation
+            metadata, formatted = get_citation(url, style)
+            
+            if metadata:
+                # Build parenthetical using structured author data
+                parenthetical = build_parenthetical(metadata)
+                authors = metadata.authors if metadata.authors else []
+                year = metadata.year or ''
+                
+                options = [{
+                    'id': 0,
+                    'title': '[Keep Original URL]',
+                    'authors': [],
+                    'authors_parsed': [],
+                    'year': '',
+                    'journal': '',
+                    'publisher': '',
+                    'volume': '',
+                    'issue': '',
+                    'pages': '',
+                    'doi': '',
+                    'url': url,
+                    'citation_type': 'original',
+                    'source': 'original',
+                    'is_original': True
+                }, {
+                    'id': 1,
+                    'title': metadata.title or '',
+                    'authors': authors,
+                    'authors_parsed': getattr(metadata, 'authors_parsed', []) or [],
+                    'year': year,
+                    'journal': getattr(metadata, 'journal', '') or '',
+                    'publisher': getattr(metadata, 'publisher', '') or '',
+                    'volume': getattr(metadata, 'volume', '') or '',
+                    'issue': getattr(metadata, 'issue', '') or '',
+                    'pages': getattr(metadata, 'pages', '') or '',
+                    'doi': getattr(metadata, 'doi', '') or '',
+                    'url': getattr(metadata, 'url', url) or url,
+                    'citation_type': metadata.citation_type.name.lower() if metadata.citation_type else 'url',
+                    'source': getattr(metadata, 'source_engine', 'ai_lookup'),
+                    'is_original': False,
+                    'parenthetical': parenthetical  # The in-text citation to use
+                }]
+                
+                return {
+                    'id': global_id,
+                    'note_id': global_id,
+                    'original': original_text,
+                    'original_url': url,  # Store URL for replacement
+                    'global_start': url_info.get('global_start', 0),
+                    'global_end': url_info.get('global_end', 0),
+                    'options': options,
+                    'selected_option': 1,
+                    'formatted': formatted,
+                    'parenthetical': parenthetical,  # The in-text citation
+                    'accepted': False,
+                    'is_url': True  # Flag to identify URL citations
+                }
+            else:
+                # No metadata found
+                return {
+                    'id': global_id,
+                    'note_id': global_id,
+                    'original': original_text,
+                    'original_url': url,
+                    'global_start': url_info.get('global_start', 0),
+                    'global_end': url_info.get('global_end', 0),
+                    'options': [{
+                        'id': 0,
+                        'title': '[Keep Original URL]',
+                        'authors': [],
+                        'year': '',
+                        'journal': '',
+                        'publisher': '',
+                        'volume': '',
+                        'issue': '',
+                        'pages': '',
+                        'doi': '',
+                        'url': url,
+                        'citation_type': 'original',
+                        'source': 'original',
+                        'is_original': True
+                    }],
+                    'selected_option': 0,
+                    'formatted': None,
+                    'parenthetical': None,
+                    'accepted': False,
+                    'is_url': True,
+                    'error': 'No metadata found'
+                }
+                
+        except Exception as e:
+            print(f"[API] Error processing URL '{url[:50]}': {e}")
+            return {
+                'id': global_id,
+                'note_id': global_id,
+                'original': original_text,
+                'original_url': url,
+                'global_start': url_info.get('global_start', 0),
+                'global_end': url_info.get('global_end', 0),
+                'options': [{
+                    'id': 0,
+                    'title': '[Keep Original URL]',
+                    'authors': [],
+                    'year': '',
+                    'journal': '',
+                    'publisher': '',
+                    'volume': '',
+                    'issue': '',
+                    'pages': '',
+                    'doi': '',
+                    'url': url,
+                    'citation_type': 'original',
+                    'source': 'original',
+                    'is_original': True
+                }],
+                'selected_option': 0,
+                'formatted': None,
+                'parenthetical': None,
+                'accepted': False,
+                'is_url': True,
+                'error': str(e)
+            }
+    
+    # Process URLs in parallel
+    url_citations = [None] * len(unique_urls)
+    if unique_urls:
+        with metrics.trace_document(trace=trace), ThreadPoolExecutor(max_workers=5) as executor:
+            url_futures = {
+                submit_in_context(executor, process_single_url, idx, url_info): idx 
+                for idx, url_info in enumerate(unique_urls)
+            }
+            for completed, future in enumerate(as_completed(url_futures), 1):
+                idx = url_futures[future]
+                url_citations[idx] = future.result()
+                print(f"[API] Completed URL {idx + 1}/{len(unique_urls)}")
+                if progress:
+                    progress('urls', completed, len(unique_urls), note=idx + 1)
+    
+    # Combine author-year and URL citations
+    all_citations = citations + [c for c in url_citations if c is not None]
+    
+    # Create session to store results (job mode created it up front)
+    if session_id is None:
+        session_id = sessions.create()
+    print(f"[API] Created author-date session {session_id[:8]}... for document {filename} (preview={is_preview})")
+    
+    trace.finished = time.monotonic()
+    trace_summary = trace.summary()
+    
+    # One batched commit for all keys
+    sessions.update(session_id, {
+        'original_bytes': file_bytes,
+        'style': style,
+        'mode': 'author-date',
+        'citations': all_citations,  # Store combined citations
+        'filename': secure_filename(filename),
+        'is_preview': is_preview,  # Track preview status
+        'trace': trace_summary,
+    })
+    
+    # Count stats
+    author_year_count = len(citations)
+    url_count = len([c for c in url_citations if c is not None])
+    
+    # Get remaining previews for unauthenticated users
+    remaining_previews = None
+    if is_preview:
+        _, _, remaining_previews = check_preview_allowed(client_ip)
+    
+    return {
+        'success': True,
+        'session_id': session_id,
+        'citations': all_citations,
+        'is_preview': is_preview,  # Frontend uses this to show login prompt
+        'remaining_previews': remaining_previews,  # How many free previews left
+        'stats': {
+            'total': len(all_citations),
+            'author_year': author_year_count,
+            'urls': url_count,
+            'with_options': sum(1 for c in all_citations if len(c.get('options', [])) > 1),
+            'no_options': sum(1 for c in all_citations if len(c.get('options', [])) <= 1)
+        },
+        'trace': trace_summary,  # Per-stage timings / cache hits for this upload
+    }
+
+
 @app.route('/api/process-author-date', methods=['POST'])
 def process_author_date():
     """
@@ -1336,6 +2432,7 @@ def process_author_date():
     Request: multipart/form-data with 'file' field
     Optional form fields:
         - style: Citation style (default: 'apa')
+        - async: 'true' to run as a background job (see /api/process)
     
     Response:
     {
@@ -1366,10 +2463,9 @@ def process_author_date():
         is_preview = not is_authenticated
         
         # Rate limit for unauthenticated users
+        client_ip = None
         if is_preview:
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            if client_ip and ',' in client_ip:
-                client_ip = client_ip.split(',')[0].strip()
+            client_ip = _client_ip()
             
             allowed, reason, remaining = check_preview_allowed(client_ip)
             if not allowed:
@@ -1405,403 +2501,16 @@ def process_author_date():
         # Read file bytes
         file_bytes = file.read()
         
-        # Extract document topics for AI context (improves accuracy)
-        document_context = get_document_context(file_bytes)
-        print(f"[API] Document context: {document_context[:100]}..." if document_context else "[API] No document context extracted")
-        
-        # Extract author-date citations from document BODY TEXT
-        from processors.author_year_extractor import AuthorDateExtractor
-        
-        extractor = AuthorDateExtractor()
-        extracted_citations = extractor.extract_citations_from_docx(file_bytes)
-        unique_citations = extractor.get_unique_citations(extracted_citations)
-        
-        print(f"[API] Extracted {len(extracted_citations)} author-year citations, {len(unique_citations)} unique")
-        
-        # =====================================================================
-        # URL EXTRACTION (Added 2025-12-14)
-        # Extract URLs from document body for AI-first metadata lookup
-        # =====================================================================
-        from processors.url_extractor import extract_urls_from_docx, get_unique_urls
-        
-        extracted_urls = extract_urls_from_docx(file_bytes)
-        unique_urls = get_unique_urls(extracted_urls)
-        
-        print(f"[API] Extracted {len(extracted_urls)} URLs, {len(unique_urls)} unique")
-        
-        # Process citations in PARALLEL for speed
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
-        def process_single_citation(idx, cite):
-            """Process one citation - called in parallel. Returns raw metadata."""
-            # Preserve ALL author names for better AI lookup accuracy
-            # Don't simplify to "et al." - send full author list
-            if cite.third_author:
-                # Three or more authors - include all three for better matching
-                original_text = f"({cite.author}, {cite.second_author}, & {cite.third_author}, {cite.year})"
-            elif cite.second_author:
-                # Two authors
-                original_text = f"({cite.author} & {cite.second_author}, {cite.year})"
-            else:
-                # Single author
-                original_text = f"({cite.author}, {cite.year})"
-            
-            note_id = idx + 1
-            
-            try:
-                # Get raw metadata (no formatting yet) - pass document context for better accuracy
-                metadata_list = get_parenthetical_metadata(original_text, limit=4, context=document_context)
-                
-                # Build options with raw metadata
-                options = [{
-                    'id': 0,
-                    'title': '[Keep Original]',
-                    'authors': [],
-                    'year': '',
-                    'journal': '',
-                    'publisher': '',
-                    'volume': '',
-                    'issue': '',
-                    'pages': '',
-                    'doi': '',
-                    'url': '',
-                    'citation_type': 'original',
-                    'source': 'original',
-                    'is_original': True
-                }]
-                
-                for opt_idx, meta in enumerate(metadata_list):
-                    options.append({
-                        'id': opt_idx + 1,
-                        'title': meta.title if meta else '',
-                        'authors': meta.authors if meta else [],
-                        'year': meta.year if meta else '',
-                        'journal': getattr(meta, 'journal', '') or '',
-                        'publisher': getattr(meta, 'publisher', '') or '',
-                        'volume': getattr(meta, 'volume', '') or '',
-                        'issue': getattr(meta, 'issue', '') or '',
-                        'pages': getattr(meta, 'pages', '') or '',
-                        'doi': getattr(meta, 'doi', '') or '',
-                        'url': getattr(meta, 'url', '') or '',
-                        'citation_type': meta.citation_type.name.lower() if meta and meta.citation_type else 'unknown',
-                        'source': getattr(meta, 'source_engine', 'ai_lookup'),
-                        'is_original': False
-                    })
-                
-                # Pre-format the recommended option (first AI result) for immediate display
-                formatted_recommendation = None
-                if len(options) > 1 and len(metadata_list) > 0:
-                    try:
-                        from formatters.base import get_formatter
-                        formatter = get_formatter(style)
-                        formatted_recommendation = formatter.format(metadata_list[0])
-                    except Exception as fmt_err:
-                        print(f"[API] Error pre-formatting recommendation: {fmt_err}")
-                
-                return {
-                    'id': idx + 1,
-                    'note_id': note_id,
-                    'original': original_text,
-                    'options': options,
-                    'selected_option': 1 if len(options) > 1 else 0,  # Default to first AI result
-                    'formatted': formatted_recommendation,  # Pre-formatted for immediate display
-                    'accepted': False
-                }
-                
-            except Exception as e:
-                print(f"[API] Error processing '{original_text[:40]}': {e}")
-                return {
-                    'id': idx + 1,
-                    'note_id': note_id,
-                    'original': original_text,
-                    'options': [{
-                        'id': 0,
-                        'title': '[Keep Original]',
-                        'authors': [],
-                        'year': '',
-                        'journal': '',
-                        'publisher': '',
-                        'volume': '',
-                        'issue': '',
-                        'pages': '',
-                        'doi': '',
-                        'url': '',
-                        'citation_type': 'original',
-                        'source': 'original',
-                        'is_original': True
-                    }],
-                    'selected_option': 0,
-                    'formatted': None,
-                    'accepted': False,
-                    'error': str(e)
-                }
-        
-        # Run lookups in parallel (up to 5 concurrent)
-        citations = [None] * len(unique_citations)
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {
-                executor.submit(process_single_citation, idx, cite): idx 
-                for idx, cite in enumerate(unique_citations)
-            }
-            for future in as_completed(futures):
-                idx = futures[future]
-                citations[idx] = future.result()
-                print(f"[API] Completed citation {idx + 1}/{len(unique_citations)}")
-        
-        # =====================================================================
-        # URL PROCESSING (Added 2025-12-14)
-        # Process each URL through AI lookup to extract metadata
-        # =====================================================================
-        
-        def get_family_name(author_parsed):
-            """
-            Get the family name from a parsed author dict.
-            
-            Args:
-                author_parsed: Dict with 'family' key, optionally 'given' and 'is_org'
-                
-            Returns:
-                The family name string
-            """
-            if not author_parsed:
-                return 'Unknown'
-            if isinstance(author_parsed, str):
-                # Fallback: parse the string
-                from models import parse_author_name
-                author_parsed = parse_author_name(author_parsed)
-            return author_parsed.get('family', 'Unknown')
-        
-        def build_parenthetical(metadata):
-            """
-            Build parenthetical citation from metadata using authors_parsed.
-            
-            Uses structured author data when available for accurate surnames.
-            Falls back to parsing author strings if authors_parsed is empty.
-            """
-            year = metadata.year or 'n.d.'
-            
-            # Prefer authors_parsed (structured data)
-            authors_parsed = getattr(metadata, 'authors_parsed', []) or []
-            
-            # Fallback: parse from authors strings
-            if not authors_parsed and metadata.authors:
-                from models import parse_author_name
-                authors_parsed = [parse_author_name(a) for a in metadata.authors]
-            
-            if not authors_parsed:
-                # No authors - use title
-                title = metadata.title or 'Unknown'
-                title_short = (title[:30] + '...') if len(title) > 33 else title
-                return f"({title_short}, {year})"
-            
-            if len(authors_parsed) >= 3:
-                # 3+ authors: use et al.
-                surname = get_family_name(authors_parsed[0])
-                return f"({surname} et al., {year})"
-            elif len(authors_parsed) == 2:
-                # 2 authors: Author1 & Author2
-                surname1 = get_family_name(authors_parsed[0])
-                surname2 = get_family_name(authors_parsed[1])
-                return f"({surname1} & {surname2}, {year})"
-            else:
-                # 1 author
-                surname = get_family_name(authors_parsed[0])
-                return f"({surname}, {year})"
-        
-        def process_single_url(url_idx, url_info):
-            """Process one URL - called in parallel. Returns citation-like structure."""
-            url = url_info.get('url', '')
-            original_text = url  # The URL itself is the "original"
-            
-            # Calculate global ID (after author-year citations)
-            global_id = len(unique_citations) + url_idx + 1
-            
-            try:
-                # Use the unified router to get metadata for the URL
-                from unified_router import get_citation
-                metadata, formatted = get_citation(url, style)
-                
-                if metadata:
-                    # Build parenthetical using structured author data
-                    parenthetical = build_parenthetical(metadata)
-                    authors = metadata.authors if metadata.authors else []
-                    year = metadata.year or ''
-                    
-                    options = [{
-                        'id': 0,
-                        'title': '[Keep Original URL]',
-                        'authors': [],
-                        'authors_parsed': [],
-                        'year': '',
-                        'journal': '',
-                        'publisher': '',
-                        'volume': '',
-                        'issue': '',
-                        'pages': '',
-                        'doi': '',
-                        'url': url,
-                        'citation_type': 'original',
-                        'source': 'original',
-                        'is_original': True
-                    }, {
-                        'id': 1,
-                        'title': metadata.title or '',
-                        'authors': authors,
-                        'authors_parsed': getattr(metadata, 'authors_parsed', []) or [],
-                        'year': year,
-                        'journal': getattr(metadata, 'journal', '') or '',
-                        'publisher': getattr(metadata, 'publisher', '') or '',
-                        'volume': getattr(metadata, 'volume', '') or '',
-                        'issue': getattr(metadata, 'issue', '') or '',
-                        'pages': getattr(metadata, 'pages', '') or '',
-                        'doi': getattr(metadata, 'doi', '') or '',
-                        'url': getattr(metadata, 'url', url) or url,
-                        'citation_type': metadata.citation_type.name.lower() if metadata.citation_type else 'url',
-                        'source': getattr(metadata, 'source_engine', 'ai_lookup'),
-                        'is_original': False,
-                        'parenthetical': parenthetical  # The in-text citation to use
-                    }]
-                    
-                    return {
-                        'id': global_id,
-                        'note_id': global_id,
-                        'original': original_text,
-                        'original_url': url,  # Store URL for replacement
-                        'global_start': url_info.get('global_start', 0),
-                        'global_end': url_info.get('global_end', 0),
-                        'options': options,
-                        'selected_option': 1,
-                        'formatted': formatted,
-                        'parenthetical': parenthetical,  # The in-text citation
-                        'accepted': False,
-                        'is_url': True  # Flag to identify URL citations
-                    }
-                else:
-                    # No metadata found
-                    return {
-                        'id': global_id,
-                        'note_id': global_id,
-                        'original': original_text,
-                        'original_url': url,
-                        'global_start': url_info.get('global_start', 0),
-                        'global_end': url_info.get('global_end', 0),
-                        'options': [{
-                            'id': 0,
-                            'title': '[Keep Original URL]',
-                            'authors': [],
-                            'year': '',
-                            'journal': '',
-                            'publisher': '',
-                            'volume': '',
-                            'issue': '',
-                            'pages': '',
-                            'doi': '',
-                            'url': url,
-                            'citation_type': 'original',
-                            'source': 'original',
-                            'is_original': True
-                        }],
-                        'selected_option': 0,
-                        'formatted': None,
-                        'parenthetical': None,
-                        'accepted': False,
-                        'is_url': True,
-                        'error': 'No metadata found'
-                    }
-                    
-            except Exception as e:
-                print(f"[API] Error processing URL '{url[:50]}': {e}")
-                return {
-                    'id': global_id,
-                    'note_id': global_id,
-                    'original': original_text,
-                    'original_url': url,
-                    'global_start': url_info.get('global_start', 0),
-                    'global_end': url_info.get('global_end', 0),
-                    'options': [{
-                        'id': 0,
-                        'title': '[Keep Original URL]',
-                        'authors': [],
-                        'year': '',
-                        'journal': '',
-                        'publisher': '',
-                        'volume': '',
-                        'issue': '',
-                        'pages': '',
-                        'doi': '',
-                        'url': url,
-                        'citation_type': 'original',
-                        'source': 'original',
-                        'is_original': True
-                    }],
-                    'selected_option': 0,
-                    'formatted': None,
-                    'parenthetical': None,
-                    'accepted': False,
-                    'is_url': True,
-                    'error': str(e)
-                }
-        
-        # Process URLs in parallel
-        url_citations = [None] * len(unique_urls)
-        if unique_urls:
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                url_futures = {
-                    executor.submit(process_single_url, idx, url_info): idx 
-                    for idx, url_info in enumerate(unique_urls)
-                }
-                for future in as_completed(url_futures):
-                    idx = url_futures[future]
-                    url_citations[idx] = future.result()
-                    print(f"[API] Completed URL {idx + 1}/{len(unique_urls)}")
-        
-        # Combine author-year and URL citations
-        all_citations = citations + [c for c in url_citations if c is not None]
+        if _wants_job():
+            return _submit_job('author-date', _process_author_date_document, file_bytes, file.filename,
+                               style, is_preview, client_ip, is_preview=is_preview)
         
-        # Record preview usage for rate limiting
+        # Record preview usage for rate limiting (before the lookups run, so
+        # concurrent uploads can't all pass the check)
         if is_preview:
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            if client_ip and ',' in client_ip:
-                client_ip = client_ip.split(',')[0].strip()
             record_preview_usage(client_ip)
         
-        # Create session to store results
-        session_id = sessions.create()
-        print(f"[API] Created author-date session {session_id[:8]}... for document {file.filename} (preview={is_preview})")
-        
-        sessions.set(session_id, 'original_bytes', file_bytes)
-        sessions.set(session_id, 'style', style)
-        sessions.set(session_id, 'mode', 'author-date')
-        sessions.set(session_id, 'citations', all_citations)  # Store combined citations
-        sessions.set(session_id, 'filename', secure_filename(file.filename))
-        sessions.set(session_id, 'is_preview', is_preview)  # Track preview status
-        
-        # Count stats
-        author_year_count = len(citations)
-        url_count = len([c for c in url_citations if c is not None])
-        
-        # Get remaining previews for unauthenticated users
-        remaining_previews = None
-        if is_preview:
-            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-            if client_ip and ',' in client_ip:
-                client_ip = client_ip.split(',')[0].strip()
-            _, _, remaining_previews = check_preview_allowed(client_ip)
-        
-        return jsonify({
-            'success': True,
-            'session_id': session_id,
-            'citations': all_citations,
-            'is_preview': is_preview,  # Frontend uses this to show login prompt
-            'remaining_previews': remaining_previews,  # How many free previews left
-            'stats': {
-                'total': len(all_citations),
-                'author_year': author_year_count,
-                'urls': url_count,
-                'with_options': sum(1 for c in all_citations if len(c.get('options', [])) > 1),
-                'no_options': sum(1 for c in all_citations if len(c.get('options', [])) <= 1)
-            }
-        })
+        return jsonify(_process_author_date_document(file_bytes, file.filename, style, is_preview, client_ip))
         
     except Exception as e:
         print(f"[API] Error in /api/process-author-date: {e}")
@@ -2312,25 +3021,16 @@ def finalize_author_date():
         print(f"[API] URL replacements to make: {len(url_replacements)}")
         
         # Generate document with References section
-        from io import BytesIO
-        import zipfile
-        import tempfile
-        import shutil
-        import xml.etree.ElementTree as ET
+        from processors.docx_package import DocxPackage, DOCUMENT_PART
         import re
         
-        temp_dir = tempfile.mkdtemp()
+        # Edited in memory; untouched parts are copied through unchanged
+        package = DocxPackage(original_bytes)
         
         try:
-            with zipfile.ZipFile(BytesIO(original_bytes), 'r') as zf:
-                zf.extractall(temp_dir)
-            
-            doc_path = os.path.join(temp_dir, 'word', 'document.xml')
-            
             # Read original XML as string to preserve all namespaces
             # (ElementTree loses namespaces on write, corrupting the document)
-            with open(doc_path, 'r', encoding='utf-8') as f:
-                xml_content = f.read()
+            xml_content = package.get_text(DOCUMENT_PART)
             
             w_ns = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
             
@@ -2430,20 +3130,8 @@ def finalize_author_date():
             # =================================================================
             # STEP 4: Write modified XML (preserves all original namespaces)
             # =================================================================
-            with open(doc_path, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
-            
-            # Repackage docx
-            output_buffer = BytesIO()
-            with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for root_dir, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root_dir, file)
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        zf.write(file_path, arcname)
-            
-            output_buffer.seek(0)
-            processed_bytes = output_buffer.read()
+            package.set_text(DOCUMENT_PART, xml_content)
+            processed_bytes = package.to_bytes()
             
             # Save to session for download
             sessions.set(session_id, 'processed_doc', processed_bytes)
@@ -2456,7 +3144,7 @@ def finalize_author_date():
             })
             
         finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            package.close()
         
     except Exception as e:
         print(f"[API] Error in /api/finalize-author-date: {e}")
@@ -2600,14 +3288,188 @@ def admin_email_costs():
         }), 500
 
 
+@app.route('/admin/costs')
+def admin_costs():
+    """
+    Cost analytics from the cost log rollups, or a CSV export.
+
+    Requires secret key: /admin/costs?key=YOUR_ADMIN_SECRET
+
+    Query parameters:
+        - since / until: Day range (e.g. 2026-10-01), inclusive
+        - granularity: 'day' or 'hour' - adds the rollup buckets
+        - format: 'csv' downloads the logged calls (or, with granularity,
+          the buckets) in CSV form
+    """
+    from email_service import ADMIN_SECRET
+    from cost_tracker import flush_cost_log
+    from cost_store import get_cost_store, GRANULARITIES
+
+    provided_key = request.args.get('key', '')
+    if not ADMIN_SECRET or not provided_key or provided_key != ADMIN_SECRET:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid or missing key'
+        }), 403
+
+    store = get_cost_store()
+    if not store.enabled:
+        return jsonify({
+            'success': False,
+            'error': 'Cost store unavailable (COST_DB off or unreadable)'
+        }), 503
+
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    granularity = request.args.get('granularity') or None
+    if granularity and granularity not in GRANULARITIES:
+        return jsonify({
+            'success': False,
+            'error': f"granularity must be one of {sorted(GRANULARITIES)}"
+        }), 400
+
+    flush_cost_log()
+    if request.args.get('format') == 'csv':
+        if granularity:
+            text = store.export_rollups_csv(granularity, since, until)
+            filename = f'citategenie_costs_{granularity}.csv'
+        else:
+            text = store.export_csv(since, until)
+            filename = 'citategenie_costs.csv'
+        return Response(text, mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        })
+
+    payload = {'success': True, 'summary': store.summary(since, until)}
+    if granularity:
+        payload['rollups'] = store.rollups(granularity, since, until)
+    return jsonify(payload)
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id: str):
+    """
+    Poll a background document job.
+    
+    Response: {success, job_id, status (queued|running|done|error), stage,
+    done, total, ...}; once status is 'done', 'result' holds the payload the
+    synchronous endpoint would have returned.
+    """
+    snapshot = _job_snapshot(job_id)
+    if not snapshot:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found or expired'
+        }), 404
+    return jsonify(dict(snapshot, success=True))
+
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id: str):
+    """
+    Stream a background job's progress as Server-Sent Events.
+    
+    Events: queued, started, progress (stage, done, total, note), then done
+    (with the final status and result) or error. Reconnecting clients resume
+    after Last-Event-ID. If the job runs in another worker, its published
+    status is relayed instead, at most once a second.
+    """
+    if not _job_snapshot(job_id):
+        return jsonify({
+            'success': False,
+            'error': 'Job not found or expired'
+        }), 404
+    
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('after', '0')
+    after = int(last_id) if str(last_id).isdigit() else 0
+    
+    def local_stream(after):
+        job = document_jobs.get(job_id)
+        while True:
+            events = document_jobs.events_since(job_id, after, timeout=15)
+            if not events:
+                if job.finished:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after = event['seq']
+                if event['type'] in ('done', 'error'):
+                    yield _sse(event['type'], dict(job.snapshot(), **event), after)
+                    return
+                yield _sse(event['type'], event, after)
+    
+    def relayed_stream():
+        last = None
+        idle = 0
+        while True:
+            snapshot = _job_snapshot(job_id)
+            if not snapshot:
+                yield _sse('error', {'error': 'Job not found or expired'})
+                return
+            state = (snapshot.get('status'), snapshot.get('stage'), snapshot.get('done'))
+            if state != last:
+                last = state
+                idle = 0
+                status = snapshot.get('status')
+                yield _sse(status if status in TERMINAL_STATES else 'progress', snapshot)
+                if status in TERMINAL_STATES:
+                    return
+            else:
+                idle += 1
+                if idle % 15 == 0:
+                    yield ": keep-alive\n\n"
+            time.sleep(1.0)
+    
+    stream = local_stream(after) if document_jobs.get(job_id) else relayed_stream()
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Routing-cascade instrumentation (see metrics.py).
+    
+    Prometheus text format by default; /metrics?format=json for JSON.
+    Counters and histograms are per gunicorn worker.
+    
+    The counters include live API spend, so a token is required:
+    METRICS_TOKEN (or ADMIN_SECRET if unset), sent as
+    "Authorization: Bearer <token>" or ?key=<token>.
+    """
+    import hmac
+    from email_service import ADMIN_SECRET
+    
+    token = os.environ.get('METRICS_TOKEN', '') or ADMIN_SECRET
+    provided = request.args.get('key', '')
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        provided = auth[len('Bearer '):].strip()
+    if not token or not provided or not hmac.compare_digest(provided, token):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid or missing key'
+        }), 403
+    
+    if request.args.get('format') == 'json':
+        snapshot = metrics.registry.snapshot()
+        snapshot['worker_pid'] = os.getpid()
+        return jsonify(snapshot)
+    return app.response_class(metrics.registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/health')
 def health():
     """Health check endpoint."""
     return jsonify({
         'status': 'healthy',
         'version': '2.1.0',  # Updated version for author-date support
-        'sessions_count': len(sessions._sessions),
-        'persistence': sessions._persistence_available
+        'sessions_count': len(sessions),
+        'persistence': sessions._persistence_available,
+        'jobs': document_jobs.stats()
     })
 
 
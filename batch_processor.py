@@ -0,0 +1,430 @@
+"""
+citeflex/batch_processor.py
+
+Bulk processing: many documents, one lookup per distinct citation.
+
+Departments send whole thesis cohorts whose notes overlap heavily (the same
+handbooks, the same key articles). Processing them one by one repeats most
+of the lookups. A batch instead:
+
+1. Opens every document (prepare_document: notes, embedded metadata cache,
+   incremental note state)
+2. Takes the union of the note texts that need a lookup, deduplicated by
+   whitespace (_note_lookup_key) and by normalized text
+   (normalized_text_key), so "Smith, 2020." and "Smith 2020" share a lookup.
+   Only self-identifying notes (a DOI, PMID, ISBN or URL, or a complete
+   citation) are shared across documents; short forms and author-date
+   notes ("Smith, 45.", "(Lee, 2019)") mean different works in different
+   theses and are resolved per document, with that document's gist
+3. Resolves each distinct citation once through get_citation
+   (route_citation + formatting) on a bounded pool, with the per-note
+   timeout and a batch deadline; the embedded cache of a document citing
+   it is consulted first, as for a single upload
+4. Copies the results into every citing document's embedded cache, then
+   writes each document in order (write_document - ibid / short form logic
+   is per document, as before)
+
+A document that can't be opened is reported with an error; the rest of the
+batch still runs.
+
+Usage:
+    from batch_processor import read_batch_upload, process_batch
+
+    documents = read_batch_upload(upload_bytes, 'cohort.zip')
+    batch = process_batch(documents, style='APA 7')
+    with open('processed.zip', 'wb') as f:
+        f.write(batch.to_zip())
+
+Command line:
+    python batch_processor.py cohort.zip --style "APA 7" --out processed.zip
+    python batch_processor.py a.docx b.docx --out-dir processed/
+
+Created: 2026-10-16
+"""
+
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from document_processor import (
+    PreparedDocument,
+    prepare_document,
+    write_document,
+    _document_gist,
+    _resolve_note_texts,
+)
+from negative_cache import submit_in_context
+from processors.shared_metadata_cache import normalized_text_key
+
+# Entries larger than this (uncompressed) are skipped when reading a zip
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+
+# A DOI, PMID, ISBN or URL anywhere in a note
+_IDENTIFIER_PATTERN = re.compile(
+    r'https?://|\b10\.\d{4,}/|\bPMID:?\s*\d|\bISBN(?:-1[03])?[-:]?\s*\d',
+    re.IGNORECASE
+)
+
+# A lookup: (document index, or None for a lookup shared by all documents; note text)
+LookupKey = Tuple[Optional[int], str]
+
+
+class BatchTooLarge(ValueError):
+    """An upload holds more documents (or bytes) than a batch may."""
+
+
+# =============================================================================
+# INPUT
+# =============================================================================
+
+def _is_document_name(name: str) -> bool:
+    """A .docx that isn't a Word lock file or macOS resource fork."""
+    base = os.path.basename(name)
+    return (
+        base.lower().endswith('.docx')
+        and not base.startswith('~$')
+        and not base.startswith('._')
+        and not name.startswith('__MACOSX/')
+    )
+
+
+def read_batch_upload(
+    data: bytes,
+    filename: str = "",
+    max_documents: Optional[int] = None,
+    max_total_bytes: Optional[int] = None
+) -> List[Tuple[str, bytes]]:
+    """
+    Split an upload into documents.
+
+    A .docx is itself a zip, so a zip of documents is told apart by its
+    entries: an archive holding word/document.xml is one document.
+
+    The limits are checked against the archive directory before anything
+    is decompressed (an entry never inflates past its recorded size).
+
+    Args:
+        data: A .docx, or a zip of .docx files (folders are allowed)
+        filename: Upload name, used for a single document
+        max_documents: Most documents the upload may hold
+        max_total_bytes: Most uncompressed bytes, all documents together
+
+    Returns:
+        List of (name, document bytes) in archive order
+
+    Raises:
+        BatchTooLarge: The upload exceeds max_documents or max_total_bytes
+    """
+    if not zipfile.is_zipfile(BytesIO(data)):
+        return []
+
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        names = archive.namelist()
+        if 'word/document.xml' in names:
+            _check_batch_limits(filename, 1, len(data), max_documents, max_total_bytes)
+            return [(filename or 'document.docx', data)]
+
+        entries = []
+        total_bytes = 0
+        for info in archive.infolist():
+            if info.is_dir() or not _is_document_name(info.filename):
+                continue
+            if info.file_size > MAX_DOCUMENT_BYTES:
+                print(f"[Batch] Skipping {info.filename}: {info.file_size} bytes uncompressed")
+                continue
+            name = os.path.normpath(info.filename).replace('\\', '/').lstrip('/')
+            if name.startswith('..'):
+                continue
+            entries.append((name, info))
+            total_bytes += info.file_size
+            _check_batch_limits(filename, len(entries), total_bytes, max_documents, max_total_bytes)
+
+        documents = [(name, archive.read(info)) for name, info in entries]
+
+    print(f"[Batch] Read {len(documents)} documents from {filename or 'archive'}")
+    return documents
+
+
+def _check_batch_limits(
+    filename: str,
+    count: int,
+    total_bytes: int,
+    max_documents: Optional[int],
+    max_total_bytes: Optional[int]
+) -> None:
+    """Raise BatchTooLarge once count or total_bytes passes its limit."""
+    if max_documents is not None and count > max_documents:
+        raise BatchTooLarge(f"{filename or 'upload'}: a batch can hold at most {max_documents} documents")
+    if max_total_bytes is not None and total_bytes > max_total_bytes:
+        raise BatchTooLarge(f"{filename or 'upload'}: documents exceed {max_total_bytes} bytes uncompressed")
+
+
+# =============================================================================
+# RESULTS
+# =============================================================================
+
+@dataclass
+class BatchDocument:
+    """One document of a batch and its outcome."""
+    name: str
+    original_bytes: bytes
+    processed_bytes: Optional[bytes] = None
+    results: List[Any] = field(default_factory=list)
+    metadata_cache: Any = None
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and self.processed_bytes is not None
+
+
+@dataclass
+class BatchResult:
+    """All documents of a batch, plus lookup statistics."""
+    documents: List[BatchDocument]
+    stats: Dict[str, Any]
+
+    def to_zip(self) -> bytes:
+        """Processed documents as a zip, under their original names."""
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for document in self.documents:
+                if document.success:
+                    archive.writestr(document.name, document.processed_bytes)
+        return buffer.getvalue()
+
+
+# =============================================================================
+# BATCH PIPELINE
+# =============================================================================
+
+def _is_self_identifying(text: str) -> bool:
+    """
+    Whether a note names the same work whichever document cites it: it
+    carries a DOI, PMID, ISBN or URL, or is a citation complete enough for
+    route_citation to just reformat it.
+    """
+    if _IDENTIFIER_PATTERN.search(text):
+        return True
+    from unified_router import parse_existing_citation, _is_citation_complete
+    return _is_citation_complete(parse_existing_citation(text))
+
+
+def _distinct_lookups(
+    prepared: List[Tuple[int, PreparedDocument]]
+) -> Tuple[List[LookupKey], Dict[Tuple[int, str], LookupKey], Dict[LookupKey, int]]:
+    """
+    Deduplicate lookup texts, across documents only for self-identifying ones.
+
+    Returns:
+        (lookups to run, (document index, lookup text) -> the lookup serving
+         it, lookup -> index of the document whose context and cache it uses:
+         for a shared lookup the first one citing it, or the first whose
+         embedded cache has it)
+    """
+    caches = {doc_index: document.metadata_cache for doc_index, document in prepared}
+    unique: List[LookupKey] = []
+    representative: Dict[Tuple[int, str], LookupKey] = {}
+    by_normalized: Dict[Tuple[Optional[int], str], LookupKey] = {}
+    owner: Dict[LookupKey, int] = {}
+
+    for doc_index, document in prepared:
+        for text in document.lookup_texts:
+            key = (None if _is_self_identifying(text) else doc_index, text)
+            if key in owner:
+                representative[(doc_index, text)] = key
+                # Prefer a document whose embedded cache already knows the text
+                if caches[doc_index].has(text) and not caches[owner[key]].has(text):
+                    owner[key] = doc_index
+                continue
+            norm = (key[0], normalized_text_key(text) or text)
+            if norm in by_normalized:
+                representative[(doc_index, text)] = by_normalized[norm]
+                continue
+            by_normalized[norm] = representative[(doc_index, text)] = key
+            owner[key] = doc_index
+            unique.append(key)
+
+    return unique, representative, owner
+
+
+def _document_contexts(documents: Dict[int, PreparedDocument], workers: int) -> Dict[int, str]:
+    """Gist of each document that owns at least one lookup (concurrently)."""
+    if not documents:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(documents)))) as executor:
+        futures = {
+            doc_index: submit_in_context(executor, _document_gist, document.processor)
+            for doc_index, document in documents.items()
+        }
+        return {doc_index: future.result() for doc_index, future in futures.items()}
+
+
+def process_batch(
+    documents: List[Tuple[str, bytes]],
+    style: str = "Chicago Manual of Style",
+    add_links: bool = True,
+    progress: Optional[Callable] = None,
+    deadline: Optional[float] = None,
+    incremental: Optional[bool] = None
+) -> BatchResult:
+    """
+    Process several documents, resolving each distinct citation once.
+
+    Args:
+        documents: (name, .docx bytes) pairs, e.g. from read_batch_upload
+        style: Citation style to use
+        add_links: Whether to make URLs clickable
+        progress: Optional callback(stage, done, total, **detail) - stage is
+                  'lookup' (distinct citations resolved) or 'documents'
+                  (documents written)
+        deadline: Seconds for all lookups together (default: config.BATCH_DEADLINE)
+        incremental: Reuse each document's embedded note state
+                     (default: config.INCREMENTAL_REPROCESSING)
+
+    Returns:
+        BatchResult with one BatchDocument per input, in input order
+    """
+    from unified_router import get_citation
+    from config import NOTE_TIMEOUT, NOTE_LOOKUP_WORKERS, BATCH_DEADLINE
+
+    if deadline is None:
+        deadline = BATCH_DEADLINE
+
+    batch = [BatchDocument(name=name, original_bytes=data) for name, data in documents]
+
+    # --- Open every document ---
+    prepared: List[Tuple[int, PreparedDocument]] = []
+    for doc_index, document in enumerate(batch):
+        try:
+            prepared.append((doc_index, prepare_document(document.original_bytes, incremental)))
+        except Exception as e:
+            print(f"[Batch] Could not open {document.name}: {e}")
+            document.error = f"Could not read document: {e}"
+
+    by_index = dict(prepared)
+    total_notes = sum(len(p.all_notes) for _, p in prepared)
+    per_document_lookups = sum(len(p.lookup_texts) for _, p in prepared)
+
+    # --- Resolve the union once ---
+    unique, representative, owner = _distinct_lookups(prepared)
+    print(f"[Batch] {len(batch)} documents, {total_notes} notes: "
+          f"{per_document_lookups} per-document lookups -> {len(unique)} distinct")
+
+    contexts = _document_contexts({i: by_index[i] for i in set(owner.values())}, NOTE_LOOKUP_WORKERS)
+
+    def lookup(key: LookupKey):
+        doc_index = owner[key]
+        return get_citation(key[1], style, contexts.get(doc_index, ""), by_index[doc_index].metadata_cache)
+
+    resolved = _resolve_note_texts(
+        unique,
+        lookup,
+        workers=NOTE_LOOKUP_WORKERS,
+        note_timeout=NOTE_TIMEOUT,
+        deadline=deadline,
+        progress=progress,
+    )
+
+    # --- Write every document with the shared results ---
+    written = 0
+    for doc_index, document in prepared:
+        entry = batch[doc_index]
+        shared = {}
+        for text in document.lookup_texts:
+            metadata, formatted = shared[text] = resolved.get(representative[(doc_index, text)], (None, None))
+            # The note state of the next (incremental) run refers to this
+            # document's own cache entry for the note text
+            if metadata and not document.metadata_cache.has(text):
+                document.metadata_cache.set(text, metadata)
+        try:
+            entry.processed_bytes, entry.results, entry.metadata_cache = write_document(
+                document, shared, style, add_links
+            )
+        except Exception as e:
+            print(f"[Batch] Failed to write {entry.name}: {e}")
+            entry.error = str(e)
+        written += 1
+        if progress:
+            progress('documents', written, len(prepared), document=entry.name, success=entry.success)
+
+    stats = {
+        'documents': len(batch),
+        'processed': sum(1 for d in batch if d.success),
+        'failed': sum(1 for d in batch if not d.success),
+        'notes': total_notes,
+        'lookups_per_document': per_document_lookups,
+        'lookups_distinct': len(unique),
+        'lookups_saved': per_document_lookups - len(unique),
+        'resolved': sum(1 for metadata, _ in resolved.values() if metadata),
+    }
+    print(f"[Batch] Done: {stats['processed']}/{stats['documents']} documents, "
+          f"{stats['lookups_saved']} lookups shared across documents")
+    return BatchResult(documents=batch, stats=stats)
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Process a batch of Word documents, looking up shared citations once."
+    )
+    parser.add_argument('inputs', nargs='+', help=".docx files and/or zips of .docx files")
+    parser.add_argument('--style', default="Chicago Manual of Style", help="Citation style")
+    parser.add_argument('--no-links', action='store_true', help="Don't make URLs clickable")
+    parser.add_argument('--out', help="Write the processed documents to this zip")
+    parser.add_argument('--out-dir', help="Write the processed documents into this directory")
+    args = parser.parse_args(argv)
+
+    if not args.out and not args.out_dir:
+        parser.error("give --out and/or --out-dir")
+
+    documents: List[Tuple[str, bytes]] = []
+    for path in args.inputs:
+        with open(path, 'rb') as f:
+            data = f.read()
+        found = read_batch_upload(data, os.path.basename(path))
+        if not found:
+            print(f"[Batch] {path}: not a .docx or a zip of .docx files")
+        documents.extend(found)
+
+    if not documents:
+        print("[Batch] Nothing to process")
+        return 1
+
+    def report(stage, done, total, **detail):
+        if stage == 'documents' or done == total or done % 25 == 0:
+            print(f"[Batch] {stage}: {done}/{total}")
+
+    batch = process_batch(documents, style=args.style, add_links=not args.no_links, progress=report)
+
+    if args.out:
+        with open(args.out, 'wb') as f:
+            f.write(batch.to_zip())
+        print(f"[Batch] Wrote {args.out}")
+    if args.out_dir:
+        for document in batch.documents:
+            if document.success:
+                path = os.path.join(args.out_dir, document.name)
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(document.processed_bytes)
+        print(f"[Batch] Wrote {batch.stats['processed']} documents to {args.out_dir}")
+
+    for document in batch.documents:
+        if document.error:
+            print(f"[Batch] FAILED {document.name}: {document.error}")
+    print(f"[Batch] Stats: {batch.stats}")
+    return 0 if batch.stats['failed'] == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,6 +4,8 @@ citeflex/config.py
 Configuration, constants, and shared settings.
 
 Version History:
+    2026-10-16: MEDICAL_DOMAINS, PUBMED_INDEXED_PUBLISHERS and GOVERNMENT_DOMAINS moved
+                here; get_newspaper_name / get_gov_agency use domain_index
     2025-12-12: Added LOC_API_KEY for Library of Congress API
     2025-12-10: Added OPENAI_API_KEY and ANTHROPIC_API_KEY with .lstrip('=') fix
     2025-12-07: Added SERPAPI_KEY for Google Scholar integration
@@ -47,11 +49,118 @@ LOC_API_KEY = os.environ.get('LOC_API_KEY', '')  # Library of Congress API
 # =============================================================================
 
 DEFAULT_TIMEOUT = 10  # seconds
+
+# Shared connection pool (engines/http_client.py)
+HTTP_POOL_HOSTS = 32       # hosts with a kept-alive pool
+HTTP_POOL_PER_HOST = 10    # max open connections to any one host
+HTTP_IO_WORKERS = 32       # threads serving async engine calls, process-wide
+
+# Per-host rate limits: host -> (requests per second, burst)
+# A 429 halves a host's rate and honours Retry-After; successes restore it.
+HOST_RATE_LIMITS = {
+    'api.crossref.org': (20, 40),
+    'api.openalex.org': (10, 20),
+    'api.semanticscholar.org': (1, 5),
+    'eutils.ncbi.nlm.nih.gov': (3, 3),
+    'www.googleapis.com': (10, 20),
+    'openlibrary.org': (5, 10),
+    'serpapi.com': (5, 10),
+    'www.courtlistener.com': (5, 10),
+}
+DEFAULT_HOST_RATE = (10, 20)
+RATE_LIMIT_MAX_WAIT = 1.0        # longest a request waits for a token before failing fast
+BREAKER_FAILURE_THRESHOLD = 5    # consecutive failures before a host is skipped
+BREAKER_COOLDOWN = 30            # seconds a tripped host is skipped
 DEFAULT_HEADERS = {
     'User-Agent': 'CiteFlex/2.0 (mailto:user@example.com)',
     'Accept': 'application/json'
 }
 
+# =============================================================================
+# DOCUMENT PROCESSING SETTINGS
+# =============================================================================
+
+NOTE_TIMEOUT = 8           # seconds a single note lookup may run
+NOTE_LOOKUP_WORKERS = 8    # concurrent note lookups per document
+DOCUMENT_DEADLINE = 90     # seconds for all lookups in one document (gunicorn timeout is 120)
+
+# Re-uploads: notes unchanged since the last run (per the note state embedded
+# in customXml/citategenie.xml) skip lookups and are only rewritten if their
+# ibid/short/full form changes
+INCREMENTAL_REPROCESSING = os.environ.get('INCREMENTAL_REPROCESSING', 'true').lower() == 'true'
+
+# Batches (batch_processor.py, /api/process-batch): lookups for a whole
+# cohort share one deadline; batches run as background jobs
+BATCH_DEADLINE = int(os.environ.get('BATCH_DEADLINE', '600'))        # seconds for all lookups in a batch
+BATCH_MAX_DOCUMENTS = int(os.environ.get('BATCH_MAX_DOCUMENTS', '50'))
+BATCH_MAX_TOTAL_MB = int(os.environ.get('BATCH_MAX_TOTAL_MB', '200'))  # uncompressed, all documents together
+
+# =============================================================================
+# AI LOOKUP BATCHING SETTINGS (engines/ai_batch.py)
+# =============================================================================
+
+# Concurrent AI lookups of the same kind and context are sent as one request.
+# A lookup waits this long for others to join (0 = one request per lookup).
+AI_BATCH_WINDOW = float(os.environ.get('AI_BATCH_WINDOW', '0.05'))
+AI_BATCH_SIZE = int(os.environ.get('AI_BATCH_SIZE', '20'))          # items per request
+AI_BATCH_MAX_TOKENS = 8000       # output tokens per batched request (caps items for long answers)
+
+# =============================================================================
+# ACADEMIC FAN-OUT SETTINGS (unified_router._route_journal)
+# =============================================================================
+
+# 'all'    - wait for every free engine, then pick the best (original behaviour)
+# 'early'  - query all engines, return as soon as one clears FANOUT_ACCEPT_SCORE
+# 'hedged' - like 'early', but query the primary engines first and start the
+#            backup engines only if the primaries are slower than their p95
+#            or finish without a good enough result
+FANOUT_MODE = os.environ.get('FANOUT_MODE', 'hedged')
+FANOUT_ACCEPT_SCORE = 0.9        # author-position score that ends the fan-out (0.9 = first author)
+HEDGE_PERCENTILE = 95            # primary latency percentile that triggers hedging
+HEDGE_MIN_SAMPLES = 20           # latency samples needed before the percentile is trusted
+HEDGE_DEFAULT_DELAY = 2.0        # seconds before hedging until then
+
+# =============================================================================
+# SHARED METADATA CACHE SETTINGS
+# =============================================================================
+
+SHARED_CACHE_MAX_ENTRIES = 5000              # keys held in memory per worker
+SHARED_CACHE_TTL = 7 * 24 * 3600             # seconds
+SHARED_CACHE_DB = os.environ.get('METADATA_CACHE_DB', '')  # optional SQLite path, e.g. /data/metadata_cache.db
+
+# =============================================================================
+# LLM RESPONSE CACHE SETTINGS (engines/llm_cache.py)
+# =============================================================================
+
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE', 'on').lower() not in ('off', 'false', '0')
+LLM_CACHE_DB = os.environ.get('LLM_CACHE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'llm_cache.db'))
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', str(30 * 24 * 3600)))   # seconds
+LLM_CACHE_MAX_MB = int(os.environ.get('LLM_CACHE_MAX_MB', '200'))
+# Error / not-found answers are kept only this long (like NEGATIVE_CACHE_TTLS['no_match'])
+LLM_CACHE_NEGATIVE_TTL = int(os.environ.get('LLM_CACHE_NEGATIVE_TTL', str(6 * 3600)))   # seconds
+
+# =============================================================================
+# COST LOG SETTINGS (cost_store.py)
+# =============================================================================
+
+# SQLite cost log with hourly/daily rollups ("off" keeps appending to costs.csv)
+COST_DB = os.environ.get('COST_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'costs.db'))
+if COST_DB.lower() in ('off', 'false', '0'):
+    COST_DB = ''
+
+# =============================================================================
+# NEGATIVE RESULT CACHE SETTINGS
+# =============================================================================
+
+# How long an unresolved citation is skipped, by reason (seconds).
+# Transient failures are retried sooner than hard no-match results.
+NEGATIVE_CACHE_TTLS = {
+    'no_match': 6 * 3600,
+    'timeout': 10 * 60,
+    'provider_error': 10 * 60,
+    'rate_limited': 2 * 60,
+}
+
 # =============================================================================
 # GEMINI SETTINGS
 # =============================================================================
@@ -917,6 +1026,47 @@ ACADEMIC_DOMAINS = {
     'worldcat.org': 'WorldCat',
 }
 
+# =============================================================================
+# MEDICAL / GOVERNMENT DOMAINS (URL routing, see domain_index.py)
+# =============================================================================
+
+# Medical domains that should NOT route to government engine
+MEDICAL_DOMAINS = ['pubmed', 'ncbi.nlm.nih.gov', 'nih.gov/health', 'medlineplus']
+
+# Publishers whose URLs carry PIIs that PubMed indexes (they often block scrapers)
+PUBMED_INDEXED_PUBLISHERS = [
+    'thelancet.com',
+    'sciencedirect.com',
+    'cell.com',
+    'nejm.org',
+    'jamanetwork.com',
+    'bmj.com',
+]
+
+# Government domains beyond .gov / .govt hosts (routers/url.classify_url)
+GOVERNMENT_DOMAINS = [
+    # UK, NHS, Parliament and devolved governments
+    'gov.uk', 'nhs.uk', 'nice.org.uk', 'parliament.uk', 'gov.scot', 'gov.wales',
+    # Canada, provinces, parliament and courts
+    'gc.ca', 'canada.ca',
+    'ontario.ca', 'quebec.ca', 'gov.bc.ca', 'alberta.ca',
+    'gov.mb.ca', 'gov.sk.ca', 'gov.ns.ca', 'gnb.ca',
+    'gov.nl.ca', 'gov.pe.ca', 'gov.nt.ca', 'gov.nu.ca', 'gov.yk.ca',
+    'parl.ca', 'scc-csc.ca',
+    # Australia (states are under gov.au) and CSIRO
+    'gov.au', 'csiro.au',
+    # New Zealand
+    'govt.nz', 'parliament.nz', 'elections.nz',
+    # Ireland
+    'gov.ie', 'oireachtas.ie', 'courts.ie', 'cso.ie', 'revenue.ie',
+    'citizensinformation.ie', 'hse.ie', 'centralbank.ie',
+    # European Union
+    'europa.eu',
+    # International organizations
+    'who.int', 'un.org', 'oecd.org', 'imf.org',
+    'worldbank.org', 'wto.org', 'nato.int', 'icrc.org',
+]
+
 # =============================================================================
 # MEDICAL TERMS (for detection)
 # =============================================================================
@@ -947,49 +1097,45 @@ def resolve_publisher_place(publisher: str, current_place: str = "") -> str:
 
 
 def get_newspaper_name(domain: str) -> str:
-    """Get newspaper name from domain."""
-    domain = domain.lower().replace('www.', '')
-    for key, name in NEWSPAPER_DOMAINS.items():
-        if key in domain:
-            return name
-    return "Unknown Publication"
+    """Get newspaper name from domain (or URL)."""
+    from domain_index import classify_domain
+    return classify_domain(domain).newspaper or "Unknown Publication"
 
 
 def get_gov_agency(domain: str) -> str:
     """
     Get government agency name from domain.
     
+    Updated: 2026-10-16 - Indexed lookup (domain_index); the most specific
+                          domain still wins, e.g. 'nimh.nih.gov' over 'nih.gov'
     Updated: 2025-12-08 - Added international government support
     Updated: 2025-12-05 - Check longer/more specific domains first
     """
-    domain = domain.lower().replace('www.', '')
-    
-    # Sort keys by length descending so more specific domains match first
-    # e.g., 'nimh.nih.gov' should match before 'nih.gov'
-    sorted_keys = sorted(GOV_AGENCY_MAP.keys(), key=len, reverse=True)
+    from domain_index import classify_domain
+    info = classify_domain(domain)
+    if info.gov_agency:
+        return info.gov_agency
     
-    for key in sorted_keys:
-        if key in domain:
-            return GOV_AGENCY_MAP[key]
+    domain = '.' + info.host
     
     # Fallback labels based on domain pattern
-    if '.gov.uk' in domain or domain.endswith('gov.uk'):
+    if domain.endswith('.gov.uk'):
         return "UK Government"
-    if '.gc.ca' in domain or '.canada.ca' in domain:
+    if domain.endswith('.gc.ca') or domain.endswith('.canada.ca'):
         return "Government of Canada"
-    if '.gov.au' in domain:
+    if domain.endswith('.gov.au'):
         return "Australian Government"
-    if '.govt.nz' in domain:
+    if domain.endswith('.govt.nz'):
         return "New Zealand Government"
-    if '.gov.ie' in domain:
+    if domain.endswith('.gov.ie'):
         return "Government of Ireland"
-    if '.europa.eu' in domain:
+    if domain.endswith('.europa.eu'):
         return "European Union"
-    if '.gov.scot' in domain:
+    if domain.endswith('.gov.scot'):
         return "Scottish Government"
-    if '.gov.wales' in domain:
+    if domain.endswith('.gov.wales'):
         return "Welsh Government"
-    if '.gov' in domain:
+    if '.gov.' in domain or domain.endswith('.gov'):
         return "U.S. Government"
     
     return "Government"
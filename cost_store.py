@@ -0,0 +1,470 @@
+"""
+citeflex/cost_store.py
+
+Indexed store for the API cost log, with hourly and daily rollups.
+
+cost_tracker appended every paid call to costs.csv, and get_total_cost and
+email_service.generate_cost_summary re-read and parsed the whole file on
+every call (/admin/email-costs included). The file only grows, so after a
+few months the admin report held a worker thread for seconds. Calls now go
+to a SQLite file:
+
+- cost_calls: one row per call, the costs.csv columns (for the CSV export
+  and ad-hoc analysis)
+- cost_rollups: calls, tokens and cost per (hour or day, provider,
+  function), updated in the same transaction as the rows - summaries read
+  buckets, never rows
+- An existing costs.csv is imported once, on first open, and renamed to
+  costs.csv.imported
+- export_csv() writes the rows in the costs.csv layout, for spreadsheet
+  analysis (/admin/costs?format=csv, the command line); the report email
+  attaches export_rollups_csv('day') instead
+- SQLite in WAL mode, so all gunicorn workers on the host share the file
+
+Usage:
+    from cost_store import get_cost_store
+
+    store = get_cost_store()
+    store.record(rows)                          # rows in CSV_HEADERS order
+    summary = store.summary()                   # totals by provider / function
+    daily = store.rollups('day', since='2026-10-01')
+    csv_text = store.export_csv()
+
+Command line:
+    python cost_store.py export costs.csv
+    python cost_store.py export daily.csv --rollups day --since 2026-10-01
+
+Created: 2026-10-16
+"""
+
+import csv
+import io
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cost_tracker import CSV_HEADERS
+
+# Rollup granularity -> length of the ISO timestamp prefix naming its bucket
+# ('2026-10-16T14' for an hour, '2026-10-16' for a day)
+GRANULARITIES = {
+    'hour': 13,
+    'day': 10,
+}
+
+ROLLUP_HEADERS = [
+    'bucket',
+    'provider',
+    'function',
+    'calls',
+    'input_tokens',
+    'output_tokens',
+    'cost_usd',
+]
+
+
+def bucket_of(timestamp: str, granularity: str) -> str:
+    """Bucket of an ISO timestamp (or date), e.g. '2026-10-16' for a day."""
+    return timestamp[:GRANULARITIES[granularity]]
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_row(row: Sequence[Any]) -> Tuple[str, str, int, int, float, str, str]:
+    """A costs.csv row (strings or values) as typed columns."""
+    row = list(row) + [''] * (len(CSV_HEADERS) - len(row))
+    timestamp, provider, input_tokens, output_tokens, cost, query, function = row[:len(CSV_HEADERS)]
+    return (
+        str(timestamp or ''),
+        str(provider or '').lower(),
+        _int(input_tokens),
+        _int(output_tokens),
+        _float(cost),
+        str(query or ''),
+        str(function or ''),
+    )
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class CostStore:
+    """
+    SQLite cost log with per-hour and per-day rollups.
+
+    Falls back to a no-op (record() returns False) if the file can't be
+    opened; cost_tracker then keeps appending to costs.csv.
+    """
+
+    def __init__(self, db_path: str, import_csv: Optional[Path] = None):
+        """
+        Args:
+            db_path: SQLite file ("" disables the store)
+            import_csv: costs.csv to import on first open, if it exists
+        """
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if db_path:
+            self._open_db(db_path, import_csv)
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def record(self, rows: Iterable[Sequence[Any]]) -> bool:
+        """
+        Store cost log rows and add them to the rollups, in one transaction.
+
+        Args:
+            rows: Rows in CSV_HEADERS order (as written by cost_tracker)
+
+        Returns:
+            True if stored, False if the store is disabled or the write failed
+        """
+        if self._db is None:
+            return False
+        try:
+            with self._lock, self._db:
+                self._insert(self._db, [_parse_row(row) for row in rows])
+            return True
+        except sqlite3.Error as e:
+            print(f"[CostStore] Write error: {e}")
+            return False
+
+    def summary(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Totals over the daily rollups.
+
+        Args:
+            since: First day included ('2026-10-01' or a full timestamp)
+            until: Last day included
+
+        Returns:
+            Dict with total_cost, total_calls, input_tokens, output_tokens,
+            by_provider {provider: {cost, calls}}, by_function
+            {function: {cost, calls}}, period_start, period_end
+        """
+        summary: Dict[str, Any] = {
+            'total_cost': 0.0,
+            'total_calls': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'by_provider': {},
+            'by_function': {},
+            'period_start': None,
+            'period_end': None,
+        }
+        where, params = self._bucket_filter('day', since, until)
+        rows = self._query(
+            "SELECT provider, function, SUM(calls), SUM(input_tokens), SUM(output_tokens),"
+            " SUM(cost_usd), MIN(first_at), MAX(last_at)"
+            f" FROM cost_rollups WHERE {where} GROUP BY provider, function",
+            params
+        )
+
+        starts, ends = [], []
+        for provider, function, calls, input_tokens, output_tokens, cost, first_at, last_at in rows:
+            summary['total_cost'] += cost
+            summary['total_calls'] += calls
+            summary['input_tokens'] += input_tokens
+            summary['output_tokens'] += output_tokens
+            for group, key in (('by_provider', provider), ('by_function', function)):
+                totals = summary[group].setdefault(key, {'cost': 0.0, 'calls': 0})
+                totals['cost'] += cost
+                totals['calls'] += calls
+            starts.append(first_at)
+            ends.append(last_at)
+
+        summary['period_start'] = min(starts) if starts else None
+        summary['period_end'] = max(ends) if ends else None
+        return summary
+
+    def rollups(
+        self,
+        granularity: str = 'day',
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        provider: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rollup buckets in time order.
+
+        Args:
+            granularity: 'hour' or 'day'
+            since: First bucket included (ISO date or timestamp)
+            until: Last bucket included
+            provider: Only this provider
+
+        Returns:
+            One dict (ROLLUP_HEADERS keys) per bucket, provider and function
+        """
+        where, params = self._bucket_filter(granularity, since, until)
+        if provider:
+            where += " AND provider = ?"
+            params.append(provider.lower())
+        rows = self._query(
+            "SELECT bucket, provider, function, calls, input_tokens, output_tokens, cost_usd"
+            f" FROM cost_rollups WHERE {where} ORDER BY bucket, provider, function",
+            params
+        )
+        return [dict(zip(ROLLUP_HEADERS, row)) for row in rows]
+
+    def export_csv(self, since: Optional[str] = None, until: Optional[str] = None) -> str:
+        """
+        The logged calls as CSV text, in the costs.csv layout.
+
+        Args:
+            since: Earliest timestamp included (ISO date or timestamp)
+            until: Latest day/timestamp included
+        """
+        clauses, params = [], []
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            # Compared on the prefix, so a bare date includes the whole day
+            clauses.append("substr(timestamp, 1, ?) <= ?")
+            params.extend([len(until), until])
+        where = " AND ".join(clauses) or "1"
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADERS)
+        for timestamp, provider, input_tokens, output_tokens, cost, query, function in self._query(
+            "SELECT timestamp, provider, input_tokens, output_tokens, cost_usd, query, function"
+            f" FROM cost_calls WHERE {where} ORDER BY id",
+            params
+        ):
+            writer.writerow([timestamp, provider, input_tokens, output_tokens, f'{cost:.8f}', query, function])
+        return buffer.getvalue()
+
+    def export_rollups_csv(self, granularity: str = 'day', since: Optional[str] = None, until: Optional[str] = None) -> str:
+        """Rollup buckets as CSV text (ROLLUP_HEADERS columns)."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=ROLLUP_HEADERS)
+        writer.writeheader()
+        for row in self.rollups(granularity, since, until):
+            row['cost_usd'] = f"{row['cost_usd']:.8f}"
+            writer.writerow(row)
+        return buffer.getvalue()
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[Tuple]) -> None:
+        """Insert parsed rows and upsert their rollups (caller commits)."""
+        if not rows:
+            return
+        conn.executemany(
+            "INSERT INTO cost_calls"
+            " (timestamp, provider, input_tokens, output_tokens, cost_usd, query, function)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+        # Pre-aggregate, so a flush touches each bucket once
+        buckets: Dict[Tuple[str, str, str, str], List[Any]] = {}
+        for timestamp, provider, input_tokens, output_tokens, cost, _, function in rows:
+            for granularity in GRANULARITIES:
+                key = (granularity, bucket_of(timestamp, granularity), provider, function)
+                totals = buckets.get(key)
+                if totals is None:
+                    totals = buckets[key] = [0, 0, 0, 0.0, timestamp, timestamp]
+                totals[0] += 1
+                totals[1] += input_tokens
+                totals[2] += output_tokens
+                totals[3] += cost
+                totals[4] = min(totals[4], timestamp)
+                totals[5] = max(totals[5], timestamp)
+
+        conn.executemany(
+            "INSERT INTO cost_rollups"
+            " (granularity, bucket, provider, function, calls, input_tokens, output_tokens, cost_usd, first_at, last_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (granularity, bucket, provider, function) DO UPDATE SET"
+            " calls = calls + excluded.calls,"
+            " input_tokens = input_tokens + excluded.input_tokens,"
+            " output_tokens = output_tokens + excluded.output_tokens,"
+            " cost_usd = cost_usd + excluded.cost_usd,"
+            " first_at = MIN(first_at, excluded.first_at),"
+            " last_at = MAX(last_at, excluded.last_at)",
+            [key + tuple(totals) for key, totals in buckets.items()]
+        )
+
+    @staticmethod
+    def _bucket_filter(granularity: str, since: Optional[str], until: Optional[str]) -> Tuple[str, List[Any]]:
+        where, params = "granularity = ?", [granularity]
+        if since:
+            where += " AND bucket >= ?"
+            params.append(bucket_of(since, granularity))
+        if until:
+            where += " AND bucket <= ?"
+            params.append(bucket_of(until, granularity))
+        return where, params
+
+    def _query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        if self._db is None:
+            return []
+        try:
+            with self._lock:
+                return self._db.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"[CostStore] Read error: {e}")
+            return []
+
+    def _open_db(self, db_path: str, import_csv: Optional[Path]) -> None:
+        """Open (or create) the SQLite file; disabled on failure."""
+        try:
+            conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cost_calls ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " timestamp TEXT NOT NULL,"
+                " provider TEXT NOT NULL,"
+                " input_tokens INTEGER NOT NULL DEFAULT 0,"
+                " output_tokens INTEGER NOT NULL DEFAULT 0,"
+                " cost_usd REAL NOT NULL DEFAULT 0,"
+                " query TEXT NOT NULL DEFAULT '',"
+                " function TEXT NOT NULL DEFAULT '')"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cost_calls_timestamp ON cost_calls (timestamp)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cost_rollups ("
+                " granularity TEXT NOT NULL,"
+                " bucket TEXT NOT NULL,"
+                " provider TEXT NOT NULL,"
+                " function TEXT NOT NULL,"
+                " calls INTEGER NOT NULL,"
+                " input_tokens INTEGER NOT NULL,"
+                " output_tokens INTEGER NOT NULL,"
+                " cost_usd REAL NOT NULL,"
+                " first_at TEXT NOT NULL,"
+                " last_at TEXT NOT NULL,"
+                " PRIMARY KEY (granularity, bucket, provider, function))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS cost_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.commit()
+            if import_csv is not None:
+                try:
+                    self._import_csv(conn, Path(import_csv))
+                except (sqlite3.Error, OSError, csv.Error) as e:
+                    # Retried on the next start; new calls are stored meanwhile
+                    print(f"[CostStore] Could not import {import_csv}: {e}")
+            self._db = conn
+            print(f"[CostStore] Cost log at {db_path}")
+        except (sqlite3.Error, OSError) as e:
+            print(f"[CostStore] Could not open {db_path}, logging to costs.csv: {e}")
+            self._db = None
+
+    @classmethod
+    def _import_csv(cls, conn: sqlite3.Connection, csv_path: Path) -> None:
+        """Import a legacy costs.csv once (the first worker to get here wins)."""
+        if not csv_path.exists():
+            return
+        # Write lock across processes: other workers wait, then see the marker
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM cost_meta WHERE key = 'csv_imported'").fetchone():
+                conn.rollback()
+                return
+            with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)  # header
+                rows = [_parse_row(row) for row in reader if row]
+            cls._insert(conn, rows)
+            conn.execute(
+                "INSERT INTO cost_meta (key, value) VALUES ('csv_imported', ?)",
+                (f"{csv_path} ({len(rows)} rows)",)
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        print(f"[CostStore] Imported {len(rows)} rows from {csv_path}")
+        try:
+            csv_path.rename(csv_path.with_name(csv_path.name + '.imported'))
+        except OSError as e:
+            print(f"[CostStore] Could not rename {csv_path}: {e}")
+
+
+# =============================================================================
+# PROCESS-WIDE INSTANCE
+# =============================================================================
+
+_cost_store: Optional[CostStore] = None
+_cost_store_lock = threading.Lock()
+
+
+def get_cost_store() -> CostStore:
+    """
+    Get the process-wide store, creating it from config on first use.
+
+    Returns:
+        The CostStore singleton (disabled if COST_DB is off or unusable)
+    """
+    global _cost_store
+    if _cost_store is None:
+        with _cost_store_lock:
+            if _cost_store is None:
+                from config import COST_DB
+                from cost_tracker import COST_LOG_PATH
+                _cost_store = CostStore(COST_DB, import_csv=COST_LOG_PATH)
+    return _cost_store
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the API cost log as CSV.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Write the logged calls (or rollups) to a CSV file")
+    export.add_argument('out', help="Output file ('-' for stdout)")
+    export.add_argument('--rollups', choices=sorted(GRANULARITIES), help="Export hourly or daily rollups instead of calls")
+    export.add_argument('--since', help="First day/timestamp included")
+    export.add_argument('--until', help="Last day/timestamp included")
+    args = parser.parse_args(argv)
+
+    store = get_cost_store()
+    if not store.enabled:
+        print("[CostStore] Store unavailable")
+        return 1
+
+    if args.rollups:
+        text = store.export_rollups_csv(args.rollups, args.since, args.until)
+    else:
+        text = store.export_csv(args.since, args.until)
+
+    if args.out == '-':
+        print(text, end='')
+    else:
+        with open(args.out, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        print(f"[CostStore] Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
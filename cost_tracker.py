@@ -3,8 +3,11 @@ citeflex/cost_tracker.py
 
 Lightweight API cost logging for CitateGenie.
 
-Logs every paid API call (Gemini, OpenAI, Claude, SerpAPI) to a CSV file
-for cost analysis. Open in Excel to analyze costs per citation/document.
+Logs every paid API call (Gemini, OpenAI, Claude, SerpAPI) for cost
+analysis. Calls are stored in cost_store (SQLite, with hourly and daily
+rollups); export them as CSV to analyze costs per citation/document in Excel:
+
+    python cost_store.py export costs.csv
 
 Usage:
     from cost_tracker import log_api_call
@@ -15,17 +18,34 @@ Usage:
     # After a SerpAPI call:
     log_api_call('serpapi', query='creativity psychology')
 
-Output: costs.csv in the application root directory
+Output: costs.db in the application root directory (costs.csv if COST_DB=off)
 
 Version History:
+    2026-10-16:      Rows go to the indexed cost_store; get_total_cost reads its
+                     rollups instead of re-parsing costs.csv
+    2026-10-16:      Per-document costs in a CostLedger held in a context variable
+                     (follows the work into lookup threads; concurrent documents
+                     no longer share module globals); rows are buffered and
+                     appended to costs.csv in batches (flush_cost_log)
+    2026-10-16:      log_api_call(cached=True) logs LLM cache hits at zero cost
     2025-12-14 V1.1: Added EMAIL_AFTER_EVERY_CALL for test mode auto-emails
     2025-12-13 V1.0: Initial implementation - CSV logging with cost calculation
 """
 
 import os
+import io
 import csv
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
+
+import metrics
 
 # =============================================================================
 # EMAIL CONFIGURATION
@@ -37,55 +57,99 @@ EMAIL_AFTER_DOCUMENT = os.environ.get('EMAIL_AFTER_DOCUMENT', 'true').lower() ==
 # =============================================================================
 # PER-DOCUMENT COST TRACKING
 # =============================================================================
-# Track costs for the current document being processed
-_current_document_cost = 0.0
-_current_document_calls = 0
-_current_document_name = ""
+# Each document (or batch) gets its own CostLedger, held in a context
+# variable. Work started with negative_cache.submit_in_context or
+# engines.http_client.run_blocking copies the context, so API calls made on
+# note-lookup pools, the AI provider pool or the event loop land in the
+# ledger of the document that caused them - concurrent documents on other
+# gunicorn threads never share totals.
+
+
+class CostLedger:
+    """
+    Costs of one document, added to from any thread in its context.
+
+    Entries are appended to a list (atomic in CPython) and only summed
+    when read, so log_api_call takes no lock.
+    """
+
+    def __init__(self, document_name: str = ""):
+        self.document_name = document_name
+        self._entries: list = []   # (provider, cost_usd)
+        self._token = None
+
+    def add(self, provider: str, cost: float) -> None:
+        self._entries.append((provider, cost))
+
+    @property
+    def cost(self) -> float:
+        return sum(cost for _, cost in list(self._entries))
 
+    @property
+    def calls(self) -> int:
+        return len(self._entries)
 
-def start_document_tracking(document_name: str = ""):
+    def summary(self) -> dict:
+        by_provider: dict = {}
+        for provider, cost in list(self._entries):
+            by_provider[provider] = by_provider.get(provider, 0.0) + cost
+        return {
+            'cost': sum(by_provider.values()),
+            'calls': self.calls,
+            'document': self.document_name,
+            'by_provider': by_provider,
+        }
+
+
+_current_ledger: contextvars.ContextVar = contextvars.ContextVar('cost_ledger', default=None)
+
+
+def start_document_tracking(document_name: str = "") -> CostLedger:
     """
-    Reset cost tracking for a new document.
+    Start a cost ledger for a new document in the current context.
     Call this at the start of document processing.
+    
+    Returns:
+        The CostLedger (pass it to finish_document_tracking)
     """
-    global _current_document_cost, _current_document_calls, _current_document_name
-    _current_document_cost = 0.0
-    _current_document_calls = 0
-    _current_document_name = document_name
+    ledger = CostLedger(document_name)
+    ledger._token = _current_ledger.set(ledger)
     print(f"[CostTracker] Started tracking costs for: {document_name or 'document'}")
+    return ledger
 
 
 def get_document_cost() -> dict:
     """
     Get the cost for the current document.
     """
-    return {
-        'cost': _current_document_cost,
-        'calls': _current_document_calls,
-        'document': _current_document_name,
-    }
+    ledger = _current_ledger.get()
+    if ledger is None:
+        return {'cost': 0.0, 'calls': 0, 'document': ''}
+    summary = ledger.summary()
+    del summary['by_provider']
+    return summary
 
 
-def finish_document_tracking() -> dict:
+def finish_document_tracking(ledger: Optional[CostLedger] = None) -> dict:
     """
     Finish tracking and optionally send email.
     Call this at the end of document processing.
     
+    Args:
+        ledger: The ledger from start_document_tracking (default: the
+                current context's)
+    
     Returns:
         Dict with document cost summary
     """
-    global _current_document_cost, _current_document_calls, _current_document_name
-    
-    summary = {
-        'cost': _current_document_cost,
-        'calls': _current_document_calls,
-        'document': _current_document_name,
-    }
+    if ledger is None:
+        ledger = _current_ledger.get() or CostLedger()
+    summary = ledger.summary()
     
-    print(f"[CostTracker] Document '{_current_document_name}' complete: {_current_document_calls} API calls, ${_current_document_cost:.4f}")
+    print(f"[CostTracker] Document '{ledger.document_name}' complete: {summary['calls']} API calls, ${summary['cost']:.4f}")
     
     # Send email if enabled
-    if EMAIL_AFTER_DOCUMENT and _current_document_calls > 0:
+    if EMAIL_AFTER_DOCUMENT and summary['calls'] > 0:
         try:
             from email_service import send_document_cost_report
             send_document_cost_report(summary)
@@ -93,14 +157,35 @@ def finish_document_tracking() -> dict:
         except Exception as e:
             print(f"[CostTracker] Document cost email failed: {e}")
     
-    # Reset for next document
-    _current_document_cost = 0.0
-    _current_document_calls = 0
-    _current_document_name = ""
+    # Leave the context as it was before start_document_tracking
+    if _current_ledger.get() is ledger:
+        try:
+            _current_ledger.reset(ledger._token)
+        except ValueError:
+            # Finished in a different context than it was started in
+            _current_ledger.set(None)
     
     return summary
 
 
+@contextmanager
+def track_document_costs(document_name: str = ""):
+    """
+    Cost ledger for the block; the context is restored even on errors.
+    
+    Usage:
+        with track_document_costs(filename) as ledger:
+            process_document(...)
+        summary = finish_document_tracking(ledger)
+    """
+    ledger = start_document_tracking(document_name)
+    try:
+        yield ledger
+    finally:
+        if _current_ledger.get() is ledger:
+            _current_ledger.reset(ledger._token)
+
+
 # =============================================================================
 # PRICING (per 1M tokens, updated Dec 2024)
 # =============================================================================
@@ -127,7 +212,8 @@ PRICING = {
 # CSV FILE SETUP
 # =============================================================================
 
-# Store costs.csv in the app root directory
+# Legacy log: imported into cost_store once, and still written if the store
+# is off or can't be opened
 COST_LOG_PATH = Path(__file__).parent / 'costs.csv'
 
 CSV_HEADERS = [
@@ -149,6 +235,83 @@ def _ensure_csv_exists():
         print(f"[CostTracker] Created cost log: {COST_LOG_PATH}")
 
 
+# =============================================================================
+# BUFFERED WRITER
+# =============================================================================
+# log_api_call used to open costs.csv for every row. Rows are now queued and
+# stored in batches (one cost_store transaction, or one append to costs.csv
+# if the store is unavailable): when COST_FLUSH_ROWS are waiting, every
+# COST_FLUSH_INTERVAL seconds (background thread), at exit, and before the
+# log is read (flush_cost_log).
+
+COST_FLUSH_ROWS = 50
+COST_FLUSH_INTERVAL = 5.0     # seconds
+
+
+class _CostLogWriter:
+    """Per-process row buffer for the cost log."""
+
+    def __init__(self):
+        self._rows: deque = deque()
+        self._flush_lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def append(self, row: list) -> None:
+        self._ensure_flusher()
+        self._rows.append(row)
+        if len(self._rows) >= COST_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Store every queued row in one write."""
+        with self._flush_lock:
+            rows = []
+            while self._rows:
+                rows.append(self._rows.popleft())
+            if not rows:
+                return
+            if _get_store().record(rows):
+                return
+            try:
+                _ensure_csv_exists()
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                with open(COST_LOG_PATH, 'a', newline='', encoding='utf-8') as f:
+                    f.write(buffer.getvalue())
+            except Exception as e:
+                print(f"[CostTracker] Warning: Could not write to log: {e}")
+
+    def _ensure_flusher(self) -> None:
+        """Start the periodic flush thread (once per process - gunicorn forks)."""
+        if self._pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._rows = deque()
+            threading.Thread(target=self._flush_forever, name='cost-log-flush', daemon=True).start()
+            atexit.register(self.flush)
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(COST_FLUSH_INTERVAL)
+            self.flush()
+
+
+_writer = _CostLogWriter()
+
+
+def _get_store():
+    from cost_store import get_cost_store
+    return get_cost_store()
+
+
+def flush_cost_log() -> None:
+    """Store queued rows (call before reading the log)."""
+    _writer.flush()
+
+
 # =============================================================================
 # COST CALCULATION
 # =============================================================================
@@ -191,10 +354,11 @@ def log_api_call(
     input_tokens: int = 0,
     output_tokens: int = 0,
     query: str = '',
-    function: str = ''
+    function: str = '',
+    cached: bool = False
 ) -> float:
     """
-    Log an API call to costs.csv and return the calculated cost.
+    Log an API call to the cost log and return the calculated cost.
     
     Args:
         provider: 'gemini', 'openai', 'claude', or 'serpapi'
@@ -202,13 +366,15 @@ def log_api_call(
         output_tokens: Number of output tokens (0 for SerpAPI)
         query: The citation/search query being processed
         function: Which function made the call (e.g., 'classify', 'lookup')
+        cached: Response served from the LLM response cache - the tokens are
+                logged at zero cost, with ':cache_hit' appended to function
         
     Returns:
         Cost in USD for this call
     """
-    _ensure_csv_exists()
-    
-    cost = calculate_cost(provider, input_tokens, output_tokens)
+    cost = 0.0 if cached else calculate_cost(provider, input_tokens, output_tokens)
+    if cached:
+        function = f"{function}:cache_hit"
     
     # Clean query for CSV (remove newlines, limit length)
     clean_query = query.replace('\n', ' ').replace('\r', '')[:200]
@@ -223,25 +389,26 @@ def log_api_call(
         function,
     ]
     
-    try:
-        with open(COST_LOG_PATH, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
-    except Exception as e:
-        print(f"[CostTracker] Warning: Could not write to log: {e}")
+    _writer.append(row)
     
     # Also print for visibility during development
+    if cached:
+        print(f"[CostTracker] {provider}: cache hit ({input_tokens} in + {output_tokens} out) = $0")
+        metrics.count('cost', 'cached_tokens', provider.lower(), input_tokens + output_tokens)
+        return cost
     if provider == 'serpapi':
         print(f"[CostTracker] {provider}: 1 search = ${cost:.4f}")
     else:
         print(f"[CostTracker] {provider}: {input_tokens} in + {output_tokens} out = ${cost:.6f}")
     
-    # ==========================================================================
-    # Accumulate cost for current document
-    # ==========================================================================
-    global _current_document_cost, _current_document_calls
-    _current_document_cost += cost
-    _current_document_calls += 1
+    # Accumulate cost for the document being processed in this context
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.add(provider.lower(), cost)
+    
+    # Per-provider spend for /metrics and the per-document trace
+    metrics.count('cost', 'usd', provider.lower(), cost)
+    metrics.count('cost', 'calls', provider.lower())
     
     return cost
 
@@ -252,11 +419,26 @@ def log_api_call(
 
 def get_total_cost() -> dict:
     """
-    Read costs.csv and return summary statistics.
+    Summary statistics of the cost log (from the daily rollups).
     
     Returns:
         Dict with total_cost, by_provider breakdown, and call_count
     """
+    flush_cost_log()
+    store = _get_store()
+    if store.enabled:
+        summary = store.summary()
+        totals = {'gemini': 0.0, 'openai': 0.0, 'claude': 0.0, 'serpapi': 0.0}
+        for provider, provider_totals in summary['by_provider'].items():
+            if provider in totals:
+                totals[provider] += provider_totals['cost']
+        return {
+            'total_cost': sum(totals.values()),
+            'by_provider': totals,
+            'call_count': summary['total_calls'],
+        }
+    
+    # Store unavailable: scan the CSV fallback log
     if not COST_LOG_PATH.exists():
         return {'total_cost': 0, 'by_provider': {}, 'call_count': 0}
     
@@ -318,4 +500,5 @@ if __name__ == "__main__":
                  query='caplan trains brains', function='lookup_fragment')
     
     print_summary()
-    print(f"\nLog file: {COST_LOG_PATH}")
+    from config import COST_DB
+    print(f"\nLog: {COST_DB if _get_store().enabled else COST_LOG_PATH}")
@@ -3,11 +3,21 @@ citategenie/detectors.py
 
 Citation type detection logic.
 Analyzes text patterns to determine the type of citation.
+
+Version History:
+    2026-10-16: Single-pass detection - every type signal (these patterns and
+                the legal signals of superlegal.is_legal_citation) is compiled
+                into one SignalScanner; scan_signals() finds all features of a
+                note in one pass and is memoized, so is_legal_citation, is_url
+                and detect_type on the same text share one scan
 """
 
 import re
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Sequence, Tuple
 from models import CitationType, DetectionResult
+from domain_index import DomainTable, split_url
 
 
 # URL detection patterns
@@ -53,13 +63,122 @@ NEWSPAPER_DOMAINS = [
     'nytimes.com', 'washingtonpost.com', 'wsj.com', 'theguardian.com',
     'bbc.com', 'reuters.com', 'apnews.com', 'cnn.com', 'latimes.com'
 ]
+_NEWSPAPER_TABLE = DomainTable(NEWSPAPER_DOMAINS)
+
+# Legal citation signals used by superlegal.is_legal_citation (stricter than
+# LEGAL_PATTERNS; any one of them makes the text a legal citation)
+LEGAL_CITATION_PATTERNS = {
+    'neutral_citation': re.compile(r'\[\d{4}\]'),  # UK neutral citation: [2024] UKSC 123
+    'case_versus': re.compile(r'\s(v|vs|versus)\.?\s', re.IGNORECASE),  # X v Y
+    'westlaw': re.compile(r'\d{4}\s+WL\s+\d+'),  # 2024 WL 123456
+    'federal_reporter': re.compile(r'\d+\s+F\.\d+[a-z]*\s+\d+'),  # 123 F.3d 456
+    'us_reports': re.compile(r'\d+\s+U\.S\.\s+\d+'),  # 388 U.S. 1
+    'regional_reporter': re.compile(r'\d+\s+[A-Z]\.\d+[a-z]*\s+\d+'),  # 355 A.2d 647
+}
+URL_IN_TEXT_PATTERN = re.compile(r'https?://[^\s<>"\')\]]+', re.IGNORECASE)
+
+
+# =============================================================================
+# SINGLE-PASS SIGNAL SCANNER
+# =============================================================================
+
+class Signals:
+    """Features found in one text: feature name -> first matching substring."""
+    
+    __slots__ = ('found',)
+    
+    def __init__(self, found: Dict[str, str]):
+        self.found: Mapping[str, str] = MappingProxyType(found)
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.found
+    
+    def any(self, names) -> bool:
+        """True if any of the named features was found."""
+        return any(name in self.found for name in names)
+    
+    def get(self, name: str) -> Optional[str]:
+        return self.found.get(name)
+    
+    def __repr__(self) -> str:
+        return f"Signals({dict(self.found)})"
+
+
+class SignalScanner:
+    """
+    Many named regexes compiled into one scanner.
+    
+    The combined pattern is an alternation of lookaheads, so one finditer
+    pass reports every position where any feature starts. Only at those
+    (few) positions are the individual patterns tried, which also catches
+    features starting at the same position. The result is what running
+    each pattern's search() would find, without a pass per pattern.
+    """
+    
+    def __init__(self, features: Sequence[Tuple[str, 're.Pattern']]):
+        self._features: List[Tuple[str, re.Pattern]] = list(features)
+        alternatives = []
+        for _, pattern in self._features:
+            group = '(?i:' if pattern.flags & re.IGNORECASE else '(?:'
+            alternatives.append(f"(?={group}{pattern.pattern}))")
+        self._combined = re.compile('|'.join(alternatives))
+    
+    def scan(self, text: str) -> Signals:
+        found: Dict[str, str] = {}
+        remaining = self._features
+        for start in self._combined.finditer(text):
+            pos = start.start()
+            pending = []
+            for name, pattern in remaining:
+                match = pattern.match(text, pos)
+                if match:
+                    found[name] = match.group()
+                else:
+                    pending.append((name, pattern))
+            remaining = pending
+            if not remaining:
+                break
+        return Signals(found)
+
+
+def _named(prefix: str, patterns: List['re.Pattern']) -> List[Tuple[str, 're.Pattern']]:
+    return [(f"{prefix}_{i}", pattern) for i, pattern in enumerate(patterns)]
+
+
+LEGAL_FEATURES = tuple(name for name, _ in _named('legal', LEGAL_PATTERNS))
+BOOK_FEATURES = tuple(name for name, _ in _named('book', BOOK_PATTERNS))
+INTERVIEW_FEATURES = tuple(name for name, _ in _named('interview', INTERVIEW_PATTERNS))
+LEGAL_CITATION_FEATURES = tuple(LEGAL_CITATION_PATTERNS)
+
+_SCANNER = SignalScanner(
+    [('doi', DOI_PATTERN), ('url', URL_PATTERN), ('url_in_text', URL_IN_TEXT_PATTERN)]
+    + _named('legal', LEGAL_PATTERNS)
+    + _named('book', BOOK_PATTERNS)
+    + _named('interview', INTERVIEW_PATTERNS)
+    + list(LEGAL_CITATION_PATTERNS.items())
+)
+
+
+@lru_cache(maxsize=2048)
+def scan_signals(text: str) -> Signals:
+    """
+    Every detection feature of a (stripped) text, in one pass.
+    
+    Memoized: route_citation checks the same query with is_legal_citation,
+    is_url and detect_type, and get_multiple_citations re-checks candidates.
+    
+    Returns:
+        Signals - e.g. 'doi', 'url', 'url_in_text', 'legal_<n>', 'book_<n>',
+        'interview_<n>', and the LEGAL_CITATION_PATTERNS names
+    """
+    return _SCANNER.scan(text)
 
 
 def is_url(text: str) -> bool:
     """Check if text is or contains a URL."""
     if not text:
         return False
-    return bool(URL_PATTERN.search(text.strip()))
+    return 'url' in scan_signals(text.strip())
 
 
 def detect_type(query: str) -> DetectionResult:
@@ -78,36 +197,31 @@ def detect_type(query: str) -> DetectionResult:
     query = query.strip()
     cleaned = query
     hints = {}
+    signals = scan_signals(query)
     
     # Check for DOI
-    doi_match = DOI_PATTERN.search(query)
-    if doi_match:
-        hints['doi'] = doi_match.group()
+    if 'doi' in signals:
+        hints['doi'] = signals.get('doi')
         return DetectionResult(CitationType.JOURNAL, 0.95, cleaned, hints)
     
     # Check for URL
-    if is_url(query):
+    if 'url' in signals:
         # Check for newspaper domains
-        lower_query = query.lower()
-        for domain in NEWSPAPER_DOMAINS:
-            if domain in lower_query:
-                return DetectionResult(CitationType.NEWSPAPER, 0.9, cleaned, {'url': query})
+        if _NEWSPAPER_TABLE.lookup(*split_url(signals.get('url'))):
+            return DetectionResult(CitationType.NEWSPAPER, 0.9, cleaned, {'url': query})
         return DetectionResult(CitationType.URL, 0.9, cleaned, {'url': query})
     
     # Check for legal citations
-    for pattern in LEGAL_PATTERNS:
-        if pattern.search(query):
-            return DetectionResult(CitationType.LEGAL, 0.85, cleaned, hints)
+    if signals.any(LEGAL_FEATURES):
+        return DetectionResult(CitationType.LEGAL, 0.85, cleaned, hints)
     
     # Check for interview
-    for pattern in INTERVIEW_PATTERNS:
-        if pattern.search(query):
-            return DetectionResult(CitationType.INTERVIEW, 0.9, cleaned, hints)
+    if signals.any(INTERVIEW_FEATURES):
+        return DetectionResult(CitationType.INTERVIEW, 0.9, cleaned, hints)
     
     # Check for book indicators
-    for pattern in BOOK_PATTERNS:
-        if pattern.search(query):
-            return DetectionResult(CitationType.BOOK, 0.8, cleaned, hints)
+    if signals.any(BOOK_FEATURES):
+        return DetectionResult(CitationType.BOOK, 0.8, cleaned, hints)
     
     # Default to unknown - let AI classify
     return DetectionResult(CitationType.UNKNOWN, 0.5, cleaned, hints)
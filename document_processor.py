@@ -15,26 +15,40 @@ Version History:
     2025-12-05 12:53: Enhanced IBID_PATTERN to recognize "Id." (Bluebook) and "pp." prefixes
                       Switched from router to unified_router import
     2025-12-05 13:15: Verified ibid detection passes 13/13 tests including Id. at X patterns
+    2026-10-16: process_document resolves notes in two phases - distinct note texts
+                are looked up concurrently (bounded pool, per-note timeout, document
+                deadline), then ibid/short form logic runs sequentially in order
+    2026-10-16: Optional progress callback (used by background jobs, see jobs.py)
+    2026-10-16: Incremental re-processing - notes unchanged since the last run are
+                matched to their source through the note state embedded in the
+                metadata cache; only new/edited notes are looked up, and only
+                notes whose text changes are rewritten
+    2026-10-16: process_document split into prepare_document / write_document so
+                batch_processor can resolve the notes of many documents together
 """
 
-import os
 import re
 import html
-import zipfile
-import tempfile
-import shutil
 import xml.etree.ElementTree as ET
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Callable
 from dataclasses import dataclass, field
 from io import BytesIO
 
 from models import normalize_doi
+from processors.docx_package import (
+    DocxPackage,
+    DOCUMENT_PART,
+    FOOTNOTES_PART,
+    ENDNOTES_PART,
+)
 
 # Embedded metadata cache (added 2025-12-14)
 from processors.document_metadata import (
     CitationMetadataCache,
+    hash_citation_text,
     load_cache_from_docx,
     save_cache_to_docx,
+    save_cache_to_package,
 )
 
 
@@ -365,21 +379,64 @@ class WordDocumentProcessor:
     
     def __init__(self, file_path_or_buffer):
         """
-        Initialize with a file path or file-like object (BytesIO).
+        Initialize with a file path, file-like object (BytesIO), raw bytes,
+        or a DocxPackage shared with other pipeline stages.
+        
+        The archive is held in memory - nothing is extracted to disk.
         """
-        self.temp_dir = tempfile.mkdtemp()
         self.original_path = None
         
-        # Handle both file paths and file-like objects
-        if hasattr(file_path_or_buffer, 'read'):
+        if isinstance(file_path_or_buffer, DocxPackage):
+            # Shared package (e.g., also used by the metadata cache)
+            self.package = file_path_or_buffer
+        elif isinstance(file_path_or_buffer, (bytes, bytearray)):
+            self.package = DocxPackage(file_path_or_buffer)
+        elif hasattr(file_path_or_buffer, 'read'):
             # It's a file-like object (e.g., from upload)
-            with zipfile.ZipFile(file_path_or_buffer, 'r') as z:
-                z.extractall(self.temp_dir)
+            self.package = DocxPackage(file_path_or_buffer.read())
         else:
             # It's a file path
             self.original_path = file_path_or_buffer
-            with zipfile.ZipFile(file_path_or_buffer, 'r') as z:
-                z.extractall(self.temp_dir)
+            with open(file_path_or_buffer, 'rb') as f:
+                self.package = DocxPackage(f.read())
+        
+        # Batched note writes: note elements indexed by w:id, built once
+        # per notes part from the package's cached tree. write_endnote /
+        # write_footnote mutate these elements in place; the part is
+        # serialized once, when the package is saved.
+        self._note_index: Dict[str, Dict[str, ET.Element]] = {}
+        self._note_index_roots: Dict[str, ET.Element] = {}
+    
+    def _find_note(self, part_name: str, note_tag: str, note_id: str) -> Optional[ET.Element]:
+        """
+        Look up a w:endnote / w:footnote element by its w:id.
+        
+        The notes part is parsed once (via the shared package) and indexed
+        on first use, so each lookup is O(1) instead of a reparse and scan.
+        The index is rebuilt if the part was replaced underneath us
+        (e.g., by a text-based edit such as LinkActivator).
+        
+        Args:
+            part_name: ENDNOTES_PART or FOOTNOTES_PART
+            note_tag: 'endnote' or 'footnote'
+            note_id: The note ID to find
+            
+        Returns:
+            The note element, or None if not found
+        """
+        root = self.package.get_tree(part_name)
+        if root is None:
+            return None
+        
+        if self._note_index_roots.get(part_name) is not root:
+            id_attr = f"{{{self.NS['w']}}}id"
+            self._note_index[part_name] = {
+                note.get(id_attr): note
+                for note in root.iter(f"{{{self.NS['w']}}}{note_tag}")
+            }
+            self._note_index_roots[part_name] = root
+        
+        return self._note_index[part_name].get(str(note_id))
     
     def get_endnotes(self) -> List[Dict[str, str]]:
         """
@@ -388,13 +445,11 @@ class WordDocumentProcessor:
         Returns:
             List of dicts: [{'id': '1', 'text': 'citation text'}, ...]
         """
-        endnotes_path = os.path.join(self.temp_dir, 'word', 'endnotes.xml')
-        if not os.path.exists(endnotes_path):
+        if not self.package.has_part(ENDNOTES_PART):
             return []
         
         try:
-            tree = ET.parse(endnotes_path)
-            root = tree.getroot()
+            root = self.package.get_tree(ENDNOTES_PART)
             notes = []
             
             for endnote in root.findall('.//w:endnote', self.NS):
@@ -430,13 +485,11 @@ class WordDocumentProcessor:
         Returns:
             List of dicts: [{'id': '1', 'text': 'citation text'}, ...]
         """
-        footnotes_path = os.path.join(self.temp_dir, 'word', 'footnotes.xml')
-        if not os.path.exists(footnotes_path):
+        if not self.package.has_part(FOOTNOTES_PART):
             return []
         
         try:
-            tree = ET.parse(footnotes_path)
-            root = tree.getroot()
+            root = self.package.get_tree(FOOTNOTES_PART)
             notes = []
             
             for footnote in root.findall('.//w:footnote', self.NS):
@@ -477,13 +530,11 @@ class WordDocumentProcessor:
         Returns:
             Plain text string from the document body
         """
-        document_path = os.path.join(self.temp_dir, 'word', 'document.xml')
-        if not os.path.exists(document_path):
+        if not self.package.has_part(DOCUMENT_PART):
             return ""
         
         try:
-            tree = ET.parse(document_path)
-            root = tree.getroot()
+            root = self.package.get_tree(DOCUMENT_PART)
             
             # Extract all text elements
             text_elements = root.findall('.//{%s}t' % self.NS['w'])
@@ -517,13 +568,11 @@ class WordDocumentProcessor:
         Returns:
             List of dicts with unique author-year combinations for reference generation
         """
-        document_path = os.path.join(self.temp_dir, 'word', 'document.xml')
-        if not os.path.exists(document_path):
+        if not self.package.has_part(DOCUMENT_PART):
             return []
         
         try:
-            tree = ET.parse(document_path)
-            root = tree.getroot()
+            root = self.package.get_tree(DOCUMENT_PART)
             
             # Extract full document text
             text_elements = root.findall('.//{%s}t' % self.NS['w'])
@@ -673,13 +722,11 @@ class WordDocumentProcessor:
         Returns:
             bool: True if successful
         """
-        document_path = os.path.join(self.temp_dir, 'word', 'document.xml')
-        if not os.path.exists(document_path):
+        if not self.package.has_part(DOCUMENT_PART):
             return False
         
         try:
-            with open(document_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = self.package.get_text(DOCUMENT_PART)
             
             # Escape for regex
             escaped_old = re.escape(old_text)
@@ -688,8 +735,7 @@ class WordDocumentProcessor:
             new_content, count = re.subn(escaped_old, new_text, content, count=1)
             
             if count > 0:
-                with open(document_path, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
+                self.package.set_text(DOCUMENT_PART, new_content)
                 return True
             
             return False
@@ -711,24 +757,12 @@ class WordDocumentProcessor:
         Returns:
             bool: True if successful
         """
-        endnotes_path = os.path.join(self.temp_dir, 'word', 'endnotes.xml')
-        if not os.path.exists(endnotes_path):
+        if not self.package.has_part(ENDNOTES_PART):
             return False
         
         try:
-            # Register namespace to preserve it
-            ET.register_namespace('w', self.NS['w'])
-            ET.register_namespace('xml', self.NS['xml'])
-            
-            tree = ET.parse(endnotes_path)
-            root = tree.getroot()
-            
-            # Find the target endnote
-            target = None
-            for endnote in root.findall('.//w:endnote', self.NS):
-                if endnote.get(f"{{{self.NS['w']}}}id") == str(note_id):
-                    target = endnote
-                    break
+            # Find the target endnote (indexed, no reparse)
+            target = self._find_note(ENDNOTES_PART, 'endnote', note_id)
             
             if target is None:
                 return False
@@ -797,7 +831,8 @@ class WordDocumentProcessor:
                 t.text = text_content
                 t.set(f"{{{self.NS['xml']}}}space", "preserve")
             
-            tree.write(endnotes_path, encoding='UTF-8', xml_declaration=True)
+            # Queued in memory; serialized once by save_to_buffer()
+            self.package.mark_modified(ENDNOTES_PART)
             return True
             
         except Exception as e:
@@ -810,22 +845,11 @@ class WordDocumentProcessor:
         Handles <i> tags for italics using regex (no BeautifulSoup needed).
         PRESERVES the footnoteRef element for proper numbering and linking.
         """
-        footnotes_path = os.path.join(self.temp_dir, 'word', 'footnotes.xml')
-        if not os.path.exists(footnotes_path):
+        if not self.package.has_part(FOOTNOTES_PART):
             return False
         
         try:
-            ET.register_namespace('w', self.NS['w'])
-            ET.register_namespace('xml', self.NS['xml'])
-            
-            tree = ET.parse(footnotes_path)
-            root = tree.getroot()
-            
-            target = None
-            for footnote in root.findall('.//w:footnote', self.NS):
-                if footnote.get(f"{{{self.NS['w']}}}id") == str(note_id):
-                    target = footnote
-                    break
+            target = self._find_note(FOOTNOTES_PART, 'footnote', note_id)
             
             if target is None:
                 return False
@@ -893,7 +917,8 @@ class WordDocumentProcessor:
                 t.text = text_content
                 t.set(f"{{{self.NS['xml']}}}space", "preserve")
             
-            tree.write(footnotes_path, encoding='UTF-8', xml_declaration=True)
+            # Queued in memory; serialized once by save_to_buffer()
+            self.package.mark_modified(FOOTNOTES_PART)
             return True
             
         except Exception as e:
@@ -904,18 +929,13 @@ class WordDocumentProcessor:
         """
         Save the modified document to a BytesIO buffer.
         
+        All queued note writes are flushed here - each notes part is
+        serialized exactly once, however many notes were replaced.
+        
         Returns:
             BytesIO buffer containing the .docx file
         """
-        buffer = BytesIO()
-        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(self.temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, self.temp_dir)
-                    zipf.write(file_path, arcname)
-        buffer.seek(0)
-        return buffer
+        return self.package.to_buffer()
     
     def save_as(self, output_path: str) -> None:
         """
@@ -924,24 +944,17 @@ class WordDocumentProcessor:
         Args:
             output_path: Path for the output .docx file
         """
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(self.temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, self.temp_dir)
-                    zipf.write(file_path, arcname)
+        with open(output_path, 'wb') as f:
+            f.write(self.package.to_bytes())
     
     def cleanup(self) -> None:
-        """Remove temporary files."""
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-    
-    def __del__(self):
-        """Cleanup on deletion."""
-        try:
-            self.cleanup()
-        except:
-            pass
+        """
+        Release resources.
+        
+        The document lives in memory, so there are no temporary files to
+        remove. Kept so existing callers don't need to change.
+        """
+        pass
 
 
 class LinkActivator:
@@ -970,53 +983,49 @@ class LinkActivator:
         Returns:
             BytesIO containing the processed .docx file with clickable URLs
         """
-        temp_dir = tempfile.mkdtemp()
-        
         try:
-            # Extract docx to temp directory
             docx_buffer.seek(0)
-            with zipfile.ZipFile(docx_buffer, 'r') as zf:
-                zf.extractall(temp_dir)
-            
-            # Process each relevant XML file
-            target_files = [
-                'word/document.xml',
-                'word/endnotes.xml',
-                'word/footnotes.xml'
-            ]
-            
-            for xml_file in target_files:
-                full_path = os.path.join(temp_dir, xml_file)
-                if os.path.exists(full_path):
-                    cls._process_xml_file(full_path)
-            
-            # Repackage as docx
-            output_buffer = BytesIO()
-            with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for root, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        zf.write(file_path, arcname)
-            
-            output_buffer.seek(0)
-            return output_buffer
+            package = DocxPackage(docx_buffer.read())
+            
+            cls.process_package(package)
+            
+            return package.to_buffer()
             
         except Exception as e:
             print(f"[LinkActivator] Error: {e}")
             docx_buffer.seek(0)
             return docx_buffer
-            
-        finally:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
     
     @classmethod
-    def _process_xml_file(cls, file_path: str):
-        """Process a single XML file to convert URLs to hyperlinks."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def process_package(cls, package: DocxPackage) -> None:
+        """
+        Make all URLs clickable in a shared DocxPackage (modified in place).
+        
+        Args:
+            package: The in-memory document package
+        """
+        # Process each relevant XML part
+        target_files = [
+            DOCUMENT_PART,
+            ENDNOTES_PART,
+            FOOTNOTES_PART,
+        ]
         
+        for xml_file in target_files:
+            try:
+                content = package.get_text(xml_file)
+                if content is None:
+                    continue
+                
+                new_content = cls._process_xml_content(content)
+                if new_content != content:
+                    package.set_text(xml_file, new_content)
+            except Exception as e:
+                print(f"[LinkActivator] Error processing {xml_file}: {e}")
+    
+    @classmethod
+    def _process_xml_content(cls, content: str) -> str:
+        """Convert URLs to hyperlinks in the XML text of a single part."""
         # Pattern to find URLs within w:t elements
         pattern = r'(<w:t[^>]*>)([^<]*?)(https?://[^\s<>"]+)([^<]*?)(</w:t>)'
         
@@ -1069,11 +1078,7 @@ class LinkActivator:
             return result
         
         # Apply the replacement
-        new_content = re.sub(pattern, replace_url, content)
-        
-        # Write back
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+        return re.sub(pattern, replace_url, content)
     
     @classmethod
     def _build_hyperlink_field(cls, safe_url: str, display_text: str) -> str:
@@ -1107,10 +1112,297 @@ class LinkActivator:
         return field_xml
 
 
+# =============================================================================
+# DOCUMENT PROCESSING
+# Two-phase: concurrent lookups, then sequential ibid/short form decisions
+# =============================================================================
+
+def _note_lookup_key(text: str) -> str:
+    """
+    Key used to deduplicate note lookups within one document.
+    
+    Notes whose text differs only in whitespace resolve to the same source,
+    so they share a single lookup.
+    """
+    return ' '.join(text.split())
+
+
+def _written_text(formatted: str) -> str:
+    """
+    Plain text of a note after write_endnote/write_footnote(formatted) -
+    what get_endnotes/get_footnotes will read back.
+    """
+    return re.sub(r'<i>(.*?)</i>', r'\1', html.unescape(formatted)).strip()
+
+
+def _match_previous_notes(
+    all_notes: List[Tuple[Dict[str, str], str]],
+    metadata_cache: CitationMetadataCache
+) -> Dict[int, Tuple[str, Any]]:
+    """
+    Incremental mode: find notes whose text is still what the last run wrote.
+    
+    A note matches its recorded state at the same position (type + w:id)
+    with the same text hash; failing that, any recorded note with the same
+    text hash, as long as that text maps to a single source (so a moved
+    "Ibid." is not guessed).
+    
+    Args:
+        all_notes: (note, note_type) pairs in document order
+        metadata_cache: Cache loaded from the document
+        
+    Returns:
+        Dict mapping note index to (source cache key, metadata)
+    """
+    previous = metadata_cache.previous_notes()
+    if not previous:
+        return {}
+    
+    by_position = {(n['type'], n['id']): n for n in previous}
+    sources_by_text: Dict[str, set] = {}
+    for n in previous:
+        sources_by_text.setdefault(n['text_hash'], set()).add(n['source'])
+    
+    metadata_by_source: Dict[str, Any] = {}
+    known: Dict[int, Tuple[str, Any]] = {}
+    
+    for idx, (note, note_type) in enumerate(all_notes):
+        text_hash = hash_citation_text(note['text'])
+        recorded = by_position.get((note_type, note['id']))
+        if recorded and recorded['text_hash'] == text_hash:
+            source = recorded['source']
+        else:
+            sources = sources_by_text.get(text_hash, ())
+            if len(sources) != 1:
+                continue
+            source = next(iter(sources))
+        
+        if source not in metadata_by_source:
+            metadata_by_source[source] = metadata_cache.get_by_hash(source)
+        if metadata_by_source[source] is not None:
+            known[idx] = (source, metadata_by_source[source])
+    
+    print(f"[process_document] Incremental: {len(known)}/{len(all_notes)} notes unchanged since last run")
+    return known
+
+
+def _document_gist(processor: 'WordDocumentProcessor') -> str:
+    """
+    Short description of the document's field/topic, used as lookup context.
+    
+    Returns:
+        The gist, or "" if unavailable
+    """
+    try:
+        body_text = processor.get_body_text(max_chars=1500)
+        if body_text:
+            import openai
+            from config import OPENAI_API_KEY
+            
+            if OPENAI_API_KEY:
+                client = openai.OpenAI(api_key=OPENAI_API_KEY)
+                gist_response = client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{
+                        "role": "user",
+                        "content": f"In 10-15 words, describe the academic field and topic of this text. Just give the description, no preamble:\n\n{body_text[:1000]}"
+                    }],
+                    max_tokens=50,
+                    temperature=0.3
+                )
+                document_context = gist_response.choices[0].message.content.strip()
+                print(f"[process_document] Document gist: {document_context}")
+                return document_context
+    except Exception as e:
+        print(f"[process_document] Could not generate document gist: {e}")
+    return ""
+
+
+def _resolve_note_texts(
+    texts: List[str],
+    lookup,
+    workers: int,
+    note_timeout: float,
+    deadline: float,
+    progress: Optional[Callable] = None
+) -> Dict[str, Tuple[Any, Any]]:
+    """
+    Phase 1 of process_document: look up distinct note texts concurrently.
+    
+    Lookups run on a bounded thread pool. A lookup that runs longer than
+    note_timeout, or is still pending when the whole-document deadline
+    passes, is abandoned and resolves to (None, None) - the note is then
+    left as written, exactly as a per-note timeout did before.
+    
+    Args:
+        texts: Distinct note texts to look up (see _note_lookup_key), or
+            other hashable lookup keys (batch_processor passes
+            (document, text) pairs)
+        lookup: Callable(text) -> (metadata, formatted)
+        workers: Maximum concurrent lookups
+        note_timeout: Seconds a single lookup may run once started
+        deadline: Seconds allowed for all lookups together
+        progress: Optional callback(stage, done, total) after each lookup
+        
+    Returns:
+        Dict mapping each text to its (metadata, formatted) result
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    from negative_cache import submit_in_context
+    
+    results: Dict[str, Tuple[Any, Any]] = {text: (None, None) for text in texts}
+    if not texts:
+        return results
+    
+    print(f"[process_document] Phase 1: Looking up {len(texts)} distinct notes ({workers} workers)...")
+    
+    started_at: Dict[str, float] = {}
+    
+    def run(text: str):
+        started_at[text] = time.monotonic()
+        return lookup(text)
+    
+    phase_start = time.monotonic()
+    doc_deadline = phase_start + deadline
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    
+    try:
+        # Carry the caller's context (negative-cache tracker, document trace) into workers
+        pending = {submit_in_context(executor, run, text): text for text in texts}
+        
+        while pending:
+            now = time.monotonic()
+            if now >= doc_deadline:
+                print(f"[process_document] Document deadline ({deadline}s) reached, {len(pending)} lookups abandoned")
+                break
+            
+            # Abandon lookups that have exceeded their own timeout
+            for future, text in list(pending.items()):
+                began = started_at.get(text)
+                if began is not None and not future.done() and now - began >= note_timeout:
+                    print(f"[process_document] Timeout after {note_timeout}s for: {text!s:.50}...")
+                    del pending[future]
+            
+            if not pending:
+                break
+            
+            # Wake up when something finishes or the next timeout is due
+            next_timeout = min(
+                (started_at[t] + note_timeout for t in pending.values() if t in started_at),
+                default=now + note_timeout
+            )
+            wait_for = max(0.05, min(next_timeout, doc_deadline) - now)
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                text = pending.pop(future)
+                try:
+                    results[text] = future.result()
+                except Exception as e:
+                    print(f"[process_document] Error in get_citation: {e}")
+                if progress:
+                    progress('lookup', len(texts) - len(pending), len(texts))
+    finally:
+        # Don't block the request on abandoned lookups
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    found = sum(1 for metadata, _ in results.values() if metadata)
+    print(f"[process_document] Phase 1 complete: {found}/{len(texts)} resolved in {time.monotonic() - phase_start:.1f}s")
+    return results
+
+
+@dataclass
+class PreparedDocument:
+    """
+    A document opened for processing, before any note is looked up.
+    
+    Built by prepare_document; lookup_texts are the distinct note texts
+    write_document needs resolved results for.
+    """
+    package: DocxPackage
+    processor: 'WordDocumentProcessor'
+    metadata_cache: CitationMetadataCache
+    endnotes: List[Dict[str, str]]
+    footnotes: List[Dict[str, str]]
+    all_notes: List[Tuple[Dict[str, str], str]]
+    known: Dict[int, Tuple[str, Any]]
+    lookup_texts: List[str]
+    cache_size_before: int = 0
+
+
+def prepare_document(file_bytes: bytes, incremental: Optional[bool] = None) -> PreparedDocument:
+    """
+    Open a document and work out which notes need a lookup.
+    
+    Args:
+        file_bytes: The document as bytes
+        incremental: Reuse the note state embedded by the last run
+                     (default: config.INCREMENTAL_REPROCESSING)
+        
+    Returns:
+        PreparedDocument (notes in document order, embedded cache, lookup texts)
+    """
+    from config import INCREMENTAL_REPROCESSING
+    
+    if incremental is None:
+        incremental = INCREMENTAL_REPROCESSING
+    
+    # Load embedded metadata cache from document (V4.1)
+    # This allows subsequent processing runs to skip API calls for known citations
+    # The upload is opened once and shared by every stage below
+    package = DocxPackage(file_bytes)
+    
+    metadata_cache = load_cache_from_docx(package)
+    cache_size_before = metadata_cache.size()
+    print(f"[process_document] Loaded metadata cache with {cache_size_before} existing citations")
+    
+    # Load document
+    processor = WordDocumentProcessor(package)
+    
+    # Get all endnotes and footnotes
+    endnotes = processor.get_endnotes()
+    footnotes = processor.get_footnotes()
+    
+    # Combine all notes with their types, maintaining document order
+    all_notes = [(note, 'endnote') for note in endnotes]
+    all_notes += [(note, 'footnote') for note in footnotes]
+    
+    # Incremental mode: notes still reading as the last run wrote them keep
+    # their source - no lookup, and no rewrite unless their form changes
+    known = _match_previous_notes(all_notes, metadata_cache) if incremental else {}
+    
+    lookup_texts = []
+    seen = set()  # lookup_texts as a set: long documents stay linear
+    for idx, (note, _) in enumerate(all_notes):
+        if idx in known:
+            continue  # Unchanged since last run
+        if is_ibid(note['text']):
+            continue  # Explicit ibid - resolved from history, no lookup
+        key = _note_lookup_key(note['text'])
+        if key not in seen:
+            seen.add(key)
+            lookup_texts.append(key)
+    
+    return PreparedDocument(
+        package=package,
+        processor=processor,
+        metadata_cache=metadata_cache,
+        endnotes=endnotes,
+        footnotes=footnotes,
+        all_notes=all_notes,
+        known=known,
+        lookup_texts=lookup_texts,
+        cache_size_before=cache_size_before,
+    )
+
+
 def process_document(
     file_bytes: bytes,
     style: str = "Chicago Manual of Style",
-    add_links: bool = True
+    add_links: bool = True,
+    progress: Optional[Callable] = None,
+    incremental: Optional[bool] = None
 ) -> tuple:
     """
     Process all citations in a Word document.
@@ -1124,11 +1416,17 @@ def process_document(
     - Explicit ibid references (user typed "ibid" or "ibid., 45")
     - Repetitive URLs (same URL as previous note → ibid)
     - Embedded metadata cache for repeated processing (V4.1)
+    - Incremental re-processing: notes unchanged since the last run are not
+      looked up again, and are only rewritten if their form changes
     
     Args:
         file_bytes: The document as bytes
         style: Citation style to use
         add_links: Whether to make URLs clickable
+        progress: Optional callback(stage, done, total, **detail) - stage is
+                  'lookup' (distinct notes looked up) or 'notes' (notes written)
+        incremental: Reuse the note state embedded by the last run
+                     (default: config.INCREMENTAL_REPROCESSING)
         
     Returns:
         Tuple of (processed_document_bytes, results_list, metadata_cache)
@@ -1136,81 +1434,99 @@ def process_document(
     """
     # Import here to avoid circular imports
     from unified_router import get_citation
+    from config import NOTE_TIMEOUT, NOTE_LOOKUP_WORKERS, DOCUMENT_DEADLINE
+    
+    # =========================================================================
+    # TWO-PHASE PROCESSING
+    # Phase 1: Concurrent lookups - one per DISTINCT note text, bounded pool,
+    #          per-note timeout and a whole-document deadline
+    # Phase 2: Sequential ibid/short form logic in document order, so
+    #          CitationHistory decisions are identical to a serial run
+    # =========================================================================
+    
+    document = prepare_document(file_bytes, incremental)
+    metadata_cache = document.metadata_cache
+    
+    # Extract document body text for context-aware lookups (only if any are needed)
+    document_context = _document_gist(document.processor) if document.lookup_texts else ""
+    
+    resolved = _resolve_note_texts(
+        document.lookup_texts,
+        lambda text: get_citation(text, style, document_context, metadata_cache),
+        workers=NOTE_LOOKUP_WORKERS,
+        note_timeout=NOTE_TIMEOUT,
+        deadline=DOCUMENT_DEADLINE,
+        progress=progress,
+    )
+    
+    return write_document(document, resolved, style, add_links, progress)
+
+
+def write_document(
+    document: PreparedDocument,
+    resolved: Dict[str, Tuple[Any, Any]],
+    style: str = "Chicago Manual of Style",
+    add_links: bool = True,
+    progress: Optional[Callable] = None
+) -> tuple:
+    """
+    Phase 2 of process_document: decide each note's form and write it.
+    
+    Runs sequentially in document order. resolved must hold a
+    (metadata, formatted) result for each of document.lookup_texts - from
+    this document's own lookups, or shared across a batch (batch_processor).
+    
+    Args:
+        document: As returned by prepare_document
+        resolved: Dict mapping lookup text to (metadata, formatted)
+        style: Citation style to use
+        add_links: Whether to make URLs clickable
+        progress: Optional callback(stage, done, total, **detail), stage 'notes'
+        
+    Returns:
+        Tuple of (processed_document_bytes, results_list, metadata_cache)
+    """
     from formatters.base import BaseFormatter, get_formatter
-    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
     
-    # Per-note timeout to prevent indefinite hanging
-    NOTE_TIMEOUT = 8  # seconds per note
+    package = document.package
+    processor = document.processor
+    metadata_cache = document.metadata_cache
+    endnotes = document.endnotes
+    footnotes = document.footnotes
+    all_notes = document.all_notes
+    known = document.known
     
     results = []
     
-    # Load embedded metadata cache from document (V4.1)
-    # This allows subsequent processing runs to skip API calls for known citations
-    metadata_cache = load_cache_from_docx(file_bytes)
-    cache_hits_before = metadata_cache.size()
-    print(f"[process_document] Loaded metadata cache with {cache_hits_before} existing citations")
-    
     # Initialize citation history for ibid and short form tracking
     history = CitationHistory()
     
     # Get the formatter for short form citations
     formatter = get_formatter(style)
     
-    # Load document
-    processor = WordDocumentProcessor(BytesIO(file_bytes))
-    
-    # Get all endnotes and footnotes
-    endnotes = processor.get_endnotes()
-    footnotes = processor.get_footnotes()
-    
-    # Extract document body text for context-aware lookups
-    document_context = ""
-    try:
-        body_text = processor.get_body_text(max_chars=1500)
-        if body_text:
-            import openai
-            from config import OPENAI_API_KEY
-            
-            if OPENAI_API_KEY:
-                client = openai.OpenAI(api_key=OPENAI_API_KEY)
-                gist_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{
-                        "role": "user",
-                        "content": f"In 10-15 words, describe the academic field and topic of this text. Just give the description, no preamble:\n\n{body_text[:1000]}"
-                    }],
-                    max_tokens=50,
-                    temperature=0.3
-                )
-                document_context = gist_response.choices[0].message.content.strip()
-                print(f"[process_document] Document gist: {document_context}")
-    except Exception as e:
-        print(f"[process_document] Could not generate document gist: {e}")
-    
-    # Helper to call get_citation with timeout
-    def get_citation_with_timeout(text: str, style: str, context: str = "", timeout: int = NOTE_TIMEOUT):
-        """Call get_citation with a timeout wrapper. Uses metadata_cache from outer scope."""
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(get_citation, text, style, context, metadata_cache)
-            try:
-                return future.result(timeout=timeout)
-            except FuturesTimeout:
-                print(f"[process_document] Timeout after {timeout}s for: {text[:50]}...")
-                return None, None
-            except Exception as e:
-                print(f"[process_document] Error in get_citation: {e}")
-                return None, None
+    def write_note(note: Dict[str, str], note_type: str, formatted: str, unchanged: bool) -> None:
+        """Write a note, unless it is unchanged and already reads that way."""
+        if unchanged and _written_text(formatted) == note['text']:
+            return
+        if note_type == 'endnote':
+            processor.write_endnote(note['id'], formatted)
+        else:
+            processor.write_footnote(note['id'], formatted)
     
-    def process_single_note(note: Dict[str, str], note_type: str) -> ProcessedCitation:
+    def process_single_note(note: Dict[str, str], note_type: str, known_note=None) -> ProcessedCitation:
         """
-        Process a single endnote or footnote.
+        Process a single endnote or footnote (Phase 2 - must run in order).
+        
+        known_note is (source key, metadata) for a note unchanged since the
+        last run (incremental mode).
         """
         note_id = note['id']
         original_text = note['text']
+        unchanged = known_note is not None
         
         try:
             # Case 1: Explicit ibid reference
-            if is_ibid(original_text):
+            if not unchanged and is_ibid(original_text):
                 previous_metadata = history.get_previous_metadata()
                 
                 if previous_metadata is None:
@@ -1242,8 +1558,13 @@ def process_document(
                     citation_form="ibid"
                 )
             
-            # Case 2+: Process citation to get metadata (with timeout)
-            metadata, full_formatted = get_citation_with_timeout(original_text, style, document_context)
+            # Case 2+: Metadata fetched in Phase 1 (shared by identical notes),
+            # or recorded by the last run for an unchanged note
+            if unchanged:
+                metadata = known_note[1]
+                full_formatted = formatter.format(metadata)
+            else:
+                metadata, full_formatted = resolved.get(_note_lookup_key(original_text), (None, None))
             
             if not metadata or not full_formatted:
                 return ProcessedCitation(
@@ -1265,10 +1586,7 @@ def process_document(
             if current_url and previous_url and urls_match(current_url, previous_url):
                 formatted = BaseFormatter.format_ibid()
                 
-                if note_type == 'endnote':
-                    processor.write_endnote(note_id, formatted)
-                else:
-                    processor.write_footnote(note_id, formatted)
+                write_note(note, note_type, formatted, unchanged)
                 
                 return ProcessedCitation(
                     original=original_text,
@@ -1283,10 +1601,7 @@ def process_document(
             if history.is_same_as_previous(metadata):
                 formatted = BaseFormatter.format_ibid()
                 
-                if note_type == 'endnote':
-                    processor.write_endnote(note_id, formatted)
-                else:
-                    processor.write_footnote(note_id, formatted)
+                write_note(note, note_type, formatted, unchanged)
                 
                 return ProcessedCitation(
                     original=original_text,
@@ -1301,10 +1616,7 @@ def process_document(
             if history.has_been_cited_before(metadata):
                 formatted = formatter.format_short(metadata)
                 
-                if note_type == 'endnote':
-                    processor.write_endnote(note_id, formatted)
-                else:
-                    processor.write_footnote(note_id, formatted)
+                write_note(note, note_type, formatted, unchanged)
                 
                 history.add(metadata, formatted)
                 
@@ -1318,10 +1630,7 @@ def process_document(
                 )
             
             # Case 5: New source → full citation
-            if note_type == 'endnote':
-                processor.write_endnote(note_id, full_formatted)
-            else:
-                processor.write_footnote(note_id, full_formatted)
+            write_note(note, note_type, full_formatted, unchanged)
             
             history.add(metadata, full_formatted)
             
@@ -1346,42 +1655,47 @@ def process_document(
                 citation_form="full"
             )
     
-    # Process endnotes
-    total_notes = len(endnotes) + len(footnotes)
+    total_notes = len(all_notes)
     print(f"[process_document] Processing {len(endnotes)} endnotes, {len(footnotes)} footnotes ({total_notes} total)")
     
-    for idx, note in enumerate(endnotes):
-        print(f"[process_document] Processing endnote {idx+1}/{len(endnotes)}: {note.get('text', '')[:40]}...")
-        result = process_single_note(note, 'endnote')
-        results.append(result)
-        print(f"[process_document] Endnote {idx+1} {'✔' if result.success else '✗'}")
+    # --- PHASE 2: Sequential citation form determination ---
+    print(f"[process_document] Phase 2: Applying ibid/short form logic sequentially...")
     
-    # Process footnotes
-    for idx, note in enumerate(footnotes):
-        print(f"[process_document] Processing footnote {idx+1}/{len(footnotes)}: {note.get('text', '')[:40]}...")
-        result = process_single_note(note, 'footnote')
+    last_source = None
+    for idx, (note, note_type) in enumerate(all_notes):
+        known_note = known.get(idx)
+        result = process_single_note(note, note_type, known_note)
         results.append(result)
-        print(f"[process_document] Footnote {idx+1} {'✔' if result.success else '✗'}")
-    
-    # Save to buffer
-    doc_buffer = processor.save_to_buffer()
+        
+        # Record the note state for the next (incremental) run
+        if result.success:
+            if known_note:
+                source = known_note[0]
+            elif is_ibid(note['text']):
+                source = last_source
+            else:
+                source = hash_citation_text(_note_lookup_key(note['text']))
+            if source:
+                metadata_cache.record_note(note_type, note['id'], _written_text(result.formatted), source, result.citation_form)
+                last_source = source
+        print(f"[process_document] {note_type.capitalize()} {note['id']} ({idx+1}/{total_notes}) {'✔' if result.success else '✗'}")
+        if progress:
+            progress('notes', idx + 1, total_notes, note=idx + 1, success=result.success, form=result.citation_form)
     
     # Make URLs clickable if requested
     if add_links:
-        doc_buffer = LinkActivator.process(doc_buffer)
-    
-    # Get document bytes
-    doc_bytes = doc_buffer.read()
+        LinkActivator.process_package(package)
     
     # Embed updated metadata cache into document (V4.1)
+    cache_hits_before = document.cache_size_before
     cache_hits_after = metadata_cache.size()
     new_citations_cached = cache_hits_after - cache_hits_before
     print(f"[process_document] Cache: {cache_hits_before} existing + {new_citations_cached} new = {cache_hits_after} total")
     
-    doc_bytes = save_cache_to_docx(doc_bytes, metadata_cache)
+    save_cache_to_package(package, metadata_cache)
     
-    # Cleanup
-    processor.cleanup()
+    # Serialize once - only modified parts are re-compressed
+    doc_bytes = package.to_bytes()
     
     return doc_bytes, results, metadata_cache
 
@@ -1406,34 +1720,19 @@ def update_document_note(doc_bytes: bytes, note_id: int, new_html: str) -> bytes
     Returns:
         Updated document as bytes
     """
-    import io
-    import zipfile
-    import tempfile
-    import shutil
-    import re
-    
     try:
-        # Extract the docx
-        temp_dir = tempfile.mkdtemp()
-        
-        with zipfile.ZipFile(io.BytesIO(doc_bytes), 'r') as zf:
-            zf.extractall(temp_dir)
-        
-        # Find and update the endnote
-        endnotes_path = os.path.join(temp_dir, 'word', 'endnotes.xml')
-        footnotes_path = os.path.join(temp_dir, 'word', 'footnotes.xml')
+        package = DocxPackage(doc_bytes)
         
         updated = False
         
-        for xml_path, note_tag in [(endnotes_path, 'w:endnote'), (footnotes_path, 'w:footnote')]:
-            if not os.path.exists(xml_path):
+        # Find and update the endnote
+        for part_name, note_tag in [(ENDNOTES_PART, 'w:endnote'), (FOOTNOTES_PART, 'w:footnote')]:
+            content = package.get_text(part_name)
+            if content is None:
                 continue
             
             # Determine note type for styling
-            note_type = 'footnote' if 'footnote' in xml_path else 'endnote'
-                
-            with open(xml_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            note_type = 'footnote' if part_name == FOOTNOTES_PART else 'endnote'
             
             # Find the note with matching ID
             # Pattern: <w:endnote w:id="N">...</w:endnote>
@@ -1451,29 +1750,15 @@ def update_document_note(doc_bytes: bytes, note_id: int, new_html: str) -> bytes
             new_content, count = re.subn(pattern, replace_note_content, content, flags=re.DOTALL)
             
             if count > 0:
-                with open(xml_path, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
+                package.set_text(part_name, new_content)
                 updated = True
                 break
         
-        # Repackage the docx
-        output_buffer = io.BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
-        
-        # Cleanup
-        shutil.rmtree(temp_dir)
-        
-        output_buffer.seek(0)
-        
         # Activate any URLs as clickable hyperlinks (use internal LinkActivator)
-        output_buffer = LinkActivator.process(output_buffer)
+        LinkActivator.process_package(package)
         
-        return output_buffer.read()
+        # Repackage the docx (single serialization)
+        return package.to_bytes()
         
     except Exception as e:
         print(f"[update_document_note] Error: {e}")
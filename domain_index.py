@@ -0,0 +1,293 @@
+"""
+citeflex/domain_index.py
+
+One pre-compiled index for every domain-based URL classification.
+
+URL classification used to be spread over _is_newspaper_url,
+_is_medical_url, _is_academic_ai_url, is_academic_publisher_url, the
+PubMed-indexed publisher scan in _route_url, superlegal's
+KNOWN_LEGAL_DOMAINS scan, gov_ngo_domains.get_org_author,
+config.get_newspaper_name / get_gov_agency and routers/url.classify_url.
+Each one ran `key in domain` over a config list for every URL. That is
+linear in lists that keep growing, and a substring match is wrong at label
+boundaries ("ft.com" in "microsoft.com" made Microsoft the Financial Times).
+
+Here the URL is parsed once, and its host and each parent suffix
+(news.bbc.co.uk -> bbc.co.uk -> co.uk) are looked up in hash tables built
+once from the same config lists:
+
+- "bbc.co.uk"    matches the host and any subdomain of it
+- "pubmed"       (no dot) matches a host label
+- "bailii.org/ie" (with a path) matches the host plus a path prefix
+- "digitalcommons." (trailing dot) matches those leading labels anywhere
+  in the host: digitalcommons.law.yale.edu, lib.digitalcommons.x.edu
+
+The most specific entry wins, so 'nimh.nih.gov' beats 'nih.gov' without
+sorting keys by length.
+
+classify_domain(url) returns every classification at once (newspaper name,
+government agency, organization author, legal, academic publisher, medical,
+...) and is memoized per URL.
+
+Usage:
+    from domain_index import classify_domain
+
+    info = classify_domain("https://www.nimh.nih.gov/health/topics")
+    info.gov_agency   # 'National Institute of Mental Health'
+    info.medical      # True
+
+Created: 2026-10-16
+"""
+
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# Two-label public suffixes: the registrable domain under these has three
+# labels (bbc.co.uk, abc.net.au). Only affects DomainInfo.registrable.
+SECOND_LEVEL_SUFFIXES = frozenset({
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'ltd.uk', 'me.uk', 'nhs.uk', 'police.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au', 'asn.au',
+    'co.nz', 'org.nz', 'ac.nz', 'govt.nz', 'net.nz',
+    'gc.ca', 'gov.bc.ca', 'co.za', 'ac.za', 'gov.za', 'org.za',
+    'co.jp', 'ac.jp', 'go.jp', 'or.jp', 'co.in', 'ac.in', 'gov.in', 'nic.in',
+    'com.br', 'gov.br', 'org.br', 'com.cn', 'gov.cn', 'edu.cn', 'ac.cn',
+    'com.sg', 'gov.sg', 'edu.sg', 'com.hk', 'gov.hk', 'co.kr', 'ac.kr', 'go.kr',
+    'com.mx', 'gob.mx', 'com.ar', 'gob.ar', 'co.il', 'ac.il', 'gov.il',
+    'gov.ie', 'gov.scot', 'gov.wales',
+})
+
+# Hosts of .gov sites that stay medical (PubMed/PMC engines), not government
+_MEDICAL_GOV = ['pubmed', 'ncbi', 'nlm.nih.gov', 'clinicaltrials']
+
+
+# =============================================================================
+# URL PARSING
+# =============================================================================
+
+def split_url(url_or_domain: str) -> Tuple[str, str]:
+    """
+    Host and path of a URL or bare domain.
+
+    Returns:
+        (host, path) - lowercase, host without www. prefix or port, path
+        starting with '/' (or '')
+    """
+    text = (url_or_domain or '').strip().lower()
+    if '://' in text:
+        text = text.split('://', 1)[1]
+    elif text.startswith('//'):
+        text = text[2:]
+
+    host, slash, rest = text.partition('/')
+    for sep in ('?', '#'):
+        host = host.split(sep, 1)[0]
+    host = host.rsplit('@', 1)[-1].split(':', 1)[0].strip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+
+    path = (slash + rest) if slash else ''
+    for sep in ('?', '#'):
+        path = path.split(sep, 1)[0]
+    return host, path
+
+
+def registrable_domain(host: str) -> str:
+    """The registrable domain of a host: news.bbc.co.uk -> bbc.co.uk."""
+    labels = host.split('.')
+    if len(labels) <= 2:
+        return host
+    if '.'.join(labels[-2:]) in SECOND_LEVEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def _parent_suffixes(host: str) -> List[str]:
+    """host and its parent suffixes, most specific first (down to 2 labels)."""
+    labels = host.split('.')
+    return ['.'.join(labels[i:]) for i in range(max(1, len(labels) - 1))]
+
+
+# =============================================================================
+# DOMAIN TABLE
+# =============================================================================
+
+class DomainTable:
+    """
+    Hash-indexed set of domain patterns, each with a value.
+
+    Built once from a config list (values True) or dict (values as given).
+    """
+
+    __slots__ = ('_suffixes', '_labels', '_paths', '_prefixes')
+
+    def __init__(self, entries: Union[Mapping[str, Any], Iterable[str]]):
+        self._suffixes: Dict[str, Any] = {}
+        self._labels: Dict[str, Any] = {}
+        self._paths: Dict[str, List[Tuple[str, Any]]] = {}
+        self._prefixes: Dict[str, Any] = {}
+
+        items = entries.items() if isinstance(entries, Mapping) else ((e, True) for e in entries)
+        for pattern, value in items:
+            pattern = pattern.strip().lower()
+            if pattern.startswith('www.'):
+                pattern = pattern[4:]
+            host, _, path = pattern.partition('/')
+            if path:
+                self._paths.setdefault(host, []).append(('/' + path, value))
+            elif host.endswith('.'):
+                self._prefixes.setdefault(host, value)
+            elif '.' in host:
+                self._suffixes.setdefault(host, value)
+            elif host:
+                self._labels.setdefault(host, value)
+
+        # Longest path prefix first
+        for prefixes in self._paths.values():
+            prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def lookup(self, host: str, path: str = '', suffixes: Optional[List[str]] = None) -> Any:
+        """
+        Value of the most specific pattern matching host/path, else None.
+
+        Args:
+            host: Lowercase host (see split_url)
+            path: Lowercase path, for patterns with a path
+            suffixes: Precomputed _parent_suffixes(host)
+        """
+        if not host:
+            return None
+        for suffix in suffixes if suffixes is not None else _parent_suffixes(host):
+            if self._paths:
+                for prefix, value in self._paths.get(suffix, ()):
+                    if path.startswith(prefix):
+                        return value
+            if suffix in self._suffixes:
+                return self._suffixes[suffix]
+        if self._prefixes:
+            value = self._lookup_prefix(host)
+            if value is not None:
+                return value
+        if self._labels:
+            for label in host.split('.'):
+                if label in self._labels:
+                    return self._labels[label]
+        return None
+
+    def _lookup_prefix(self, host: str) -> Any:
+        """Longest "label.label." pattern starting at any label of host."""
+        labels = host.split('.')
+        for start in range(len(labels) - 1):
+            # At least one label must follow the pattern
+            for end in range(len(labels) - 1, start, -1):
+                key = '.'.join(labels[start:end]) + '.'
+                if key in self._prefixes:
+                    return self._prefixes[key]
+        return None
+
+    def __len__(self) -> int:
+        return (len(self._suffixes) + len(self._labels) + len(self._prefixes)
+                + sum(len(p) for p in self._paths.values()))
+
+
+# =============================================================================
+# CLASSIFICATION
+# =============================================================================
+
+@dataclass(frozen=True)
+class DomainInfo:
+    """Every domain-based classification of one URL."""
+    host: str
+    registrable: str
+    newspaper: Optional[str] = None           # NEWSPAPER_DOMAINS name
+    gov_agency: Optional[str] = None          # GOV_AGENCY_MAP name
+    org_author: Optional[str] = None          # gov_ngo_domains.ORG_DOMAINS name
+    legal: bool = False                       # LEGAL_DOMAINS
+    academic_publisher: Optional[str] = None  # engines.doi.ACADEMIC_PUBLISHER_DOMAINS key
+    academic: Optional[str] = None            # ACADEMIC_DOMAINS name
+    academic_ai: Optional[str] = None         # ACADEMIC_AI_DOMAINS name
+    medical: bool = False                     # MEDICAL_DOMAINS
+    pubmed_publisher: bool = False            # PUBMED_INDEXED_PUBLISHERS
+    government: bool = False                  # GOVERNMENT_DOMAINS, or a .gov/.govt host
+
+
+class DomainIndex:
+    """The compiled tables, built from config on first use."""
+
+    def __init__(self):
+        from config import (
+            NEWSPAPER_DOMAINS, GOV_AGENCY_MAP, LEGAL_DOMAINS, ACADEMIC_DOMAINS,
+            ACADEMIC_AI_DOMAINS, MEDICAL_DOMAINS, PUBMED_INDEXED_PUBLISHERS,
+            GOVERNMENT_DOMAINS,
+        )
+        from engines.gov_ngo_domains import ORG_DOMAINS
+        from engines.doi import ACADEMIC_PUBLISHER_DOMAINS
+
+        self.newspaper = DomainTable(NEWSPAPER_DOMAINS)
+        self.gov_agency = DomainTable(GOV_AGENCY_MAP)
+        self.org_author = DomainTable(ORG_DOMAINS)
+        self.legal = DomainTable(LEGAL_DOMAINS)
+        self.academic_publisher = DomainTable({key: key for key in ACADEMIC_PUBLISHER_DOMAINS})
+        self.academic = DomainTable(ACADEMIC_DOMAINS)
+        self.academic_ai = DomainTable(ACADEMIC_AI_DOMAINS)
+        self.medical = DomainTable(MEDICAL_DOMAINS)
+        self.pubmed_publisher = DomainTable(PUBMED_INDEXED_PUBLISHERS)
+        self.government = DomainTable(GOVERNMENT_DOMAINS)
+        self.medical_gov = DomainTable(_MEDICAL_GOV)
+
+    def classify(self, url_or_domain: str) -> DomainInfo:
+        host, path = split_url(url_or_domain)
+        if not host:
+            return DomainInfo(host='', registrable='')
+
+        suffixes = _parent_suffixes(host)
+        labels = host.split('.')
+        medical = bool(self.medical.lookup(host, path, suffixes))
+
+        government = bool(self.government.lookup(host, path, suffixes))
+        if not government and ('gov' in labels[1:] or 'govt' in labels[1:]):
+            government = not self.medical_gov.lookup(host, path, suffixes)
+
+        return DomainInfo(
+            host=host,
+            registrable=registrable_domain(host),
+            newspaper=self.newspaper.lookup(host, path, suffixes),
+            gov_agency=self.gov_agency.lookup(host, path, suffixes),
+            org_author=self.org_author.lookup(host, path, suffixes),
+            legal=bool(self.legal.lookup(host, path, suffixes)),
+            academic_publisher=self.academic_publisher.lookup(host, path, suffixes),
+            academic=self.academic.lookup(host, path, suffixes),
+            academic_ai=self.academic_ai.lookup(host, path, suffixes),
+            medical=medical,
+            pubmed_publisher=bool(self.pubmed_publisher.lookup(host, path, suffixes)),
+            government=government,
+        )
+
+
+_index: Optional[DomainIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_domain_index() -> DomainIndex:
+    """The process-wide index (compiled on first call)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DomainIndex()
+    return _index
+
+
+@lru_cache(maxsize=4096)
+def classify_domain(url_or_domain: str) -> DomainInfo:
+    """
+    Classify a URL (or bare domain) by its host.
+
+    Args:
+        url_or_domain: e.g. "https://www.nytimes.com/2024/..." or "cdc.gov"
+
+    Returns:
+        DomainInfo (all fields empty for an unparseable input)
+    """
+    return get_domain_index().classify(url_or_domain)
@@ -18,6 +18,9 @@ Usage:
     success = send_cost_report()  # Sends to ADMIN_EMAIL
 
 Version History:
+    2026-10-16:      Cost summary read from the cost_store rollups; the
+                     attachment holds the daily rollups (the full call log is
+                     at /admin/costs?format=csv)
     2025-12-13 V1.0: Initial implementation
 """
 
@@ -46,13 +49,41 @@ FROM_EMAIL = os.environ.get('FROM_EMAIL', 'CitateGenie <onboarding@resend.dev>')
 
 def generate_cost_summary() -> dict:
     """
-    Generate a summary of API costs from costs.csv.
+    Generate a summary of API costs from the cost log.
+    
+    Totals come from the daily rollups of cost_store, so the report doesn't
+    re-read every logged call; costs.csv is only parsed if the store is
+    unavailable.
     
     Returns:
         Dict with summary statistics and CSV content
     """
-    from cost_tracker import COST_LOG_PATH
+    from cost_tracker import COST_LOG_PATH, flush_cost_log
+    from cost_store import get_cost_store
+    
+    flush_cost_log()
+    store = get_cost_store()
+    if store.enabled:
+        stored = store.summary()
+        totals = {
+            provider: {'cost': 0.0, 'calls': 0}
+            for provider in ('gemini', 'openai', 'claude', 'serpapi')
+        }
+        for provider, provider_totals in stored['by_provider'].items():
+            if provider in totals:
+                totals[provider] = dict(provider_totals)
+        return {
+            'total_cost': sum(p['cost'] for p in totals.values()),
+            'total_calls': sum(p['calls'] for p in totals.values()),
+            'by_provider': totals,
+            # Daily buckets, not every call - the report stays O(buckets)
+            'csv_content': store.export_rollups_csv('day') if stored['total_calls'] else '',
+            'csv_filename': 'citategenie_costs_daily.csv',
+            'period_start': stored['period_start'],
+            'period_end': stored['period_end'],
+        }
     
+    # Store unavailable: parse the CSV fallback log
     if not COST_LOG_PATH.exists():
         return {
             'total_cost': 0,
@@ -147,6 +178,13 @@ def format_cost_report_email(summary: dict) -> str:
     
     provider_section = '\n'.join(provider_lines) if provider_lines else "  No API calls recorded"
     
+    if summary.get('csv_filename', '').endswith('_daily.csv'):
+        attachment_note = ("Daily totals per provider and function attached as CSV.\n"
+                           "Open in Excel for detailed analysis; the full call log can be\n"
+                           "exported from /admin/costs?format=csv.")
+    else:
+        attachment_note = "Full data attached as costs.csv\nOpen in Excel for detailed analysis."
+    
     body = f"""CitateGenie API Cost Report
 {'=' * 35}
 
@@ -164,8 +202,7 @@ BY PROVIDER
 
 {'=' * 35}
 
-Full data attached as costs.csv
-Open in Excel for detailed analysis.
+{attachment_note}
 
 --
 CitateGenie Cost Tracker
@@ -266,7 +303,7 @@ def send_cost_report(to_email: str = None) -> bool:
         subject=subject,
         body=body,
         attachment_content=summary['csv_content'] if summary['csv_content'] else None,
-        attachment_filename='citategenie_costs.csv' if summary['csv_content'] else None
+        attachment_filename=summary.get('csv_filename', 'citategenie_costs.csv') if summary['csv_content'] else None
     )
 
 
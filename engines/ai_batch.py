@@ -0,0 +1,171 @@
+"""
+citeflex/engines/ai_batch.py
+
+Micro-batching for concurrent AI lookups of the same kind.
+
+Document processing looks notes up concurrently, so the AI layer sees
+bursts of lookup_fragment / lookup_academic_url / ... calls that each send
+the same system prompt and the same document context for one citation. The
+batcher collects those calls for a short window and hands them to one
+batched request (ai_lookup._request_batch), which numbers the items and maps
+the answers back by index:
+
+- Calls share a batch only if their key matches (kind, shared context,
+  instructions) - the context is sent once per request
+- The first caller (the leader) waits up to `window` seconds, or until the
+  batch is full, then runs the request; the others wait for its result
+- A leader left alone gets NOT_BATCHED and sends its usual single request,
+  so an isolated lookup is unchanged apart from the window
+- Identical items in one batch are sent once
+- Exceptions raised by the request are re-raised in every caller, and
+  lookup problems (timeouts, rate limits) are replayed into each caller's
+  tracker, as with single_flight
+
+Usage:
+    answer = ai_batcher.submit(('fragment', gist), fragment, run_batch, max_items=10)
+    if answer is NOT_BATCHED:
+        answer = single_request(fragment)
+
+Created: 2026-10-16
+"""
+
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import metrics
+from config import AI_BATCH_WINDOW, AI_BATCH_SIZE
+from negative_cache import track_lookup_problems, report_lookup_problem
+
+
+class _NotBatched:
+    """Marker: no batched answer for this item - send the single request."""
+
+    def __repr__(self) -> str:
+        return 'NOT_BATCHED'
+
+
+NOT_BATCHED = _NotBatched()
+
+
+# =============================================================================
+# BATCHER
+# =============================================================================
+
+class _Batch:
+    """Items collected under one key, and the answers once the request ran."""
+
+    __slots__ = ('items', 'positions', 'full', 'done', 'results', 'error', 'problems')
+
+    def __init__(self):
+        self.items: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.problems: set = set()
+
+
+class AIBatcher:
+    """
+    Thread-safe collector of concurrent single-item AI lookups.
+
+    Args:
+        window: Seconds the first caller waits for others (0 disables batching)
+        max_items: Default cap on items per request
+    """
+
+    def __init__(self, window: float = AI_BATCH_WINDOW, max_items: int = AI_BATCH_SIZE):
+        self.window = window
+        self.max_items = max(1, max_items)
+        self._open: Dict[Hashable, _Batch] = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batched_items = 0
+
+    def submit(
+        self,
+        key: Hashable,
+        item: str,
+        run: Callable[[List[str]], List[Any]],
+        max_items: Optional[int] = None
+    ) -> Any:
+        """
+        Answer for one item, from a request shared with concurrent callers.
+
+        Args:
+            key: Calls with the same key can share a request
+            item: This caller's input
+            run: Sends the batched request: run(items) -> one answer per item
+                 (NOT_BATCHED where the response had none)
+            max_items: Cap on items per request (default: self.max_items)
+
+        Returns:
+            The answer, or NOT_BATCHED if the caller should send its own request
+        """
+        if self.window <= 0:
+            return NOT_BATCHED
+        limit = max(1, min(max_items or self.max_items, self.max_items))
+
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            position = batch.positions.get(item)
+            if position is None:
+                position = batch.positions[item] = len(batch.items)
+                batch.items.append(item)
+            if len(batch.items) >= limit:
+                # Close it: later callers start a new batch
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            self._run(key, batch, run)
+        else:
+            batch.done.wait()
+            for reason in batch.problems:
+                report_lookup_problem(reason)
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[position] if leader else copy.deepcopy(batch.results[position])
+
+    def _run(self, key: Hashable, batch: _Batch, run: Callable[[List[str]], List[Any]]) -> None:
+        batch.full.wait(self.window)
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            items = list(batch.items)
+
+        try:
+            if len(items) == 1:
+                batch.results = [NOT_BATCHED]
+                return
+            with track_lookup_problems() as problems:
+                results = list(run(items))
+            batch.problems = set(problems)
+            batch.results = (results + [NOT_BATCHED] * len(items))[:len(items)]
+            with self._lock:
+                self._requests += 1
+                self._batched_items += len(items)
+            metrics.count('ai', 'batched_items', str(key[0]) if isinstance(key, tuple) else '', len(items))
+        except BaseException as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for diagnostics."""
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'batched_items': self._batched_items,
+                'open': len(self._open),
+            }
+
+
+# Process-wide batcher used by engines.ai_lookup
+ai_batcher = AIBatcher()
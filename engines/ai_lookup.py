@@ -21,6 +21,20 @@ HALLUCINATION SAFEGUARD:
 - If no database confirms the AI's guess, result is rejected
 
 Version History:
+    2026-10-16:      AI_PROVIDER_STRATEGY - 'hedged' starts the next provider
+                     once the current one passes its observed p95 latency
+                     (network calls only, not cache hits), 'race' calls all
+                     providers and takes the first valid JSON answer,
+                     'sequential' (default) is the previous behaviour
+    2026-10-16:      Provider responses cached on disk (engines/llm_cache.py),
+                     keyed on provider, model, system and prompt; the
+                     _call_*_simple helpers log their real token usage
+    2026-10-16:      Batched lookups - batch_lookup_fragments() and
+                     batch_lookup_parenthetical_options() send many citations
+                     and the shared context in one request, answers mapped
+                     back by index; concurrent single lookups (fragment,
+                     authors/year, options, newspaper/academic URL) share a
+                     request through engines/ai_batch.py
     2025-12-12 V2.0: MAJOR CONSOLIDATION
                      - Merged routers/claude.py (classification, batch)
                      - Merged routers/gemini.py (classification)
@@ -33,15 +47,23 @@ Version History:
 
 import os
 import re
+import copy
 import json
 import time
+import threading
 import requests
-from typing import Optional, List, Tuple, Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, List, Tuple, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, as_completed, wait
 
 from models import CitationMetadata, CitationType
-from config import DEFAULT_TIMEOUT
+from config import DEFAULT_TIMEOUT, AI_BATCH_SIZE, AI_BATCH_MAX_TOKENS, LLM_CACHE_NEGATIVE_TTL
 from cost_tracker import log_api_call
+from negative_cache import report_lookup_problem, submit_in_context, TIMEOUT, RATE_LIMITED, PROVIDER_ERROR
+from engines.http_client import http_post, LatencyTracker
+from engines.single_flight import lookup_flight
+from engines.ai_batch import ai_batcher, NOT_BATCHED
+from engines.llm_cache import get_llm_cache
+import metrics
 
 # =============================================================================
 # API KEYS (from config.py - centralized key management)
@@ -80,8 +102,23 @@ if ANTHROPIC_API_KEY:
 # Filter chain to only available providers
 ACTIVE_CHAIN = [p for p in AI_PROVIDER_CHAIN if p in AVAILABLE_PROVIDERS]
 
+# How the chain is walked (_call_provider_chain):
+#   'sequential' - one provider at a time, the next only after a failure (default)
+#   'hedged'     - also start the next provider once the current one runs past
+#                  its observed p95 latency (AI_HEDGE_DEFAULT_DELAY until
+#                  AI_HEDGE_MIN_SAMPLES calls have been seen)
+#   'race'       - start every provider at once; the first valid JSON answer wins
+# 'hedged' and 'race' can pay for more than one provider per lookup.
+AI_PROVIDER_STRATEGY = os.environ.get('AI_PROVIDER_STRATEGY', 'sequential').strip().lower()
+if AI_PROVIDER_STRATEGY not in ('sequential', 'hedged', 'race'):
+    AI_PROVIDER_STRATEGY = 'sequential'
+AI_HEDGE_PERCENTILE = 95
+AI_HEDGE_MIN_SAMPLES = 10
+AI_HEDGE_DEFAULT_DELAY = 8.0     # seconds before hedging while samples are few
+AI_HEDGE_MIN_DELAY = 2.0         # never hedge sooner than this
+
 if ACTIVE_CHAIN:
-    print(f"[AI_Lookup] Provider chain: {' → '.join(ACTIVE_CHAIN)}")
+    print(f"[AI_Lookup] Provider chain: {' → '.join(ACTIVE_CHAIN)} ({AI_PROVIDER_STRATEGY})")
 else:
     print("[AI_Lookup] WARNING: No AI providers configured")
 
@@ -96,36 +133,199 @@ def _call_ai(prompt: str, system: str, max_tokens: int = 1000) -> Optional[str]:
     
     Tries each provider in order until one succeeds.
     Returns raw text response or None if all fail.
+    
+    Identical concurrent calls (same system, prompt and max_tokens) share
+    one provider request.
+    """
+    return lookup_flight.do(('ai', system, prompt, max_tokens), _call_provider_chain, prompt, system, max_tokens)
+
+
+def _providers_available() -> bool:
+    """
+    Whether any AI provider is configured. If none is, that is reported as a
+    lookup problem, so the miss isn't negative-cached as a real no-match.
     """
+    if ACTIVE_CHAIN:
+        return True
+    report_lookup_problem(PROVIDER_ERROR)
+    return False
+
+
+def _call_provider_chain(prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """Get an answer from the providers in ACTIVE_CHAIN (per AI_PROVIDER_STRATEGY)."""
+    if not _providers_available():
+        return None
+    if len(ACTIVE_CHAIN) > 1:
+        if AI_PROVIDER_STRATEGY == 'race':
+            return _race_providers(prompt, system, max_tokens)
+        if AI_PROVIDER_STRATEGY == 'hedged':
+            return _hedge_providers(prompt, system, max_tokens)
+    
     for provider in ACTIVE_CHAIN:
-        try:
-            if provider == 'gemini':
-                result = _call_gemini(prompt, system, max_tokens)
-            elif provider == 'openai':
-                result = _call_openai(prompt, system, max_tokens)
-            elif provider == 'claude':
-                result = _call_claude(prompt, system, max_tokens)
-            else:
-                continue
-            
-            if result:
-                return result
-                
-        except Exception as e:
-            print(f"[AI_Lookup] {provider} failed: {e}")
+        result = _call_provider(provider, prompt, system, max_tokens)
+        if result:
+            return result
+    
+    return None
+
+
+def _call_provider(provider: str, prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """
+    One provider call; failures are reported and return None.
+    
+    Answers from the response cache are returned untimed, so ai_latency
+    (and the hedge delay) only sees real network calls.
+    """
+    request = _PROVIDER_REQUESTS.get(provider)
+    if request is None:
+        return None
+    cached = _cached_response(provider, prompt, system, max_tokens)
+    if cached is not None:
+        return cached
+    
+    start = time.monotonic()
+    try:
+        with metrics.timed('ai', provider):
+            result = request(prompt, system, max_tokens)
+        ai_latency.record(provider, time.monotonic() - start)
+        return result
+        
+    except Exception as e:
+        print(f"[AI_Lookup] {provider} failed: {e}")
+        metrics.count('ai', 'failure', provider)
+        # A failure after the full timeout still tells us how slow the provider is
+        ai_latency.record(provider, time.monotonic() - start)
+        if isinstance(e, requests.Timeout):
+            report_lookup_problem(TIMEOUT)
+        elif 'Rate limited' in str(e):
+            report_lookup_problem(RATE_LIMITED)
+        else:
+            report_lookup_problem(PROVIDER_ERROR)
+        return None
+
+
+# =============================================================================
+# HEDGED / RACING PROVIDER CALLS
+# =============================================================================
+# Provider calls are blocking HTTP requests, so they run on a shared pool.
+# A losing call can't be interrupted: calls not yet started are cancelled,
+# running ones finish in the background. Their tokens are still logged by
+# cost_tracker (in the caller's context) and their answers still fill the
+# LLM response cache; metrics count them as 'ai'/'lost'.
+
+# Rolling per-provider latency (successful and failed calls)
+ai_latency = LatencyTracker()
+
+_provider_pool: Optional[ThreadPoolExecutor] = None
+_provider_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _provider_pool
+    with _provider_pool_lock:
+        if _provider_pool is None:
+            _provider_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix='ai-provider')
+        return _provider_pool
+
+
+def _valid_answer(text: Optional[str]) -> bool:
+    """A non-empty response containing parseable JSON (every _call_ai prompt asks for JSON)."""
+    return bool(text) and _parse_json_response(text) is not None
+
+
+def _hedge_delay(provider: str) -> float:
+    """Seconds to give a provider before the next one is started too."""
+    observed = ai_latency.percentile(provider, AI_HEDGE_PERCENTILE, min_samples=AI_HEDGE_MIN_SAMPLES)
+    return max(AI_HEDGE_MIN_DELAY, observed if observed is not None else AI_HEDGE_DEFAULT_DELAY)
+
+
+def _first_valid(
+    running: Dict[Future, str],
+    queued: List[str],
+    start: Callable[[str], None],
+    hedge: bool
+) -> Optional[str]:
+    """
+    Wait for the first valid answer among running provider calls.
+    
+    Starts the next queued provider when a call fails, and - if hedge is
+    set - when the latest one runs past its hedge delay.
+    """
+    latest = next(reversed(running.values()))
+    while running:
+        timeout = _hedge_delay(latest) if hedge and queued else None
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        
+        if not done:
+            # Hedge: the latest provider is slower than usual
+            latest = queued[0]
+            metrics.count('ai', 'hedge', latest)
+            print(f"[AI_Lookup] Hedging to {latest} after {timeout:.1f}s")
+            start(queued.pop(0))
             continue
+        
+        for future in done:
+            provider = running.pop(future)
+            result = future.result()
+            if _valid_answer(result):
+                for loser in running.values():
+                    metrics.count('ai', 'lost', loser)
+                for other in running:
+                    other.cancel()
+                return result
+            if result:
+                print(f"[AI_Lookup] {provider} returned no valid JSON")
+        
+        # Everything that finished failed: fall through to the next provider
+        if queued:
+            latest = queued[0]
+            start(queued.pop(0))
     
     return None
 
 
+def _hedge_providers(prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """Walk the chain in order, starting the next provider early when one is slow."""
+    running: Dict[Future, str] = {}
+    queued = list(ACTIVE_CHAIN)
+    
+    def start(provider: str) -> None:
+        running[submit_in_context(_pool(), _call_provider, provider, prompt, system, max_tokens)] = provider
+    
+    start(queued.pop(0))
+    return _first_valid(running, queued, start, hedge=True)
+
+
+def _race_providers(prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """Call every provider at once; the first valid answer wins."""
+    running: Dict[Future, str] = {}
+    
+    def start(provider: str) -> None:
+        running[submit_in_context(_pool(), _call_provider, provider, prompt, system, max_tokens)] = provider
+    
+    for provider in ACTIVE_CHAIN:
+        start(provider)
+    return _first_valid(running, [], start, hedge=False)
+
+
 def _call_gemini(prompt: str, system: str, max_tokens: int) -> Optional[str]:
-    """Call Gemini API."""
+    """Call Gemini API (answered from the response cache when possible)."""
+    if not GEMINI_API_KEY:
+        return None
+    cached = _cached_response('gemini', prompt, system, max_tokens)
+    if cached is not None:
+        return cached
+    return _request_gemini(prompt, system, max_tokens)
+
+
+def _request_gemini(prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """Gemini API request (no cache read; the answer is cached)."""
     if not GEMINI_API_KEY:
         return None
     
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
     
-    response = requests.post(
+    response = http_post(
         url,
         headers={
             'Content-Type': 'application/json',
@@ -154,15 +354,27 @@ def _call_gemini(prompt: str, system: str, max_tokens: int) -> Optional[str]:
     if not candidates:
         return None
     
-    return candidates[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+    text = candidates[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+    _cache_answer('gemini', system, prompt, max_tokens, text, input_tokens, output_tokens)
+    return text
 
 
 def _call_openai(prompt: str, system: str, max_tokens: int) -> Optional[str]:
-    """Call OpenAI API."""
+    """Call OpenAI API (answered from the response cache when possible)."""
+    if not OPENAI_API_KEY:
+        return None
+    cached = _cached_response('openai', prompt, system, max_tokens)
+    if cached is not None:
+        return cached
+    return _request_openai(prompt, system, max_tokens)
+
+
+def _request_openai(prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """OpenAI API request (no cache read; the answer is cached)."""
     if not OPENAI_API_KEY:
         return None
     
-    response = requests.post(
+    response = http_post(
         "https://api.openai.com/v1/chat/completions",
         headers={
             "Authorization": f"Bearer {OPENAI_API_KEY}",
@@ -192,15 +404,27 @@ def _call_openai(prompt: str, system: str, max_tokens: int) -> Optional[str]:
     output_tokens = usage.get('completion_tokens', 0)
     log_api_call('openai', input_tokens, output_tokens, prompt[:100], 'ai_lookup')
     
-    return result['choices'][0]['message']['content']
+    text = result['choices'][0]['message']['content']
+    _cache_answer('openai', system, prompt, max_tokens, text, input_tokens, output_tokens)
+    return text
 
 
 def _call_claude(prompt: str, system: str, max_tokens: int) -> Optional[str]:
-    """Call Claude API."""
+    """Call Claude API (answered from the response cache when possible)."""
+    if not ANTHROPIC_API_KEY:
+        return None
+    cached = _cached_response('claude', prompt, system, max_tokens)
+    if cached is not None:
+        return cached
+    return _request_claude(prompt, system, max_tokens)
+
+
+def _request_claude(prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """Claude API request (no cache read; the answer is cached)."""
     if not ANTHROPIC_API_KEY:
         return None
     
-    response = requests.post(
+    response = http_post(
         "https://api.anthropic.com/v1/messages",
         headers={
             "x-api-key": ANTHROPIC_API_KEY,
@@ -228,7 +452,60 @@ def _call_claude(prompt: str, system: str, max_tokens: int) -> Optional[str]:
     output_tokens = usage.get('output_tokens', 0)
     log_api_call('claude', input_tokens, output_tokens, prompt[:100], 'ai_lookup')
     
-    return result['content'][0]['text']
+    text = result['content'][0]['text']
+    _cache_answer('claude', system, prompt, max_tokens, text, input_tokens, output_tokens)
+    return text
+
+
+def _cached_response(provider: str, prompt: str, system: str, max_tokens: int) -> Optional[str]:
+    """A provider's cached answer to this prompt, or None."""
+    return get_llm_cache().get(provider, _PROVIDER_MODELS[provider], system, prompt, max_tokens)
+
+
+def _is_negative_answer(data: Any) -> bool:
+    """An error / not-found answer ({"error": ...}, {"found": false}, nothing)."""
+    if isinstance(data, list):
+        return all(_is_negative_answer(item) for item in data)
+    if isinstance(data, dict):
+        return not data or bool(data.get('error')) or data.get('found') is False
+    return True
+
+
+def _cache_answer(
+    provider: str,
+    system: str,
+    prompt: str,
+    max_tokens: int,
+    text: Optional[str],
+    input_tokens: int,
+    output_tokens: int
+) -> None:
+    """
+    Cache a JSON-prompt answer.
+    
+    Unparseable (e.g. truncated) answers are not cached; error / not-found
+    answers only for LLM_CACHE_NEGATIVE_TTL, so a transient miss isn't
+    replayed for the full cache TTL.
+    """
+    data = _parse_json_response(text)
+    if data is None:
+        return
+    ttl = LLM_CACHE_NEGATIVE_TTL if _is_negative_answer(data) else None
+    get_llm_cache().put(provider, _PROVIDER_MODELS[provider], system, prompt, max_tokens,
+                        text, input_tokens, output_tokens, ttl_seconds=ttl)
+
+
+_PROVIDER_MODELS = {
+    'gemini': GEMINI_MODEL,
+    'openai': OPENAI_MODEL,
+    'claude': CLAUDE_MODEL,
+}
+
+_PROVIDER_REQUESTS = {
+    'gemini': _request_gemini,
+    'openai': _request_openai,
+    'claude': _request_claude,
+}
 
 
 def _parse_json_response(text: str) -> Optional[dict]:
@@ -324,13 +601,12 @@ def lookup_org_name(domain: str) -> Optional[str]:
             else:
                 continue
             
-            if result:
+            # Reject if it looks like an error or too short
+            if result and _usable_org_name(result):
                 # Clean up the response
                 result = result.strip().strip('"').strip("'")
-                # Reject if it looks like an error or too short
-                if len(result) > 3 and 'error' not in result.lower() and 'sorry' not in result.lower():
-                    print(f"[AI_Lookup] Organization name for {domain}: {result}")
-                    return result
+                print(f"[AI_Lookup] Organization name for {domain}: {result}")
+                return result
         except Exception as e:
             print(f"[AI_Lookup] {provider} error for org lookup: {e}")
             continue
@@ -338,8 +614,18 @@ def lookup_org_name(domain: str) -> Optional[str]:
     return None
 
 
+def _usable_org_name(text: str) -> bool:
+    """An organization-name answer that isn't an error, apology or too short."""
+    text = (text or '').strip().strip('"').strip("'")
+    return len(text) > 3 and 'error' not in text.lower() and 'sorry' not in text.lower()
+
+
 def _call_gemini_simple(prompt: str) -> Optional[str]:
     """Simple Gemini call for short text responses."""
+    cached = get_llm_cache().get('gemini', GEMINI_MODEL, '', prompt, 100, 'org_lookup')
+    if cached is not None:
+        return cached.strip()
+    
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
     
     headers = {"Content-Type": "application/json"}
@@ -351,11 +637,16 @@ def _call_gemini_simple(prompt: str) -> Optional[str]:
     }
     
     try:
-        response = requests.post(url, headers=headers, params=params, json=data, timeout=10)
+        response = http_post(url, headers=headers, params=params, json=data, timeout=10)
         if response.status_code == 200:
             result = response.json()
             text = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            log_api_call('gemini', 'org_lookup', 0.0001)  # Minimal cost
+            usage = result.get('usageMetadata', {})
+            input_tokens = usage.get('promptTokenCount', 0)
+            output_tokens = usage.get('candidatesTokenCount', 0)
+            log_api_call('gemini', input_tokens, output_tokens, prompt[:100], 'org_lookup')
+            if _usable_org_name(text):
+                get_llm_cache().put('gemini', GEMINI_MODEL, '', prompt, 100, text, input_tokens, output_tokens)
             return text.strip()
     except Exception as e:
         print(f"[AI_Lookup] Gemini simple call error: {e}")
@@ -364,6 +655,10 @@ def _call_gemini_simple(prompt: str) -> Optional[str]:
 
 def _call_openai_simple(prompt: str) -> Optional[str]:
     """Simple OpenAI call for short text responses."""
+    cached = get_llm_cache().get('openai', OPENAI_MODEL, '', prompt, 100, 'org_lookup')
+    if cached is not None:
+        return cached.strip()
+    
     url = "https://api.openai.com/v1/chat/completions"
     
     headers = {
@@ -379,11 +674,16 @@ def _call_openai_simple(prompt: str) -> Optional[str]:
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = http_post(url, headers=headers, json=data, timeout=10)
         if response.status_code == 200:
             result = response.json()
             text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            log_api_call('openai', 'org_lookup', 0.001)  # Minimal cost
+            usage = result.get('usage', {})
+            input_tokens = usage.get('prompt_tokens', 0)
+            output_tokens = usage.get('completion_tokens', 0)
+            log_api_call('openai', input_tokens, output_tokens, prompt[:100], 'org_lookup')
+            if _usable_org_name(text):
+                get_llm_cache().put('openai', OPENAI_MODEL, '', prompt, 100, text, input_tokens, output_tokens)
             return text.strip()
     except Exception as e:
         print(f"[AI_Lookup] OpenAI simple call error: {e}")
@@ -392,6 +692,10 @@ def _call_openai_simple(prompt: str) -> Optional[str]:
 
 def _call_claude_simple(prompt: str) -> Optional[str]:
     """Simple Claude call for short text responses."""
+    cached = get_llm_cache().get('claude', CLAUDE_MODEL, '', prompt, 100, 'org_lookup')
+    if cached is not None:
+        return cached.strip()
+    
     url = "https://api.anthropic.com/v1/messages"
     
     headers = {
@@ -407,11 +711,16 @@ def _call_claude_simple(prompt: str) -> Optional[str]:
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = http_post(url, headers=headers, json=data, timeout=10)
         if response.status_code == 200:
             result = response.json()
             text = result.get("content", [{}])[0].get("text", "")
-            log_api_call('claude', 'org_lookup', 0.001)  # Minimal cost
+            usage = result.get('usage', {})
+            input_tokens = usage.get('input_tokens', 0)
+            output_tokens = usage.get('output_tokens', 0)
+            log_api_call('claude', input_tokens, output_tokens, prompt[:100], 'org_lookup')
+            if _usable_org_name(text):
+                get_llm_cache().put('claude', CLAUDE_MODEL, '', prompt, 100, text, input_tokens, output_tokens)
             return text.strip()
     except Exception as e:
         print(f"[AI_Lookup] Claude simple call error: {e}")
@@ -440,16 +749,10 @@ def lookup_newspaper_url(url: str, verify: bool = False) -> Optional[CitationMet
     prompt = f"Extract citation metadata from this article URL:\n{url}"
     
     try:
-        response = _call_openai(prompt, NEWSPAPER_URL_SYSTEM, max_tokens=500)
-        
-        if not response:
-            print("[AI_Lookup] No response from AI for newspaper URL")
-            return None
+        data = _ai_item('newspaper_url', url, lambda: _call_openai(prompt, NEWSPAPER_URL_SYSTEM, max_tokens=500))
         
-        data = _parse_json_response(response)
-        
-        if not data:
-            print(f"[AI_Lookup] Failed to parse AI response: {response[:200]}")
+        if not isinstance(data, dict):
+            print("[AI_Lookup] No usable AI response for newspaper URL")
             return None
         
         if data.get('error'):
@@ -552,16 +855,10 @@ def lookup_academic_url(url: str, verify: bool = False) -> Optional[CitationMeta
     prompt = f"Extract citation metadata from this academic publication URL:\n{url}"
     
     try:
-        response = _call_openai(prompt, ACADEMIC_URL_SYSTEM, max_tokens=500)
+        data = _ai_item('academic_url', url, lambda: _call_openai(prompt, ACADEMIC_URL_SYSTEM, max_tokens=500))
         
-        if not response:
-            print("[AI_Lookup] No response from AI for academic URL")
-            return None
-        
-        data = _parse_json_response(response)
-        
-        if not data:
-            print(f"[AI_Lookup] Failed to parse AI response: {response[:200]}")
+        if not isinstance(data, dict):
+            print("[AI_Lookup] No usable AI response for academic URL")
             return None
         
         if data.get('error'):
@@ -646,7 +943,7 @@ def classify_citation(text: str) -> Tuple[CitationType, Optional[CitationMetadat
     Returns:
         Tuple of (CitationType, optional CitationMetadata with extracted info)
     """
-    if not ACTIVE_CHAIN:
+    if not _providers_available():
         return CitationType.UNKNOWN, None
     
     prompt = f"Classify this citation:\n\n{text}"
@@ -929,25 +1226,37 @@ def lookup_parenthetical_citation_options(
         prompt += f"\nContext: {context}"
     prompt += f"\n\nReturn up to {limit} matches. JSON only."
     
-    response = _call_ai(prompt, LOOKUP_MULTI_SYSTEM, max_tokens=2000)
-    data = _parse_json_response(response)
+    data = _ai_item(
+        'options',
+        f"Authors: {authors_str}; Year: {year}",
+        lambda: _call_ai(prompt, LOOKUP_MULTI_SYSTEM, max_tokens=2000),
+        shared=context,
+        instruction=f"Return up to {limit} matches per item.",
+    )
+    results = _options_from_data(data, authors, year, limit)
     
-    if not data or not isinstance(data.get('works'), list):
+    print(f"[AI_Lookup] Found {len(results)} options")
+    return results
+
+
+def _options_from_data(data: Any, authors: List[str], year: str, limit: int) -> List[CitationMetadata]:
+    """Metadata for each work of a LOOKUP_MULTI_SYSTEM answer."""
+    if not isinstance(data, dict) or not isinstance(data.get('works'), list):
         return []
     
     results = []
     for work in data['works'][:limit]:
+        if not isinstance(work, dict):
+            continue
         meta = _dict_to_metadata(work, authors, year)
         if meta and meta.title:
             results.append(meta)
-    
-    print(f"[AI_Lookup] Found {len(results)} options")
     return results
 
 
 def _ai_lookup_authors_year(authors: List[str], year: str, context: str = "") -> Optional[CitationMetadata]:
     """Internal: Look up work by authors + year."""
-    if not ACTIVE_CHAIN:
+    if not _providers_available():
         return None
     
     print(f"[AI_Lookup] Looking up: {', '.join(authors)} ({year})")
@@ -958,10 +1267,14 @@ def _ai_lookup_authors_year(authors: List[str], year: str, context: str = "") ->
         prompt += f"\nContext: {context}"
     prompt += "\n\nJSON only."
     
-    response = _call_ai(prompt, LOOKUP_SYSTEM, max_tokens=600)
-    data = _parse_json_response(response)
+    data = _ai_item(
+        'authors_year',
+        f"Authors: {authors_str}; Year: {year}",
+        lambda: _call_ai(prompt, LOOKUP_SYSTEM, max_tokens=600),
+        shared=context,
+    )
     
-    if not data or not data.get('found'):
+    if not isinstance(data, dict) or not data.get('found'):
         print(f"[AI_Lookup] Not found: {', '.join(authors)} ({year})")
         return None
     
@@ -1024,7 +1337,7 @@ def lookup_fragment(
         >>> print(meta.title)
         "Trains, Brains, and Sprains: Railway Spine and the Origins of Psychoneuroses"
     """
-    if not ACTIVE_CHAIN:
+    if not _providers_available():
         print("[AI_Lookup] No AI providers available")
         return None
     
@@ -1036,16 +1349,32 @@ def lookup_fragment(
         prompt += f"\n\nDocument context: {gist}"
     prompt += "\n\nIdentify the published work. JSON only."
     
-    # Get AI's guess
-    response = _call_ai(prompt, FRAGMENT_SYSTEM, max_tokens=800)
-    guess = _parse_json_response(response)
+    # Get AI's guess (batched with concurrent fragment lookups for the same gist)
+    guess = _ai_item(
+        'fragment',
+        fragment,
+        lambda: _call_ai(prompt, FRAGMENT_SYSTEM, max_tokens=800),
+        shared=gist,
+    )
+    return _fragment_from_guess(guess, fragment, verify)
+
+
+def _fragment_from_guess(guess: Any, fragment: str, verify: bool = True) -> Optional[CitationMetadata]:
+    """
+    Accept or reject the AI's guess for a fragment (FRAGMENT_SYSTEM answer).
     
-    if not guess:
+    Verified against the databases unless verify=False; unverified guesses
+    only pass with high confidence.
+    """
+    if not isinstance(guess, dict) or not guess:
         print("[AI_Lookup] AI returned no guess")
         return None
     
-    confidence = guess.get('confidence', 0)
-    title = guess.get('title', '')
+    try:
+        confidence = float(guess.get('confidence') or 0)
+    except (TypeError, ValueError):
+        confidence = 0
+    title = guess.get('title') or ''
     
     print(f"[AI_Lookup] AI guess: {title[:60]}... (confidence: {confidence})")
     
@@ -1459,6 +1788,232 @@ def _dict_to_metadata(data: dict, original_authors: List[str], original_year: st
     )
 
 
+# =============================================================================
+# BATCHED LOOKUP
+# =============================================================================
+# Several citations in one request: the system prompt and the shared document
+# context are sent once, the citations are numbered, and the answers are
+# mapped back by index. Used directly by the batch_lookup_* functions, and by
+# the single-citation lookups above through _ai_item, which lets concurrent
+# lookups of the same kind and context share a request (engines/ai_batch.py).
+
+BATCH_SUFFIX = """
+
+BATCH MODE: The input lists several numbered items. Treat each item on its own, exactly as described above for a single input. Respond with a JSON array only - one object per item, in the format above, each with an added "index" field holding the item's number:
+[{"index": 1, ...}, {"index": 2, ...}]"""
+
+# kind -> (system prompt, label of the shared context, max output tokens per item, OpenAI only)
+_BATCH_KINDS: Dict[str, Tuple[str, str, int, bool]] = {
+    'fragment': (FRAGMENT_SYSTEM, 'Document context', 800, False),
+    'authors_year': (LOOKUP_SYSTEM, 'Context', 600, False),
+    'options': (LOOKUP_MULTI_SYSTEM, 'Context', 2000, False),
+    'newspaper_url': (NEWSPAPER_URL_SYSTEM, '', 500, True),
+    'academic_url': (ACADEMIC_URL_SYSTEM, '', 500, True),
+}
+
+
+def _batch_size(kind: str) -> int:
+    """Items per request for a kind (bounded by AI_BATCH_MAX_TOKENS of output)."""
+    per_item = _BATCH_KINDS[kind][2]
+    return max(1, min(AI_BATCH_SIZE, AI_BATCH_MAX_TOKENS // per_item))
+
+
+def _request_batch(kind: str, items: List[str], shared: str = "", instruction: str = "") -> List[Any]:
+    """
+    Send one request for several items of a kind.
+    
+    Args:
+        kind: Key of _BATCH_KINDS
+        items: Inputs, e.g. fragments, "Authors: ...; Year: ..." or URLs
+        shared: Document context sent once for all items
+        instruction: Extra instruction (e.g. the number of matches)
+        
+    Returns:
+        One parsed answer per item: a dict, None if no provider answered,
+        NOT_BATCHED if the response had no answer for that item
+    """
+    system, shared_label, per_item, openai_only = _BATCH_KINDS[kind]
+    
+    prompt = f"{shared_label}: {shared}\n\n" if shared and shared_label else ""
+    prompt += f"{len(items)} items:\n" + "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+    if instruction:
+        prompt += f"\n\n{instruction}"
+    prompt += "\n\nJSON array only."
+    max_tokens = min(per_item * len(items), AI_BATCH_MAX_TOKENS)
+    
+    print(f"[AI_Lookup] Batched {kind} lookup: {len(items)} items in one request")
+    if openai_only:
+        response = _call_openai(prompt, system + BATCH_SUFFIX, max_tokens)
+    else:
+        response = _call_ai(prompt, system + BATCH_SUFFIX, max_tokens)
+    if not response:
+        # A provider failure was reported already; this also covers the
+        # OpenAI-only kinds when OpenAI isn't configured
+        report_lookup_problem(PROVIDER_ERROR)
+        return [None] * len(items)
+    
+    data = _parse_json_response(response)
+    if isinstance(data, dict):
+        data = data.get('results') or data.get('items')
+    
+    answers: List[Any] = [NOT_BATCHED] * len(items)
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(entry.pop('index', 0)) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < len(items) and answers[idx] is NOT_BATCHED:
+            answers[idx] = entry
+    
+    missing = sum(1 for answer in answers if answer is NOT_BATCHED)
+    if missing:
+        print(f"[AI_Lookup] Batched {kind} response missed {missing}/{len(items)} items")
+    return answers
+
+
+def _ai_item(
+    kind: str,
+    item: str,
+    single: Callable[[], Optional[str]],
+    shared: str = "",
+    instruction: str = ""
+) -> Any:
+    """
+    Parsed AI answer for one item.
+    
+    Concurrent lookups of the same kind, context and instruction share one
+    batched request; a lookup without company (or missing from the batched
+    response) sends its own request through `single`.
+    """
+    answer = ai_batcher.submit(
+        (kind, shared, instruction),
+        item,
+        lambda items: _request_batch(kind, items, shared, instruction),
+        max_items=_batch_size(kind),
+    )
+    if answer is NOT_BATCHED:
+        return _parse_json_response(single())
+    return answer
+
+
+def _chunked_answers(kind: str, items: List[str], shared: str = "", instruction: str = "") -> List[Any]:
+    """Answers for any number of items: requests of _batch_size(kind), run concurrently."""
+    size = _batch_size(kind)
+    chunks = [items[start:start + size] for start in range(0, len(items), size)]
+    if len(chunks) == 1:
+        return _request_batch(kind, chunks[0], shared, instruction)
+    
+    with ThreadPoolExecutor(max_workers=min(4, len(chunks))) as executor:
+        futures = [submit_in_context(executor, _request_batch, kind, chunk, shared, instruction) for chunk in chunks]
+        return [answer for future in futures for answer in future.result()]
+
+
+def batch_lookup_fragments(
+    fragments: List[str],
+    gist: str = "",
+    verify: bool = True
+) -> List[Optional[CitationMetadata]]:
+    """
+    Look up several citation fragments with one request per batch.
+    
+    The gist is sent once. Every guess still goes through
+    _verify_against_databases (concurrently); a fragment the response
+    skipped falls back to lookup_fragment.
+    
+    Args:
+        fragments: Messy citations that the upstream engines couldn't resolve
+        gist: Document context shared by all of them
+        verify: Verify each AI guess against databases (anti-hallucination)
+        
+    Returns:
+        One CitationMetadata (or None) per fragment, in input order
+    """
+    if not fragments:
+        return []
+    if not _providers_available():
+        print("[AI_Lookup] No AI providers available")
+        return [None] * len(fragments)
+    
+    unique = list(dict.fromkeys(fragments))
+    answers = dict(zip(unique, _chunked_answers('fragment', unique, gist)))
+    
+    def resolve(fragment: str) -> Optional[CitationMetadata]:
+        guess = answers[fragment]
+        if guess is NOT_BATCHED:
+            return lookup_fragment(fragment, gist=gist, verify=verify)
+        return _fragment_from_guess(guess, fragment, verify)
+    
+    with ThreadPoolExecutor(max_workers=min(8, len(unique))) as executor:
+        futures = {fragment: submit_in_context(executor, resolve, fragment) for fragment in unique}
+        resolved = {fragment: future.result() for fragment, future in futures.items()}
+    
+    # Repeated fragments get their own copy
+    results, seen = [], set()
+    for fragment in fragments:
+        results.append(copy.deepcopy(resolved[fragment]) if fragment in seen else resolved[fragment])
+        seen.add(fragment)
+    return results
+
+
+def batch_lookup_parenthetical_options(
+    citation_texts: List[str],
+    context: str = "",
+    limit: int = 5
+) -> List[Optional[List[CitationMetadata]]]:
+    """
+    Get the options for several parenthetical citations with one request per batch.
+    
+    Args:
+        citation_texts: Texts like "(Simonton, 1992)"
+        context: Document context/gist shared by all of them
+        limit: Maximum options per citation
+        
+    Returns:
+        One list of options per citation, in input order (empty if unparseable
+        or not found; None if no provider answered, so the caller can retry
+        instead of treating it as not found)
+    """
+    results: List[Optional[List[CitationMetadata]]] = [[] for _ in citation_texts]
+    if not citation_texts or not _providers_available():
+        return results
+    
+    parsed: Dict[str, Tuple[List[str], str]] = {}
+    for text in citation_texts:
+        if text not in parsed:
+            found = parse_parenthetical_citation(text)
+            if found:
+                parsed[text] = found
+    if not parsed:
+        return results
+    
+    texts = list(parsed)
+    items = [f"Authors: {', '.join(parsed[t][0])}; Year: {parsed[t][1]}" for t in texts]
+    answers = dict(zip(texts, _chunked_answers(
+        'options', items, context, instruction=f"Return up to {limit} matches per item."
+    )))
+    
+    options: Dict[str, Optional[List[CitationMetadata]]] = {}
+    for text in texts:
+        answer = answers[text]
+        if answer is None:
+            # No provider answered (reported as PROVIDER_ERROR) - not a miss
+            options[text] = None
+        elif answer is NOT_BATCHED:
+            options[text] = lookup_parenthetical_citation_options(text, context=context, limit=limit)
+        else:
+            authors, year = parsed[text]
+            options[text] = _options_from_data(answer, authors, year, limit)
+    
+    for i, text in enumerate(citation_texts):
+        results[i] = copy.deepcopy(options.get(text, []))
+    unanswered = sum(1 for t in texts if options[t] is None)
+    print(f"[AI_Lookup] Batched options for {len(texts)} citations: "
+          f"{sum(1 for t in texts if options[t])} found, {unanswered} unanswered")
+    return results
+
+
 # =============================================================================
 # TESTING
 # =============================================================================
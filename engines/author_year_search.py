@@ -16,12 +16,12 @@ Created: 2025-12-10
 """
 
 import re
-import time
 from typing import Optional, List, Tuple, Dict, Any
 from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from models import CitationMetadata, CitationType
+from negative_cache import submit_in_context
 
 
 @dataclass
@@ -141,22 +141,22 @@ class AuthorDateEngine:
             # Crossref (free)
             cr = self._get_crossref()
             if cr:
-                futures[executor.submit(
-                    self._search_crossref, author, year, second_author, third_author
+                futures[submit_in_context(
+                    executor, self._search_crossref, author, year, second_author, third_author
                 )] = "crossref"
             
             # OpenAlex (free)
             oa = self._get_openalex()
             if oa:
-                futures[executor.submit(
-                    self._search_openalex, author, year, second_author, third_author
+                futures[submit_in_context(
+                    executor, self._search_openalex, author, year, second_author, third_author
                 )] = "openalex"
             
             # Google Scholar via SerpAPI (paid but cheaper than Claude)
             gs = self._get_google_scholar()
             if gs:
-                futures[executor.submit(
-                    self._search_google_scholar, author, year, second_author, third_author
+                futures[submit_in_context(
+                    executor, self._search_google_scholar, author, year, second_author, third_author
                 )] = "google_scholar"
             
             # Collect results
@@ -478,7 +478,7 @@ class AuthorDateEngine:
             return results
         
         try:
-            import requests
+            from engines.http_client import http_post
             
             # Build query with all available authors
             authors_str = author
@@ -511,7 +511,7 @@ Only respond with valid JSON, no other text."""
 
             print(f"[AuthorDateEngine] Trying GPT-4o for: {authors_str} ({year})")
             
-            response = requests.post(
+            response = http_post(
                 "https://api.openai.com/v1/chat/completions",
                 headers={
                     "Authorization": f"Bearer {api_key}",
@@ -714,10 +714,6 @@ Only respond with valid JSON, no other text."""
             except Exception as e:
                 print(f"[AuthorDateEngine] Error searching {author}, {year}: {e}")
                 results[key] = None
-            
-            # Small delay to avoid rate limiting
-            if i < total - 1:
-                time.sleep(0.5)
         
         return results
 
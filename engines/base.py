@@ -3,15 +3,23 @@ citeflex/engines/base.py
 
 Abstract base class for all search engines.
 Each engine must implement the search() method.
+
+All engines share one pooled HTTP session (engines/http_client.py) and expose
+async variants of search/search_multiple/get_by_id for concurrent fan-out.
+Identical concurrent lookups on the same engine are coalesced into one call
+(engines/single_flight.py).
 """
 
-import time
 from abc import ABC, abstractmethod
 from typing import Optional, List
 import requests
 
 from models import CitationMetadata, CitationType
 from config import DEFAULT_HEADERS, DEFAULT_TIMEOUT
+from engines.http_client import get_session, http_request, run_blocking
+from engines.single_flight import coalesced
+from negative_cache import report_lookup_problem, TIMEOUT, RATE_LIMITED
+import metrics
 
 
 class SearchEngine(ABC):
@@ -24,6 +32,14 @@ class SearchEngine(ABC):
     Engines may optionally implement:
     - search_multiple(query, limit) -> List[CitationMetadata]
     - get_by_id(id) -> CitationMetadata (for DOI, PMID, ISBN lookup)
+    
+    Async variants (search_async, search_multiple_async, get_by_id_async)
+    run the sync methods on the shared I/O pool by default; an engine with
+    a native async client can override them.
+    
+    The lookup methods listed in COALESCED_METHODS are wrapped automatically
+    in every subclass: concurrent identical calls wait for the first one
+    instead of repeating its HTTP requests.
     """
     
     # Override in subclasses
@@ -32,20 +48,27 @@ class SearchEngine(ABC):
     
     # Rate limit retry settings
     MAX_RETRIES = 2
-    RETRY_DELAY_BASE = 2  # Base delay in seconds for exponential backoff
+    
+    # Lookup methods that get single-flight coalescing in every subclass
+    COALESCED_METHODS = ('search', 'search_multiple', 'get_by_id', 'fetch_by_url')
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for attr in cls.COALESCED_METHODS:
+            method = cls.__dict__.get(attr)
+            if callable(method) and not getattr(method, '__isabstractmethod__', False):
+                setattr(cls, attr, coalesced(method))
     
     def __init__(self, api_key: Optional[str] = None, timeout: int = DEFAULT_TIMEOUT):
         self.api_key = api_key
         self.timeout = timeout
-        self._session = None
+        # Engine-specific headers (the pooled session is shared by all engines)
+        self.session_headers: dict = {}
     
     @property
     def session(self) -> requests.Session:
-        """Lazy-loaded requests session with default headers."""
-        if self._session is None:
-            self._session = requests.Session()
-            self._session.headers.update(DEFAULT_HEADERS)
-        return self._session
+        """The process-wide pooled session (keep-alive, per-host limits)."""
+        return get_session()
     
     @abstractmethod
     def search(self, query: str) -> Optional[CitationMetadata]:
@@ -99,49 +122,46 @@ class SearchEngine(ABC):
         """
         Make an HTTP request with error handling and rate limit retry.
         
-        Implements exponential backoff for 429 (Too Many Requests) responses.
+        Requests go through the shared per-host limiter / circuit breaker
+        (engines/http_client.HostGuard). A 429 teaches the limiter the
+        host's Retry-After, and the retry waits there only briefly - if the
+        host is still blocked it fails fast instead of sleeping this thread.
         
         Returns:
             Response object if successful, None on error
         """
         try:
-            merged_headers = dict(DEFAULT_HEADERS)
+            merged_headers = dict(self.session_headers)
+            merged_headers.update(DEFAULT_HEADERS)
             if headers:
                 merged_headers.update(headers)
             
             if method.upper() == "GET":
-                response = self.session.get(
+                response = http_request(
+                    "GET",
                     url,
                     params=params,
                     headers=merged_headers,
                     timeout=self.timeout
                 )
             else:
-                response = self.session.post(
+                response = http_request(
+                    "POST",
                     url,
                     json=params,
                     headers=merged_headers,
                     timeout=self.timeout
                 )
             
-            # Handle rate limiting with exponential backoff
+            # Rate limited: the limiter now knows when the host is free again
             if response.status_code == 429:
                 if retry_count < self.MAX_RETRIES:
-                    # Get retry delay from header or use exponential backoff
-                    retry_after = response.headers.get('Retry-After')
-                    if retry_after:
-                        try:
-                            delay = int(retry_after)
-                        except ValueError:
-                            delay = self.RETRY_DELAY_BASE * (2 ** retry_count)
-                    else:
-                        delay = self.RETRY_DELAY_BASE * (2 ** retry_count)
-                    
-                    print(f"[{self.name}] Rate limited. Retrying in {delay}s (attempt {retry_count + 1}/{self.MAX_RETRIES})...")
-                    time.sleep(delay)
+                    print(f"[{self.name}] Rate limited (attempt {retry_count + 1}/{self.MAX_RETRIES})...")
+                    metrics.count('http', 'retry', self.name)
                     return self._make_request(url, params, headers, method, retry_count + 1)
                 else:
                     print(f"[{self.name}] Rate limit exceeded after {self.MAX_RETRIES} retries")
+                    report_lookup_problem(RATE_LIMITED)
                     return None
             
             response.raise_for_status()
@@ -149,11 +169,32 @@ class SearchEngine(ABC):
             
         except requests.Timeout:
             print(f"[{self.name}] Request timeout after {self.timeout}s")
+            report_lookup_problem(TIMEOUT)
             return None
         except requests.RequestException as e:
             print(f"[{self.name}] Request error: {e}")
             return None
     
+    # -------------------------------------------------------------------------
+    # Async interface (shared event loop / I/O pool - see engines/http_client)
+    # -------------------------------------------------------------------------
+    
+    async def search_async(self, query: str) -> Optional[CitationMetadata]:
+        """Async search(); runs on the shared I/O pool."""
+        return await run_blocking(self.search, query)
+    
+    async def search_multiple_async(self, query: str, limit: int = 5) -> List[CitationMetadata]:
+        """Async search_multiple(); runs on the shared I/O pool."""
+        return await run_blocking(self.search_multiple, query, limit)
+    
+    async def get_by_id_async(self, identifier: str) -> Optional[CitationMetadata]:
+        """Async get_by_id(); runs on the shared I/O pool."""
+        return await run_blocking(self.get_by_id, identifier)
+    
+    async def _make_request_async(self, *args, **kwargs) -> Optional[requests.Response]:
+        """Async _make_request(); same arguments and error handling."""
+        return await run_blocking(self._make_request, *args, **kwargs)
+    
     def _create_metadata(
         self,
         citation_type: CitationType,
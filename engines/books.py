@@ -21,10 +21,11 @@ Version History:
     2025-12-05 20:30: Moved from root to engines/ directory
 """
 
-import requests
 import re
 import os
 
+from engines.http_client import http_get
+
 # WorldCat API key (optional - get from https://www.worldcat.org/webservices/)
 WORLDCAT_API_KEY = os.environ.get('WORLDCAT_API_KEY', '')
 
@@ -494,7 +495,7 @@ class OpenLibraryAPI:
                 'jscmd': 'data' # 'data' endpoint gives rich metadata including places
             }
             
-            response = requests.get(OpenLibraryAPI.BASE_URL, params=params, timeout=5)
+            response = http_get(OpenLibraryAPI.BASE_URL, params=params, timeout=5)
             data = response.json()
             
             if key in data:
@@ -549,7 +550,7 @@ class OpenLibraryAPI:
                 'fields': 'title,author_name,publisher,publish_year,isbn'
             }
             
-            response = requests.get(OpenLibraryAPI.SEARCH_URL, params=params, timeout=5)
+            response = http_get(OpenLibraryAPI.SEARCH_URL, params=params, timeout=5)
             data = response.json()
             
             candidates = []
@@ -630,7 +631,7 @@ class GoogleBooksAPI:
             
             for q in queries_to_try:
                 params = {'q': q, 'maxResults': 3, 'printType': 'books', 'orderBy': 'relevance'}
-                response = requests.get(GoogleBooksAPI.BASE_URL, params=params, timeout=5)
+                response = http_get(GoogleBooksAPI.BASE_URL, params=params, timeout=5)
                 
                 if response.status_code == 200:
                     items = response.json().get('items', [])
@@ -701,7 +702,7 @@ class LibraryOfCongressAPI:
                 'c': 3  # max 3 results
             }
             
-            response = requests.get(LibraryOfCongressAPI.SEARCH_URL, params=params, timeout=8)
+            response = http_get(LibraryOfCongressAPI.SEARCH_URL, params=params, timeout=8)
             
             if response.status_code == 200:
                 data = response.json()
@@ -797,7 +798,7 @@ class WorldCatAPI:
                 'count': 3
             }
             
-            response = requests.get(WorldCatAPI.SEARCH_URL, params=params, timeout=8)
+            response = http_get(WorldCatAPI.SEARCH_URL, params=params, timeout=8)
             
             if response.status_code == 200:
                 data = response.json()
@@ -883,7 +884,7 @@ class InternetArchiveAPI:
                 'output': 'json'
             }
             
-            response = requests.get(InternetArchiveAPI.SEARCH_URL, params=params, timeout=8)
+            response = http_get(InternetArchiveAPI.SEARCH_URL, params=params, timeout=8)
             
             if response.status_code == 200:
                 data = response.json()
@@ -2,6 +2,10 @@
 citeflex/engines/doi.py
 
 DOI extraction and academic publisher URL handling.
+
+Version History:
+    2026-10-16: Publisher domains are matched through domain_index (hash lookup
+                of the host and its parent domains, most specific first)
 """
 
 import re
@@ -9,6 +13,7 @@ from typing import Optional
 from urllib.parse import urlparse
 
 from models import CitationMetadata
+from domain_index import classify_domain
 
 
 # Academic publisher domains and their DOI URL patterns
@@ -64,19 +69,19 @@ def extract_doi_from_url(url: str) -> Optional[str]:
             if path.startswith('10.'):
                 return path
         
-        # Check each publisher pattern
-        for pub_domain, pattern in ACADEMIC_PUBLISHER_DOMAINS.items():
-            if pub_domain in domain:
-                match = re.search(pattern, url, re.IGNORECASE)
-                if match:
-                    extracted = match.group(1)
-                    # For ScienceDirect, we got PII not DOI
-                    if 'sciencedirect' in domain:
-                        return None  # Need different handling
-                    # Ensure it looks like a DOI
-                    if extracted.startswith('10.'):
-                        return extracted
-                    return None
+        # Check the publisher's pattern (indexed by domain, see domain_index.py)
+        pub_domain = classify_domain(url).academic_publisher
+        if pub_domain:
+            match = re.search(ACADEMIC_PUBLISHER_DOMAINS[pub_domain], url, re.IGNORECASE)
+            if match:
+                extracted = match.group(1)
+                # For ScienceDirect, we got PII not DOI
+                if 'sciencedirect' in domain:
+                    return None  # Need different handling
+                # Ensure it looks like a DOI
+                if extracted.startswith('10.'):
+                    return extracted
+                return None
         
         # Generic DOI pattern in URL
         doi_match = re.search(r'(10\.\d{4,}/[^\s&?#]+)', url)
@@ -102,18 +107,7 @@ def is_academic_publisher_url(url: str) -> bool:
     if not url:
         return False
     
-    try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower().replace('www.', '')
-        
-        for pub_domain in ACADEMIC_PUBLISHER_DOMAINS:
-            if pub_domain in domain:
-                return True
-        
-        return False
-        
-    except Exception:
-        return False
+    return classify_domain(url).academic_publisher is not None
 
 
 def fetch_crossref_by_doi(doi: str) -> Optional[CitationMetadata]:
@@ -26,6 +26,7 @@ from engines.base import SearchEngine
 from models import CitationMetadata, CitationType
 from config import DEFAULT_HEADERS, NEWSPAPER_DOMAINS, GOV_AGENCY_MAP
 from engines.gov_ngo_domains import get_org_author as get_org_author_from_cache
+from domain_index import classify_domain
 
 # Try to import AI org lookup - optional fallback for .org domains
 try:
@@ -61,7 +62,8 @@ class GenericURLEngine(SearchEngine):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # Use browser-like headers to avoid being blocked
-        self.session.headers.update({
+        # (per-engine: the pooled session is shared by every engine)
+        self.session_headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
@@ -1364,9 +1366,8 @@ class GenericURLEngine(SearchEngine):
             domain = parsed.netloc.lower().replace('www.', '')
             
             # Newspaper
-            for news_domain in NEWSPAPER_DOMAINS:
-                if news_domain in domain:
-                    return CitationType.NEWSPAPER
+            if classify_domain(url).newspaper:
+                return CitationType.NEWSPAPER
             
             # Government
             if '.gov' in domain:
@@ -1760,15 +1761,7 @@ class NewspaperEngine(GenericURLEngine):
         
         # Ensure newspaper field is set
         if not result.newspaper:
-            try:
-                parsed = urlparse(url)
-                domain = parsed.netloc.lower().replace('www.', '')
-                for news_domain, name in NEWSPAPER_DOMAINS.items():
-                    if news_domain in domain:
-                        result.newspaper = name
-                        break
-            except:
-                pass
+            result.newspaper = classify_domain(url).newspaper
         
         return result
 
@@ -18,7 +18,7 @@ Sources:
     - Official organization websites
     - APA/Chicago citation guides
 
-Last updated: 2025-12-15
+Last updated: 2026-10-16 (get_org_author looks domains up through domain_index)
 """
 
 # =============================================================================
@@ -476,21 +476,10 @@ def get_org_author(url_or_domain: str) -> str | None:
         >>> get_org_author("https://www.cdc.gov/some/page.html")
         "Centers for Disease Control and Prevention"
     """
-    domain = normalize_domain(url_or_domain)
-    
-    # Try exact match first
-    if domain in ORG_DOMAINS:
-        return ORG_DOMAINS[domain]
-    
-    # Try matching subdomains (e.g., "cancer.gov" should match if we have it)
-    # Also try parent domains (e.g., "sub.cdc.gov" should match "cdc.gov")
-    parts = domain.split(".")
-    for i in range(len(parts) - 1):
-        parent_domain = ".".join(parts[i:])
-        if parent_domain in ORG_DOMAINS:
-            return ORG_DOMAINS[parent_domain]
-    
-    return None
+    # Exact domain, then parent domains ("sub.cdc.gov" -> "cdc.gov"),
+    # as hash lookups in the shared domain index
+    from domain_index import classify_domain
+    return classify_domain(url_or_domain).org_author
 
 
 def is_org_domain(url_or_domain: str) -> bool:
@@ -0,0 +1,588 @@
+"""
+citeflex/engines/http_client.py
+
+Shared, pooled HTTP client for all engines - sync and asyncio.
+
+Before this module every SearchEngine owned its own requests.Session, and
+books.py, superlegal.py, legal.py and ai_lookup.py called module-level
+requests.get/post (a new TCP + TLS handshake per call). _route_journal also
+built a fresh ThreadPoolExecutor for every query. Now:
+
+- ONE requests.Session per process, with a bounded connection pool per host
+  (keep-alive, TLS reuse); http_get/http_post are drop-in replacements for
+  requests.get/post
+- ONE background asyncio loop with ONE bounded I/O thread pool; engines expose
+  async search/search_multiple/get_by_id (see SearchEngine) that run there,
+  and run_sync() lets synchronous Flask code await them
+- gather_with_deadline() fans out coroutines and keeps whatever finished in
+  time, replacing per-query executors + as_completed
+- fan_out() adds early exit (stop as soon as a result is good enough) and
+  hedging (start backup calls only when the primaries are slower than
+  their usual p95, tracked per call name by engine_latency)
+
+requests has no native asyncio transport and no async HTTP library is in
+requirements.txt, so async calls run the pooled session on the shared I/O
+pool. The interface is what matters: engines can later override the async
+methods with a native client without touching callers.
+
+Context variables (e.g. negative_cache problem tracking) are carried from
+the caller into the loop and into I/O threads.
+
+Every pooled request also passes through a per-host HostGuard:
+
+- Token bucket per host (config.HOST_RATE_LIMITS). A request waits at most
+  RATE_LIMIT_MAX_WAIT for a token; otherwise it fails fast with
+  HostUnavailable instead of parking the thread
+- Adaptive: a 429 halves the host's rate and blocks it until Retry-After;
+  successes slowly restore the configured rate
+- Circuit breaker: after BREAKER_FAILURE_THRESHOLD consecutive failures
+  (timeouts, connection errors, 5xx, 429) the host is skipped for
+  BREAKER_COOLDOWN seconds, then a single trial request is let through
+
+Created: 2026-10-16
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    HTTP_POOL_HOSTS,
+    HTTP_POOL_PER_HOST,
+    HTTP_IO_WORKERS,
+    HOST_RATE_LIMITS,
+    DEFAULT_HOST_RATE,
+    RATE_LIMIT_MAX_WAIT,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_COOLDOWN,
+)
+from negative_cache import report_lookup_problem, TIMEOUT, RATE_LIMITED, PROVIDER_ERROR
+import metrics
+
+
+# =============================================================================
+# PER-HOST RATE LIMITING + CIRCUIT BREAKER
+# =============================================================================
+
+class HostUnavailable(requests.ConnectionError):
+    """
+    Raised instead of sending a request when its host is rate limited or
+    its circuit is open. Subclasses requests.ConnectionError so existing
+    `except requests.RequestException` handlers treat it as a failed call.
+    """
+    
+    def __init__(self, host: str, reason: str, retry_in: float = 0.0):
+        self.host = host
+        self.reason = reason
+        self.retry_in = retry_in
+        super().__init__(f"{host} unavailable ({reason}), retry in {retry_in:.1f}s")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta-seconds or HTTP-date) into seconds.
+    
+    Returns:
+        Seconds to wait, or None if missing/unparseable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class _HostState:
+    """Token bucket + breaker state for one host."""
+    
+    def __init__(self, rate: float, burst: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0       # from Retry-After
+        self.failures = 0              # consecutive
+        self.open_until = 0.0          # breaker open while now < open_until
+        self.trial_in_flight = False   # half-open probe
+
+
+class HostGuard:
+    """
+    Shared per-host limiter and circuit breaker.
+    
+    Usage (done for you by http_request):
+        guard.acquire(host)          # may wait briefly or raise HostUnavailable
+        ...send request...
+        guard.record(host, status)   # or guard.record_failure(host)
+    """
+    
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        default: Tuple[float, float],
+        max_wait: float,
+        failure_threshold: int,
+        cooldown: float
+    ):
+        self.limits = dict(limits)
+        self.default = default
+        self.max_wait = max_wait
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+    
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            rate, burst = self.limits.get(host, self.default)
+            state = self._hosts[host] = _HostState(rate, burst)
+        return state
+    
+    def acquire(self, host: str) -> None:
+        """
+        Take a token for host, waiting at most max_wait.
+        
+        Raises:
+            HostUnavailable: Circuit open, or no token within max_wait
+        """
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            
+            # Circuit breaker
+            if now < state.open_until:
+                raise HostUnavailable(host, 'circuit open', state.open_until - now)
+            if state.failures >= self.failure_threshold:
+                # Cool-down over: half-open, let exactly one probe through
+                if state.trial_in_flight:
+                    raise HostUnavailable(host, 'circuit half-open', self.cooldown)
+                state.trial_in_flight = True
+            
+            # Token bucket (plus any Retry-After block)
+            state.tokens = min(state.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            wait = max(0.0, state.blocked_until - now)
+            if state.tokens < 1:
+                wait = max(wait, (1 - state.tokens) / state.rate)
+            
+            if wait > self.max_wait:
+                state.trial_in_flight = False
+                raise HostUnavailable(host, 'rate limited', wait)
+            
+            # Reserve the token now so concurrent callers queue behind us
+            state.tokens -= 1
+        
+        if wait > 0:
+            time.sleep(wait)
+    
+    def record(self, host: str, status_code: int, retry_after: Optional[float] = None) -> None:
+        """Learn from a response."""
+        if status_code == 429:
+            with self._lock:
+                state = self._state(host)
+                state.rate = max(state.base_rate / 16, state.rate / 2)
+                delay = retry_after if retry_after is not None else 1 / state.rate
+                state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+                print(f"[HostGuard] {host} rate limited: {state.rate:.2f} req/s, paused {delay:.1f}s")
+            self.record_failure(host)
+        elif status_code >= 500:
+            self.record_failure(host)
+        else:
+            with self._lock:
+                state = self._state(host)
+                state.failures = 0
+                state.trial_in_flight = False
+                state.open_until = 0.0
+                # Recover gradually toward the configured rate
+                state.rate = min(state.base_rate, state.rate * 1.1)
+    
+    def record_failure(self, host: str) -> None:
+        """Count a timeout / connection error / server error."""
+        with self._lock:
+            state = self._state(host)
+            state.failures += 1
+            state.trial_in_flight = False
+            if state.failures >= self.failure_threshold:
+                state.open_until = time.monotonic() + self.cooldown
+                print(f"[HostGuard] Circuit OPEN for {host} ({state.failures} consecutive failures), skipping {self.cooldown}s")
+    
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot for diagnostics."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    'rate': round(state.rate, 2),
+                    'failures': state.failures,
+                    'circuit_open': now < state.open_until,
+                    'blocked_for': round(max(0.0, state.blocked_until - now), 1),
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+host_guard = HostGuard(
+    HOST_RATE_LIMITS,
+    DEFAULT_HOST_RATE,
+    max_wait=RATE_LIMIT_MAX_WAIT,
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    cooldown=BREAKER_COOLDOWN,
+)
+
+
+# =============================================================================
+# SHARED SESSION (sync)
+# =============================================================================
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Get the process-wide pooled session.
+
+    Connections are kept alive and reused per host. At most
+    HTTP_POOL_PER_HOST connections are open to any one host; extra requests
+    wait for a free connection instead of opening more.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_HOSTS,
+                    pool_maxsize=HTTP_POOL_PER_HOST,
+                    pool_block=True,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Drop-in for requests.request() on the pooled session.
+    
+    Goes through host_guard: may wait briefly for a rate-limit token, and
+    raises HostUnavailable (a requests.ConnectionError) without sending
+    anything if the host is rate limited or its circuit is open. Connection
+    errors and 5xx responses are reported to the negative cache as
+    PROVIDER_ERROR, so a miss they cause is retried soon.
+    """
+    host = (urlsplit(url).hostname or '').lower()
+    
+    try:
+        host_guard.acquire(host)
+    except HostUnavailable as e:
+        print(f"[HostGuard] Skipping request: {e}")
+        metrics.count('http', 'skipped', host)
+        report_lookup_problem(RATE_LIMITED if e.reason == 'rate limited' else TIMEOUT)
+        raise
+    
+    start = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except requests.Timeout:
+        host_guard.record_failure(host)
+        metrics.count('http', 'timeout', host)
+        raise
+    except requests.ConnectionError:
+        host_guard.record_failure(host)
+        metrics.count('http', 'connection_error', host)
+        report_lookup_problem(PROVIDER_ERROR)
+        raise
+    except Exception:
+        # ChunkedEncodingError, TooManyRedirects, ... - also ends a half-open
+        # probe, which would otherwise keep the circuit from ever closing
+        host_guard.record_failure(host)
+        metrics.count('http', 'error', host)
+        report_lookup_problem(PROVIDER_ERROR)
+        raise
+    finally:
+        metrics.observe('http', host, time.perf_counter() - start)
+    
+    metrics.count('http', f"status_{response.status_code // 100}xx", host)
+    if response.status_code >= 500:
+        # The engine didn't answer - a miss now says nothing about the citation
+        report_lookup_problem(PROVIDER_ERROR)
+    if not kwargs.get('stream'):
+        metrics.count('bytes', 'fetched', host, len(response.content))
+    
+    retry_after = parse_retry_after(response.headers.get('Retry-After')) if response.status_code == 429 else None
+    host_guard.record(host, response.status_code, retry_after)
+    return response
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """Drop-in for requests.get() on the pooled, guarded session."""
+    return http_request('GET', url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    """Drop-in for requests.post() on the pooled, guarded session."""
+    return http_request('POST', url, **kwargs)
+
+
+# =============================================================================
+# SHARED EVENT LOOP (async)
+# =============================================================================
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Get the background event loop, starting it on first use."""
+    global _loop, _io_pool
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _io_pool = ThreadPoolExecutor(max_workers=HTTP_IO_WORKERS, thread_name_prefix='http-io')
+                loop.set_default_executor(_io_pool)
+                thread = threading.Thread(target=loop.run_forever, name='http-loop', daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Await a blocking call on the shared I/O pool, preserving context vars.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(None, lambda: ctx.run(fn, *args, **kwargs))
+
+
+async def async_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Async http_request() on the shared pool."""
+    return await run_blocking(http_request, method, url, **kwargs)
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the background loop and wait for its result.
+
+    Called from synchronous code (Flask request threads). The caller's
+    context variables are visible inside the coroutine.
+
+    Args:
+        coro: The coroutine to run
+        timeout: Seconds to wait (None = no limit)
+
+    Raises:
+        concurrent.futures.TimeoutError: If the timeout expires
+    """
+    loop = get_loop()
+    ctx = contextvars.copy_context()
+    result: Future = Future()
+
+    def start():
+        # Tasks copy the *current* context at creation - create it inside ctx
+        task = ctx.run(loop.create_task, coro)
+
+        def done(t: asyncio.Task):
+            if t.cancelled():
+                result.cancel()
+            elif t.exception() is not None:
+                result.set_exception(t.exception())
+            else:
+                result.set_result(t.result())
+
+        task.add_done_callback(done)
+
+    loop.call_soon_threadsafe(start)
+    return result.result(timeout=timeout)
+
+
+async def gather_with_deadline(
+    calls: Dict[str, Awaitable],
+    timeout: float
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Run named coroutines concurrently; keep the ones that finish in time.
+
+    Args:
+        calls: name -> coroutine
+        timeout: Seconds to wait for all of them
+
+    Returns:
+        (results by name for calls that completed without error,
+         True if any call was still running at the deadline)
+    """
+    if not calls:
+        return {}, False
+
+    tasks = {asyncio.ensure_future(coro): name for name, coro in calls.items()}
+    done, pending = await asyncio.wait(tasks.keys(), timeout=timeout)
+
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is None:
+            results[tasks[task]] = task.result()
+
+    return results, bool(pending)
+
+
+# =============================================================================
+# EARLY-EXIT / HEDGED FAN-OUT
+# =============================================================================
+
+class LatencyTracker:
+    """Rolling per-name latency samples (seconds) for hedging decisions."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, name: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Latency percentile for name.
+
+        Returns:
+            Seconds, or None if fewer than min_samples are recorded
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+engine_latency = LatencyTracker()
+
+
+async def _timed(name: str, factory: Callable[[], Awaitable]) -> Any:
+    """
+    Await factory() and record how long it took under name.
+
+    A call cancelled by fan_out (early exit, deadline, hedging) is recorded
+    with the time it had run so far: a lower bound, but without it only the
+    fast completions would feed the percentile and hedge delays would drift
+    ever lower.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        result = await factory()
+    except asyncio.CancelledError:
+        engine_latency.record(name, loop.time() - start)
+        raise
+    engine_latency.record(name, loop.time() - start)
+    return result
+
+
+async def fan_out(
+    primary: Dict[str, Callable[[], Awaitable]],
+    timeout: float,
+    accept: Optional[Callable[[str, Any], bool]] = None,
+    hedges: Optional[Dict[str, Callable[[], Awaitable]]] = None,
+    hedge_after: Optional[float] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Fan out named calls; stop early once one is good enough.
+
+    - accept(name, result) is called as each call completes; the first True
+      ends the fan-out and the stragglers are cancelled (their blocking
+      work finishes in the background and is ignored; engine_latency still
+      records how long they had run)
+    - hedges are only started after hedge_after seconds, or as soon as all
+      primaries have finished without an accepted result
+
+    Args:
+        primary: name -> zero-argument coroutine factory, started at once
+        timeout: Overall deadline in seconds
+        accept: Early-exit predicate (None = wait for everything)
+        hedges: name -> factory for backup calls (None = no hedging)
+        hedge_after: Seconds before hedges start (None = when primaries finish)
+
+    Returns:
+        (results by name for calls that completed without error,
+         True if the deadline expired with calls still running)
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + timeout
+    tasks: Dict[asyncio.Future, str] = {}
+
+    def launch(group: Dict[str, Callable[[], Awaitable]]) -> set:
+        started = set()
+        for name, factory in group.items():
+            task = asyncio.ensure_future(_timed(name, factory))
+            tasks[task] = name
+            started.add(task)
+        return started
+
+    pending = launch(primary)
+    hedges_started = not hedges
+    if not hedges_started and not pending:
+        pending = launch(hedges)
+        hedges_started = True
+
+    results: Dict[str, Any] = {}
+    accepted = False
+
+    while pending and not accepted:
+        now = loop.time()
+        if now >= deadline:
+            break
+        wait_for = deadline - now
+        if not hedges_started and hedge_after is not None:
+            wait_for = min(wait_for, max(0.0, start + hedge_after - now))
+
+        done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            if task.cancelled() or task.exception() is not None:
+                continue
+            name = tasks[task]
+            results[name] = task.result()
+            if accept is not None and not accepted and accept(name, results[name]):
+                accepted = True
+
+        if accepted or hedges_started:
+            continue
+        hedge_due = hedge_after is not None and loop.time() >= start + hedge_after
+        if hedge_due or not pending:
+            print(f"[HTTPClient] Hedging with {', '.join(hedges)} after {loop.time() - start:.2f}s")
+            pending |= launch(hedges)
+            hedges_started = True
+
+    for task in pending:
+        task.cancel()
+
+    return results, bool(pending) and not accepted
@@ -36,12 +36,12 @@ Features:
 
 import re
 import difflib
-import requests
 import time
 from typing import Optional, List, Dict
 from urllib.parse import urlparse, unquote
 
 from engines.base import SearchEngine
+from engines.http_client import http_get
 from models import CitationMetadata, CitationType
 from config import COURTLISTENER_API_KEY
 
@@ -618,7 +618,7 @@ class CourtListenerEngine(SearchEngine):
                 'order_by': 'score desc',
                 'format': 'json'
             }
-            response = requests.get(
+            response = http_get(
                 self.base_url,
                 params=params,
                 headers=self.headers,
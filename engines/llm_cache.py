@@ -0,0 +1,284 @@
+"""
+citeflex/engines/llm_cache.py
+
+Persistent cache of LLM responses, keyed on provider, model and prompt.
+
+The AI layer (engines/ai_lookup.py) sent the same prompts again on every
+upload: the same fragment with the same gist, the same classification
+request, the same organization name for a domain. Academic users cite the
+same canon, so many prompts repeat across documents and users. Responses are
+now kept in a local SQLite file:
+
+- Key: SHA-256 of (provider, model, system, prompt, max_tokens) - a
+  different model or system prompt never reuses an answer
+- Entries expire after LLM_CACHE_TTL (callers pass a shorter TTL for
+  error / not-found answers and skip unusable ones); the file is kept under
+  LLM_CACHE_MAX_MB by evicting expired, then least recently used, entries
+- A hit is logged through cost_tracker.log_api_call with the original token
+  counts at zero cost, so usage reports still see the tokens
+- LLM_CACHE=off disables the cache; `with bypass_llm_cache():` skips it
+  (no reads, no writes) for the calls made inside the block
+- SQLite in WAL mode, so all gunicorn workers on the host share the file
+
+Usage:
+    from engines.llm_cache import get_llm_cache
+
+    cache = get_llm_cache()
+    text = cache.get('openai', OPENAI_MODEL, system, prompt, max_tokens)
+    if text is None:
+        text = ...  # call the provider
+        cache.put('openai', OPENAI_MODEL, system, prompt, max_tokens, text, input_tokens, output_tokens)
+
+Created: 2026-10-16
+"""
+
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import metrics
+
+# Evict down to this share of the size limit, so eviction doesn't run on every put
+_EVICT_TARGET = 0.9
+
+_bypass: contextvars.ContextVar = contextvars.ContextVar('llm_cache_bypass', default=False)
+
+
+@contextmanager
+def bypass_llm_cache():
+    """Skip the response cache (reads and writes) for AI calls in the block."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_key(provider: str, model: str, system: str, prompt: str, max_tokens: int) -> str:
+    """SHA-256 key of everything that determines a response."""
+    payload = json.dumps([provider, model, system or '', prompt or '', max_tokens], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class LLMResponseCache:
+    """
+    SQLite-backed response cache with a TTL and a size limit.
+
+    Falls back to a no-op if the file can't be opened.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 30 * 24 * 3600, max_bytes: int = 200 * 1024 * 1024):
+        """
+        Args:
+            db_path: SQLite file ("" disables the cache)
+            ttl_seconds: How long a response stays valid
+            max_bytes: Size limit of the stored responses
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+        if db_path:
+            self._open_db(db_path)
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def get(
+        self,
+        provider: str,
+        model: str,
+        system: str,
+        prompt: str,
+        max_tokens: int,
+        function: str = 'ai_lookup'
+    ) -> Optional[str]:
+        """
+        Cached response text, or None.
+
+        A hit is logged to cost_tracker (as `function`) with its token
+        counts at zero cost.
+        """
+        if self._db is None or _bypass.get():
+            return None
+
+        key = cache_key(provider, model, system, prompt, max_tokens)
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT response, input_tokens, output_tokens FROM llm_cache"
+                    " WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[LLMCache] Read error: {e}")
+            return None
+
+        if row is None:
+            self._misses += 1
+            metrics.count('llm_cache', 'miss', provider)
+            return None
+
+        self._hits += 1
+        metrics.count('llm_cache', 'hit', provider)
+        from cost_tracker import log_api_call
+        log_api_call(provider, row[1], row[2], prompt[:100], function, cached=True)
+        return row[0]
+
+    def put(
+        self,
+        provider: str,
+        model: str,
+        system: str,
+        prompt: str,
+        max_tokens: int,
+        response: Optional[str],
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        ttl_seconds: Optional[float] = None
+    ) -> None:
+        """Store a response (empty responses are not cached) for ttl_seconds (default: self.ttl_seconds)."""
+        if self._db is None or _bypass.get() or not response:
+            return
+
+        key = cache_key(provider, model, system, prompt, max_tokens)
+        now = time.time()
+        size = len(response.encode('utf-8')) + len(key)
+        try:
+            with self._lock:
+                old = self._db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache"
+                    " (key, provider, model, response, input_tokens, output_tokens, size, created_at, last_used, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, provider, model, response, input_tokens or 0, output_tokens or 0,
+                     size, now, now, now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds))
+                )
+                self._size += size - (old[0] if old else 0)
+                if self._size > self.max_bytes:
+                    self._evict(now)
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[LLMCache] Write error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for diagnostics."""
+        total = self._hits + self._misses
+        return {
+            'enabled': self.enabled,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / total, 3) if total else 0.0,
+            'bytes': self._size,
+            'evicted': self._evicted,
+        }
+
+    def clear(self) -> None:
+        """Delete every cached response."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM llm_cache")
+            self._db.commit()
+            self._size = 0
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _evict(self, now: float) -> None:
+        """Drop expired, then least recently used entries (caller holds the lock)."""
+        removed = self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,)).rowcount
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+        target = self.max_bytes * _EVICT_TARGET
+        if self._size > target:
+            excess = self._size - target
+            rows = self._db.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall()
+            doomed = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((key,))
+                excess -= size
+                self._size -= size
+            self._db.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+            removed += len(doomed)
+
+        self._evicted += removed
+        print(f"[LLMCache] Evicted {removed} responses ({self._size} bytes kept)")
+
+    def _open_db(self, db_path: str) -> None:
+        """Open (or create) the SQLite file; disabled on failure."""
+        try:
+            conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " provider TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " input_tokens INTEGER NOT NULL DEFAULT 0,"
+                " output_tokens INTEGER NOT NULL DEFAULT 0,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+            self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            self._db = conn
+            print(f"[LLMCache] Response cache at {db_path} ({self._size} bytes)")
+        except sqlite3.Error as e:
+            print(f"[LLMCache] Could not open {db_path}, caching disabled: {e}")
+            self._db = None
+
+
+# =============================================================================
+# PROCESS-WIDE INSTANCE
+# =============================================================================
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Get the process-wide cache, creating it from config on first use.
+
+    Returns:
+        The LLMResponseCache singleton (a no-op if LLM_CACHE is off)
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                from config import LLM_CACHE_ENABLED, LLM_CACHE_DB, LLM_CACHE_TTL, LLM_CACHE_MAX_MB
+                _llm_cache = LLMResponseCache(
+                    db_path=LLM_CACHE_DB if LLM_CACHE_ENABLED else '',
+                    ttl_seconds=LLM_CACHE_TTL,
+                    max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+                )
+    return _llm_cache
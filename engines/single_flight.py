@@ -0,0 +1,186 @@
+"""
+citeflex/engines/single_flight.py
+
+Request coalescing ("single-flight") for identical in-flight lookups.
+
+The same query often reaches an engine from several threads at once: two
+notes citing the same DOI in one document, or two users uploading the same
+reading list. Without coalescing each thread pays for its own HTTP / AI
+call. With it, the first caller (the leader) does the work and concurrent
+callers with the same key wait for, and share, its result:
+
+- Nothing is cached: once the leader finishes the key is released, so the
+  next call runs normally (caching is the metadata caches' job)
+- Followers get a deep copy of the result, so nobody mutates a shared
+  CitationMetadata
+- Exceptions raised by the leader are re-raised in every follower
+- Lookup problems (timeouts, rate limits - see negative_cache) reported
+  while the leader ran are replayed into each follower's tracker
+- Re-entrant: a leader that calls back into the same key runs it directly
+- Coalesced engine methods are timed per engine (metrics 'engine' stage)
+
+SearchEngine applies @coalesced to search / search_multiple / get_by_id /
+fetch_by_url of every subclass, and ai_lookup._call_ai coalesces on
+(system, prompt, max_tokens), so call sites don't change.
+
+Created: 2026-10-16
+"""
+
+import copy
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import metrics
+from negative_cache import track_lookup_problems, report_lookup_problem
+
+
+# =============================================================================
+# SINGLE-FLIGHT GROUP
+# =============================================================================
+
+class _Call:
+    """One in-flight call and the threads waiting on it."""
+
+    __slots__ = ('leader', 'done', 'result', 'error', 'problems')
+
+    def __init__(self, leader: int):
+        self.leader = leader
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.problems: set = set()
+
+
+class SingleFlight:
+    """
+    Thread-safe group of in-flight calls keyed by a hashable key.
+
+    Usage:
+        flight = SingleFlight()
+        result = flight.do(('crossref', 'get_by_id', doi), engine.get_by_id, doi)
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs), or wait for an identical call already running.
+
+        Args:
+            key: Identifies "the same call"
+            fn: The function to run if no identical call is in flight
+
+        Returns:
+            fn's result (a deep copy for followers)
+        """
+        me = threading.get_ident()
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call(me)
+                role = 'leader'
+                self._leaders += 1
+            elif call.leader == me:
+                role = 'reentrant'
+            else:
+                role = 'follower'
+                self._coalesced += 1
+
+        if role == 'reentrant':
+            return fn(*args, **kwargs)
+
+        if role == 'leader':
+            try:
+                with track_lookup_problems() as problems:
+                    call.result = fn(*args, **kwargs)
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                call.problems = set(problems)
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        call.done.wait()
+        for reason in call.problems:
+            report_lookup_problem(reason)
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def is_leader(self, key: Hashable) -> bool:
+        """True if the current thread is already running the call for key."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call is not None and call.leader == threading.get_ident()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for diagnostics."""
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'calls': self._leaders, 'coalesced': self._coalesced, 'in_flight': in_flight}
+
+
+# Process-wide group shared by all engines and the AI layer
+lookup_flight = SingleFlight()
+
+
+# =============================================================================
+# KEYS + DECORATOR
+# =============================================================================
+
+def _normalize_arg(value: Any) -> Any:
+    """Collapse whitespace in strings; other values are used as-is."""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    return value
+
+
+def call_key(scope: Tuple, args: tuple, kwargs: dict) -> Optional[Tuple]:
+    """
+    Build a single-flight key from a scope and call arguments.
+
+    Returns:
+        Hashable key, or None if an argument is unhashable (don't coalesce)
+    """
+    key = (
+        scope,
+        tuple(_normalize_arg(a) for a in args),
+        tuple(sorted((k, _normalize_arg(v)) for k, v in kwargs.items())),
+    )
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def coalesced(method: Callable) -> Callable:
+    """
+    Decorator for engine methods: identical concurrent calls on engines of
+    the same class and name share one execution.
+    """
+    if getattr(method, '_single_flight', False):
+        return method
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        engine_name = getattr(self, 'name', '')
+        scope = (type(self).__qualname__, engine_name, method.__name__)
+        key = call_key(scope, args, kwargs)
+        if key is None or lookup_flight.is_leader(key):
+            # Unhashable arguments, or a nested call (e.g. super().search) - run directly
+            return method(self, *args, **kwargs)
+        with metrics.timed('engine', f"{engine_name}.{method.__name__}"):
+            return lookup_flight.do(key, method, self, *args, **kwargs)
+
+    wrapper._single_flight = True
+    return wrapper
@@ -4,6 +4,11 @@ citeflex/engines/superlegal.py
 Unified Legal Citation Engine - Merged from court.py + legal.py
 
 Version History:
+    2026-10-16: is_legal_citation matches URL hosts against an indexed
+                KNOWN_LEGAL_DOMAINS table (domain_index.DomainTable)
+    2026-10-16: is_legal_citation reads its pattern signals from the single-pass
+                detectors.scan_signals; the fuzzy famous-case match runs last, only
+                for ambiguous text, and only against keys of a compatible length
     2025-12-06 16:00: Added _extract_case_name() to fix cache lookup bug.
                       Now extracts "Loving v Virginia" from "Loving v. Virginia, 388 U.S. 1 (1967)"
                       before cache lookup, ensuring famous cases are found even when
@@ -25,14 +30,16 @@ Features:
 
 import re
 import difflib
-import requests
 import time
 from typing import Optional, List, Dict
 from urllib.parse import urlparse, unquote
 
 from engines.base import SearchEngine
+from engines.http_client import http_get
 from models import CitationMetadata, CitationType
 from config import COURTLISTENER_API_KEY
+from domain_index import DomainTable, split_url
+from detectors import scan_signals, LEGAL_CITATION_FEATURES, URL_IN_TEXT_PATTERN
 
 
 # =============================================================================
@@ -230,6 +237,34 @@ def _extract_case_name(text: str) -> str:
     return text  # Fallback to original
 
 
+# FAMOUS_CASES keys grouped by length, for _fuzzy_candidates
+_keys_by_length: Dict[int, List[str]] = {}
+_keys_indexed = 0
+
+
+def _fuzzy_candidates(clean_key: str, cutoff: float) -> List[str]:
+    """
+    FAMOUS_CASES keys that can reach `cutoff` against clean_key.
+    
+    difflib's ratio is at most 2*min(len)/(len_a + len_b), so keys whose
+    length is too far off can never match - the result of get_close_matches
+    is the same without them, and long notes skip the fuzzy pass entirely.
+    """
+    global _keys_by_length, _keys_indexed
+    if _keys_indexed != len(FAMOUS_CASES):
+        by_length: Dict[int, List[str]] = {}
+        for key in FAMOUS_CASES:
+            by_length.setdefault(len(key), []).append(key)
+        _keys_by_length, _keys_indexed = by_length, len(FAMOUS_CASES)
+    
+    n = len(clean_key)
+    if n == 0:
+        return []
+    bound = cutoff / (2 - cutoff)  # min(len)/max(len) needed to reach cutoff
+    low, high = n * bound, n / bound
+    return [key for length, keys in _keys_by_length.items() if low <= length <= high for key in keys]
+
+
 def _find_best_cache_match(text: str) -> Optional[str]:
     """Find the best matching key in FAMOUS_CASES using fuzzy matching."""
     # First, extract just the case name (strips citation details like "388 U.S. 1 (1967)")
@@ -241,7 +276,10 @@ def _find_best_cache_match(text: str) -> Optional[str]:
         return clean_key
     
     # Fuzzy match
-    matches = difflib.get_close_matches(clean_key, FAMOUS_CASES.keys(), n=1, cutoff=0.7)
+    candidates = _fuzzy_candidates(clean_key, 0.7)
+    if not candidates:
+        return None
+    matches = difflib.get_close_matches(clean_key, candidates, n=1, cutoff=0.7)
     if matches:
         return matches[0]
     return None
@@ -273,6 +311,13 @@ KNOWN_LEGAL_DOMAINS = [
     'supremecourt.gov', 'law.cornell.edu', 'findlaw.com'
 ]
 
+# Compiled once: hosts (and their subdomains) are hash lookups, not substring scans
+_KNOWN_LEGAL_TABLE = DomainTable(KNOWN_LEGAL_DOMAINS)
+
+# Cheap signals that settle a text as NOT a case, so the fuzzy famous-case
+# match is skipped (see detectors.scan_signals)
+_NON_LEGAL_FEATURES = ('doi', 'url', 'book_0')
+
 
 def is_legal_citation(text: str) -> bool:
     """
@@ -284,42 +329,33 @@ def is_legal_citation(text: str) -> bool:
     - Legal URLs
     - Case name patterns: X v Y
     - Reporter patterns: Westlaw, Federal Reporter, U.S. Reports, etc.
+    
+    The pattern signals come from one memoized scan (detectors.scan_signals)
+    and are checked first; an exact famous-case lookup is a dict hit. The
+    fuzzy famous-case match only runs when none of that decides - no legal
+    signal, and nothing marking the text as a DOI, URL or ISBN.
     """
     if not text:
         return False
     clean = text.strip()
+    signals = scan_signals(clean)
     
-    # UK neutral citation: [2024] UKSC 123
-    if '[' in clean and ']' in clean and re.search(r'\[\d{4}\]', clean):
-        return True
-    
-    # Check famous cases cache
-    if _find_best_cache_match(clean):
+    # Neutral citation, X v Y, Westlaw and reporter patterns
+    if signals.any(LEGAL_CITATION_FEATURES):
         return True
     
     # Legal URLs
-    if 'http' in clean and any(d in clean for d in KNOWN_LEGAL_DOMAINS):
-        return True
-    
-    # Case name pattern: X v Y
-    if re.search(r'\s(v|vs|versus)\.?\s', clean, re.IGNORECASE):
+    if 'url_in_text' in signals and any(
+        _KNOWN_LEGAL_TABLE.lookup(*split_url(url)) for url in URL_IN_TEXT_PATTERN.findall(clean)
+    ):
         return True
     
-    # Reporter patterns (US case citations)
-    # Westlaw: 2024 WL 123456
-    if re.search(r'\d{4}\s+WL\s+\d+', clean):
+    # Famous cases cache: exact key first, fuzzy only for ambiguous text
+    if _normalize_key(_extract_case_name(clean)) in FAMOUS_CASES:
         return True
-    # Federal Reporter: 123 F.2d 456, 123 F.3d 456
-    if re.search(r'\d+\s+F\.\d+[a-z]*\s+\d+', clean):
-        return True
-    # U.S. Reports: 388 U.S. 1
-    if re.search(r'\d+\s+U\.S\.\s+\d+', clean):
-        return True
-    # Atlantic/Pacific reporters: 355 A.2d 647
-    if re.search(r'\d+\s+[A-Z]\.\d+[a-z]*\s+\d+', clean):
-        return True
-    
-    return False
+    if signals.any(_NON_LEGAL_FEATURES):
+        return False
+    return _find_best_cache_match(clean) is not None
 
 
 # =============================================================================
@@ -536,7 +572,7 @@ class CourtListenerEngine(SearchEngine):
                 'order_by': 'score desc',
                 'format': 'json'
             }
-            response = requests.get(
+            response = http_get(
                 self.base_url,
                 params=params,
                 headers=self.headers,
@@ -0,0 +1,299 @@
+"""
+citeflex/jobs.py
+
+Background jobs for document processing.
+
+/api/process and /api/process-author-date used to run extraction, lookups
+and the docx rewrite inside the request thread, so a large document held a
+gunicorn thread for its whole run and failed at the 120 s worker timeout.
+In job mode (form field async=true, or DOCUMENT_JOBS=always) the upload is
+handed to a small in-process worker pool instead:
+
+- submit() returns immediately; the job id is the session id the results
+  will be stored under
+- The pipeline reports progress through a callback (stage, done, total),
+  recorded as numbered events
+- Events can be streamed (Server-Sent Events, events_since) or polled
+  (snapshot)
+- Snapshots are also published through on_update (throttled), which app.py
+  writes into the shared session store - so a worker that doesn't run the
+  job can still answer a poll
+
+The pool bounds how many documents a worker processes at once; HTTP threads
+only accept uploads and serve progress. Admission is bounded too: submit()
+raises JobQueueFull once max_pending jobs (or max_per_client for one
+client) are queued or running, so the pool's queue can't grow without limit.
+
+Usage:
+    manager = JobManager(workers=2, on_update=save_snapshot, max_pending=32, max_per_client=3)
+    job = manager.submit(session_id, 'footnotes', run_pipeline, file_bytes, client=ip)
+    ...
+    for event in manager.events_since(session_id, after=0, timeout=15):
+        ...
+
+Created: 2026-10-16
+"""
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from negative_cache import submit_in_context
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'error'
+TERMINAL_STATES = (DONE, FAILED)
+
+# Finished jobs are dropped from memory after this long (the session keeps
+# the results; the published snapshot keeps the final status)
+JOB_RETENTION_SECONDS = 3600
+
+# Minimum seconds between two on_update publications of one job
+PUBLISH_INTERVAL = 1.0
+
+
+class JobQueueFull(Exception):
+    """Too many unfinished jobs, overall or for one client."""
+
+
+# =============================================================================
+# JOB
+# =============================================================================
+
+class Job:
+    """One submitted document and its progress events."""
+
+    def __init__(self, job_id: str, kind: str, label: str = "", client: Optional[str] = None):
+        self.id = job_id
+        self.kind = kind
+        self.label = label
+        self.client = client
+        self.status = QUEUED
+        self.stage = ''
+        self.done = 0
+        self.total = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.changed = threading.Condition()
+        self._published_at = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def snapshot(self, include_result: bool = True) -> Dict[str, Any]:
+        """JSON-friendly status for polling."""
+        with self.changed:
+            data = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'label': self.label,
+                'status': self.status,
+                'stage': self.stage,
+                'done': self.done,
+                'total': self.total,
+                'events': len(self.events),
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+            }
+            if self.error:
+                data['error'] = self.error
+            if include_result and self.result is not None:
+                data['result'] = self.result
+        return data
+
+    def _emit(self, event_type: str, **fields) -> None:
+        """Append an event and wake streaming readers (caller holds no lock)."""
+        with self.changed:
+            event = {'seq': len(self.events) + 1, 'type': event_type, 'time': time.time()}
+            event.update(fields)
+            self.events.append(event)
+            self.changed.notify_all()
+
+
+class JobProgress:
+    """
+    Progress callback handed to the pipeline.
+
+    Call as progress(stage, done, total, **detail), e.g.
+    progress('lookup', 12, 40) or progress('notes', 3, 40, note='...').
+    """
+
+    def __init__(self, manager: 'JobManager', job: Job):
+        self._manager = manager
+        self._job = job
+
+    def __call__(self, stage: str, done: int, total: int, **detail) -> None:
+        job = self._job
+        with job.changed:
+            job.stage = stage
+            job.done = done
+            job.total = total
+        job._emit('progress', stage=stage, done=done, total=total, **detail)
+        self._manager._publish(job)
+
+
+# =============================================================================
+# MANAGER
+# =============================================================================
+
+class JobManager:
+    """
+    In-process pool running document jobs.
+
+    The pool is created lazily, per process, so a manager built at import
+    time works in every forked gunicorn worker.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+        max_pending: int = 0,
+        max_per_client: int = 0
+    ):
+        """
+        Args:
+            workers: Jobs run at once
+            on_update: Called with throttled job snapshots
+            max_pending: Cap on queued + running jobs (0: unlimited)
+            max_per_client: Cap on queued + running jobs per client (0: unlimited)
+        """
+        self.workers = max(1, workers)
+        self.on_update = on_update
+        self.max_pending = max_pending
+        self.max_per_client = max_per_client
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='document-job')
+            return self._executor
+
+    def submit(
+        self,
+        job_id: str,
+        kind: str,
+        fn: Callable,
+        *args,
+        label: str = "",
+        client: Optional[str] = None,
+        **kwargs
+    ) -> Job:
+        """
+        Queue fn(*args, progress=JobProgress, **kwargs) and return at once.
+
+        Args:
+            job_id: Id to look the job up by (app.py uses the session id)
+            kind: Pipeline name, e.g. 'footnotes' or 'author-date'
+            fn: The pipeline; its return value becomes the job result
+            label: Shown in status (e.g. the file name)
+            client: Who submitted it (e.g. the client IP), for max_per_client
+
+        Returns:
+            The queued Job
+
+        Raises:
+            JobQueueFull: max_pending or max_per_client unfinished jobs already
+        """
+        job = Job(job_id, kind, label, client)
+        with self._lock:
+            self._prune()
+            unfinished = [j for j in self._jobs.values() if not j.finished]
+            if self.max_pending and len(unfinished) >= self.max_pending:
+                raise JobQueueFull(f"{len(unfinished)} documents are already queued; try again shortly")
+            if self.max_per_client and client is not None and \
+                    sum(1 for j in unfinished if j.client == client) >= self.max_per_client:
+                raise JobQueueFull(f"You already have {self.max_per_client} documents processing; "
+                                   f"wait for one to finish")
+            self._jobs[job_id] = job
+        job._emit('queued')
+        self._publish(job, force=True)
+        # Carry the caller's context (e.g. document trace) into the pool
+        submit_in_context(self._pool(), self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable, args: tuple, kwargs: dict) -> None:
+        with job.changed:
+            job.status = RUNNING
+        job._emit('started')
+        self._publish(job, force=True)
+        print(f"[Jobs] {job.kind} job {job.id[:8]} started ({job.label})")
+
+        try:
+            result = fn(*args, progress=JobProgress(self, job), **kwargs)
+            with job.changed:
+                job.result = result
+                job.status = DONE
+                job.finished_at = time.time()
+            job._emit('done')
+            print(f"[Jobs] {job.kind} job {job.id[:8]} finished in {job.finished_at - job.created_at:.1f}s")
+        except Exception as e:
+            traceback.print_exc()
+            with job.changed:
+                job.error = str(e)
+                job.status = FAILED
+                job.finished_at = time.time()
+            job._emit('error', error=str(e))
+            print(f"[Jobs] {job.kind} job {job.id[:8]} failed: {e}")
+
+        self._publish(job, force=True)
+
+    def _publish(self, job: Job, force: bool = False) -> None:
+        """Hand a snapshot to on_update, at most every PUBLISH_INTERVAL."""
+        if self.on_update is None:
+            return
+        now = time.monotonic()
+        if not force and now - job._published_at < PUBLISH_INTERVAL:
+            return
+        job._published_at = now
+        try:
+            self.on_update(job.snapshot())
+        except Exception as e:
+            print(f"[Jobs] Failed to publish job {job.id[:8]}: {e}")
+
+    def _prune(self) -> None:
+        """Forget finished jobs past retention (caller holds self._lock)."""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job if it runs (or ran) in this process."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def events_since(self, job_id: str, after: int = 0, timeout: float = 15.0) -> List[Dict[str, Any]]:
+        """
+        Events numbered above `after`, waiting up to timeout for new ones.
+
+        Returns:
+            New events (empty on timeout, or if the job isn't in this process)
+        """
+        job = self.get(job_id)
+        if job is None:
+            return []
+        with job.changed:
+            if len(job.events) <= after and not job.finished:
+                job.changed.wait(timeout)
+            return list(job.events[after:])
+
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status (for /health)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
@@ -0,0 +1,298 @@
+"""
+citeflex/metrics.py
+
+Structured instrumentation for the routing cascade.
+
+Before this module the only visibility into route_citation, the routing
+layers and the engines was scattered print() output. Now every stage
+reports into process-wide histograms and counters:
+
+- citeflex_stage_seconds{stage,name}  latency histograms: 'route', 'layer'
+  (famous_cache, doi, free_engines, scholar, ai, url, books, legal),
+  'engine' (per engine method), 'http' (per host), 'ai' (per provider)
+- citeflex_<metric>_total{event,name}  counters: metadata_cache hits/misses,
+  http timeouts/retries/status classes, bytes fetched, AI failures, cost
+
+Aggregates are exposed at /metrics (Prometheus text, or JSON with
+?format=json) next to /health. The endpoint requires METRICS_TOKEN (or
+ADMIN_SECRET), since the cost counters show live API spend.
+
+A per-document trace collects the same observations for one upload only.
+It lives in a context variable, so it follows the work into the asyncio
+loop and into worker threads started with negative_cache.submit_in_context
+or engines.http_client.run_blocking.
+
+Usage:
+    import metrics
+
+    with metrics.timed('layer', 'free_engines'):
+        ...
+    metrics.count('metadata_cache', 'hit_shared')
+
+    with metrics.trace_document('thesis.docx') as trace:
+        process_document(...)
+    summary = trace.summary()
+
+Created: 2026-10-16
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# =============================================================================
+# HISTOGRAMS
+# =============================================================================
+
+# Upper bounds (seconds) - from a cache hit to a slow AI call
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative counts on export)."""
+
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        """Approximate percentile (bucket upper bound)."""
+        if not self.count:
+            return 0.0
+        target = pct / 100 * self.count
+        running = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 4),
+            'mean': round(self.total / self.count, 4) if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': round(self.max, 4),
+        }
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+class MetricsRegistry:
+    """Thread-safe histograms and counters keyed by (kind, name)."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, name: str, seconds: float) -> None:
+        with self._lock:
+            hist = self._histograms.get((stage, name))
+            if hist is None:
+                hist = self._histograms[(stage, name)] = Histogram()
+            hist.observe(seconds)
+
+    def add(self, metric: str, event: str, name: str, value: float = 1) -> None:
+        key = (metric, event, name)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly view of everything recorded so far."""
+        with self._lock:
+            stages: Dict[str, Dict[str, Any]] = {}
+            for (stage, name), hist in sorted(self._histograms.items()):
+                stages.setdefault(stage, {})[name] = hist.to_dict()
+            counters: Dict[str, Dict[str, Any]] = {}
+            for (metric, event, name), value in sorted(self._counters.items()):
+                counters.setdefault(metric, {}).setdefault(event, {})[name] = value
+        return {'stages': stages, 'counters': counters}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines = [
+            '# HELP citeflex_stage_seconds Latency per routing layer, engine and HTTP host',
+            '# TYPE citeflex_stage_seconds histogram',
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        for (stage, name), hist in histograms:
+            labels = f'stage="{_escape(stage)}",name="{_escape(name)}"'
+            running = 0
+            for bound, n in zip(LATENCY_BUCKETS, hist.counts):
+                running += n
+                lines.append(f'citeflex_stage_seconds_bucket{{{labels},le="{bound}"}} {running}')
+            lines.append(f'citeflex_stage_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f'citeflex_stage_seconds_sum{{{labels}}} {hist.total:.6f}')
+            lines.append(f'citeflex_stage_seconds_count{{{labels}}} {hist.count}')
+
+        declared = set()
+        for (metric, event, name), value in counters:
+            full = f'citeflex_{metric}_total'
+            if full not in declared:
+                lines.append(f'# TYPE {full} counter')
+                declared.add(full)
+            lines.append(f'{full}{{event="{_escape(event)}",name="{_escape(name)}"}} {value:g}')
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+registry = MetricsRegistry()
+
+
+# =============================================================================
+# PER-DOCUMENT TRACE
+# =============================================================================
+
+class DocumentTrace:
+    """Observations for one document, aggregated per stage and per counter."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self._stages: Dict[Tuple[str, str], List[float]] = {}
+        self._counters: Dict[Tuple[str, str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault((stage, name), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def add(self, metric: str, event: str, name: str, value: float = 1) -> None:
+        key = (metric, event, name)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        JSON-friendly summary, e.g. for the /api/process response.
+
+        Stage totals add up time spent in each layer across all notes; since
+        notes are looked up concurrently they can exceed the wall time.
+        """
+        end = self.finished if self.finished is not None else time.monotonic()
+        with self._lock:
+            stages: Dict[str, Dict[str, Any]] = {}
+            for (stage, name), (count, total, longest) in sorted(self._stages.items()):
+                stages.setdefault(stage, {})[name] = {
+                    'count': count,
+                    'total_ms': round(total * 1000, 1),
+                    'max_ms': round(longest * 1000, 1),
+                }
+            counters: Dict[str, Dict[str, Any]] = {}
+            for (metric, event, name), value in sorted(self._counters.items()):
+                counters.setdefault(metric, {}).setdefault(event, {})[name] = round(value, 6)
+        return {
+            'label': self.label,
+            'wall_ms': round((end - self.started) * 1000, 1),
+            'stages': stages,
+            'counters': counters,
+        }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('document_trace', default=None)
+
+
+@contextmanager
+def trace_document(label: str = "", trace: Optional[DocumentTrace] = None):
+    """
+    Collect a per-document trace while the block runs.
+
+    Args:
+        label: Shown in the summary (e.g. the file name)
+        trace: Existing trace to keep adding to (for work split across blocks)
+
+    Yields:
+        The DocumentTrace (call .summary() after the block)
+    """
+    if trace is None:
+        trace = DocumentTrace(label)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finished = time.monotonic()
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[DocumentTrace]:
+    """The trace being collected in this context, if any."""
+    return _current_trace.get()
+
+
+# =============================================================================
+# RECORDING API
+# =============================================================================
+
+def observe(stage: str, name: str, seconds: float) -> None:
+    """
+    Record a latency sample.
+
+    Args:
+        stage: Kind of stage - 'route', 'layer', 'engine', 'http', 'ai'
+        name: Which one, e.g. 'free_engines', 'Crossref', 'api.crossref.org'
+        seconds: Elapsed time
+    """
+    registry.observe(stage, name, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.observe(stage, name, seconds)
+
+
+def count(metric: str, event: str, name: str = "", value: float = 1) -> None:
+    """
+    Increment a counter.
+
+    Args:
+        metric: Counter family, e.g. 'metadata_cache', 'http', 'bytes'
+        event: What happened, e.g. 'hit_shared', 'timeout', 'fetched'
+        name: Optional subject (engine, host, provider)
+        value: Amount to add
+    """
+    registry.add(metric, event, name, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(metric, event, name, value)
+
+
+@contextmanager
+def timed(stage: str, name: str):
+    """Time the block and record it with observe() (also on exceptions)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, name, time.perf_counter() - start)
@@ -0,0 +1,252 @@
+"""
+citeflex/negative_cache.py
+
+Negative-result cache for citations that could not be resolved.
+
+When route_citation() walks the whole chain (famous papers, DOI, free
+engines, Google Scholar, AI) and still finds nothing, the next upload of the
+same half-finished draft would pay for the full paid cascade again. This
+module remembers misses for a short, per-reason TTL:
+
+- no_match        every tier answered "not found" - retried after hours
+- timeout         an engine timed out - retried after minutes
+- provider_error  an engine or AI provider failed (connection error, 5xx,
+                  no provider configured) - retried after minutes
+- rate_limited    an engine returned 429 - retried soonest
+
+Why a lookup failed is collected while it runs: engines call
+report_lookup_problem() when they hit a timeout, rate limit or error, and the
+router wraps each lookup in track_lookup_problems(). Collection uses a
+context variable, so concurrent documents don't see each other's problems;
+submit_in_context() carries it into worker threads.
+
+Lookups that send the document context to the AI tier pass it to get() and
+record() as well: a miss in one document must not hide the citation from
+another whose context would resolve it.
+
+Usage:
+    from negative_cache import get_negative_cache, track_lookup_problems, classify_miss
+
+    cache = get_negative_cache()
+    if cache.get('route', query, context=context):
+        return None, ""
+    with track_lookup_problems() as problems:
+        metadata = ...full lookup...
+    if not metadata:
+        cache.record('route', query, classify_miss(problems), context=context)
+
+Created: 2026-10-16
+"""
+
+import contextvars
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Set, Tuple
+
+# =============================================================================
+# MISS REASONS
+# =============================================================================
+
+NO_MATCH = 'no_match'
+TIMEOUT = 'timeout'
+PROVIDER_ERROR = 'provider_error'
+RATE_LIMITED = 'rate_limited'
+
+# Default TTLs (seconds) - overridden by config.NEGATIVE_CACHE_TTLS
+DEFAULT_TTLS: Dict[str, float] = {
+    NO_MATCH: 6 * 3600,
+    TIMEOUT: 10 * 60,
+    PROVIDER_ERROR: 10 * 60,
+    RATE_LIMITED: 2 * 60,
+}
+
+
+# =============================================================================
+# PROBLEM TRACKING (per lookup, thread/context-safe)
+# =============================================================================
+
+_lookup_problems: contextvars.ContextVar = contextvars.ContextVar('lookup_problems', default=None)
+
+
+@contextmanager
+def track_lookup_problems():
+    """
+    Collect the problems reported while a lookup runs.
+
+    Nested tracking is allowed; problems are reported to the innermost
+    tracker and propagated to the enclosing one when it exits.
+
+    Yields:
+        Set of reasons reported inside the block
+    """
+    problems: Set[str] = set()
+    outer = _lookup_problems.get()
+    token = _lookup_problems.set(problems)
+    try:
+        yield problems
+    finally:
+        _lookup_problems.reset(token)
+        if outer is not None:
+            outer.update(problems)
+
+
+def report_lookup_problem(reason: str) -> None:
+    """
+    Record that part of the current lookup failed for a transient reason.
+
+    Safe to call when no lookup is being tracked (it's a no-op then).
+
+    Args:
+        reason: TIMEOUT, PROVIDER_ERROR or RATE_LIMITED
+    """
+    problems = _lookup_problems.get()
+    if problems is not None:
+        problems.add(reason)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """
+    executor.submit() that carries the caller's context into the worker
+    thread, so report_lookup_problem() inside it reaches the caller's tracker.
+    """
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def classify_miss(problems: Set[str]) -> str:
+    """
+    Pick the reason to cache a miss under.
+
+    A miss caused (even partly) by rate limiting, timeouts or a failed
+    provider may succeed on retry, so those outrank a plain no-match and get
+    the shorter TTL. NO_MATCH means every tier actually answered.
+    """
+    if RATE_LIMITED in problems:
+        return RATE_LIMITED
+    if TIMEOUT in problems:
+        return TIMEOUT
+    if PROVIDER_ERROR in problems:
+        return PROVIDER_ERROR
+    return NO_MATCH
+
+
+# =============================================================================
+# NEGATIVE CACHE
+# =============================================================================
+
+class NegativeResultCache:
+    """
+    Bounded, thread-safe map of (scope, normalized query, context hash)
+    -> (reason, expiry).
+
+    Scopes keep different lookups apart, e.g. 'route' for route_citation()
+    and 'parenthetical' for get_parenthetical_metadata(). The context hash
+    is empty for lookups that don't depend on document context.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 10000):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    @staticmethod
+    def _key(scope: str, query: str, context: str = "") -> Tuple[str, str, str]:
+        context = ' '.join((context or '').split())
+        context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()[:16] if context else ''
+        return scope, ' '.join((query or '').lower().split()), context_hash
+
+    def get(self, scope: str, query: str, context: str = "") -> Optional[str]:
+        """
+        Check whether a query recently failed.
+
+        Args:
+            scope: Which lookup is asking
+            query: The citation text
+            context: Document context the lookup was given, if any
+
+        Returns:
+            The miss reason if a live entry exists, None otherwise
+        """
+        key = self._key(scope, query, context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            reason, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._hits += 1
+
+        print(f"[NegativeCache] Skipping recent {reason} for: {query[:50]}...")
+        return reason
+
+    def record(self, scope: str, query: str, reason: str = NO_MATCH, context: str = "") -> None:
+        """
+        Remember that a query could not be resolved.
+
+        Args:
+            scope: Which lookup failed
+            query: The citation text
+            reason: NO_MATCH, TIMEOUT, PROVIDER_ERROR or RATE_LIMITED
+            context: Document context the lookup was given, if any
+        """
+        ttl = self.ttls.get(reason, self.ttls[NO_MATCH])
+        if ttl <= 0:
+            return
+
+        key = self._key(scope, query, context)
+        with self._lock:
+            self._entries[key] = (reason, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        print(f"[NegativeCache] Recorded {reason} ({int(ttl)}s) for: {query[:50]}...")
+
+    def forget(self, scope: str, query: str, context: str = "") -> None:
+        """Drop an entry (e.g. after the user edits the citation)."""
+        with self._lock:
+            self._entries.pop(self._key(scope, query, context), None)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for diagnostics."""
+        with self._lock:
+            by_reason: Dict[str, int] = {}
+            for reason, _ in self._entries.values():
+                by_reason[reason] = by_reason.get(reason, 0) + 1
+        return {'entries': len(self._entries), 'hits': self._hits, **by_reason}
+
+
+# =============================================================================
+# PROCESS-WIDE INSTANCE
+# =============================================================================
+
+_negative_cache: Optional[NegativeResultCache] = None
+_negative_cache_lock = threading.Lock()
+
+
+def get_negative_cache() -> NegativeResultCache:
+    """Get the process-wide negative cache, created from config on first use."""
+    global _negative_cache
+    if _negative_cache is None:
+        with _negative_cache_lock:
+            if _negative_cache is None:
+                try:
+                    from config import NEGATIVE_CACHE_TTLS
+                except ImportError:
+                    NEGATIVE_CACHE_TTLS = None
+                _negative_cache = NegativeResultCache(ttls=NEGATIVE_CACHE_TTLS)
+    return _negative_cache
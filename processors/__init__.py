@@ -18,8 +18,12 @@ Modules:
     
     # Embedded metadata cache (2025-12-14):
     document_metadata.py    - Read/write citation cache embedded in documents
+    shared_metadata_cache.py - Process-wide LRU/TTL tier behind the document cache
+    
+    docx_package.py         - In-memory .docx shared across pipeline stages
 """
 
+from processors.docx_package import DocxPackage
 from processors.word_document import WordDocumentProcessor
 from processors.author_date import process_author_date_document
 from processors.orchestrator import process_document_unified, ProcessingResult
@@ -27,9 +31,11 @@ from processors.document_metadata import (
     CitationMetadataCache,
     load_cache_from_docx,
     save_cache_to_docx,
+    save_cache_to_package,
     export_cache_to_csv,
     hash_citation_text,
 )
+from processors.shared_metadata_cache import SharedMetadataCache, get_shared_metadata_cache
 
 __all__ = [
     # Legacy
@@ -42,6 +48,11 @@ __all__ = [
     'CitationMetadataCache',
     'load_cache_from_docx',
     'save_cache_to_docx',
+    'save_cache_to_package',
     'export_cache_to_csv',
     'hash_citation_text',
+    'SharedMetadataCache',
+    'get_shared_metadata_cache',
+    # Shared in-memory document
+    'DocxPackage',
 ]
@@ -7,14 +7,11 @@ Handles generation of References sections for APA, Harvard, etc.
 Created: 2025-12-10
 """
 
-import zipfile
-import tempfile
-import shutil
-import os
 import re
-from io import BytesIO
 from typing import List
 
+from processors.docx_package import DocxPackage, DOCUMENT_PART
+
 
 def append_references_section(doc_bytes: bytes, references: List[str]) -> bytes:
     """
@@ -30,21 +27,14 @@ def append_references_section(doc_bytes: bytes, references: List[str]) -> bytes:
     if not references:
         return doc_bytes
     
-    temp_dir = tempfile.mkdtemp()
-    
     try:
-        # Extract docx
-        with zipfile.ZipFile(BytesIO(doc_bytes), 'r') as zf:
-            zf.extractall(temp_dir)
+        package = DocxPackage(doc_bytes)
         
         # Read document.xml
-        doc_path = os.path.join(temp_dir, 'word', 'document.xml')
-        if not os.path.exists(doc_path):
+        content = package.get_text(DOCUMENT_PART)
+        if content is None:
             return doc_bytes
         
-        with open(doc_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
         # Build References section XML
         references_xml = _build_references_xml(references)
         
@@ -62,29 +52,13 @@ def append_references_section(doc_bytes: bytes, references: List[str]) -> bytes:
             # Fallback: couldn't find body close, return original
             return doc_bytes
         
-        # Write modified document.xml
-        with open(doc_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        
-        # Repackage docx
-        output_buffer = BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
-        
-        output_buffer.seek(0)
-        return output_buffer.read()
+        # Write modified document.xml and repackage
+        package.set_text(DOCUMENT_PART, new_content)
+        return package.to_bytes()
         
     except Exception as e:
         print(f"[append_references_section] Error: {e}")
         return doc_bytes
-        
-    finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
 
 
 def _build_references_xml(references: List[str]) -> str:
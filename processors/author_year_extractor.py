@@ -1150,12 +1150,12 @@ class AuthorDateExtractor:
         
         return queries
     
-    def extract_citations_from_docx(self, file_bytes: bytes) -> List[AuthorYearCitation]:
+    def extract_citations_from_docx(self, file_bytes) -> List[AuthorYearCitation]:
         """
         Extract citations from a Word document.
         
         Args:
-            file_bytes: The .docx file as bytes
+            file_bytes: The .docx file as bytes, or a shared DocxPackage
             
         Returns:
             List of AuthorYearCitation objects
@@ -1183,43 +1183,29 @@ def extract_author_date_citations(text: str) -> List[AuthorYearCitation]:
 # WORD DOCUMENT EXTRACTION
 # =============================================================================
 
-def extract_body_text_from_docx(file_bytes: bytes) -> str:
+def extract_body_text_from_docx(file_bytes) -> str:
     """
     Extract main body text from a Word document (excluding footnotes/endnotes).
     
     Args:
-        file_bytes: The .docx file as bytes
+        file_bytes: The .docx file as bytes, or a shared DocxPackage
         
     Returns:
         Plain text content of document body
     """
-    import zipfile
-    import xml.etree.ElementTree as ET
-    from io import BytesIO
-    
-    NS = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+    from processors.docx_package import DocxPackage, DOCUMENT_PART
     
     try:
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            # Read main document
-            if 'word/document.xml' not in zf.namelist():
-                return ""
-            
-            with zf.open('word/document.xml') as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-            
-            # Extract all text from paragraphs
-            text_parts = []
-            for para in root.findall('.//w:p', NS):
-                para_text = []
-                for t in para.findall('.//w:t', NS):
-                    if t.text:
-                        para_text.append(t.text)
-                if para_text:
-                    text_parts.append(''.join(para_text))
-            
-            return '\n'.join(text_parts)
+        package = DocxPackage.ensure(file_bytes)
+        
+        # Read main document
+        if not package.has_part(DOCUMENT_PART):
+            return ""
+        
+        # Extract all text from paragraphs
+        text_parts = [para for para in package.body_paragraphs() if para]
+        
+        return '\n'.join(text_parts)
     
     except Exception as e:
         print(f"[extract_body_text_from_docx] Error: {e}")
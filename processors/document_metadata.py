@@ -16,25 +16,53 @@ How it works:
 Technical Details:
 - .docx files are ZIP archives containing XML
 - Word preserves Custom XML Parts through edits
-- We use SHA-256 hash of exact citation text as cache key (exact matching)
-- Metadata is serialized to/from XML format
+- We use SHA-256 hash of exact citation text as cache key (exact matching);
+  on a miss, a secondary index on canonical identifiers (normalized DOI,
+  URL without tracking parameters, ISBN-13, PMID) and on normalized text
+  catches cosmetic edits ("Smith 2020" vs "Smith, 2020")
+- Metadata is serialized as one compressed JSON payload (format 2.0):
+  a field dictionary plus one row of values per citation, zlib-compressed
+  and base64-encoded as the text of the <citategenie> element, so the part
+  stays plain, Word-safe XML. Rows are only turned back into metadata on
+  first use, and rows never used are written back as they were loaded.
+  The original one-element-per-field XML (format 1.0) is still read.
+- The cache also records the note state of the last run: for every note,
+  the hash of the text we wrote, the cache entry of its source and its
+  form. On re-processing, notes whose text is unchanged are matched back to
+  their source without a lookup (incremental mode, see process_document)
 
 Created: 2025-12-14
+Version History:
+    2026-10-16: Note state for incremental re-processing; from_xml_string
+                ignores the element namespace (previously nothing was loaded
+                because the root declares xmlns)
+    2026-10-16: Compact format 2.0 (compressed JSON with a field dictionary),
+                lazy materialization, CitationMetadata memoized per entry
+    2026-10-16: Secondary identifier / normalized-text index; variant texts
+                are stored as aliases of the entry they matched
 """
 
-import os
 import re
+import copy
+import base64
 import hashlib
 import zipfile
-import tempfile
-import shutil
+import zlib
 import json
+import threading
 import xml.etree.ElementTree as ET
-from typing import Dict, Optional, Any, List
-from io import BytesIO
+from typing import Dict, Optional, Any, List, Union
 from datetime import datetime
 
+import metrics
 from models import CitationMetadata, CitationType
+from processors.docx_package import DocxPackage, CONTENT_TYPES_PART
+from processors.shared_metadata_cache import (
+    get_shared_metadata_cache,
+    identity_keys_from_dict,
+    normalized_text_key,
+    text_identity_keys,
+)
 
 
 # =============================================================================
@@ -43,6 +71,15 @@ from models import CitationMetadata, CitationType
 
 # Custom XML namespace for CitateGenie metadata
 CITATEGENIE_NS = "http://citategenie.com/metadata/v1"
+
+# Serialization formats: 1.0 = one XML element per field (read only),
+# 2.0 = compressed JSON payload
+LEGACY_FORMAT_VERSION = "1.0"
+COMPACT_FORMAT_VERSION = "2.0"
+COMPACT_ENCODING = "json+zlib+base64"
+# Largest decompressed payload accepted from an uploaded document
+# (600 citations take ~200 KB)
+MAX_COMPACT_BYTES = 8 * 1024 * 1024
 CITATEGENIE_ITEM_ID = "citategenie-metadata-cache"
 
 # Path within docx where custom XML is stored
@@ -89,13 +126,70 @@ class CitationMetadataCache:
     
     Manages the mapping between citation text hashes and resolved metadata.
     Can be serialized to/from XML for embedding in documents.
+    
+    Backed by the process-wide SharedMetadataCache: a miss here falls
+    through to the shared tier (and a hit there is copied into this
+    document's cache), and every set() writes through to it.
+    
+    Thread-safe: the note-lookup workers of a document (and stragglers
+    past its deadline) share one instance, so entries, packed rows and the
+    variant index are only touched under a lock, and serialization works
+    on a snapshot.
     """
     
-    def __init__(self):
-        """Initialize an empty cache."""
+    def __init__(self, use_shared_tier: bool = True):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            use_shared_tier: Consult/populate the process-wide cache tier
+        """
         self._cache: Dict[str, Dict[str, Any]] = {}
-        self._version = "1.0"
+        # Format 2.0 rows not yet materialized: hash -> [original, cached_at, values]
+        self._packed: Dict[str, list] = {}
+        # Field dictionary the packed rows are aligned to
+        self._fields: List[str] = []
+        # CitationMetadata built once per entry (get() hands out copies)
+        self._objects: Dict[str, CitationMetadata] = {}
+        # Variant text hash -> hash of the entry it matched
+        self._aliases: Dict[str, str] = {}
+        # Identifier / normalized-text key -> entry hash (built on first miss)
+        self._index: Optional[Dict[str, str]] = None
+        # Note state: loaded from the document / recorded by this run
+        self._previous_notes: List[Dict[str, str]] = []
+        self._notes: List[Dict[str, str]] = []
+        self._version = COMPACT_FORMAT_VERSION
         self._created = datetime.utcnow().isoformat()
+        self._shared = get_shared_metadata_cache() if use_shared_tier else None
+        self._lock = threading.RLock()
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickle state for the session store: the process-wide tier (which
+        holds locks) is reattached on load, memoized objects are rebuilt.
+        """
+        state = self.__dict__.copy()
+        state['_shared'] = self._shared is not None
+        state['_objects'] = {}
+        state['_index'] = None
+        del state['_lock']
+        with self._lock:
+            for name in ('_cache', '_packed', '_aliases'):
+                state[name] = dict(state[name])
+            for name in ('_previous_notes', '_notes'):
+                state[name] = list(state[name])
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Unpickle, also caches saved before these fields existed."""
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._shared = get_shared_metadata_cache() if state.get('_shared') else None
+        for name, default in (('_packed', {}), ('_fields', []), ('_objects', {}),
+                              ('_aliases', {}), ('_index', None),
+                              ('_previous_notes', []), ('_notes', [])):
+            if name not in self.__dict__:
+                setattr(self, name, default)
     
     def get(self, citation_text: str) -> Optional[CitationMetadata]:
         """
@@ -111,12 +205,34 @@ class CitationMetadataCache:
         if not hash_key:
             return None
         
-        if hash_key in self._cache:
-            print(f"[MetadataCache] Cache HIT for hash {hash_key}: {citation_text[:40]}...")
-            data = self._cache[hash_key]
-            return CitationMetadata.from_dict(data.get('metadata', {}))
+        with self._lock:
+            if self._entry(hash_key) is not None:
+                print(f"[MetadataCache] Cache HIT for hash {hash_key}: {citation_text[:40]}...")
+                metrics.count('metadata_cache', 'hit_document')
+                return self._metadata(hash_key)
+            
+            # Cosmetic variant of an entry in this document: same identifier or
+            # same normalized text. Remember the variant for the next lookup/run.
+            match = self._find_variant(citation_text)
+            if match is not None:
+                print(f"[MetadataCache] Normalized HIT for hash {hash_key} -> {match}: {citation_text[:40]}...")
+                metrics.count('metadata_cache', 'hit_normalized')
+                self._aliases[hash_key] = match
+                metadata = self._metadata(match)
+                metadata.raw_source = citation_text.strip()
+                return metadata
+        
+        # Second tier: metadata resolved for other documents in this process
+        if self._shared is not None:
+            metadata = self._shared.get(citation_text)
+            if metadata is not None:
+                print(f"[MetadataCache] Shared tier HIT for hash {hash_key}: {citation_text[:40]}...")
+                metrics.count('metadata_cache', 'hit_shared')
+                self._store(hash_key, citation_text, metadata)
+                return metadata
         
         print(f"[MetadataCache] Cache MISS for hash {hash_key}: {citation_text[:40]}...")
+        metrics.count('metadata_cache', 'miss')
         return None
     
     def set(self, citation_text: str, metadata: CitationMetadata) -> None:
@@ -131,22 +247,168 @@ class CitationMetadataCache:
         if not hash_key or not metadata:
             return
         
-        self._cache[hash_key] = {
+        self._store(hash_key, citation_text, metadata)
+        print(f"[MetadataCache] Stored metadata for hash {hash_key}")
+        
+        if self._shared is not None:
+            self._shared.set(citation_text, metadata)
+    
+    def _store(self, hash_key: str, citation_text: str, metadata: CitationMetadata) -> None:
+        """Add an entry to this document's cache only."""
+        entry = {
             'original_text': citation_text.strip(),
             'hash': hash_key,
             'metadata': metadata.to_dict(),
             'cached_at': datetime.utcnow().isoformat(),
         }
-        print(f"[MetadataCache] Stored metadata for hash {hash_key}")
+        with self._lock:
+            self._cache[hash_key] = entry
+            self._packed.pop(hash_key, None)
+            self._objects.pop(hash_key, None)
+            self._aliases.pop(hash_key, None)
+            if self._index is not None:
+                for key in self._identity_keys(entry['original_text'], entry['metadata']):
+                    self._index[key] = hash_key
+    
+    def _row_metadata(self, values: list) -> Dict[str, Any]:
+        """Metadata dict of a packed row (fields without a value are omitted)."""
+        return {
+            field: value
+            for field, value in zip(self._fields, values)
+            if value is not None
+        }
+    
+    def _entry(self, hash_key: str) -> Optional[Dict[str, Any]]:
+        """The entry for a key (or alias), unpacking a format 2.0 row on first use."""
+        with self._lock:
+            hash_key = self._aliases.get(hash_key, hash_key)
+            entry = self._cache.get(hash_key)
+            if entry is None and hash_key in self._packed:
+                original_text, cached_at, values = self._packed[hash_key]
+                # Into _cache before leaving _packed: the key is never absent from both
+                entry = self._cache[hash_key] = {
+                    'original_text': original_text,
+                    'hash': hash_key,
+                    'metadata': self._row_metadata(values),
+                    'cached_at': cached_at,
+                }
+                del self._packed[hash_key]
+            return entry
+    
+    @staticmethod
+    def _identity_keys(original_text: str, metadata: Dict[str, Any]) -> List[str]:
+        """Secondary-index keys for an entry: identifiers in its text and metadata, normalized text."""
+        keys = text_identity_keys(original_text) + identity_keys_from_dict(metadata)
+        keys.append(normalized_text_key(original_text))
+        return [key for key in keys if key]
+    
+    def _find_variant(self, citation_text: str) -> Optional[str]:
+        """
+        Entry hash for a text that differs only cosmetically from a cached one.
+        
+        Returns:
+            The matching entry's hash, or None
+        """
+        keys = text_identity_keys(citation_text) + [normalized_text_key(citation_text)]
+        with self._lock:
+            if self._index is None:
+                # Built on the first miss, from packed rows without materializing
+                # them; published only once complete
+                index: Dict[str, str] = {}
+                for hash_key, entry in self._cache.items():
+                    for key in self._identity_keys(entry.get('original_text', ''), entry.get('metadata', {})):
+                        index.setdefault(key, hash_key)
+                for hash_key, (original_text, _, values) in self._packed.items():
+                    for key in self._identity_keys(original_text, self._row_metadata(values)):
+                        index.setdefault(key, hash_key)
+                self._index = index
+            
+            for key in keys:
+                hash_key = self._index.get(key) if key else None
+                if hash_key is not None and self._entry(hash_key) is not None:
+                    return hash_key
+        return None
+    
+    def _metadata(self, hash_key: str) -> CitationMetadata:
+        """
+        CitationMetadata for an existing entry, built once.
+        
+        Callers get a shallow copy, so reassigning fields on one result
+        doesn't leak into the cache.
+        """
+        with self._lock:
+            hash_key = self._aliases.get(hash_key, hash_key)
+            metadata = self._objects.get(hash_key)
+            if metadata is None:
+                metadata = self._objects[hash_key] = CitationMetadata.from_dict(
+                    self._entry(hash_key).get('metadata', {})
+                )
+        return copy.copy(metadata)
+    
+    def get_by_hash(self, hash_key: str) -> Optional[CitationMetadata]:
+        """
+        Cached metadata for a cache key recorded in the note state.
+        
+        Args:
+            hash_key: Key as returned by hash_citation_text
+            
+        Returns:
+            CitationMetadata, or None if the entry is gone
+        """
+        with self._lock:
+            if self._entry(hash_key) is None:
+                return None
+            metrics.count('metadata_cache', 'hit_note')
+            return self._metadata(hash_key)
+    
+    # -------------------------------------------------------------------------
+    # Note state (incremental re-processing)
+    # -------------------------------------------------------------------------
+    
+    def previous_notes(self) -> List[Dict[str, str]]:
+        """
+        Note state embedded by the previous run.
+        
+        Returns:
+            List of {'type', 'id', 'text_hash', 'source', 'form'} in document order
+        """
+        return list(self._previous_notes)
+    
+    def record_note(self, note_type: str, note_id: str, written_text: str, source_key: str, form: str) -> None:
+        """
+        Record one note of this run (replaces the previous state on save).
+        
+        Args:
+            note_type: 'endnote' or 'footnote'
+            note_id: The note's w:id
+            written_text: The note's plain text as it now stands in the document
+            source_key: Cache key of the note's source metadata
+            form: 'full', 'short' or 'ibid'
+        """
+        note = {
+            'type': note_type,
+            'id': str(note_id),
+            'text_hash': hash_citation_text(written_text),
+            'source': source_key,
+            'form': form,
+        }
+        with self._lock:
+            self._notes.append(note)
+    
+    def _note_state(self) -> List[Dict[str, str]]:
+        """The notes to embed: this run's if it recorded any, else the loaded ones."""
+        return self._notes or self._previous_notes
     
     def has(self, citation_text: str) -> bool:
         """Check if citation is in cache without retrieving it."""
         hash_key = hash_citation_text(citation_text)
-        return hash_key in self._cache
+        with self._lock:
+            return hash_key in self._cache or hash_key in self._packed or hash_key in self._aliases
     
     def size(self) -> int:
         """Return number of cached citations."""
-        return len(self._cache)
+        with self._lock:
+            return len(self._cache) + len(self._packed)
     
     def get_all_metadata(self) -> List[Dict[str, Any]]:
         """
@@ -156,8 +418,13 @@ class CitationMetadataCache:
         Returns:
             List of metadata dictionaries with original text included
         """
+        with self._lock:
+            for hash_key in list(self._packed):
+                self._entry(hash_key)
+            entries = list(self._cache.items())
+        
         results = []
-        for hash_key, entry in self._cache.items():
+        for hash_key, entry in entries:
             item = entry.get('metadata', {}).copy()
             item['original_text'] = entry.get('original_text', '')
             item['hash'] = hash_key
@@ -167,46 +434,62 @@ class CitationMetadataCache:
     
     def to_xml_string(self) -> str:
         """
-        Serialize the cache to XML string.
+        Serialize the cache to XML string (format 2.0).
+        
+        Materialized entries are encoded against the field dictionary;
+        rows that were never used are written back untouched.
         
         Returns:
             XML string representation of the cache
         """
-        root = ET.Element('citategenie', {
-            'version': self._version,
-            'created': self._created,
-            'xmlns': CITATEGENIE_NS,
-        })
+        # Snapshot: late lookups may still set() while the document is saved
+        with self._lock:
+            fields = list(self._fields)
+            entries = list(self._cache.items())
+            packed = list(self._packed.items())
+            aliases = dict(self._aliases)
+            notes = list(self._note_state())
+        field_index = {field: i for i, field in enumerate(fields)}
         
-        for hash_key, entry in self._cache.items():
-            citation_el = ET.SubElement(root, 'citation', {'hash': hash_key})
-            
-            # Original text
-            original_el = ET.SubElement(citation_el, 'original')
-            original_el.text = entry.get('original_text', '')
-            
-            # Cached timestamp
-            cached_el = ET.SubElement(citation_el, 'cached_at')
-            cached_el.text = entry.get('cached_at', '')
-            
-            # Metadata fields
+        citations = []
+        for hash_key, entry in entries:
             metadata = entry.get('metadata', {})
-            meta_el = ET.SubElement(citation_el, 'metadata')
-            
+            values: List[Any] = [None] * len(fields)
             for key, value in metadata.items():
                 if value is None:
                     continue
-                
-                field_el = ET.SubElement(meta_el, key)
-                
-                if isinstance(value, list):
-                    # Handle lists (e.g., authors)
-                    field_el.text = json.dumps(value)
-                elif isinstance(value, dict):
-                    # Handle dicts (e.g., raw_data)
-                    field_el.text = json.dumps(value)
-                else:
-                    field_el.text = str(value)
+                if key not in field_index:
+                    field_index[key] = len(fields)
+                    fields.append(key)
+                    values.append(None)
+                values[field_index[key]] = value
+            while values and values[-1] is None:
+                values.pop()
+            citations.append([hash_key, entry.get('original_text', ''), entry.get('cached_at', ''), values])
+        
+        for hash_key, row in packed:
+            citations.append([hash_key] + list(row))
+        
+        payload = {
+            'created': self._created,
+            'fields': fields,
+            'citations': citations,
+            'aliases': aliases,
+            'notes': [
+                [n['type'], n['id'], n['text_hash'], n['source'], n['form']]
+                for n in notes
+            ],
+        }
+        raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        
+        root = ET.Element('citategenie', {
+            'version': COMPACT_FORMAT_VERSION,
+            'encoding': COMPACT_ENCODING,
+            'created': self._created,
+            'count': str(len(citations)),
+            'xmlns': CITATEGENIE_NS,
+        })
+        root.text = base64.b64encode(zlib.compress(raw, 9)).decode('ascii')
         
         return ET.tostring(root, encoding='unicode', xml_declaration=True)
     
@@ -226,9 +509,20 @@ class CitationMetadataCache:
         try:
             root = ET.fromstring(xml_string)
             
-            cache._version = root.get('version', '1.0')
+            # The root declares xmlns=CITATEGENIE_NS, so every tag comes back
+            # as {ns}tag - match on local names
+            for el in root.iter():
+                if isinstance(el.tag, str) and el.tag.startswith('{'):
+                    el.tag = el.tag.split('}', 1)[1]
+            
+            cache._version = root.get('version', LEGACY_FORMAT_VERSION)
             cache._created = root.get('created', datetime.utcnow().isoformat())
             
+            if root.get('encoding') == COMPACT_ENCODING:
+                cache._load_compact(root.text or '')
+                print(f"[MetadataCache] Loaded {cache.size()} cached citations (format {cache._version})")
+                return cache
+            
             for citation_el in root.findall('.//citation'):
                 hash_key = citation_el.get('hash')
                 if not hash_key:
@@ -273,19 +567,58 @@ class CitationMetadataCache:
                     'cached_at': cached_at,
                 }
             
+            for note_el in root.findall('./notes/note'):
+                if note_el.get('hash') and note_el.get('source'):
+                    cache._previous_notes.append({
+                        'type': note_el.get('type', ''),
+                        'id': note_el.get('id', ''),
+                        'text_hash': note_el.get('hash'),
+                        'source': note_el.get('source'),
+                        'form': note_el.get('form', 'full'),
+                    })
+            
             print(f"[MetadataCache] Loaded {cache.size()} cached citations from XML")
             
         except ET.ParseError as e:
             print(f"[MetadataCache] Failed to parse XML: {e}")
+        except (ValueError, zlib.error) as e:
+            print(f"[MetadataCache] Failed to decode cache payload: {e}")
         
         return cache
+    
+    def _load_compact(self, text: str) -> None:
+        """Read a format 2.0 payload; rows stay packed until first use."""
+        inflater = zlib.decompressobj()
+        raw = inflater.decompress(base64.b64decode(text), MAX_COMPACT_BYTES)
+        if inflater.unconsumed_tail:
+            raise ValueError(f"payload inflates past {MAX_COMPACT_BYTES} bytes")
+        payload = json.loads(raw.decode('utf-8'))
+        self._created = payload.get('created', self._created)
+        self._fields = list(payload.get('fields', []))
+        for row in payload.get('citations', []):
+            hash_key, original_text, cached_at, values = row
+            self._packed[hash_key] = [original_text, cached_at, values]
+        self._aliases = {
+            alias: target
+            for alias, target in payload.get('aliases', {}).items()
+            if target in self._packed
+        }
+        for note in payload.get('notes', []):
+            note_type, note_id, text_hash, source, form = note
+            self._previous_notes.append({
+                'type': note_type,
+                'id': note_id,
+                'text_hash': text_hash,
+                'source': source,
+                'form': form,
+            })
 
 
 # =============================================================================
 # DOCUMENT OPERATIONS
 # =============================================================================
 
-def load_cache_from_docx(file_bytes: bytes) -> CitationMetadataCache:
+def load_cache_from_docx(file_bytes: Union[bytes, DocxPackage]) -> CitationMetadataCache:
     """
     Load the citation metadata cache from a Word document.
     
@@ -293,35 +626,33 @@ def load_cache_from_docx(file_bytes: bytes) -> CitationMetadataCache:
     Returns empty cache if not found.
     
     Args:
-        file_bytes: The document as bytes
+        file_bytes: The document as bytes, or a shared DocxPackage
         
     Returns:
         CitationMetadataCache (may be empty if no cache found)
     """
     try:
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            # List all files in archive
-            names = zf.namelist()
-            
-            # Look for our custom XML part
-            # Word may store custom XML in various locations
-            possible_paths = [
-                f'{CUSTOM_XML_DIR}/{CUSTOM_XML_ITEM_FILENAME}',
-                f'{CUSTOM_XML_DIR}/item1.xml',  # Word sometimes uses generic names
-                f'{CUSTOM_XML_DIR}/item2.xml',
-                f'{CUSTOM_XML_DIR}/item3.xml',
-            ]
-            
-            for path in possible_paths:
-                if path in names:
-                    content = zf.read(path).decode('utf-8')
-                    # Check if this is our XML (has citategenie root or namespace)
-                    if '<citategenie' in content or CITATEGENIE_NS in content:
-                        print(f"[DocumentMetadata] Found cache at {path}")
-                        return CitationMetadataCache.from_xml_string(content)
-            
-            print("[DocumentMetadata] No existing cache found in document")
-            return CitationMetadataCache()
+        package = DocxPackage.ensure(file_bytes)
+        
+        # Look for our custom XML part
+        # Word may store custom XML in various locations
+        possible_paths = [
+            f'{CUSTOM_XML_DIR}/{CUSTOM_XML_ITEM_FILENAME}',
+            f'{CUSTOM_XML_DIR}/item1.xml',  # Word sometimes uses generic names
+            f'{CUSTOM_XML_DIR}/item2.xml',
+            f'{CUSTOM_XML_DIR}/item3.xml',
+        ]
+        
+        for path in possible_paths:
+            if package.has_part(path):
+                content = package.get_text(path)
+                # Check if this is our XML (has citategenie root or namespace)
+                if '<citategenie' in content or CITATEGENIE_NS in content:
+                    print(f"[DocumentMetadata] Found cache at {path}")
+                    return CitationMetadataCache.from_xml_string(content)
+        
+        print("[DocumentMetadata] No existing cache found in document")
+        return CitationMetadataCache()
             
     except zipfile.BadZipFile:
         print("[DocumentMetadata] Invalid docx file")
@@ -331,6 +662,38 @@ def load_cache_from_docx(file_bytes: bytes) -> CitationMetadataCache:
         return CitationMetadataCache()
 
 
+def save_cache_to_package(package: DocxPackage, cache: CitationMetadataCache) -> bool:
+    """
+    Embed the citation metadata cache into an open DocxPackage, in place.
+    
+    Adds or updates customXml/citategenie.xml and registers it in
+    [Content_Types].xml. Nothing is serialized until package.to_bytes().
+    
+    Args:
+        package: The shared DocxPackage for this run
+        cache: The CitationMetadataCache to embed
+        
+    Returns:
+        True if the cache was written
+    """
+    if cache.size() == 0:
+        print("[DocumentMetadata] Empty cache, skipping embed")
+        return False
+    
+    try:
+        # Write our XML cache
+        package.set_text(f'{CUSTOM_XML_DIR}/{CUSTOM_XML_ITEM_FILENAME}', cache.to_xml_string())
+        print(f"[DocumentMetadata] Wrote cache with {cache.size()} citations to {CUSTOM_XML_ITEM_FILENAME}")
+        
+        # Update [Content_Types].xml to include our custom XML part
+        _update_content_types(package)
+        return True
+        
+    except Exception as e:
+        print(f"[DocumentMetadata] Error saving cache: {e}")
+        return False
+
+
 def save_cache_to_docx(file_bytes: bytes, cache: CitationMetadataCache) -> bytes:
     """
     Embed the citation metadata cache into a Word document.
@@ -349,62 +712,29 @@ def save_cache_to_docx(file_bytes: bytes, cache: CitationMetadataCache) -> bytes
         print("[DocumentMetadata] Empty cache, skipping embed")
         return file_bytes
     
-    temp_dir = tempfile.mkdtemp()
-    
     try:
-        # Extract docx
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            zf.extractall(temp_dir)
-        
-        # Create customXml directory if it doesn't exist
-        custom_xml_dir = os.path.join(temp_dir, CUSTOM_XML_DIR)
-        os.makedirs(custom_xml_dir, exist_ok=True)
-        
-        # Write our XML cache
-        cache_path = os.path.join(custom_xml_dir, CUSTOM_XML_ITEM_FILENAME)
-        xml_content = cache.to_xml_string()
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            f.write(xml_content)
-        
-        print(f"[DocumentMetadata] Wrote cache with {cache.size()} citations to {CUSTOM_XML_ITEM_FILENAME}")
-        
-        # Update [Content_Types].xml to include our custom XML part
-        content_types_path = os.path.join(temp_dir, '[Content_Types].xml')
-        _update_content_types(content_types_path)
-        
-        # Repackage docx
-        output_buffer = BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root_dir, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root_dir, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
-        
-        output_buffer.seek(0)
-        return output_buffer.read()
+        package = DocxPackage(file_bytes)
+        if not save_cache_to_package(package, cache):
+            return file_bytes
+        return package.to_bytes()
         
     except Exception as e:
         print(f"[DocumentMetadata] Error saving cache: {e}")
         return file_bytes
-        
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-def _update_content_types(content_types_path: str) -> None:
+def _update_content_types(package: DocxPackage) -> None:
     """
     Update [Content_Types].xml to include our custom XML content type.
     
     This ensures Word recognizes our custom XML part.
     """
-    if not os.path.exists(content_types_path):
+    if not package.has_part(CONTENT_TYPES_PART):
         return
     
     try:
         # Parse existing content types
-        tree = ET.parse(content_types_path)
-        root = tree.getroot()
+        root = package.get_tree(CONTENT_TYPES_PART)
         
         # Namespace for content types
         ns = {'ct': 'http://schemas.openxmlformats.org/package/2006/content-types'}
@@ -420,7 +750,7 @@ def _update_content_types(content_types_path: str) -> None:
             override.set('PartName', our_path)
             override.set('ContentType', 'application/xml')
             
-            tree.write(content_types_path, encoding='UTF-8', xml_declaration=True)
+            package.mark_modified(CONTENT_TYPES_PART)
             print(f"[DocumentMetadata] Added content type for {our_path}")
             
     except Exception as e:
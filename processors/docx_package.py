@@ -0,0 +1,324 @@
+"""
+citeflex/processors/docx_package.py
+
+In-memory .docx package shared by every stage of a processing run.
+
+A .docx is a ZIP archive of XML parts. Historically each pipeline stage
+(URL/DOI/parenthetical extraction, body text, text replacements, References
+section, LinkActivator, metadata cache embedding) re-opened the upload,
+often extracted it to a temp directory, and zipped it back up. This module
+opens the archive ONCE and lets all stages share it:
+
+- Parts are inflated lazily, on first read, and only once
+- document.xml / footnotes.xml / endnotes.xml are parsed lazily and the
+  ElementTree is cached, so several extractors share one parse
+- A part can be edited either as a tree (get_tree + mark_modified) or as
+  text (get_text + set_text); the two views are kept consistent
+- to_bytes() serializes exactly once at the end, re-compressing only the
+  parts that changed - untouched parts are copied as raw deflated bytes
+
+Every function that used to take file_bytes also accepts a DocxPackage
+(see DocxPackage.ensure), so existing call sites keep working.
+
+Created: 2026-10-16
+"""
+
+import copy
+import re
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from typing import Dict, List, Optional, Union
+
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+DOCUMENT_PART = 'word/document.xml'
+FOOTNOTES_PART = 'word/footnotes.xml'
+ENDNOTES_PART = 'word/endnotes.xml'
+CONTENT_TYPES_PART = '[Content_Types].xml'
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+XML_NS = 'http://www.w3.org/XML/1998/namespace'
+
+# Size of the fixed portion of a ZIP local file header
+_LOCAL_HEADER_SIZE = 30
+
+# Namespace declarations live on the root element, near the top of each part
+_XMLNS_PATTERN = re.compile(rb'xmlns:([A-Za-z_][\w.-]*)="([^"]+)"')
+_XMLNS_SCAN_BYTES = 8192
+
+
+class DocxPackage:
+    """
+    A .docx archive held in memory for the duration of one processing run.
+
+    Usage:
+        package = DocxPackage(file_bytes)
+        urls = extract_urls_from_docx(package)        # parses document.xml
+        ids = extract_identifiers_from_docx(package)  # reuses the same parse
+        apply_text_replacements_to_package(package, replacements)
+        LinkActivator.process_package(package)
+        save_cache_to_package(package, cache)
+        output_bytes = package.to_bytes()             # single serialization
+    """
+
+    def __init__(self, file_bytes: bytes):
+        """
+        Open the archive. Only the central directory is read here.
+
+        Args:
+            file_bytes: The .docx file as bytes
+
+        Raises:
+            zipfile.BadZipFile: If the bytes are not a ZIP archive
+        """
+        self._source = bytes(file_bytes)
+        self._zip = zipfile.ZipFile(BytesIO(self._source), 'r')
+        self._infos: Dict[str, zipfile.ZipInfo] = {
+            info.filename: info for info in self._zip.infolist()
+        }
+        self._order: List[str] = [info.filename for info in self._zip.infolist()]
+
+        # Inflated bytes for parts that have been read
+        self._data: Dict[str, bytes] = {}
+        # Parsed trees (authoritative over _data when the part is in _tree_dirty)
+        self._trees: Dict[str, ET.Element] = {}
+        self._tree_dirty: set = set()
+        # Parts whose bytes differ from the source archive
+        self._modified: set = set()
+        # Derived views of document.xml, dropped whenever it changes
+        self._paragraphs: Optional[List[str]] = None
+
+    @classmethod
+    def ensure(cls, source: Union[bytes, 'DocxPackage']) -> 'DocxPackage':
+        """Return source unchanged if it is already a package, else open it."""
+        if isinstance(source, cls):
+            return source
+        return cls(source)
+
+    # -------------------------------------------------------------------------
+    # Part access
+    # -------------------------------------------------------------------------
+
+    def has_part(self, name: str) -> bool:
+        """Check whether the archive contains a part."""
+        return name in self._infos or name in self._data
+
+    def part_names(self) -> List[str]:
+        """All part names, in archive order (new parts last)."""
+        return list(self._order)
+
+    def read_part(self, name: str) -> Optional[bytes]:
+        """
+        Get the current bytes of a part.
+
+        Returns:
+            Part bytes, or None if the part does not exist
+        """
+        if name in self._tree_dirty:
+            self._flush_tree(name)
+
+        if name not in self._data:
+            if name not in self._infos:
+                return None
+            self._data[name] = self._zip.read(self._infos[name])
+
+        return self._data[name]
+
+    def write_part(self, name: str, data: Union[bytes, str]) -> None:
+        """
+        Replace (or add) a part. Any cached tree for it is discarded.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        if name not in self._infos and name not in self._data:
+            self._order.append(name)
+
+        self._data[name] = data
+        self._trees.pop(name, None)
+        self._tree_dirty.discard(name)
+        self._modified.add(name)
+        self._invalidate(name)
+
+    def get_text(self, name: str) -> Optional[str]:
+        """Get a part decoded as UTF-8 text (for string/regex based editing)."""
+        data = self.read_part(name)
+        if data is None:
+            return None
+        return data.decode('utf-8')
+
+    def set_text(self, name: str, text: str) -> None:
+        """Replace a part with new UTF-8 text."""
+        self.write_part(name, text)
+
+    # -------------------------------------------------------------------------
+    # Tree access
+    # -------------------------------------------------------------------------
+
+    def get_tree(self, name: str) -> Optional[ET.Element]:
+        """
+        Get the parsed root element of an XML part.
+
+        The tree is parsed on first access and cached. Callers that mutate
+        it must call mark_modified(name) so the change is serialized.
+
+        Returns:
+            Root element, or None if the part does not exist
+        """
+        if name in self._trees:
+            return self._trees[name]
+
+        data = self.read_part(name)
+        if data is None:
+            return None
+
+        _register_namespaces(data)
+        root = ET.fromstring(data)
+        self._trees[name] = root
+        return root
+
+    def mark_modified(self, name: str) -> None:
+        """Record that the cached tree for a part has been mutated."""
+        if name not in self._trees:
+            return
+        self._tree_dirty.add(name)
+        self._modified.add(name)
+        self._invalidate(name)
+
+    def _flush_tree(self, name: str) -> None:
+        """Serialize a mutated tree back to bytes."""
+        root = self._trees[name]
+        buffer = BytesIO()
+        ET.ElementTree(root).write(buffer, encoding='UTF-8', xml_declaration=True)
+        self._data[name] = buffer.getvalue()
+        self._tree_dirty.discard(name)
+
+    def _invalidate(self, name: str) -> None:
+        """Drop derived views that depend on a part."""
+        if name == DOCUMENT_PART:
+            self._paragraphs = None
+
+    # -------------------------------------------------------------------------
+    # Shared views
+    # -------------------------------------------------------------------------
+
+    def body_paragraphs(self) -> List[str]:
+        """
+        Text of every w:p in document.xml, in order (empty paragraphs included).
+
+        This is the paragraph walk the URL, DOI and parenthetical extractors
+        all perform; computing it once keeps their global offsets identical.
+        """
+        if self._paragraphs is None:
+            root = self.get_tree(DOCUMENT_PART)
+            paragraphs = []
+            if root is not None:
+                t_tag = f'{{{W_NS}}}t'
+                for para in root.iter(f'{{{W_NS}}}p'):
+                    paragraphs.append(''.join(
+                        t.text for t in para.iter(t_tag) if t.text
+                    ))
+            self._paragraphs = paragraphs
+        return self._paragraphs
+
+    # -------------------------------------------------------------------------
+    # Serialization
+    # -------------------------------------------------------------------------
+
+    def is_modified(self) -> bool:
+        """True if any part differs from the source archive."""
+        return bool(self._modified)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the package.
+
+        Unchanged parts are copied as their original compressed bytes;
+        only modified or new parts are deflated.
+
+        Returns:
+            The .docx file as bytes
+        """
+        if not self._modified:
+            return self._source
+
+        for name in list(self._tree_dirty):
+            self._flush_tree(name)
+
+        output = BytesIO()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zout:
+            for name in self._order:
+                if name in self._modified:
+                    info = self._infos.get(name)
+                    if info is not None:
+                        new_info = zipfile.ZipInfo(name, date_time=info.date_time)
+                        new_info.external_attr = info.external_attr
+                    else:
+                        new_info = zipfile.ZipInfo(name)
+                    new_info.compress_type = zipfile.ZIP_DEFLATED
+                    zout.writestr(new_info, self._data[name])
+                else:
+                    self._copy_raw(zout, self._infos[name])
+
+        return output.getvalue()
+
+    def to_buffer(self) -> BytesIO:
+        """Serialize the package into a rewound BytesIO."""
+        buffer = BytesIO(self.to_bytes())
+        buffer.seek(0)
+        return buffer
+
+    def _copy_raw(self, zout: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        """
+        Copy an unchanged entry without inflating and re-deflating it.
+
+        Falls back to a normal (re-compressing) write if the source entry
+        can't be copied verbatim.
+        """
+        try:
+            offset = info.header_offset
+            header = self._source[offset:offset + _LOCAL_HEADER_SIZE]
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            start = offset + _LOCAL_HEADER_SIZE + name_len + extra_len
+            raw = self._source[start:start + info.compress_size]
+            if len(raw) != info.compress_size or info.flag_bits & 0x01:
+                raise ValueError("entry not copyable")
+
+            new_info = copy.copy(info)
+            new_info.flag_bits &= ~0x08  # sizes go in the local header, no data descriptor
+            new_info.extra = b''
+            new_info.header_offset = zout.fp.tell()
+            zout.fp.write(new_info.FileHeader())
+            zout.fp.write(raw)
+            zout.filelist.append(new_info)
+            zout.NameToInfo[new_info.filename] = new_info
+            zout.start_dir = zout.fp.tell()
+            zout._didModify = True
+        except Exception:
+            zout.writestr(info, self._zip.read(info), compress_type=info.compress_type)
+
+    def close(self) -> None:
+        """Release the source archive."""
+        try:
+            self._zip.close()
+        except Exception:
+            pass
+
+
+def _register_namespaces(data: bytes) -> None:
+    """
+    Register the prefixes declared in a part so ElementTree writes them back
+    as w:, r:, etc. instead of ns0:, ns1: when the tree is serialized.
+    """
+    ET.register_namespace('w', W_NS)
+    ET.register_namespace('xml', XML_NS)
+    for prefix, uri in _XMLNS_PATTERN.findall(data[:_XMLNS_SCAN_BYTES]):
+        try:
+            ET.register_namespace(prefix.decode('ascii'), uri.decode('utf-8'))
+        except ValueError:
+            pass
@@ -13,11 +13,11 @@ Version History:
 """
 
 import zipfile
-from io import BytesIO
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 import xml.etree.ElementTree as ET
 
 from models import CitationMetadata, CitationType
+from processors.docx_package import DocxPackage
 from formatters.base import get_formatter
 
 
@@ -185,7 +185,7 @@ def _get_source_key(metadata: CitationMetadata) -> str:
 
 
 def update_document_footnotes(
-    file_bytes: bytes,
+    file_bytes: Union[bytes, DocxPackage],
     footnote_updates: List[Dict]
 ) -> bytes:
     """
@@ -194,7 +194,7 @@ def update_document_footnotes(
     This function delegates to document_processor for actual XML manipulation.
     
     Args:
-        file_bytes: Original document bytes
+        file_bytes: Original document bytes, or a shared DocxPackage
         footnote_updates: List of dicts with 'note_id' and 'formatted' keys
         
     Returns:
@@ -202,7 +202,7 @@ def update_document_footnotes(
     """
     from document_processor import WordDocumentProcessor, LinkActivator
     
-    processor = WordDocumentProcessor(BytesIO(file_bytes))
+    processor = WordDocumentProcessor(DocxPackage.ensure(file_bytes))
     
     for update in footnote_updates:
         note_id = update.get('note_id')
@@ -215,15 +215,10 @@ def update_document_footnotes(
             else:
                 processor.write_endnote(str(note_id), formatted)
     
-    # Save to buffer
-    output_buffer = processor.save_to_buffer()
-    
-    # Activate URLs as hyperlinks
-    output_buffer = LinkActivator.process(output_buffer)
-    
-    processor.cleanup()
+    # Activate URLs as hyperlinks (in place), then serialize once
+    LinkActivator.process_package(processor.package)
     
-    return output_buffer.read()
+    return processor.package.to_bytes()
 
 
 def process_footnote_document(
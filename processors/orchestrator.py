@@ -23,7 +23,7 @@ Version History:
     2025-12-12 V1.0: Initial implementation
 """
 
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 from dataclasses import dataclass
 
 from processors.url_extractor import extract_urls_from_docx, get_unique_urls
@@ -46,9 +46,10 @@ from processors.author_date_builder import (
 from processors.topic_extractor import extract_topics
 from processors.word_document import (
     extract_body_text,
-    apply_text_replacements,
-    append_references_section
+    apply_text_replacements_to_package,
+    append_references_to_package,
 )
+from processors.docx_package import DocxPackage
 from models import CitationMetadata
 
 
@@ -157,9 +158,12 @@ def _process_author_date_style(
         # Step 1: Extract all citation candidates from body
         print(f"[Orchestrator] Extracting citations from document body...")
         
-        urls = extract_urls_from_docx(file_bytes)
-        identifiers = extract_identifiers_from_docx(file_bytes)
-        parentheticals = extract_parentheticals_from_docx(file_bytes)
+        # Open the upload once; all extractors share the same parse
+        package = DocxPackage(file_bytes)
+        
+        urls = extract_urls_from_docx(package)
+        identifiers = extract_identifiers_from_docx(package)
+        parentheticals = extract_parentheticals_from_docx(package)
         
         # Combine and deduplicate
         all_extractions = []
@@ -202,7 +206,7 @@ def _process_author_date_style(
             )
         
         # Step 2: Extract document topics for AI context
-        body_text = extract_body_text(file_bytes)
+        body_text = extract_body_text(package)
         topics = extract_topics(body_text)
         document_context = ", ".join(topics) if topics else ""
         print(f"[Orchestrator] Document topics: {document_context[:100]}...")
@@ -237,19 +241,19 @@ def _process_author_date_style(
         )
         
         # Step 5: Apply replacements to document body
-        updated_bytes = apply_text_replacements(file_bytes, replacements)
+        apply_text_replacements_to_package(package, replacements)
         
         # Step 6: Append References section
         if references_section:
-            updated_bytes = append_references_section(updated_bytes, references_section, style)
+            append_references_to_package(package, references_section, style)
         
         # Step 7: Activate URLs if requested
         if add_links:
             from document_processor import LinkActivator
-            from io import BytesIO
-            buffer = BytesIO(updated_bytes)
-            buffer = LinkActivator.process(buffer)
-            updated_bytes = buffer.read()
+            LinkActivator.process_package(package)
+        
+        # Serialize once
+        updated_bytes = package.to_bytes()
         
         return ProcessingResult(
             success=True,
@@ -337,7 +341,7 @@ def process_single_citation(
     return get_citation(text, style)
 
 
-def detect_style_from_document(file_bytes: bytes) -> str:
+def detect_style_from_document(file_bytes: Union[bytes, DocxPackage]) -> str:
     """
     Attempt to detect citation style from document content.
     
@@ -346,28 +350,26 @@ def detect_style_from_document(file_bytes: bytes) -> str:
     - (Author, Year) patterns → likely APA/MLA
     
     Args:
-        file_bytes: Document bytes
+        file_bytes: Document bytes, or a shared DocxPackage
         
     Returns:
         Detected style name or "APA 7" as default
     """
     from document_processor import WordDocumentProcessor
-    from io import BytesIO
     
-    processor = WordDocumentProcessor(BytesIO(file_bytes))
+    package = DocxPackage.ensure(file_bytes)
+    processor = WordDocumentProcessor(package)
     
     # Check for existing footnotes/endnotes
     footnotes = processor.get_footnotes()
     endnotes = processor.get_endnotes()
     
-    processor.cleanup()
-    
     if footnotes or endnotes:
         # Document has footnotes - likely needs footnote style
         return "Chicago Manual of Style"
     
     # Check body for parenthetical patterns
-    body_text = extract_body_text(file_bytes)
+    body_text = extract_body_text(package)
     
     import re
     # Look for (Author, Year) patterns
@@ -15,10 +15,9 @@ Version History:
 """
 
 import re
-import zipfile
-from io import BytesIO
-from typing import List, Dict, Optional, Tuple
-import xml.etree.ElementTree as ET
+from typing import List, Dict, Optional, Tuple, Union
+
+from processors.docx_package import DocxPackage, DOCUMENT_PART
 
 
 # =============================================================================
@@ -306,60 +305,47 @@ def extract_all_parentheticals(text: str) -> List[Dict]:
     return results
 
 
-def extract_parentheticals_from_docx(file_bytes: bytes) -> List[Dict]:
+def extract_parentheticals_from_docx(file_bytes: Union[bytes, DocxPackage]) -> List[Dict]:
     """
     Extract parenthetical citations from a Word document's body text.
     
     Args:
-        file_bytes: The .docx file as bytes
+        file_bytes: The .docx file as bytes, or a shared DocxPackage
         
     Returns:
         List of citation dicts with position data
     """
     try:
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            if 'word/document.xml' not in zf.namelist():
-                print("[ParentheticalExtractor] No document.xml found")
-                return []
-            
-            with zf.open('word/document.xml') as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-            
-            ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-            
-            results = []
-            char_offset = 0
-            
-            for para in root.findall('.//w:p', ns):
-                para_text_parts = []
-                
-                for t in para.findall('.//w:t', ns):
-                    if t.text:
-                        para_text_parts.append(t.text)
-                
-                para_text = ''.join(para_text_parts)
-                
-                # Find citations in this paragraph
-                para_citations = extract_all_parentheticals(para_text)
-                
-                for cite in para_citations:
-                    cite['paragraph_offset'] = char_offset
-                    cite['global_start'] = char_offset + cite['start']
-                    cite['global_end'] = char_offset + cite['end']
-                    results.append(cite)
-                
-                char_offset += len(para_text) + 1
-            
-            # Count by type
-            type_counts = {}
-            for r in results:
-                t = r['type']
-                type_counts[t] = type_counts.get(t, 0) + 1
+        package = DocxPackage.ensure(file_bytes)
+        
+        if not package.has_part(DOCUMENT_PART):
+            print("[ParentheticalExtractor] No document.xml found")
+            return []
+        
+        results = []
+        char_offset = 0
+        
+        for para_text in package.body_paragraphs():
+            # Find citations in this paragraph
+            para_citations = extract_all_parentheticals(para_text)
             
-            print(f"[ParentheticalExtractor] Found citations: {type_counts}")
-            return results
+            for cite in para_citations:
+                cite['paragraph_offset'] = char_offset
+                cite['global_start'] = char_offset + cite['start']
+                cite['global_end'] = char_offset + cite['end']
+                results.append(cite)
             
+            char_offset += len(para_text) + 1
+        
+        # Count by type
+        type_counts = {}
+        for r in results:
+            t = r['type']
+            type_counts[t] = type_counts.get(t, 0) + 1
+        
+        print(f"[ParentheticalExtractor] Found citations: {type_counts}")
+        return results
+        
     except Exception as e:
         print(f"[ParentheticalExtractor] Error: {e}")
         return []
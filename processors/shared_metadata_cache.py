@@ -0,0 +1,441 @@
+"""
+citeflex/processors/shared_metadata_cache.py
+
+Process-wide citation metadata cache (second tier behind CitationMetadataCache).
+
+The embedded document cache (document_metadata.py) only helps when the SAME
+document is processed again. Across uploads, users keep citing the same few
+thousand canonical works, so this tier is shared by every document processed
+in the worker:
+
+- Bounded LRU with a TTL per entry
+- Keyed on the exact-text hash AND on normalized identifiers (DOI, PMID,
+  ISBN-13, canonical URL), so "https://doi.org/10.1086/226147" and
+  "doi:10.1086/226147" hit the same entry
+- Optional SQLite backing (METADATA_CACHE_DB) so entries survive gunicorn
+  worker restarts and are shared between workers on the same host
+
+CitationMetadataCache consults this tier on a miss and writes through to it,
+so route_citation() needs no changes.
+
+Created: 2026-10-16
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from models import CitationMetadata, normalize_doi
+
+
+# =============================================================================
+# IDENTIFIER KEYS
+# =============================================================================
+
+_DOI_PATTERN = re.compile(r'\b(10\.\d{4,}/[^\s<>"\')\],;]+)', re.IGNORECASE)
+_PMID_PATTERN = re.compile(r'\bPMID:?\s*(\d{6,9})\b', re.IGNORECASE)
+_ISBN_PATTERN = re.compile(r'\bISBN(?:-1[03])?[-:]?\s*((?:\d[-\s]?){9}[\dXx]|(?:\d[-\s]?){13})\b', re.IGNORECASE)
+
+# Query parameters that never change which page a URL points to
+_TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'ref_src')
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical form of a URL for cache keys.
+
+    Lowercases scheme and host, drops "www.", the fragment, trailing slashes
+    and tracking parameters. Unlike document_processor.normalize_url, other
+    query parameters are kept (youtube.com/watch?v=... must stay distinct).
+
+    Args:
+        url: The URL to canonicalize
+
+    Returns:
+        Canonical URL, or "" if it isn't an http(s) URL
+    """
+    if not url:
+        return ""
+
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return ""
+
+    if parts.scheme.lower() not in ('http', 'https') or not parts.netloc:
+        return ""
+
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    ))
+    path = parts.path.rstrip('/')
+
+    return urlunsplit(('https', host, path, query, ''))
+
+
+def _normalize_isbn(isbn: str) -> str:
+    """
+    ISBN-13 digits, so an ISBN-10 and its ISBN-13 form share a key.
+
+    Anything that isn't a 10-character ISBN is returned as digits (and a
+    trailing X) only.
+    """
+    digits = re.sub(r'[^\dXx]', '', isbn or '').upper()
+    if len(digits) == 10 and digits[:9].isdigit():
+        core = '978' + digits[:9]
+        check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(core)) % 10) % 10
+        return core + str(check)
+    return digits
+
+
+# Runs of anything but letters and digits (punctuation, spacing, dashes)
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalized_text_key(text: str) -> str:
+    """
+    Key for a citation's text that ignores cosmetic differences.
+
+    Case, Unicode form, punctuation and spacing are dropped, so
+    "Smith 2020" and "Smith, 2020." share a key; words and numbers
+    (including page numbers) still have to match.
+
+    Args:
+        text: The citation text
+
+    Returns:
+        Key like "norm:<hash>", or "" if nothing is left after normalizing
+    """
+    if not text:
+        return ""
+    normalized = _NON_WORD.sub(' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+    if not normalized:
+        return ""
+    return "norm:" + hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+def text_identity_keys(text: str) -> List[str]:
+    """
+    Normalized identifier keys found in a citation's text.
+
+    Only unambiguous identifiers are used: a bare URL, or a text containing
+    exactly one DOI / PMID / ISBN. A note citing several works must not
+    borrow the metadata of just one of them.
+
+    Args:
+        text: The citation text
+
+    Returns:
+        List of keys like "doi:10.1086/226147", "url:https://example.com/a"
+    """
+    if not text:
+        return []
+
+    text = text.strip()
+    keys = []
+
+    if text.lower().startswith(('http://', 'https://')) and not re.search(r'\s', text):
+        doi = normalize_doi(text)
+        if doi.startswith('10.') and doi != text.lower():
+            keys.append(f"doi:{doi}")
+        else:
+            url = canonical_url(text)
+            if url:
+                keys.append(f"url:{url}")
+        return keys
+
+    dois = {normalize_doi(d).rstrip('.') for d in _DOI_PATTERN.findall(text)}
+    if len(dois) == 1:
+        keys.append(f"doi:{dois.pop()}")
+
+    pmids = set(_PMID_PATTERN.findall(text))
+    if len(pmids) == 1:
+        keys.append(f"pmid:{pmids.pop()}")
+
+    isbns = {_normalize_isbn(i) for i in _ISBN_PATTERN.findall(text)}
+    if len(isbns) == 1:
+        keys.append(f"isbn:{isbns.pop()}")
+
+    return keys
+
+
+def metadata_identity_keys(metadata: CitationMetadata) -> List[str]:
+    """
+    Normalized identifier keys for resolved metadata.
+
+    Args:
+        metadata: The resolved CitationMetadata
+
+    Returns:
+        List of keys (see text_identity_keys)
+    """
+    return identity_keys_from_dict({
+        'doi': metadata.doi,
+        'pmid': metadata.pmid,
+        'isbn': metadata.isbn,
+        'url': metadata.url,
+    })
+
+
+def identity_keys_from_dict(data: Dict[str, Any]) -> List[str]:
+    """
+    Normalized identifier keys for metadata stored as a dict
+    (CitationMetadata.to_dict() form), without building the object.
+
+    Args:
+        data: Metadata dict with optional doi / pmid / isbn / url
+
+    Returns:
+        List of keys (see text_identity_keys)
+    """
+    keys = []
+
+    doi = normalize_doi(data.get('doi') or '')
+    if doi:
+        keys.append(f"doi:{doi}")
+    pmid = str(data.get('pmid') or '').strip()
+    if pmid:
+        keys.append(f"pmid:{pmid}")
+    isbn = _normalize_isbn(data.get('isbn') or '')
+    if isbn:
+        keys.append(f"isbn:{isbn}")
+    url = canonical_url(data.get('url') or '')
+    if url:
+        keys.append(f"url:{url}")
+
+    return keys
+
+
+# =============================================================================
+# SHARED CACHE
+# =============================================================================
+
+class SharedMetadataCache:
+    """
+    Thread-safe, bounded LRU + TTL cache of CitationMetadata.
+
+    Values are stored as metadata dicts, and a fresh CitationMetadata is
+    built on every hit, so callers can't mutate a shared entry.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 7 * 24 * 3600, db_path: str = ""):
+        """
+        Args:
+            max_entries: Maximum number of keys held in memory
+            ttl_seconds: How long an entry stays valid
+            db_path: Optional SQLite file for persistent backing ("" = memory only)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._open_db(db_path)
+
+    # -------------------------------------------------------------------------
+    # Public interface (mirrors CitationMetadataCache)
+    # -------------------------------------------------------------------------
+
+    def get(self, citation_text: str) -> Optional[CitationMetadata]:
+        """
+        Look up metadata by exact text, then by any identifier in the text.
+
+        Args:
+            citation_text: The original citation text
+
+        Returns:
+            CitationMetadata if found and not expired, None otherwise
+        """
+        from processors.document_metadata import hash_citation_text
+
+        hash_key = hash_citation_text(citation_text)
+        if not hash_key:
+            return None
+
+        for key in [f"text:{hash_key}"] + text_identity_keys(citation_text):
+            data = self._lookup(key)
+            if data is not None:
+                self._hits += 1
+                print(f"[SharedCache] HIT on {key[:60]}")
+                metadata = CitationMetadata.from_dict(data)
+                metadata.raw_source = citation_text.strip()
+                return metadata
+
+        self._misses += 1
+        return None
+
+    def set(self, citation_text: str, metadata: CitationMetadata) -> None:
+        """
+        Store metadata under the text hash and its identifier keys.
+
+        An identifier found in the text is only used as a key if the
+        metadata carries it too: a note with DOI X that resolved to some
+        other work must not answer later lookups for X.
+
+        Args:
+            citation_text: The original citation text
+            metadata: The resolved CitationMetadata
+        """
+        from processors.document_metadata import hash_citation_text
+
+        hash_key = hash_citation_text(citation_text)
+        if not hash_key or not metadata:
+            return
+
+        identity_keys = metadata_identity_keys(metadata)
+        keys = [f"text:{hash_key}"] + identity_keys
+        keys += [key for key in text_identity_keys(citation_text) if key in identity_keys]
+        keys = list(dict.fromkeys(keys))
+        data = metadata.to_dict()
+        expires_at = time.time() + self.ttl_seconds
+
+        with self._lock:
+            for key in keys:
+                self._entries[key] = (expires_at, data)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        self._db_put(keys, data, expires_at)
+
+    def size(self) -> int:
+        """Number of keys held in memory."""
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for diagnostics."""
+        total = self._hits + self._misses
+        return {
+            'entries': self.size(),
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / total, 3) if total else 0.0,
+            'persistent': self._db is not None,
+        }
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the SQLite file is left alone)."""
+        with self._lock:
+            self._entries.clear()
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Memory first, then SQLite (promoting the entry into memory)."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        entry = self._db_get(key, now)
+        if entry is None:
+            return None
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[1]
+
+    def _open_db(self, db_path: str) -> None:
+        """Open (or create) the SQLite backing store; memory-only on failure."""
+        try:
+            conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata_cache ("
+                " key TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("DELETE FROM metadata_cache WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+            self._db = conn
+            print(f"[SharedCache] Persistent cache at {db_path}")
+        except sqlite3.Error as e:
+            print(f"[SharedCache] Could not open {db_path}, using memory only: {e}")
+            self._db = None
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT data, expires_at FROM metadata_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+            if row is None:
+                return None
+            return row[1], json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[SharedCache] Read error: {e}")
+            return None
+
+    def _db_put(self, keys: List[str], data: Dict[str, Any], expires_at: float) -> None:
+        if self._db is None:
+            return
+        try:
+            payload = json.dumps(data, default=str)
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO metadata_cache (key, data, expires_at) VALUES (?, ?, ?)",
+                    [(key, payload, expires_at) for key in keys]
+                )
+                self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[SharedCache] Write error: {e}")
+
+
+# =============================================================================
+# PROCESS-WIDE INSTANCE
+# =============================================================================
+
+_shared_cache: Optional[SharedMetadataCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_metadata_cache() -> SharedMetadataCache:
+    """
+    Get the process-wide cache, creating it from config on first use.
+
+    Returns:
+        The SharedMetadataCache singleton
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                from config import SHARED_CACHE_MAX_ENTRIES, SHARED_CACHE_TTL, SHARED_CACHE_DB
+                _shared_cache = SharedMetadataCache(
+                    max_entries=SHARED_CACHE_MAX_ENTRIES,
+                    ttl_seconds=SHARED_CACHE_TTL,
+                    db_path=SHARED_CACHE_DB,
+                )
+    return _shared_cache
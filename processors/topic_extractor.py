@@ -18,10 +18,9 @@ Version History:
 
 import re
 from collections import Counter
-from typing import List, Optional
-import zipfile
-from io import BytesIO
-import xml.etree.ElementTree as ET
+from typing import List, Optional, Union
+
+from processors.docx_package import DocxPackage, DOCUMENT_PART
 
 
 # Common English stop words to exclude
@@ -77,35 +76,33 @@ ACADEMIC_STOP_WORDS = {
 ALL_STOP_WORDS = STOP_WORDS | ACADEMIC_STOP_WORDS
 
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
+def extract_text_from_docx(file_bytes: Union[bytes, DocxPackage]) -> str:
     """
     Extract body text from a .docx file.
     
     Args:
-        file_bytes: The document as bytes
+        file_bytes: The document as bytes, or a shared DocxPackage
         
     Returns:
         Plain text content of the document body
     """
     try:
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            # Read document.xml (main body)
-            if 'word/document.xml' not in zf.namelist():
-                return ""
-            
-            with zf.open('word/document.xml') as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-            
-            # Extract all text elements
-            ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-            text_parts = []
-            
-            for t in root.findall('.//w:t', ns):
-                if t.text:
-                    text_parts.append(t.text)
-            
-            return ' '.join(text_parts)
+        package = DocxPackage.ensure(file_bytes)
+        
+        # Read document.xml (main body)
+        root = package.get_tree(DOCUMENT_PART)
+        if root is None:
+            return ""
+        
+        # Extract all text elements
+        ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+        text_parts = []
+        
+        for t in root.findall('.//w:t', ns):
+            if t.text:
+                text_parts.append(t.text)
+        
+        return ' '.join(text_parts)
             
     except Exception as e:
         print(f"[TopicExtractor] Error extracting text: {e}")
@@ -142,12 +139,12 @@ def extract_topics(text: str, max_topics: int = 15) -> List[str]:
     return top_words[:max_topics]
 
 
-def extract_topics_from_docx(file_bytes: bytes, max_topics: int = 15) -> List[str]:
+def extract_topics_from_docx(file_bytes: Union[bytes, DocxPackage], max_topics: int = 15) -> List[str]:
     """
     Extract topic keywords directly from a .docx file.
     
     Args:
-        file_bytes: The document as bytes
+        file_bytes: The document as bytes, or a shared DocxPackage
         max_topics: Maximum number of topics to return
         
     Returns:
@@ -178,12 +175,12 @@ def format_context_string(topics: List[str]) -> str:
 # MAIN ENTRY POINT
 # =============================================================================
 
-def get_document_context(file_bytes: bytes, max_topics: int = 15) -> str:
+def get_document_context(file_bytes: Union[bytes, DocxPackage], max_topics: int = 15) -> str:
     """
     Main entry point: Extract topics from docx and format as context string.
     
     Args:
-        file_bytes: The document as bytes
+        file_bytes: The document as bytes, or a shared DocxPackage
         max_topics: Maximum topics to include
         
     Returns:
@@ -20,18 +20,20 @@ Version History:
                 Phase 2: Sequential ibid/short form logic (fixes history tracking)
 """
 
-import os
 import re
 import html
-import zipfile
-import tempfile
-import shutil
 import xml.etree.ElementTree as ET
 from typing import List, Optional, Dict, Any, Tuple
 from dataclasses import dataclass, field
 from io import BytesIO
 
 from models import normalize_doi
+from processors.docx_package import (
+    DocxPackage,
+    DOCUMENT_PART,
+    FOOTNOTES_PART,
+    ENDNOTES_PART,
+)
 
 
 # =============================================================================
@@ -361,21 +363,64 @@ class WordDocumentProcessor:
     
     def __init__(self, file_path_or_buffer):
         """
-        Initialize with a file path or file-like object (BytesIO).
+        Initialize with a file path, file-like object (BytesIO), raw bytes,
+        or a DocxPackage shared with other pipeline stages.
+        
+        The archive is held in memory - nothing is extracted to disk.
         """
-        self.temp_dir = tempfile.mkdtemp()
         self.original_path = None
         
-        # Handle both file paths and file-like objects
-        if hasattr(file_path_or_buffer, 'read'):
+        if isinstance(file_path_or_buffer, DocxPackage):
+            # Shared package (e.g., also used by the metadata cache)
+            self.package = file_path_or_buffer
+        elif isinstance(file_path_or_buffer, (bytes, bytearray)):
+            self.package = DocxPackage(file_path_or_buffer)
+        elif hasattr(file_path_or_buffer, 'read'):
             # It's a file-like object (e.g., from upload)
-            with zipfile.ZipFile(file_path_or_buffer, 'r') as z:
-                z.extractall(self.temp_dir)
+            self.package = DocxPackage(file_path_or_buffer.read())
         else:
             # It's a file path
             self.original_path = file_path_or_buffer
-            with zipfile.ZipFile(file_path_or_buffer, 'r') as z:
-                z.extractall(self.temp_dir)
+            with open(file_path_or_buffer, 'rb') as f:
+                self.package = DocxPackage(f.read())
+        
+        # Batched note writes: note elements indexed by w:id, built once
+        # per notes part from the package's cached tree. write_endnote /
+        # write_footnote mutate these elements in place; the part is
+        # serialized once, when the package is saved.
+        self._note_index: Dict[str, Dict[str, ET.Element]] = {}
+        self._note_index_roots: Dict[str, ET.Element] = {}
+    
+    def _find_note(self, part_name: str, note_tag: str, note_id: str) -> Optional[ET.Element]:
+        """
+        Look up a w:endnote / w:footnote element by its w:id.
+        
+        The notes part is parsed once (via the shared package) and indexed
+        on first use, so each lookup is O(1) instead of a reparse and scan.
+        The index is rebuilt if the part was replaced underneath us
+        (e.g., by a text-based edit such as LinkActivator).
+        
+        Args:
+            part_name: ENDNOTES_PART or FOOTNOTES_PART
+            note_tag: 'endnote' or 'footnote'
+            note_id: The note ID to find
+            
+        Returns:
+            The note element, or None if not found
+        """
+        root = self.package.get_tree(part_name)
+        if root is None:
+            return None
+        
+        if self._note_index_roots.get(part_name) is not root:
+            id_attr = f"{{{self.NS['w']}}}id"
+            self._note_index[part_name] = {
+                note.get(id_attr): note
+                for note in root.iter(f"{{{self.NS['w']}}}{note_tag}")
+            }
+            self._note_index_roots[part_name] = root
+        
+        return self._note_index[part_name].get(str(note_id))
     
     def get_endnotes(self) -> List[Dict[str, str]]:
         """
@@ -384,13 +429,11 @@ class WordDocumentProcessor:
         Returns:
             List of dicts: [{'id': '1', 'text': 'citation text'}, ...]
         """
-        endnotes_path = os.path.join(self.temp_dir, 'word', 'endnotes.xml')
-        if not os.path.exists(endnotes_path):
+        if not self.package.has_part(ENDNOTES_PART):
             return []
         
         try:
-            tree = ET.parse(endnotes_path)
-            root = tree.getroot()
+            root = self.package.get_tree(ENDNOTES_PART)
             notes = []
             
             for endnote in root.findall('.//w:endnote', self.NS):
@@ -426,13 +469,11 @@ class WordDocumentProcessor:
         Returns:
             List of dicts: [{'id': '1', 'text': 'citation text'}, ...]
         """
-        footnotes_path = os.path.join(self.temp_dir, 'word', 'footnotes.xml')
-        if not os.path.exists(footnotes_path):
+        if not self.package.has_part(FOOTNOTES_PART):
             return []
         
         try:
-            tree = ET.parse(footnotes_path)
-            root = tree.getroot()
+            root = self.package.get_tree(FOOTNOTES_PART)
             notes = []
             
             for footnote in root.findall('.//w:footnote', self.NS):
@@ -474,24 +515,12 @@ class WordDocumentProcessor:
         Returns:
             bool: True if successful
         """
-        endnotes_path = os.path.join(self.temp_dir, 'word', 'endnotes.xml')
-        if not os.path.exists(endnotes_path):
+        if not self.package.has_part(ENDNOTES_PART):
             return False
         
         try:
-            # Register namespace to preserve it
-            ET.register_namespace('w', self.NS['w'])
-            ET.register_namespace('xml', self.NS['xml'])
-            
-            tree = ET.parse(endnotes_path)
-            root = tree.getroot()
-            
-            # Find the target endnote
-            target = None
-            for endnote in root.findall('.//w:endnote', self.NS):
-                if endnote.get(f"{{{self.NS['w']}}}id") == str(note_id):
-                    target = endnote
-                    break
+            # Find the target endnote (indexed, no reparse)
+            target = self._find_note(ENDNOTES_PART, 'endnote', note_id)
             
             if target is None:
                 return False
@@ -568,7 +597,8 @@ class WordDocumentProcessor:
                 t.text = text_content
                 t.set(f"{{{self.NS['xml']}}}space", "preserve")
             
-            tree.write(endnotes_path, encoding='UTF-8', xml_declaration=True)
+            # Queued in memory; serialized once by save_to_buffer()
+            self.package.mark_modified(ENDNOTES_PART)
             return True
             
         except Exception as e:
@@ -581,22 +611,11 @@ class WordDocumentProcessor:
         Handles <i> tags for italics using regex (no BeautifulSoup needed).
         PRESERVES the footnoteRef element for proper numbering and linking.
         """
-        footnotes_path = os.path.join(self.temp_dir, 'word', 'footnotes.xml')
-        if not os.path.exists(footnotes_path):
+        if not self.package.has_part(FOOTNOTES_PART):
             return False
         
         try:
-            ET.register_namespace('w', self.NS['w'])
-            ET.register_namespace('xml', self.NS['xml'])
-            
-            tree = ET.parse(footnotes_path)
-            root = tree.getroot()
-            
-            target = None
-            for footnote in root.findall('.//w:footnote', self.NS):
-                if footnote.get(f"{{{self.NS['w']}}}id") == str(note_id):
-                    target = footnote
-                    break
+            target = self._find_note(FOOTNOTES_PART, 'footnote', note_id)
             
             if target is None:
                 return False
@@ -672,7 +691,8 @@ class WordDocumentProcessor:
                 t.text = text_content
                 t.set(f"{{{self.NS['xml']}}}space", "preserve")
             
-            tree.write(footnotes_path, encoding='UTF-8', xml_declaration=True)
+            # Queued in memory; serialized once by save_to_buffer()
+            self.package.mark_modified(FOOTNOTES_PART)
             return True
             
         except Exception as e:
@@ -683,18 +703,13 @@ class WordDocumentProcessor:
         """
         Save the modified document to a BytesIO buffer.
         
+        All queued note writes are flushed here - each notes part is
+        serialized exactly once, however many notes were replaced.
+        
         Returns:
             BytesIO buffer containing the .docx file
         """
-        buffer = BytesIO()
-        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(self.temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, self.temp_dir)
-                    zipf.write(file_path, arcname)
-        buffer.seek(0)
-        return buffer
+        return self.package.to_buffer()
     
     def save_as(self, output_path: str) -> None:
         """
@@ -703,24 +718,17 @@ class WordDocumentProcessor:
         Args:
             output_path: Path for the output .docx file
         """
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(self.temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, self.temp_dir)
-                    zipf.write(file_path, arcname)
+        with open(output_path, 'wb') as f:
+            f.write(self.package.to_bytes())
     
     def cleanup(self) -> None:
-        """Remove temporary files."""
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-    
-    def __del__(self):
-        """Cleanup on deletion."""
-        try:
-            self.cleanup()
-        except:
-            pass
+        """
+        Release resources.
+        
+        The document lives in memory, so there are no temporary files to
+        remove. Kept so existing callers don't need to change.
+        """
+        pass
 
 
 class LinkActivator:
@@ -749,53 +757,49 @@ class LinkActivator:
         Returns:
             BytesIO containing the processed .docx file with clickable URLs
         """
-        temp_dir = tempfile.mkdtemp()
-        
         try:
-            # Extract docx to temp directory
             docx_buffer.seek(0)
-            with zipfile.ZipFile(docx_buffer, 'r') as zf:
-                zf.extractall(temp_dir)
-            
-            # Process each relevant XML file
-            target_files = [
-                'word/document.xml',
-                'word/endnotes.xml',
-                'word/footnotes.xml'
-            ]
+            package = DocxPackage(docx_buffer.read())
             
-            for xml_file in target_files:
-                full_path = os.path.join(temp_dir, xml_file)
-                if os.path.exists(full_path):
-                    cls._process_xml_file(full_path)
+            cls.process_package(package)
             
-            # Repackage as docx
-            output_buffer = BytesIO()
-            with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for root, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        zf.write(file_path, arcname)
-            
-            output_buffer.seek(0)
-            return output_buffer
+            return package.to_buffer()
             
         except Exception as e:
             print(f"[LinkActivator] Error: {e}")
             docx_buffer.seek(0)
             return docx_buffer
-            
-        finally:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
     
     @classmethod
-    def _process_xml_file(cls, file_path: str):
-        """Process a single XML file to convert URLs to hyperlinks."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def process_package(cls, package: DocxPackage) -> None:
+        """
+        Make all URLs clickable in a shared DocxPackage (modified in place).
         
+        Args:
+            package: The in-memory document package
+        """
+        # Process each relevant XML part
+        target_files = [
+            DOCUMENT_PART,
+            ENDNOTES_PART,
+            FOOTNOTES_PART,
+        ]
+        
+        for xml_file in target_files:
+            try:
+                content = package.get_text(xml_file)
+                if content is None:
+                    continue
+                
+                new_content = cls._process_xml_content(content)
+                if new_content != content:
+                    package.set_text(xml_file, new_content)
+            except Exception as e:
+                print(f"[LinkActivator] Error processing {xml_file}: {e}")
+    
+    @classmethod
+    def _process_xml_content(cls, content: str) -> str:
+        """Convert URLs to hyperlinks in the XML text of a single part."""
         # Pattern to find URLs within w:t elements
         pattern = r'(<w:t[^>]*>)([^<]*?)(https?://[^\s<>"]+)([^<]*?)(</w:t>)'
         
@@ -848,11 +852,7 @@ class LinkActivator:
             return result
         
         # Apply the replacement
-        new_content = re.sub(pattern, replace_url, content)
-        
-        # Write back
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+        return re.sub(pattern, replace_url, content)
     
     @classmethod
     def _build_hyperlink_field(cls, safe_url: str, display_text: str) -> str:
@@ -915,6 +915,7 @@ def process_document(
     from routers.unified import get_citation
     from formatters.base import BaseFormatter, get_formatter
     from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+    from negative_cache import submit_in_context
     
     # Per-note timeout to prevent indefinite hanging
     NOTE_TIMEOUT = 8  # seconds per note
@@ -927,8 +928,9 @@ def process_document(
     # Get the formatter for short form citations
     formatter = get_formatter(style)
     
-    # Load document
-    processor = WordDocumentProcessor(BytesIO(file_bytes))
+    # Load document (held in memory for the whole run)
+    package = DocxPackage(file_bytes)
+    processor = WordDocumentProcessor(package)
     
     # Get all endnotes and footnotes
     endnotes = processor.get_endnotes()
@@ -1023,8 +1025,10 @@ def process_document(
         print(f"[process_document] Fetching: {note.get('text', '')[:40]}...")
         return fetch_metadata_for_note(note, note_type)
     
+    # Carry the caller's context (cost ledger, document trace) into the workers
     with ThreadPoolExecutor(max_workers=PARALLEL_WORKERS) as executor:
-        fetched_data = list(executor.map(fetch_wrapper, all_notes))
+        futures = [submit_in_context(executor, fetch_wrapper, note) for note in all_notes]
+        fetched_data = [future.result() for future in futures]
     
     print(f"[process_document] Phase 1 complete: {len(fetched_data)} notes fetched")
     
@@ -1182,17 +1186,12 @@ def process_document(
     
     print(f"[process_document] Phase 2 complete: {len(results)} notes processed")
     
-    # Save to buffer
-    doc_buffer = processor.save_to_buffer()
-    
     # Make URLs clickable if requested
     if add_links:
-        doc_buffer = LinkActivator.process(doc_buffer)
-    
-    # Cleanup
-    processor.cleanup()
+        LinkActivator.process_package(package)
     
-    return doc_buffer.read(), results
+    # Serialize once
+    return package.to_bytes(), results
 
 
 # =============================================================================
@@ -1215,34 +1214,19 @@ def update_document_note(doc_bytes: bytes, note_id: int, new_html: str) -> bytes
     Returns:
         Updated document as bytes
     """
-    import io
-    import zipfile
-    import tempfile
-    import shutil
-    import re
-    
     try:
-        # Extract the docx
-        temp_dir = tempfile.mkdtemp()
-        
-        with zipfile.ZipFile(io.BytesIO(doc_bytes), 'r') as zf:
-            zf.extractall(temp_dir)
-        
-        # Find and update the endnote
-        endnotes_path = os.path.join(temp_dir, 'word', 'endnotes.xml')
-        footnotes_path = os.path.join(temp_dir, 'word', 'footnotes.xml')
+        package = DocxPackage(doc_bytes)
         
         updated = False
         
-        for xml_path, note_tag in [(endnotes_path, 'w:endnote'), (footnotes_path, 'w:footnote')]:
-            if not os.path.exists(xml_path):
+        # Find and update the endnote
+        for part_name, note_tag in [(ENDNOTES_PART, 'w:endnote'), (FOOTNOTES_PART, 'w:footnote')]:
+            content = package.get_text(part_name)
+            if content is None:
                 continue
             
             # Determine note type for styling
-            note_type = 'footnote' if 'footnote' in xml_path else 'endnote'
-                
-            with open(xml_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            note_type = 'footnote' if part_name == FOOTNOTES_PART else 'endnote'
             
             # Find the note with matching ID
             # Pattern: <w:endnote w:id="N">...</w:endnote>
@@ -1260,29 +1244,15 @@ def update_document_note(doc_bytes: bytes, note_id: int, new_html: str) -> bytes
             new_content, count = re.subn(pattern, replace_note_content, content, flags=re.DOTALL)
             
             if count > 0:
-                with open(xml_path, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
+                package.set_text(part_name, new_content)
                 updated = True
                 break
         
-        # Repackage the docx
-        output_buffer = io.BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
-        
-        # Cleanup
-        shutil.rmtree(temp_dir)
-        
-        output_buffer.seek(0)
-        
         # Activate any URLs as clickable hyperlinks (use internal LinkActivator)
-        output_buffer = LinkActivator.process(output_buffer)
+        LinkActivator.process_package(package)
         
-        return output_buffer.read()
+        # Repackage the docx (single serialization)
+        return package.to_bytes()
         
     except Exception as e:
         print(f"[update_document_note] Error: {e}")
@@ -1353,92 +1323,63 @@ def html_to_word_xml(html: str, note_type: str = 'endnote') -> str:
 # Added: 2025-12-12 - Support for unified processor architecture
 # =============================================================================
 
-def extract_body_text(file_bytes: bytes) -> str:
+def extract_body_text(file_bytes) -> str:
     """
     Extract plain text from document body.
     
     Args:
-        file_bytes: Document as bytes
+        file_bytes: Document as bytes, or a shared DocxPackage
         
     Returns:
         Plain text string
     """
-    NS_BODY = {
-        'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-    }
-    
     try:
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            if 'word/document.xml' not in zf.namelist():
-                return ""
-            
-            with zf.open('word/document.xml') as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-            
-            text_parts = []
-            
-            for para in root.findall('.//w:p', NS_BODY):
-                para_text = []
-                for t in para.findall('.//w:t', NS_BODY):
-                    if t.text:
-                        para_text.append(t.text)
-                if para_text:
-                    text_parts.append(''.join(para_text))
-            
-            return '\n'.join(text_parts)
+        package = DocxPackage.ensure(file_bytes)
+        
+        if not package.has_part(DOCUMENT_PART):
+            return ""
+        
+        text_parts = [para for para in package.body_paragraphs() if para]
+        
+        return '\n'.join(text_parts)
             
     except Exception as e:
         print(f"[WordDocument] Error extracting text: {e}")
         return ""
 
 
-def extract_body_text_with_positions(file_bytes: bytes) -> List[Dict]:
+def extract_body_text_with_positions(file_bytes) -> List[Dict]:
     """
     Extract text with paragraph and character positions.
     
     Returns list of paragraphs with their text and position info.
     
     Args:
-        file_bytes: Document as bytes
+        file_bytes: Document as bytes, or a shared DocxPackage
         
     Returns:
         List of dicts with 'text', 'para_index', 'char_start', 'char_end'
     """
-    NS_BODY = {
-        'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-    }
-    
     try:
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            if 'word/document.xml' not in zf.namelist():
-                return []
-            
-            with zf.open('word/document.xml') as f:
-                tree = ET.parse(f)
-                root = tree.getroot()
-            
-            paragraphs = []
-            char_offset = 0
-            
-            for idx, para in enumerate(root.findall('.//w:p', NS_BODY)):
-                para_text = []
-                for t in para.findall('.//w:t', NS_BODY):
-                    if t.text:
-                        para_text.append(t.text)
-                
-                full_text = ''.join(para_text)
-                
-                paragraphs.append({
-                    'text': full_text,
-                    'para_index': idx,
-                    'char_start': char_offset,
-                    'char_end': char_offset + len(full_text),
-                })
-                
-                char_offset += len(full_text) + 1  # +1 for newline
+        package = DocxPackage.ensure(file_bytes)
+        
+        if not package.has_part(DOCUMENT_PART):
+            return []
+        
+        paragraphs = []
+        char_offset = 0
+        
+        for idx, full_text in enumerate(package.body_paragraphs()):
+            paragraphs.append({
+                'text': full_text,
+                'para_index': idx,
+                'char_start': char_offset,
+                'char_end': char_offset + len(full_text),
+            })
             
-            return paragraphs
+            char_offset += len(full_text) + 1  # +1 for newline
+        
+        return paragraphs
             
     except Exception as e:
         print(f"[WordDocument] Error extracting positions: {e}")
@@ -1462,63 +1403,65 @@ def apply_text_replacements(
     if not replacements:
         return file_bytes
     
-    temp_dir = tempfile.mkdtemp()
-    
     try:
-        # Extract docx
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            zf.extractall(temp_dir)
-        
-        doc_path = os.path.join(temp_dir, 'word', 'document.xml')
-        
-        if not os.path.exists(doc_path):
-            return file_bytes
-        
-        # Read document XML
-        with open(doc_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        package = DocxPackage(file_bytes)
+        apply_text_replacements_to_package(package, replacements)
+        return package.to_bytes()
         
-        # Apply each replacement
-        for repl in replacements:
-            original = repl.get('original', '')
-            replacement = repl.get('replacement', '')
-            
-            if not original:
-                continue
-            
-            # Escape for XML
-            original_escaped = html.escape(original)
-            replacement_escaped = html.escape(replacement)
-            
-            # Simple case: text is in a single w:t element
-            simple_pattern = f'>{re.escape(original_escaped)}<'
-            simple_replacement = f'>{replacement_escaped}<'
-            
-            if re.search(simple_pattern, content):
-                content = re.sub(simple_pattern, simple_replacement, content)
+    except Exception as e:
+        print(f"[WordDocument] Error applying replacements: {e}")
+        return file_bytes
+
+
+def apply_text_replacements_to_package(
+    package: DocxPackage,
+    replacements: List[Dict]
+) -> int:
+    """
+    Apply text replacements to the body of a shared DocxPackage (in place).
+    
+    Args:
+        package: The in-memory document package
+        replacements: List of dicts with 'original' and 'replacement' keys
         
-        # Write updated XML
-        with open(doc_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+    Returns:
+        Number of replacements that matched
+    """
+    if not replacements:
+        return 0
+    
+    # Read document XML
+    content = package.get_text(DOCUMENT_PART)
+    if content is None:
+        return 0
+    
+    applied = 0
+    
+    # Apply each replacement
+    for repl in replacements:
+        original = repl.get('original', '')
+        replacement = repl.get('replacement', '')
         
-        # Repackage docx
-        output_buffer = BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root_dir, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root_dir, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
+        if not original:
+            continue
         
-        output_buffer.seek(0)
-        return output_buffer.read()
+        # Escape for XML
+        original_escaped = html.escape(original)
+        replacement_escaped = html.escape(replacement)
         
-    except Exception as e:
-        print(f"[WordDocument] Error applying replacements: {e}")
-        return file_bytes
+        # Simple case: text is in a single w:t element
+        simple_pattern = f'>{re.escape(original_escaped)}<'
+        simple_replacement = f'>{replacement_escaped}<'
         
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        if re.search(simple_pattern, content):
+            content = re.sub(simple_pattern, simple_replacement, content)
+            applied += 1
+    
+    # Write updated XML
+    if applied:
+        package.set_text(DOCUMENT_PART, content)
+    
+    return applied
 
 
 def append_references_section(
@@ -1545,33 +1488,53 @@ def append_references_section(
     if not references_text.strip():
         return file_bytes
     
-    temp_dir = tempfile.mkdtemp()
+    try:
+        package = DocxPackage(file_bytes)
+        if not append_references_to_package(package, references_text, style):
+            return file_bytes
+        return package.to_bytes()
+        
+    except Exception as e:
+        print(f"[WordDocument] Error appending references: {e}")
+        return file_bytes
+
+
+def append_references_to_package(
+    package: DocxPackage,
+    references_text: str,
+    style: str = "APA"
+) -> bool:
+    """
+    Append a References section to the body of a shared DocxPackage (in place).
+    
+    See append_references_section() for the layout produced.
+    
+    Args:
+        package: The in-memory document package
+        references_text: Formatted references string (entries separated by \\n\\n)
+        style: Citation style (affects heading)
+        
+    Returns:
+        True if the section was added
+    """
+    if not references_text.strip():
+        return False
+    
     NS_REF = {
         'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
         'xml': 'http://www.w3.org/XML/1998/namespace',
     }
     
     try:
-        # Extract docx
-        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zf:
-            zf.extractall(temp_dir)
-        
-        doc_path = os.path.join(temp_dir, 'word', 'document.xml')
-        
-        if not os.path.exists(doc_path):
-            return file_bytes
-        
-        # Register namespaces
-        ET.register_namespace('w', NS_REF['w'])
-        ET.register_namespace('xml', NS_REF['xml'])
+        root = package.get_tree(DOCUMENT_PART)
         
-        tree = ET.parse(doc_path)
-        root = tree.getroot()
+        if root is None:
+            return False
         
         # Find the body element
         body = root.find('.//w:body', NS_REF)
         if body is None:
-            return file_bytes
+            return False
         
         # Find sectPr (section properties) - must stay at end
         sect_pr = body.find('w:sectPr', NS_REF)
@@ -1662,24 +1625,10 @@ def append_references_section(
             else:
                 body.append(ref_para)
         
-        # Write updated XML
-        tree.write(doc_path, encoding='UTF-8', xml_declaration=True)
-        
-        # Repackage docx
-        output_buffer = BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root_dir, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root_dir, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
-        
-        output_buffer.seek(0)
-        return output_buffer.read()
+        # Mark document.xml for re-serialization
+        package.mark_modified(DOCUMENT_PART)
+        return True
         
     except Exception as e:
         print(f"[WordDocument] Error appending references: {e}")
-        return file_bytes
-        
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        return False
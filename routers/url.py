@@ -10,6 +10,8 @@ This module is the entry point for all URL-based citations. It:
 4. Falls back to generic URL scraping when no specialized handler exists
 
 Version History:
+    2026-10-16: classify_url's domain checks use domain_index (one parse, hash
+                lookups) instead of substring scans over the config lists
     2025-12-08: Initial creation - URL routing architecture
 """
 
@@ -18,7 +20,7 @@ from typing import Optional, Tuple
 from urllib.parse import urlparse
 
 from models import CitationMetadata, CitationType
-from config import NEWSPAPER_DOMAINS, GOV_AGENCY_MAP, ACADEMIC_DOMAINS, LEGAL_DOMAINS
+from domain_index import classify_domain
 
 
 # =============================================================================
@@ -346,98 +348,27 @@ def classify_url(url: str) -> Tuple[str, Optional[str]]:
     # PHASE 2: Domain-based classification
     # ==========================================================================
     
-    try:
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower().replace('www.', '')
-    except Exception:
-        return (URLType.GENERIC, None)
+    # One indexed lookup covers every domain list (see domain_index.py);
+    # the order below is the order the lists used to be scanned in
+    info = classify_domain(url)
     
     # Legal domains
-    for legal_domain in LEGAL_DOMAINS:
-        if legal_domain in domain:
-            return (URLType.LEGAL, None)
+    if info.legal:
+        return (URLType.LEGAL, None)
     
     # Newspaper domains
-    for news_domain in NEWSPAPER_DOMAINS:
-        if news_domain in domain:
-            return (URLType.NEWSPAPER, None)
-    
-    # UK government (gov.uk) - check before generic .gov
-    if 'gov.uk' in domain:
-        return (URLType.GOVERNMENT, None)
-    
-    # UK NHS and related health bodies
-    if 'nhs.uk' in domain or 'nice.org.uk' in domain:
-        return (URLType.GOVERNMENT, None)
-    
-    # UK Parliament and devolved governments
-    if 'parliament.uk' in domain or 'gov.scot' in domain or 'gov.wales' in domain:
-        return (URLType.GOVERNMENT, None)
-    
-    # Canada (.gc.ca, .canada.ca, provincial)
-    if '.gc.ca' in domain or '.canada.ca' in domain or domain.endswith('canada.ca'):
-        return (URLType.GOVERNMENT, None)
-    # Canadian provincial governments
-    canadian_provincial = [
-        'ontario.ca', 'quebec.ca', 'gov.bc.ca', 'alberta.ca',
-        'gov.mb.ca', 'gov.sk.ca', 'gov.ns.ca', 'gnb.ca',
-        'gov.nl.ca', 'gov.pe.ca', 'gov.nt.ca', 'gov.nu.ca', 'gov.yk.ca'
-    ]
-    if any(prov in domain for prov in canadian_provincial):
-        return (URLType.GOVERNMENT, None)
-    # Canadian parliament and courts
-    if 'parl.ca' in domain or 'scc-csc.ca' in domain:
-        return (URLType.GOVERNMENT, None)
-    
-    # Australia (.gov.au)
-    if '.gov.au' in domain:
-        return (URLType.GOVERNMENT, None)
-    # Australian state/territory specific patterns
-    aus_states = ['nsw.gov.au', 'vic.gov.au', 'qld.gov.au', 'wa.gov.au',
-                  'sa.gov.au', 'tas.gov.au', 'nt.gov.au', 'act.gov.au']
-    if any(state in domain for state in aus_states):
-        return (URLType.GOVERNMENT, None)
-    # CSIRO (not .gov.au but government)
-    if 'csiro.au' in domain:
-        return (URLType.GOVERNMENT, None)
-    
-    # New Zealand (.govt.nz)
-    if 'govt.nz' in domain:
-        return (URLType.GOVERNMENT, None)
-    # NZ Parliament and other government
-    if 'parliament.nz' in domain or 'elections.nz' in domain:
-        return (URLType.GOVERNMENT, None)
+    if info.newspaper:
+        return (URLType.NEWSPAPER, None)
     
-    # Ireland (.gov.ie and other government bodies)
-    if 'gov.ie' in domain:
+    # Government: UK, Canada, Australia, NZ, Ireland, EU and international
+    # organizations (config.GOVERNMENT_DOMAINS), then .gov hosts - except
+    # medical .gov sites, which should use PubMed/PMC engines
+    if info.government:
         return (URLType.GOVERNMENT, None)
-    # Irish government bodies
-    irish_gov = ['oireachtas.ie', 'courts.ie', 'cso.ie', 'revenue.ie',
-                 'citizensinformation.ie', 'hse.ie', 'centralbank.ie']
-    if any(ie_gov in domain for ie_gov in irish_gov):
-        return (URLType.GOVERNMENT, None)
-    
-    # European Union (.europa.eu)
-    if '.europa.eu' in domain or domain.endswith('europa.eu'):
-        return (URLType.GOVERNMENT, None)
-    
-    # International organizations
-    intl_orgs = ['who.int', 'un.org', 'oecd.org', 'imf.org', 
-                 'worldbank.org', 'wto.org', 'nato.int', 'icrc.org']
-    if any(org in domain for org in intl_orgs):
-        return (URLType.GOVERNMENT, None)
-    
-    # Government domains (.gov) - US and generic
-    if '.gov' in domain:
-        # Exclude medical .gov sites - they should use PubMed/PMC engines
-        medical_gov = ['pubmed', 'ncbi', 'nlm.nih', 'clinicaltrials']
-        if not any(med in domain for med in medical_gov):
-            return (URLType.GOVERNMENT, None)
     
     # Academic publisher domains
-    for academic_domain in ACADEMIC_DOMAINS:
-        if academic_domain in domain:
-            return (URLType.ACADEMIC, None)
+    if info.academic:
+        return (URLType.ACADEMIC, None)
     
     # Fallback
     return (URLType.GENERIC, None)
@@ -0,0 +1,485 @@
+"""
+citeflex/session_store.py
+
+Per-key, delta-based session persistence backends for app.SessionManager.
+
+SessionManager used to pickle the WHOLE session (processed_doc,
+original_bytes, metadata_cache, results, ...) and fsync it on every set().
+/api/process alone called set() eight times in a row, so a 5 MB upload was
+serialized and fsynced ~40 MB worth. The backends here write only what
+changed:
+
+- Every key is stored separately: JSON when the value round-trips exactly,
+  pickle otherwise
+- Large bytes values (the .docx) live out of line in a content-addressed
+  blob directory, <root>/blobs/<sha256[:2]>/<sha256>, written once
+- write() takes several keys at once (batched commit)
+- Unreferenced blobs are removed by gc_blobs()
+
+Two backends (SESSION_BACKEND):
+
+file    FileSessionStore - one directory per session, one file per key.
+        Private to the worker that holds a session in memory; other
+        workers only see it by reloading from disk.
+
+sqlite  SQLiteSessionStore - one WAL-mode SQLite file shared by all gunicorn
+        workers on the host. Every write bumps a per-session version, so a
+        worker can ask for just the keys changed since the version it holds
+        (changes_since) and serve a consistent read-your-writes view.
+
+Legacy whole-session <session_id>.pkl files are read by SessionManager and
+migrated into the configured backend.
+
+Created: 2026-10-16
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+# bytes values at least this large go to the content-addressed blob store
+BLOB_MIN_BYTES = 64 * 1024
+
+# Blobs younger than this are never garbage-collected (a concurrent writer
+# may have stored the blob but not yet its reference)
+BLOB_GC_GRACE_SECONDS = 3600
+
+# Value kinds
+KIND_JSON = 'json'
+KIND_PICKLE = 'pkl'
+KIND_BLOB = 'blob'
+
+META_FILE = 'meta.json'
+BLOB_DIR = 'blobs'
+SQLITE_FILE = 'sessions.db'
+
+
+# =============================================================================
+# SHARED HELPERS (atomic files, blobs, value encoding)
+# =============================================================================
+
+def _write_file(path: Path, payload: bytes) -> int:
+    """Write atomically: temp file, fsync, rename."""
+    temp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temp, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    return len(payload)
+
+
+class BlobStore:
+    """Content-addressed files for large bytes values."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, value: bytes) -> str:
+        """Store bytes under their hash (once); return the hash."""
+        digest = hashlib.sha256(value).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            # Refresh mtime so the GC grace period covers the new reference
+            os.utime(path)
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_file(path, value)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def collect(self, referenced: Set[str]) -> int:
+        """Delete blobs not in referenced (past the grace period)."""
+        if not self.root.exists():
+            return 0
+        removed = 0
+        cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+        for blob in self.root.glob('*/*'):
+            try:
+                if blob.name not in referenced and blob.stat().st_mtime < cutoff:
+                    blob.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+def encode_value(value: Any, blobs: BlobStore) -> Tuple[str, bytes]:
+    """Pick the cheapest faithful encoding for a value: (kind, payload)."""
+    if isinstance(value, (bytes, bytearray)) and len(value) >= BLOB_MIN_BYTES:
+        digest = blobs.put(bytes(value))
+        return KIND_BLOB, json.dumps({'sha256': digest, 'size': len(value)}).encode('utf-8')
+
+    if not isinstance(value, (bytes, bytearray)):
+        try:
+            text = json.dumps(value)
+            # Only if JSON gives the value back unchanged (no tuples, int keys, ...)
+            if json.loads(text) == value:
+                return KIND_JSON, text.encode('utf-8')
+        except (TypeError, ValueError):
+            pass
+
+    return KIND_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_value(kind: str, payload: bytes, blobs: BlobStore) -> Any:
+    if kind == KIND_JSON:
+        return json.loads(payload)
+    if kind == KIND_BLOB:
+        return blobs.get(json.loads(payload)['sha256'])
+    return pickle.loads(payload)
+
+
+def _blob_digest(payload: bytes) -> Optional[str]:
+    try:
+        return json.loads(payload)['sha256']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+# =============================================================================
+# FILE BACKEND
+# =============================================================================
+
+class FileSessionStore:
+    """
+    Directory-per-session store with one file per key:
+
+        <root>/<session_id>/meta.json      created_at / expires_at
+        <root>/<session_id>/<key>.json     small JSON-safe values
+        <root>/<session_id>/<key>.pkl      other small values
+        <root>/<session_id>/<key>.blob     {"sha256", "size"} -> blob
+
+    Not thread-safe per session: callers serialize writes to the same
+    session (SessionManager does).
+    """
+
+    shared = False
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.blobs = BlobStore(self.root / BLOB_DIR)
+
+    def write(
+        self,
+        session_id: str,
+        changes: Dict[str, Any],
+        meta: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Persist changed keys (and optionally the session metadata).
+
+        Args:
+            session_id: The session
+            changes: key -> new value; only these keys are written
+            meta: New created_at/expires_at record, if it changed
+
+        Returns:
+            New session version (always 0 - files aren't versioned)
+        """
+        session_dir = self.root / session_id
+        session_dir.mkdir(parents=True, exist_ok=True)
+
+        if meta is not None:
+            _write_file(session_dir / META_FILE, json.dumps(meta).encode('utf-8'))
+
+        for key, value in changes.items():
+            kind, payload = encode_value(value, self.blobs)
+            stem = quote(key, safe='')
+            _write_file(session_dir / f"{stem}.{kind}", payload)
+            # A key can change encoding (e.g. None -> bytes); drop the stale file
+            for other in (KIND_JSON, KIND_PICKLE, KIND_BLOB):
+                if other != kind:
+                    stale = session_dir / f"{stem}.{other}"
+                    if stale.exists():
+                        stale.unlink()
+
+        return 0
+
+    def read(self, session_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], int]]:
+        """
+        Load one session.
+
+        Returns:
+            (meta, data, version), or None if the session isn't stored
+        """
+        session_dir = self.root / session_id
+        meta = self.read_meta(session_id)
+        if meta is None:
+            return None
+
+        data: Dict[str, Any] = {}
+        for path in session_dir.iterdir():
+            kind = path.suffix[1:]
+            if kind in (KIND_JSON, KIND_PICKLE, KIND_BLOB) and path.name != META_FILE:
+                data[unquote(path.stem)] = decode_value(kind, path.read_bytes(), self.blobs)
+        return meta, data, 0
+
+    def read_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Session metadata only (no values), or None."""
+        meta_path = self.root / session_id / META_FILE
+        try:
+            return json.loads(meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session's files (its blobs are left to gc_blobs)."""
+        shutil.rmtree(self.root / session_id, ignore_errors=True)
+
+    def session_ids(self) -> Iterator[str]:
+        """Ids of all stored sessions."""
+        if not self.root.exists():
+            return
+        for path in self.root.iterdir():
+            if path.is_dir() and path.name != BLOB_DIR:
+                yield path.name
+
+    def gc_blobs(self) -> int:
+        """
+        Delete blobs no stored session references.
+
+        Returns:
+            Number of blobs removed
+        """
+        referenced: Set[str] = set()
+        for session_id in self.session_ids():
+            for ref in (self.root / session_id).glob(f'*.{KIND_BLOB}'):
+                try:
+                    digest = _blob_digest(ref.read_bytes())
+                except OSError:
+                    continue
+                if digest:
+                    referenced.add(digest)
+        return self.blobs.collect(referenced)
+
+
+# =============================================================================
+# SQLITE BACKEND (shared by all workers on the host)
+# =============================================================================
+
+class SQLiteSessionStore:
+    """
+    Sessions in one WAL-mode SQLite file, blobs out of line.
+
+    Tables:
+        sessions(id, created_at, expires_at, expires_ts, version)
+        session_values(session_id, key, kind, payload, version)
+
+    A write bumps sessions.version and stamps the written values with it,
+    so changes_since(id, v) returns exactly the keys other workers changed.
+    Connections are per thread (and per process, since gunicorn forks).
+    """
+
+    shared = True
+
+    def __init__(self, root: Path, db_path: Optional[Path] = None):
+        self.root = Path(root)
+        self.db_path = Path(db_path) if db_path else self.root / SQLITE_FILE
+        self.blobs = BlobStore(self.root / BLOB_DIR)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " created_at TEXT NOT NULL,"
+                " expires_at TEXT NOT NULL,"
+                " expires_ts REAL NOT NULL,"
+                " version INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_values ("
+                " session_id TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " payload BLOB NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " PRIMARY KEY (session_id, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_ts)")
+
+    def _connect(self, write: bool = True) -> sqlite3.Connection:
+        """
+        The thread's connection as a transaction block.
+
+        Writes take SQLite's write lock up front (IMMEDIATE); reads use a
+        deferred transaction - a consistent WAL snapshot that never waits
+        for, or blocks, writers in other workers.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return _Transaction(conn, 'IMMEDIATE' if write else 'DEFERRED')
+
+    def write(
+        self,
+        session_id: str,
+        changes: Dict[str, Any],
+        meta: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Persist changed keys (and optionally the session metadata) in one
+        transaction.
+
+        Returns:
+            The session's new version
+        """
+        # Encode (and write blobs) before taking the database write lock
+        encoded = [(key,) + encode_value(value, self.blobs) for key, value in changes.items()]
+
+        with self._connect() as conn:
+            if meta is not None:
+                conn.execute(
+                    "INSERT INTO sessions (id, created_at, expires_at, expires_ts, version)"
+                    " VALUES (?, ?, ?, ?, 0)"
+                    " ON CONFLICT(id) DO UPDATE SET created_at = excluded.created_at,"
+                    " expires_at = excluded.expires_at, expires_ts = excluded.expires_ts",
+                    (session_id, meta['created_at'], meta['expires_at'], _iso_timestamp(meta['expires_at']))
+                )
+            cursor = conn.execute(
+                "UPDATE sessions SET version = version + 1 WHERE id = ? RETURNING version",
+                (session_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                # Deleted (e.g. expired by another worker) - don't resurrect values
+                return 0
+            version = row[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_values (session_id, key, kind, payload, version)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(session_id, key, kind, payload, version) for key, kind, payload in encoded]
+            )
+        return version
+
+    def read(self, session_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], int]]:
+        """
+        Load one session.
+
+        Returns:
+            (meta, data, version), or None if the session isn't stored
+        """
+        with self._connect(write=False) as conn:
+            row = conn.execute(
+                "SELECT created_at, expires_at, version FROM sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            values = conn.execute(
+                "SELECT key, kind, payload FROM session_values WHERE session_id = ?",
+                (session_id,)
+            ).fetchall()
+        meta = {'created_at': row[0], 'expires_at': row[1]}
+        data = {key: decode_value(kind, payload, self.blobs) for key, kind, payload in values}
+        return meta, data, row[2]
+
+    def read_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect(write=False) as conn:
+            row = conn.execute(
+                "SELECT created_at, expires_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return {'created_at': row[0], 'expires_at': row[1]} if row else None
+
+    def changes_since(self, session_id: str, version: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Keys written (by any worker) after the given version.
+
+        Returns:
+            (current version, changed values), or None if the session is gone
+        """
+        with self._connect(write=False) as conn:
+            row = conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0] == version:
+                return version, {}
+            values = conn.execute(
+                "SELECT key, kind, payload FROM session_values WHERE session_id = ? AND version > ?",
+                (session_id, version)
+            ).fetchall()
+        return row[0], {key: decode_value(kind, payload, self.blobs) for key, kind, payload in values}
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_values WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def session_ids(self) -> Iterator[str]:
+        with self._connect(write=False) as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM sessions")]
+        return iter(ids)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete every expired session (from any worker); returns how many."""
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM session_values WHERE session_id IN"
+                " (SELECT id FROM sessions WHERE expires_ts <= ?)",
+                (now,)
+            )
+            return conn.execute("DELETE FROM sessions WHERE expires_ts <= ?", (now,)).rowcount
+
+    def gc_blobs(self) -> int:
+        with self._connect(write=False) as conn:
+            rows = conn.execute(
+                "SELECT payload FROM session_values WHERE kind = ?", (KIND_BLOB,)
+            ).fetchall()
+        referenced = {digest for digest in (_blob_digest(row[0]) for row in rows) if digest}
+        return self.blobs.collect(referenced)
+
+
+class _Transaction:
+    """`with` block = one transaction (IMMEDIATE or DEFERRED) on an autocommit connection."""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str = 'IMMEDIATE'):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _iso_timestamp(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+# =============================================================================
+# FACTORY
+# =============================================================================
+
+def make_session_store(backend: str, root: Path):
+    """
+    Build the configured backend.
+
+    Args:
+        backend: 'sqlite' or 'file'
+        root: Session storage directory (blobs and the SQLite file live here)
+    """
+    if backend == 'sqlite':
+        return SQLiteSessionStore(root)
+    return FileSessionStore(root)
+
@@ -4,6 +4,15 @@ citeflex/unified_router.py
 Unified routing logic combining the best of CiteFlex Pro and Cite Fix Pro.
 
 Version History:
+    2026-10-16: get_parenthetical_metadata_batch() - author-date citations of
+                a document looked up with batched AI requests
+    2026-10-16: URL classification (_is_newspaper_url, _is_medical_url,
+                _is_academic_ai_url, PubMed-indexed publishers) via domain_index
+    2026-10-16: Academic fan-out exits early on a confident author match and
+                hedges to backup engines (FANOUT_MODE)
+    2026-10-16: Free-engine fan-out runs on the shared event loop and pooled
+                HTTP client (engines/http_client.py) instead of a
+                ThreadPoolExecutor per query; negative-result cache
     2025-12-12 V4.0: MAJOR - Consolidated AI into engines/ai_lookup.py
                      - Removed dependencies on routers/claude.py, routers/gemini.py
                      - AI classification now uses configurable provider chain
@@ -27,20 +36,36 @@ KEY IMPROVEMENTS OVER ORIGINAL router.py:
 
 ARCHITECTURE:
 - Wrapper classes convert superlegal.py/books.py dicts → CitationMetadata
-- Parallel execution via ThreadPoolExecutor (12s timeout)
+- Parallel execution via async fan-out on the shared HTTP client (12s timeout),
+  ending early on a confident match and hedging to backup engines
 - Routing priority: Legal → URL handling → Parallel search → AI Fallback
 - AI provider chain: gemini → openai → claude (configurable via env var)
 """
 
 import re
-from typing import Optional, Tuple, List
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Optional, Tuple, List, Dict
 
 from models import CitationMetadata, CitationType
-from config import NEWSPAPER_DOMAINS, GOV_AGENCY_MAP, ACADEMIC_AI_DOMAINS
+from config import (
+    FANOUT_MODE,
+    FANOUT_ACCEPT_SCORE,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_DEFAULT_DELAY,
+)
 from detectors import detect_type, DetectionResult, is_url
 from extractors import extract_by_type
 from formatters.base import get_formatter
+from engines.http_client import run_sync, fan_out, engine_latency
+from domain_index import classify_domain
+import metrics
+from negative_cache import (
+    get_negative_cache,
+    track_lookup_problems,
+    report_lookup_problem,
+    classify_miss,
+    TIMEOUT as NEGATIVE_TIMEOUT,
+)
 
 # Import CiteFlex Pro engines
 from engines.academic import CrossrefEngine, OpenAlexEngine, SemanticScholarEngine, PubMedEngine
@@ -122,10 +147,14 @@ else:
 # =============================================================================
 
 PARALLEL_TIMEOUT = 12  # seconds
-MAX_WORKERS = 4
+MAX_WORKERS = 4  # Free engines queried concurrently per lookup
 
-# Medical domains that should NOT route to government engine
-MEDICAL_DOMAINS = ['pubmed', 'ncbi.nlm.nih.gov', 'nih.gov/health', 'medlineplus']
+# Hedged fan-out: engines queried first; the rest start only when these are slow
+PRIMARY_ENGINES = ("Crossref", "OpenAlex")
+
+# Negative-cache scopes (route_citation vs. author-date parenthetical lookups)
+NEGATIVE_SCOPE_ROUTE = 'route'
+NEGATIVE_SCOPE_PARENTHETICAL = 'parenthetical'
 
 
 # =============================================================================
@@ -716,6 +745,7 @@ def _is_citation_complete(meta: CitationMetadata) -> bool:
 # UNIFIED LEGAL SEARCH (uses superlegal.py)
 # =============================================================================
 
+@metrics.timed('layer', 'legal')
 def _route_legal(query: str) -> Optional[CitationMetadata]:
     """
     Route legal case queries using Cite Fix Pro's superlegal.py.
@@ -740,6 +770,7 @@ def _route_legal(query: str) -> Optional[CitationMetadata]:
 # UNIFIED BOOK SEARCH (uses books.py)
 # =============================================================================
 
+@metrics.timed('layer', 'books')
 def _route_book(query: str) -> Optional[CitationMetadata]:
     """
     Route book queries using Cite Fix Pro's books.py.
@@ -763,6 +794,22 @@ def _route_book(query: str) -> Optional[CitationMetadata]:
 # UNIFIED JOURNAL SEARCH (parallel execution)
 # =============================================================================
 
+def _hedge_delay(primary: dict) -> float:
+    """
+    Seconds to wait for the primary engines before hedging.
+    
+    Uses the slowest primary's recent p95 latency, or HEDGE_DEFAULT_DELAY
+    until enough samples have been recorded.
+    """
+    delays = [
+        engine_latency.percentile(name, HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES)
+        for name in primary
+    ]
+    if any(d is None for d in delays):
+        return HEDGE_DEFAULT_DELAY
+    return max(delays)
+
+
 def _route_journal(query: str, gist: str = "") -> Optional[CitationMetadata]:
     """
     Route journal/academic queries using parallel API execution.
@@ -778,50 +825,67 @@ def _route_journal(query: str, gist: str = "") -> Optional[CitationMetadata]:
     the Eric Caplan paper (sole author) rather than Louis Caplan (neurologist).
     """
     # Layer 1-2: Check famous papers cache first (instant lookup for 10,000 most-cited)
-    famous = find_famous_paper(query)
-    if famous:
-        try:
-            result = _crossref.get_by_id(famous["doi"])
-            if result:
-                print("[UnifiedRouter] Found via Famous Papers cache")
-                return result
-        except Exception:
-            pass
+    with metrics.timed('layer', 'famous_cache'):
+        famous = find_famous_paper(query)
+        result = None
+        if famous:
+            try:
+                result = _crossref.get_by_id(famous["doi"])
+            except Exception:
+                pass
+    if result:
+        print("[UnifiedRouter] Found via Famous Papers cache")
+        return result
     
     # Layer 3: Check for DOI in query (instant lookup)
     doi_match = re.search(r'(10\.\d{4,}/[^\s]+)', query)
     if doi_match:
         doi = doi_match.group(1).rstrip('.,;')
-        try:
-            result = _crossref.get_by_id(doi)
-            if result:
-                print("[UnifiedRouter] Found via direct DOI lookup")
-                return result
-        except Exception:
-            pass
+        with metrics.timed('layer', 'doi'):
+            try:
+                result = _crossref.get_by_id(doi)
+            except Exception:
+                pass
+        if result:
+            print("[UnifiedRouter] Found via direct DOI lookup")
+            return result
     
     # Layer 4: Parallel search across FREE academic engines
+    # (async fan-out on the shared loop / pooled HTTP client - no per-query threads)
     results = []
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {
-            executor.submit(_crossref.search, query): "Crossref",
-            executor.submit(_openalex.search, query): "OpenAlex",
-            executor.submit(_semantic.search, query): "Semantic Scholar",
-            executor.submit(_pubmed.search, query): "PubMed",
-        }
-        
-        for future in as_completed(futures, timeout=PARALLEL_TIMEOUT):
-            engine_name = futures[future]
-            try:
-                result = future.result(timeout=2)
-                if result and result.has_minimum_data():
-                    result.source_engine = engine_name
-                    # Score by author position
-                    result.confidence = _score_author_position(result, query)
-                    results.append(result)
-            except Exception:
-                pass
+    def score(engine_name: str, result: Optional[CitationMetadata]) -> bool:
+        """Score each result as it arrives; True ends the fan-out early."""
+        if not (result and result.has_minimum_data()):
+            return False
+        result.source_engine = engine_name
+        # Score by author position
+        result.confidence = _score_author_position(result, query)
+        results.append(result)
+        return FANOUT_MODE != 'all' and result.confidence >= FANOUT_ACCEPT_SCORE
+    
+    engines = {
+        "Crossref": lambda: _crossref.search_async(query),
+        "OpenAlex": lambda: _openalex.search_async(query),
+        "Semantic Scholar": lambda: _semantic.search_async(query),
+        "PubMed": lambda: _pubmed.search_async(query),
+    }
+    with metrics.timed('layer', 'free_engines'):
+        if FANOUT_MODE == 'hedged':
+            primary = {name: engines[name] for name in PRIMARY_ENGINES}
+            hedges = {name: call for name, call in engines.items() if name not in primary}
+            completed, timed_out = run_sync(fan_out(
+                primary, timeout=PARALLEL_TIMEOUT, accept=score,
+                hedges=hedges, hedge_after=_hedge_delay(primary)
+            ))
+        else:
+            completed, timed_out = run_sync(fan_out(engines, timeout=PARALLEL_TIMEOUT, accept=score))
+    
+    if timed_out:
+        metrics.count('layer', 'timeout', 'free_engines')
+        # Keep whatever finished in time; remember the miss may be transient
+        print(f"[UnifiedRouter] Free engines timed out after {PARALLEL_TIMEOUT}s")
+        report_lookup_problem(NEGATIVE_TIMEOUT)
     
     # Sort by author-position score (highest first)
     if results:
@@ -838,7 +902,8 @@ def _route_journal(query: str, gist: str = "") -> Optional[CitationMetadata]:
     # Layer 4.5: Try Google Scholar (paid, better for fragments)
     if GOOGLE_SCHOLAR_AVAILABLE:
         try:
-            gs_result = _google_scholar.search(query)
+            with metrics.timed('layer', 'scholar'):
+                gs_result = _google_scholar.search(query)
             if gs_result and gs_result.has_minimum_data():
                 gs_result.confidence = _score_author_position(gs_result, query)
                 if gs_result.confidence >= 0.7:
@@ -852,7 +917,8 @@ def _route_journal(query: str, gist: str = "") -> Optional[CitationMetadata]:
     # Layer 6: AI lookup with verification (last resort)
     if AI_AVAILABLE:
         try:
-            ai_result = lookup_fragment(query, gist=gist, verify=True)
+            with metrics.timed('layer', 'ai'):
+                ai_result = lookup_fragment(query, gist=gist, verify=True)
             if ai_result:
                 print(f"[UnifiedRouter] Found via AI lookup: {ai_result.title[:50]}...")
                 return ai_result
@@ -874,8 +940,7 @@ def _route_journal(query: str, gist: str = "") -> Optional[CitationMetadata]:
 
 def _is_medical_url(url: str) -> bool:
     """Check if URL is a medical resource (PubMed, NIH, etc.)."""
-    url_lower = url.lower()
-    return any(domain in url_lower for domain in MEDICAL_DOMAINS)
+    return classify_domain(url).medical
 
 
 def _is_newspaper_url(url: str) -> bool:
@@ -883,20 +948,9 @@ def _is_newspaper_url(url: str) -> bool:
     Check if URL is from a newspaper or magazine domain.
     
     Uses NEWSPAPER_DOMAINS from config.py which includes major publications
-    like NYT, WSJ, The Atlantic, The New Yorker, etc.
+    like NYT, WSJ, The Atlantic, The New Yorker, etc. (indexed, see domain_index.py)
     """
-    try:
-        from urllib.parse import urlparse
-        parsed = urlparse(url.lower())
-        domain = parsed.netloc.replace('www.', '')
-        
-        # Check against known newspaper/magazine domains
-        for news_domain in NEWSPAPER_DOMAINS:
-            if news_domain in domain:
-                return True
-        return False
-    except Exception:
-        return False
+    return classify_domain(url).newspaper is not None
 
 
 def _is_academic_ai_url(url: str) -> bool:
@@ -914,20 +968,10 @@ def _is_academic_ai_url(url: str) -> bool:
     These sources often lack DOIs or aren't consistently indexed in
     Crossref/OpenAlex/Semantic Scholar.
     """
-    try:
-        from urllib.parse import urlparse
-        parsed = urlparse(url.lower())
-        domain = parsed.netloc.replace('www.', '')
-        
-        # Check against known academic AI domains
-        for academic_domain in ACADEMIC_AI_DOMAINS:
-            if academic_domain in domain:
-                return True
-        return False
-    except Exception:
-        return False
+    return classify_domain(url).academic_ai is not None
 
 
+@metrics.timed('layer', 'url')
 def _route_url(url: str) -> Optional[CitationMetadata]:
     """
     Route URL-based queries.
@@ -997,19 +1041,8 @@ def _route_url(url: str) -> Optional[CitationMetadata]:
     # Example: PIIS0140-6736(51)91311-6 in Lancet URLs
     # ==========================================================================
     
-    PUBMED_INDEXED_PUBLISHERS = [
-        'thelancet.com',
-        'sciencedirect.com', 
-        'cell.com',
-        'nejm.org',
-        'jamanetwork.com',
-        'bmj.com',
-    ]
-    
-    url_lower = url.lower()
-    is_pubmed_publisher = any(pub in url_lower for pub in PUBMED_INDEXED_PUBLISHERS)
-    
-    if is_pubmed_publisher:
+    # PUBMED_INDEXED_PUBLISHERS in config.py
+    if classify_domain(url).pubmed_publisher:
         # Try to extract PII from URL (e.g., PIIS0140-6736(51)91311-6)
         pii_match = re.search(r'PII([A-Z0-9\-\(\)]+)', url, re.IGNORECASE)
         if pii_match:
@@ -1108,6 +1141,7 @@ def _route_url(url: str) -> Optional[CitationMetadata]:
 # MAIN ROUTING FUNCTION
 # =============================================================================
 
+@metrics.timed('route', 'route_citation')
 def route_citation(query: str, style: str = "chicago", context: str = "", metadata_cache=None) -> Tuple[Optional[CitationMetadata], str]:
     """
     Main entry point: route query to appropriate engine and format result.
@@ -1127,6 +1161,10 @@ def route_citation(query: str, style: str = "chicago", context: str = "", metada
     
     NEW (V4.1): Checks metadata_cache before any API calls. If citation is found
     in cache, returns cached metadata immediately (skips all lookups).
+    
+    NEW (2026-10-16): Text that recently failed the whole chain with the
+    same context is skipped until its negative-cache entry expires (see
+    negative_cache.py).
     """
     query = query.strip()
     if not query:
@@ -1148,28 +1186,57 @@ def route_citation(query: str, style: str = "chicago", context: str = "", metada
     parsed = parse_existing_citation(query)
     if parsed and _is_citation_complete(parsed):
         print(f"[UnifiedRouter] Parsed complete citation: {parsed.citation_type.name}")
+        metrics.count('route', 'parsed_complete')
         # Store in cache if available
         if metadata_cache is not None:
             metadata_cache.set(query, parsed)
         return parsed, formatter.format(parsed)
     
+    # NEGATIVE CACHE: this exact text recently failed the whole chain -
+    # don't pay for the cascade again until the miss expires
+    negative_cache = get_negative_cache()
+    if negative_cache.get(NEGATIVE_SCOPE_ROUTE, query, context=context):
+        metrics.count('negative_cache', 'skip', NEGATIVE_SCOPE_ROUTE)
+        return None, ""
+    
+    with track_lookup_problems() as problems:
+        metadata = _resolve_metadata(query, context)
+    
+    # Format and return
+    if metadata:
+        # Store in cache if available (new V4.1)
+        if metadata_cache is not None:
+            metadata_cache.set(query, metadata)
+        return metadata, formatter.format(metadata)
+    
+    negative_cache.record(NEGATIVE_SCOPE_ROUTE, query, classify_miss(problems), context=context)
+    return None, ""
+
+
+def _resolve_metadata(query: str, context: str = "") -> Optional[CitationMetadata]:
+    """
+    Run the engine chain for route_citation() (everything after the caches).
+    
+    Args:
+        query: The citation text (stripped)
+        context: Optional document context/gist
+        
+    Returns:
+        CitationMetadata, or None if nothing matched
+    """
+    metadata = None
+    
     # 1. Check for legal citation FIRST (superlegal.py handles famous cases)
     if superlegal.is_legal_citation(query):
         metadata = _route_legal(query)
         if metadata:
-            # Store in cache if available (V4.1)
-            if metadata_cache is not None:
-                metadata_cache.set(query, metadata)
-            return metadata, formatter.format(metadata)
+            return metadata
     
     # 2. Check for URL
     if is_url(query):
         metadata = _route_url(query)
         if metadata:
-            # Store in cache if available (V4.1)
-            if metadata_cache is not None:
-                metadata_cache.set(query, metadata)
-            return metadata, formatter.format(metadata)
+            return metadata
     
     # 3. Detect type using standard detectors
     detection = detect_type(query)
@@ -1227,14 +1294,7 @@ def route_citation(query: str, style: str = "chicago", context: str = "", metada
         if not metadata:
             metadata = _route_journal(query, gist=context)
     
-    # Format and return
-    if metadata:
-        # Store in cache if available (new V4.1)
-        if metadata_cache is not None:
-            metadata_cache.set(query, metadata)
-        return metadata, formatter.format(metadata)
-    
-    return None, ""
+    return metadata
 
 
 # =============================================================================
@@ -1813,13 +1873,19 @@ def get_parenthetical_metadata(
     Returns:
         List of CitationMetadata objects (unformatted).
     """
+    negative_cache = get_negative_cache()
+    if negative_cache.get(NEGATIVE_SCOPE_PARENTHETICAL, citation_text, context=context):
+        return []
+    
     try:
         from engines.ai_lookup import lookup_parenthetical_citation_options
         
-        metadata_list = lookup_parenthetical_citation_options(citation_text, context=context, limit=limit)
+        with track_lookup_problems() as problems:
+            metadata_list = lookup_parenthetical_citation_options(citation_text, context=context, limit=limit)
         
         if not metadata_list:
             print(f"[UnifiedRouter] No metadata found for: {citation_text}")
+            negative_cache.record(NEGATIVE_SCOPE_PARENTHETICAL, citation_text, classify_miss(problems), context=context)
             return []
         
         print(f"[UnifiedRouter] Returning {len(metadata_list)} metadata options")
@@ -1833,6 +1899,64 @@ def get_parenthetical_metadata(
         return []
 
 
+def get_parenthetical_metadata_batch(
+    citation_texts: List[str],
+    limit: int = 5,
+    context: str = ""
+) -> Dict[str, List[CitationMetadata]]:
+    """
+    get_parenthetical_metadata for many citations, with batched AI requests.
+    
+    The document context is sent once per request instead of once per
+    citation. Citations in the negative cache are skipped, and misses are
+    recorded there, as for single lookups. Citations no provider answered
+    are left out of the result (and not recorded), so the caller can look
+    them up on their own.
+    
+    Args:
+        citation_texts: Texts like "(Simonton, 1992)"
+        limit: Maximum options per citation
+        context: Optional document context/gist shared by all citations
+        
+    Returns:
+        Dict mapping citation text -> metadata options (empty list if none;
+        missing if the lookup got no answer)
+    """
+    negative_cache = get_negative_cache()
+    results: Dict[str, List[CitationMetadata]] = {}
+    pending = []
+    for text in dict.fromkeys(citation_texts):
+        if negative_cache.get(NEGATIVE_SCOPE_PARENTHETICAL, text, context=context):
+            results[text] = []
+        else:
+            pending.append(text)
+    if not pending:
+        return results
+    
+    try:
+        from engines.ai_lookup import batch_lookup_parenthetical_options
+        
+        with track_lookup_problems() as problems:
+            options = batch_lookup_parenthetical_options(pending, context=context, limit=limit)
+        
+        for text, metadata_list in zip(pending, options):
+            if metadata_list is None:
+                continue
+            results[text] = metadata_list
+            if not metadata_list:
+                negative_cache.record(NEGATIVE_SCOPE_PARENTHETICAL, text, classify_miss(problems), context=context)
+        
+        print(f"[UnifiedRouter] Batched metadata: {sum(1 for t in pending if results.get(t))}/{len(pending)} citations found")
+        return results
+        
+    except ImportError:
+        print("[UnifiedRouter] ai_lookup module not available")
+        return results
+    except Exception as e:
+        print(f"[UnifiedRouter] Error in get_parenthetical_metadata_batch: {e}")
+        return results
+
+
 # =============================================================================
 # BACKWARD COMPATIBILITY
 # =============================================================================